@@ -1,58 +1,447 @@
-from flask import Flask, request, jsonify, Response
-from bedrock_client import BedrockClient
-from errors import ConfigurationError, BedrockInvocationError
+import itertools
+import json
+import os
+import secrets
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from flask import Flask, request, jsonify, Response, stream_with_context
+from client_pool import credential_manager, get_bedrock_client, readiness, start_warm_up
+from concurrency_limiter import AdaptiveLimiter
+from errors import ConfigurationError, BedrockInvocationError, ThrottlingError, OverloadedError
+from fair_share import current_client, set_client
+from generation_policy import GenerationPolicy, StopScanner, format_report
+import metrics
+from prompt_utils import FRAME_TOKENS, GENERATION_PARAMS, build_prompt_single_turn, fit_passages, read_batch_item
+from response_cache import ResponseCache
+from semantic_cache import SemanticCache
+from session_store import HistoryCompactor, SessionStore
+from single_flight import SingleFlight
+from token_budget import TokenBudget, estimate_tokens
+from vector_store import Retriever
 
 app = Flask(__name__)
 
-def build_prompt_single_turn(user_input: str) -> str:
+# Per-message max_gen_len and trimming of invented turns (GENERATION_POLICY);
+# None keeps GENERATION_PARAMS as they are.
+generation_policy = GenerationPolicy.from_env()
+
+# Exact-match reply cache: single-turn prompts carry no history, so the
+# prompt plus GENERATION_PARAMS fully determine the request.
+response_cache = ResponseCache.from_env()
+
+# Optional paraphrase-matching cache (SEMANTIC_CACHE=1); None when disabled.
+semantic_cache = SemanticCache.from_env()
+
+# Optional retrieval of context passages (RAG_INDEX_PATH); None when disabled.
+retriever = Retriever.from_env()
+
+# Identical prompts that arrive while one is being generated share its call
+inflight = SingleFlight()
+
+# Adaptive cap on concurrent Bedrock calls; excess requests get a fast 429
+limiter = AdaptiveLimiter.from_env()
+
+# Optional multi-turn conversations (SESSION_STORE); None keeps /chat stateless.
+sessions = SessionStore.from_env()
+
+# Upper bound on the estimated prompt size (PROMPT_TOKEN_BUDGET); context
+# passages and older turns are left out, newest turns kept, to stay within it
+prompt_budget = TokenBudget.from_env()
+
+# System line for prompts that carry earlier turns (the single-turn one is
+# in prompt_utils)
+MULTI_TURN_SYSTEM = (
+    "System: Respond **only** with the assistant’s direct reply. "
+    "Do NOT explain your reasoning or talk about instructions."
+)
+SUMMARY_PREFIX = "Summary of the earlier conversation:"
+
+# Token estimate of the fixed line, counted once
+MULTI_TURN_SYSTEM_TOKENS = estimate_tokens(MULTI_TURN_SYSTEM)
+
+def build_prompt_multi_turn(session, user_input: str, passages: list[str] = None) -> str:
     """
-    Build a one-off prompt that tells Llama to ignore history and only reply directly:
-      System: Respond ONLY with the assistant’s direct reply to the user message. Do NOT include any previous conversation or extra commentary.
+    Build a prompt that continues a session:
+      System: Respond **only** with the assistant’s direct reply. ...
+      <memory slots, e.g. "You are talking to Alice.">
+      Summary of the earlier conversation: ...   (once old turns were compacted)
+      Context:            (only when retrieved passages are given)
+      User: ... / Assistant: ...   (the session's recent turns)
       User: <user_input>
       Assistant:
+    The system line, memory, summary and new message are always included;
+    passages and then the newest turns fill the rest of the token budget.
+    Turns come pre-rendered from session.history with cached token counts,
+    so earlier messages are neither formatted nor counted again.
     """
-    return "\n".join([
-        "System: Respond ONLY with the assistant’s direct reply to the user message. "
-        "Do NOT include any previous conversation or extra commentary.",
-        f"User: {user_input}",
-        "Assistant:"
-    ])
+    lines = [MULTI_TURN_SYSTEM]
+    used = MULTI_TURN_SYSTEM_TOKENS + FRAME_TOKENS + estimate_tokens(user_input)
+    memory_text = session.memory.to_prompt() if session.memory is not None else ""
+    if memory_text:
+        lines.append(memory_text)
+        used += estimate_tokens(memory_text) + 1
+    if session.summary:
+        summary_line = f"{SUMMARY_PREFIX} {session.summary}"
+        lines.append(summary_line)
+        used += estimate_tokens(summary_line) + 1
+    used = fit_passages(lines, used, passages, prompt_budget)
+    history = session.recent_history(prompt_budget.max_prompt_tokens - used)
+    if history:
+        lines.append(history)
+    lines.append(f"User: {user_input}")
+    lines.append("Assistant:")
+    return "\n".join(lines)
 
-@app.route("/chat", methods=["POST"])
-def chat_endpoint():
-    # 1) Parse JSON body
+def build_chat_prompt(user_input: str, session=None) -> str:
+    """
+    Single-turn prompt, or a multi-turn one when a session with earlier
+    turns (or a summary of them) is given, with retrieved context passages
+    when RAG is enabled.
+    """
+    passages = retriever.retrieve(user_input) if retriever is not None else None
+    if session is not None and (session.turns or session.summary):
+        return build_prompt_multi_turn(session, user_input, passages)
+    return build_prompt_single_turn(user_input, passages, prompt_budget)
+
+# Generation settings and instructions for compacting old turns
+SUMMARY_PARAMS = {"max_gen_len": 256, "temperature": 0.2, "top_p": 0.9}
+SUMMARY_SYSTEM = (
+    "System: Summarize the conversation below in a few sentences so it can be "
+    "continued later. Keep names, facts, decisions and open questions. "
+    "Respond only with the summary."
+)
+
+def summarize_history(previous_summary: str, transcript: str) -> str:
+    """
+    Fold `transcript` (old User:/Assistant: lines) into the running
+    summary. Runs on the HistoryCompactor thread and goes through the
+    limiter like any other Bedrock call.
+    """
+    lines = [SUMMARY_SYSTEM]
+    if previous_summary:
+        lines.append(f"{SUMMARY_PREFIX} {previous_summary}")
+    lines.append(transcript)
+    lines.append("Summary:")
+    return limiter.call(get_bedrock_client().invoke, "\n".join(lines), **SUMMARY_PARAMS)
+
+def start_history_compactor():
+    """
+    Give `sessions` a fresh HistoryCompactor. Runs at import and again in
+    each gunicorn worker after fork (gunicorn.conf.py post_fork): the
+    compactor's threads do not survive fork, so a worker must not rely on
+    the one built in the preloading master.
+    """
+    if sessions is not None and os.getenv("SESSION_COMPACT", "1") != "0":
+        sessions.compactor = HistoryCompactor(
+            summarize_history,
+            trigger_tokens=prompt_budget.max_prompt_tokens * 3 // 4,
+            keep_tokens=prompt_budget.max_prompt_tokens // 2,
+        )
+
+# Summarize old turns in the background once a session's history passes
+# three quarters of the prompt budget, keeping the newest half verbatim
+# (SESSION_COMPACT=0 disables it and simply leaves old turns out).
+start_history_compactor()
+
+def lookup_cached_reply(bedrock, user_input: str, prompt_text: str, semantic: bool = True, params: dict = None):
+    """
+    Check the exact-match cache, then the semantic cache if enabled and
+    `semantic` is set (it matches on the message alone, so callers turn it
+    off for prompts that carry conversation history or custom `params`).
+    Returns (reply or None, cache_key, message_vector); pass the last two to
+    remember_reply() once a fresh reply has been generated.
+    """
+    cache_key = response_cache.make_key(bedrock.model_id, prompt_text, **(params or GENERATION_PARAMS))
+    reply = response_cache.get(cache_key)
+    if reply is not None or semantic_cache is None or not semantic:
+        return reply, cache_key, None
+
+    vector = semantic_cache.embed(user_input)
+    if vector is not None:
+        reply = semantic_cache.lookup(vector)
+    return reply, cache_key, vector
+
+def remember_reply(cache_key: str, vector, reply: str):
+    response_cache.put(cache_key, reply)
+    if vector is not None:
+        semantic_cache.add(vector, reply)
+
+def trim_generation(generated: str, max_gen_len: int, report: dict = None) -> str:
+    """
+    Cut invented turns from `generated` when the generation policy is on,
+    filling `report` (if given) with its generation report. The result is
+    empty when the text was nothing but an invented turn.
+    """
+    if generation_policy is None:
+        return generated
+    reply, details = generation_policy.finish(generated, max_gen_len)
+    if report is not None:
+        report.update(details)
+    return reply
+
+def invoke_and_remember(bedrock, prompt_text: str, cache_key: str, vector, params: dict = None,
+                        report: dict = None) -> str:
+    """
+    Generate, trim and cache a reply. The generation report goes into
+    `report`, which only the request that made the call passes in, so
+    requests coalesced onto it do not claim its tokens as their own.
+    """
+    params = params or GENERATION_PARAMS
+    generated = limiter.call(bedrock.invoke, prompt_text, **params)
+    reply = trim_generation(generated, params["max_gen_len"], report)
+    if not reply:
+        # Nothing but an invented turn: pass the text on, but don't cache it
+        return generated
+    remember_reply(cache_key, vector, reply)
+    return reply
+
+def choose_generation_params(user_input: str, data) -> dict:
+    """
+    GENERATION_PARAMS with max_gen_len picked by the generation policy for
+    `user_input` and the body's optional "latency_budget_ms". Raises
+    ValueError for a malformed budget.
+    """
+    budget = data.get("latency_budget_ms") if isinstance(data, dict) else None
+    if budget is not None and (isinstance(budget, bool) or not isinstance(budget, (int, float)) or budget <= 0):
+        raise ValueError("'latency_budget_ms' must be a positive number.")
+    if generation_policy is None:
+        return GENERATION_PARAMS
+    return {**GENERATION_PARAMS, "max_gen_len": generation_policy.max_gen_len(user_input, budget)}
+
+def read_user_input():
+    """
+    Pull the "message" field out of the JSON body.
+    Returns (user_input, None) or (None, error_response).
+    """
     data = request.get_json()
     if not data or "message" not in data:
-        return jsonify({"error": "Send JSON like { 'message':'Hello' }"}), 400
+        return None, (jsonify({"error": "Send JSON like { 'message':'Hello' }"}), 400)
 
     user_input = data["message"].strip()
     if not user_input:
-        return jsonify({"error": "Message cannot be empty."}), 400
+        return None, (jsonify({"error": "Message cannot be empty."}), 400)
+    return user_input, None
 
-    # 2) Build the Bedrock prompt
-    prompt_text = build_prompt_single_turn(user_input)
+def read_session():
+    """
+    The caller's (session_id, Session or None) when sessions are enabled,
+    else (None, None). The id comes from the JSON body's "session_id" or the
+    session_id cookie; a new one is issued when neither is present.
+    """
+    if sessions is None:
+        return None, None
+    data = request.get_json(silent=True) or {}
+    return load_session(data.get("session_id") or request.cookies.get("session_id"))
+
+def load_session(session_id):
+    """
+    (session_id, Session or None) for a client-supplied id; malformed or
+    missing ids get a fresh one.
+    """
+    if not isinstance(session_id, str) or not 0 < len(session_id) <= 128:
+        return secrets.token_urlsafe(16), None
+    return session_id, sessions.get(session_id)
+
+def with_session_cookie(response, session_id: str):
+    response.set_cookie("session_id", session_id, max_age=int(sessions.idle_ttl), httponly=True, samesite="Lax")
+    return response
+
+def too_many_requests(message: str, retry_after: int):
+    response = jsonify({"error": message})
+    response.headers["Retry-After"] = str(retry_after)
+    return response, 429
+
+def sse_event(payload: dict, event: str = None) -> str:
+    """
+    Format one Server-Sent-Events frame carrying a JSON payload.
+    """
+    head = f"event: {event}\n" if event else ""
+    return f"{head}data: {json.dumps(payload)}\n\n"
+
+@app.before_request
+def start_timing():
+    metrics.start_request()
+    # Bedrock calls made for this request count against its client's share
+    fair_share = limiter.fair_share
+    if fair_share is not None:
+        set_client(fair_share.identify(request.headers.get(fair_share.header),
+                                       request.headers.get("X-Forwarded-For"), request.remote_addr))
+
+@app.after_request
+def add_server_timing(response):
+    # Stage breakdown for browser devtools; streams only cover the work
+    # done before the first byte
+    path = request.url_rule.rule if request.url_rule else "unmatched"
+    server_timing = metrics.finish_request(path, response.status_code)
+    if server_timing:
+        response.headers["Server-Timing"] = server_timing
+    return response
+
+@app.route("/chat", methods=["POST"])
+def chat_endpoint():
+    # 1) Parse JSON body
+    with metrics.stage("parse"):
+        user_input, error = read_user_input()
+    if error:
+        return error
 
-    # 3) Invoke Bedrock
     try:
-        bedrock = BedrockClient()
-        reply = bedrock.invoke(
-            prompt_text,
-            max_gen_len=512,
-            temperature=0.5,
-            top_p=0.9
-        )
+        params = choose_generation_params(user_input, request.get_json())
+    except ValueError as ve:
+        return jsonify({"error": str(ve)}), 400
+
+    # 2) Build the Bedrock prompt (continuing the session, if any)
+    with metrics.stage("session"):
+        session_id, session = read_session()
+    with metrics.stage("prompt"):
+        prompt_text = build_chat_prompt(user_input, session)
+
+    # 3) Invoke Bedrock (unless an identical prompt was answered recently)
+    report = {}
+    try:
+        with metrics.stage("client"):
+            bedrock = get_bedrock_client()
+        with metrics.stage("cache"):
+            reply, cache_key, vector = lookup_cached_reply(
+                bedrock, user_input, prompt_text, semantic=session is None, params=params
+            )
+        if reply is None:
+            reply = inflight.do(cache_key, invoke_and_remember, bedrock, prompt_text, cache_key, vector, params, report)
     except ConfigurationError as ce:
         return jsonify({"error": f"Configuration error: {ce}"}), 500
+    except OverloadedError as oe:
+        return too_many_requests(f"Server busy: {oe}", oe.retry_after)
+    except ThrottlingError as te:
+        return too_many_requests(f"Llama invocation throttled: {te}", limiter.retry_after())
     except BedrockInvocationError as be:
         return jsonify({"error": f"Llama invocation failed: {be}"}), 502
 
-    # 4) Return JSON {"reply": "<assistant_reply>"}
-    return jsonify({"reply": reply})
+    # 4) Return JSON {"reply": "<assistant_reply>"} (plus "session_id"),
+    #    with the generation report in X-Generation when this request
+    #    made the Bedrock call
+    headers = {"X-Generation": format_report(report)} if report else {}
+    if session_id is None:
+        return jsonify({"reply": reply}), headers
+    sessions.record(session_id, user_input, reply)
+    return with_session_cookie(jsonify({"reply": reply, "session_id": session_id}), session_id), headers
 
-@app.route("/", methods=["GET"])
-def index():
-    # Return a minimal single-page HTML+JS chat UI
-    html = """
+@app.route("/chat/stream", methods=["POST"])
+def chat_stream_endpoint():
+    """
+    Same request body as /chat, but the reply is sent as Server-Sent Events:
+      data: {"text": "<chunk>"}        (repeated as tokens arrive)
+      event: done / data: {}           (generation finished; carries
+                                        "session_id" when sessions are on
+                                        and the "generation" report)
+      event: error / data: {"error"}   (Bedrock failed mid-stream)
+    The stream from Bedrock is closed as soon as the model starts a new
+    "User:"/"System:" turn, and that text is not sent.
+    """
+    with metrics.stage("parse"):
+        user_input, error = read_user_input()
+    if error:
+        return error
+    try:
+        params = choose_generation_params(user_input, request.get_json())
+    except ValueError as ve:
+        return jsonify({"error": str(ve)}), 400
+
+    with metrics.stage("session"):
+        session_id, session = read_session()
+    with metrics.stage("prompt"):
+        prompt_text = build_chat_prompt(user_input, session)
+    try:
+        with metrics.stage("client"):
+            bedrock = get_bedrock_client()
+    except ConfigurationError as ce:
+        return jsonify({"error": f"Configuration error: {ce}"}), 500
+
+    with metrics.stage("cache"):
+        cached, cache_key, vector = lookup_cached_reply(bedrock, user_input, prompt_text, semantic=session is None,
+                                                        params=params)
+
+    # Take a Bedrock slot before answering so an overloaded server can still
+    # send a proper 429. The slot is held until the stream ends; the limiter
+    # learns from time-to-first-chunk, which does not grow with reply length.
+    slot = {"held": False}
+    if cached is None:
+        try:
+            limiter.acquire()
+        except OverloadedError as oe:
+            return too_many_requests(f"Server busy: {oe}", oe.retry_after)
+        slot["held"] = True
+    started = time.monotonic()
+
+    def release_slot(latency=None, throttled=False):
+        if slot["held"]:
+            slot["held"] = False
+            limiter.release(latency, throttled=throttled)
+
+    done = {"session_id": session_id} if session_id is not None else {}
+
+    def generate():
+        if cached is not None:
+            if session_id is not None:
+                sessions.record(session_id, user_input, cached)
+            yield sse_event({"text": cached})
+            yield sse_event(done, event="done")
+            return
+        chunks = []
+        latency = None      # time to first chunk
+        throttled = False
+        scanner = StopScanner() if generation_policy is not None else None
+        stream = bedrock.invoke_stream(prompt_text, **params)
+        try:
+            for chunk in stream:
+                if latency is None:
+                    latency = time.monotonic() - started
+                if scanner is not None:
+                    chunk = scanner.feed(chunk)
+                if chunk:
+                    chunks.append(chunk)
+                    yield sse_event({"text": chunk})
+                if scanner is not None and scanner.stopped:
+                    # Stop paying for invented turns: close the Bedrock stream
+                    stream.close()
+                    break
+            if scanner is not None and not scanner.stopped:
+                tail = scanner.flush()
+                if tail.strip():
+                    chunks.append(tail)
+                    yield sse_event({"text": tail})
+        except ThrottlingError as te:
+            latency, throttled = time.monotonic() - started, True
+            yield sse_event({"error": f"Llama invocation throttled: {te}"}, event="error")
+            return
+        except BedrockInvocationError as be:
+            latency = None
+            yield sse_event({"error": f"Llama invocation failed: {be}"}, event="error")
+            return
+        finally:
+            release_slot(latency, throttled)
+        reply = "".join(chunks).strip()
+        if scanner is not None:
+            generated = "".join(scanner.generated)
+            if not scanner.stopped and latency is not None:
+                generation_policy.observe(estimate_tokens(generated), time.monotonic() - started - latency)
+            _, report = generation_policy.finish(generated, params["max_gen_len"], stopped=scanner.stopped)
+            done["generation"] = report
+        if reply:
+            remember_reply(cache_key, vector, reply)
+            if session_id is not None:
+                sessions.record(session_id, user_input, reply)
+        yield sse_event(done, event="done")
+
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    response = Response(stream_with_context(generate()), mimetype="text/event-stream", headers=headers)
+    # Covers clients that disconnect before the generator ever runs
+    response.call_on_close(release_slot)
+    if session_id is not None:
+        with_session_cookie(response, session_id)
+    return response
+
+# Minimal single-page HTML+JS chat UI served at /
+INDEX_HTML = """
     <!DOCTYPE html>
     <html>
     <head>
@@ -93,6 +482,33 @@ def index():
           div.textContent = (role === 'user' ? 'You: ' : 'Assistant: ') + text;
           chatBox.appendChild(div);
           chatBox.scrollTop = chatBox.scrollHeight;
+          return div;
+        }
+
+        // Render Server-Sent Events from /chat/stream into `div` as they arrive
+        async function readStream(resp, div) {
+          const reader = resp.body.getReader();
+          const decoder = new TextDecoder();
+          let buffer = '';
+          while (true) {
+            const { value, done } = await reader.read();
+            if (done) break;
+            buffer += decoder.decode(value, { stream: true });
+            const frames = buffer.split('\n\n');
+            buffer = frames.pop();
+            for (const frame of frames) {
+              const isError = frame.startsWith('event: error');
+              const dataLine = frame.split('\n').find(l => l.startsWith('data: '));
+              if (!dataLine) continue;
+              const data = JSON.parse(dataLine.slice(6));
+              if (isError) {
+                div.textContent += ' [Error] ' + data.error;
+              } else if (data.text) {
+                div.textContent += data.text;
+              }
+              chatBox.scrollTop = chatBox.scrollHeight;
+            }
+          }
         }
 
         async function sendMessage() {
@@ -105,16 +521,16 @@ def index():
           sendBtn.disabled = true;
 
           try {
-            const resp = await fetch('/chat', {
+            const resp = await fetch('/chat/stream', {
               method: 'POST',
               headers: { 'Content-Type': 'application/json' },
               body: JSON.stringify({ message: msg })
             });
-            const data = await resp.json();
-            if (data.reply) {
-              addMessage('assistant', data.reply);
-            } else if (data.error) {
+            if (!resp.ok) {
+              const data = await resp.json();
               addMessage('assistant', '[Error] ' + data.error);
+            } else {
+              await readStream(resp, addMessage('assistant', ''));
             }
           } catch (err) {
             addMessage('assistant', '[Network error]');
@@ -138,8 +554,157 @@ def index():
     </body>
     </html>
     """
-    return Response(html, mimetype='text/html')
+
+@app.route("/", methods=["GET"])
+def index():
+    # Return a minimal single-page HTML+JS chat UI
+    return Response(INDEX_HTML, mimetype='text/html')
+
+# /chat/batch limits: items per request, and Bedrock calls in flight per batch
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "1000"))
+BATCH_PARALLELISM = int(os.getenv("BATCH_PARALLELISM", "8"))
+BATCH_MAX_PARALLELISM = int(os.getenv("BATCH_MAX_PARALLELISM", "32"))
+
+def answer_batch_item(bedrock, index: int, item) -> dict:
+    """
+    The NDJSON result line for one batch item; failures are reported in the
+    line (with the status /chat would have returned) rather than raised.
+    Items without their own max_gen_len get the generation policy's, as
+    /chat does, and the item that made the call carries its "generation"
+    report.
+    """
+    try:
+        user_input, params = read_batch_item(item)
+        default = params == GENERATION_PARAMS
+        if not (isinstance(item, dict) and "max_gen_len" in item):
+            params["max_gen_len"] = choose_generation_params(user_input, item)["max_gen_len"]
+    except ValueError as ve:
+        return {"index": index, "error": str(ve), "status": 400}
+    prompt_text = build_chat_prompt(user_input)
+    report = {}
+    try:
+        reply, cache_key, vector = lookup_cached_reply(bedrock, user_input, prompt_text, semantic=default, params=params)
+        if reply is None:
+            reply = inflight.do(cache_key, invoke_and_remember, bedrock, prompt_text, cache_key, vector, params, report)
+    except OverloadedError as oe:
+        return {"index": index, "error": f"Server busy: {oe}", "status": 429}
+    except ThrottlingError as te:
+        return {"index": index, "error": f"Llama invocation throttled: {te}", "status": 429}
+    except BedrockInvocationError as be:
+        return {"index": index, "error": f"Llama invocation failed: {be}", "status": 502}
+    result = {"index": index, "reply": reply}
+    if report:
+        result["generation"] = report
+    return result
+
+@app.route("/chat/batch", methods=["POST"])
+def chat_batch_endpoint():
+    """
+    Answer many single-turn messages in one request:
+      { "messages": ["Hello", {"message": "Hi", "max_gen_len": 64}, ...],
+        "parallelism": 8 }
+    Replies stream back as newline-delimited JSON in completion order, one
+    line per item tagged with its position in "messages":
+      {"index": 3, "reply": "..."}
+      {"index": 0, "error": "...", "status": 502}
+    followed by {"done": true, "count": N, "failed": F}. At most
+    `parallelism` items (default BATCH_PARALLELISM) are in flight, each
+    through the same caches, coalescing and concurrency limiter as /chat,
+    and finished results are sent rather than kept.
+    """
+    data = request.get_json(silent=True)
+    items = data.get("messages") if isinstance(data, dict) else None
+    if not isinstance(items, list) or not items:
+        return jsonify({"error": "Send JSON like { 'messages': ['Hello', 'Hi'] }"}), 400
+    if len(items) > BATCH_MAX_ITEMS:
+        return jsonify({"error": f"At most {BATCH_MAX_ITEMS} messages per batch."}), 400
+    parallelism = data.get("parallelism", BATCH_PARALLELISM)
+    if isinstance(parallelism, bool) or not isinstance(parallelism, int) or parallelism < 1:
+        return jsonify({"error": "'parallelism' must be a positive integer."}), 400
+    parallelism = min(parallelism, BATCH_MAX_PARALLELISM, len(items))
+    try:
+        bedrock = get_bedrock_client()
+    except ConfigurationError as ce:
+        return jsonify({"error": f"Configuration error: {ce}"}), 500
+
+    client = current_client()
+
+    def answer(index, item):
+        set_client(client)
+        return answer_batch_item(bedrock, index, item)
+
+    def generate():
+        pool = ThreadPoolExecutor(max_workers=parallelism, thread_name_prefix="chat-batch")
+        pending = set()
+        failed = 0
+        try:
+            queued = iter(enumerate(items))
+            for index, item in itertools.islice(queued, parallelism):
+                pending.add(pool.submit(answer, index, item))
+            while pending:
+                finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    result = future.result()
+                    failed += "error" in result
+                    yield json.dumps(result) + "\n"
+                    # Refill one slot per finished item
+                    for index, item in itertools.islice(queued, 1):
+                        pending.add(pool.submit(answer, index, item))
+            yield json.dumps({"done": True, "count": len(items), "failed": failed}) + "\n"
+        finally:
+            # On client disconnect, drop the items not yet started
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    return Response(stream_with_context(generate()), mimetype="application/x-ndjson",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.route("/healthz", methods=["GET"])
+def healthz():
+    # Readiness probe: 200 once the shared Bedrock client is built and a
+    # connection to its endpoint is open, 503 until then (or when it cannot
+    # be, with the reason). Starts the warm-up if nothing else has.
+    state = readiness()
+    if state["status"] == "starting":
+        start_warm_up()
+    return jsonify(state), 200 if state["status"] == "ready" else 503
+
+@app.route("/metrics", methods=["GET"])
+def metrics_endpoint():
+    # Stage/request latency histograms and response-shape counters in the
+    # Prometheus text format
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+
+@app.route("/stats", methods=["GET"])
+def stats_endpoint():
+    # Current concurrency limit, queue depth, cache/coalescing counters,
+    # generation policy totals, per-attempt retry/hedge metrics of the
+    # shared Bedrock client and credential refresh state
+    stats = {
+        "limiter": limiter.stats(),
+        "response_cache": response_cache.stats(),
+        "inflight": inflight.stats(),
+    }
+    if generation_policy is not None:
+        stats["generation"] = generation_policy.stats()
+    if sessions is not None:
+        stats["sessions"] = sessions.stats()
+        if sessions.compactor is not None:
+            stats["sessions"]["compaction"] = sessions.compactor.stats()
+    try:
+        retry_policy = getattr(get_bedrock_client(), "retry_policy", None)
+    except ConfigurationError:
+        retry_policy = None
+    if retry_policy is not None:
+        stats["retries"] = retry_policy.stats()
+    credentials = credential_manager()
+    if credentials is not None:
+        stats["credentials"] = credentials.stats()
+    return jsonify(stats)
 
 if __name__ == "__main__":
-    # Listen on port 8080 for App Runner
-    app.run(host="0.0.0.0", port=8080)
+    # Build the shared Bedrock client and open a connection in the
+    # background while the server starts; /healthz reports when it is done
+    start_warm_up()
+    # Flask's development server, for local use; production runs
+    # `gunicorn -c gunicorn.conf.py app:app`. Listens on port 8080 for App Runner.
+    app.run(host="0.0.0.0", port=int(os.getenv("PORT", "8080")))
@@ -0,0 +1,211 @@
+# asgi_app.py
+#
+# asyncio serving mode for the chat service. Serves the same "/" and
+# "/chat" contracts as the Flask app in app.py, but each in-flight chat is a
+# coroutine waiting on BedrockClient.ainvoke rather than a pinned OS thread,
+# so one process can hold hundreds of concurrent Bedrock calls.
+#
+#   uvicorn asgi_app:application --host 0.0.0.0 --port 8080
+
+import asyncio
+import json
+import app as chat_app
+import metrics
+from client_pool import get_bedrock_client, get_io_executor, readiness, start_warm_up
+from errors import ConfigurationError, BedrockInvocationError, ThrottlingError, OverloadedError
+from fair_share import set_client
+from generation_policy import format_report
+
+MAX_BODY_BYTES = 1024 * 1024
+
+
+async def read_body(receive) -> bytes:
+    body = b""
+    more = True
+    while more:
+        message = await receive()
+        body += message.get("body", b"")
+        more = message.get("more_body", False)
+        if len(body) > MAX_BODY_BYTES:
+            break
+    return body
+
+
+async def send_response(send, status: int, body: bytes, content_type: bytes, headers=()):
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [(b"content-type", content_type), (b"content-length", str(len(body)).encode()), *headers],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+async def send_json(send, status: int, payload: dict, headers=()):
+    await send_response(send, status, json.dumps(payload).encode("utf-8"), b"application/json", headers)
+
+
+def prepare_prompt(bedrock, user_input: str, session=None, params: dict = None):
+    """
+    Build the prompt and check the reply caches (same steps as app.chat_endpoint).
+    """
+    prompt_text = chat_app.build_chat_prompt(user_input, session)
+    cached, cache_key, vector = chat_app.lookup_cached_reply(
+        bedrock, user_input, prompt_text, semantic=session is None, params=params
+    )
+    return prompt_text, cached, cache_key, vector
+
+
+async def ainvoke_and_remember(bedrock, prompt_text: str, cache_key: str, vector, params: dict = None,
+                               report: dict = None) -> str:
+    """
+    Async app.invoke_and_remember.
+    """
+    params = params or chat_app.GENERATION_PARAMS
+    generated = await chat_app.limiter.acall(bedrock.ainvoke, prompt_text, **params)
+    reply = chat_app.trim_generation(generated, params["max_gen_len"], report)
+    if not reply:
+        return generated
+    chat_app.remember_reply(cache_key, vector, reply)
+    return reply
+
+
+async def chat(body: bytes):
+    """
+    Returns (status, payload) for a POST /chat body. 429 payloads carry a
+    "retry_after" hint in seconds, sent as the Retry-After header, and fresh
+    replies a "generation" report, sent as the X-Generation header. With
+    sessions enabled the conversation is keyed by the body's "session_id",
+    which is echoed (or issued) in the reply.
+    """
+    # 1) Parse JSON body
+    with metrics.stage("parse"):
+        try:
+            data = json.loads(body)
+        except ValueError:
+            data = None
+    if not isinstance(data, dict) or not isinstance(data.get("message"), str):
+        return 400, {"error": "Send JSON like { 'message':'Hello' }"}
+
+    user_input = data["message"].strip()
+    if not user_input:
+        return 400, {"error": "Message cannot be empty."}
+    try:
+        params = chat_app.choose_generation_params(user_input, data)
+    except ValueError as ve:
+        return 400, {"error": str(ve)}
+
+    loop = asyncio.get_running_loop()
+    session_id = session = None
+    try:
+        with metrics.stage("client"):
+            bedrock = get_bedrock_client()
+
+        # 2) Build the prompt / check caches. RAG, the semantic cache and the
+        #    session store can block (embedding calls, SQLite), so run those
+        #    off the event loop.
+        optional = (chat_app.retriever, chat_app.semantic_cache, chat_app.sessions)
+        if chat_app.sessions is not None:
+            with metrics.stage("session"):
+                session_id, session = await loop.run_in_executor(
+                    get_io_executor(), chat_app.load_session, data.get("session_id")
+                )
+        with metrics.stage("prompt"):
+            if all(step is None for step in optional):
+                prompt_text, reply, cache_key, vector = prepare_prompt(bedrock, user_input, params=params)
+            else:
+                prompt_text, reply, cache_key, vector = await loop.run_in_executor(
+                    get_io_executor(), prepare_prompt, bedrock, user_input, session, params
+                )
+
+        # 3) Invoke Bedrock without holding a thread while waiting; identical
+        #    concurrent prompts share one call
+        report = {}
+        if reply is None:
+            reply = await chat_app.inflight.ado(
+                cache_key, ainvoke_and_remember, bedrock, prompt_text, cache_key, vector, params, report
+            )
+    except ConfigurationError as ce:
+        return 500, {"error": f"Configuration error: {ce}"}
+    except OverloadedError as oe:
+        return 429, {"error": f"Server busy: {oe}", "retry_after": oe.retry_after}
+    except ThrottlingError as te:
+        return 429, {"error": f"Llama invocation throttled: {te}", "retry_after": chat_app.limiter.retry_after()}
+    except BedrockInvocationError as be:
+        return 502, {"error": f"Llama invocation failed: {be}"}
+
+    # 4) Return JSON {"reply": "<assistant_reply>"} (plus "session_id")
+    payload = {"reply": reply}
+    if session_id is not None:
+        await loop.run_in_executor(get_io_executor(), chat_app.sessions.record, session_id, user_input, reply)
+        payload["session_id"] = session_id
+    if report:
+        payload["generation"] = report
+    return 200, payload
+
+
+def identify_client(scope):
+    """
+    Tag this request's task with its client (see app.start_timing).
+    """
+    fair_share = chat_app.limiter.fair_share
+    if fair_share is None:
+        return
+    headers = dict(scope.get("headers") or ())
+    peer = scope.get("client")
+    api_key = headers.get(fair_share.header.lower().encode("latin-1"))
+    forwarded_for = headers.get(b"x-forwarded-for")
+    set_client(fair_share.identify(
+        api_key.decode("latin-1") if api_key else None,
+        forwarded_for.decode("latin-1") if forwarded_for else None,
+        peer[0] if peer else None,
+    ))
+
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            # Warm up in the background; /healthz reports when it is done
+            start_warm_up()
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def application(scope, receive, send):
+    """
+    ASGI entry point.
+    """
+    if scope["type"] == "lifespan":
+        return await lifespan(receive, send)
+    if scope["type"] != "http":
+        return
+
+    path, method = scope["path"], scope["method"]
+    if path == "/":
+        if method != "GET":
+            return await send_json(send, 405, {"error": "Method not allowed"})
+        return await send_response(send, 200, chat_app.INDEX_HTML.encode("utf-8"), b"text/html; charset=utf-8")
+    if path == "/chat":
+        if method != "POST":
+            return await send_json(send, 405, {"error": "Method not allowed"})
+        metrics.start_request()
+        identify_client(scope)
+        status, payload = await chat(await read_body(receive))
+        headers = [(b"retry-after", str(payload["retry_after"]).encode())] if status == 429 else []
+        report = payload.pop("generation", None)
+        if report:
+            headers.append((b"x-generation", format_report(report).encode()))
+        server_timing = metrics.finish_request(path, status)
+        if server_timing:
+            headers.append((b"server-timing", server_timing.encode()))
+        return await send_json(send, status, payload, headers)
+    if path == "/healthz":
+        state = readiness()
+        if state["status"] == "starting":
+            start_warm_up()
+        return await send_json(send, 200 if state["status"] == "ready" else 503, state)
+    if path == "/metrics":
+        return await send_response(send, 200, metrics.render().encode("utf-8"), b"text/plain; version=0.0.4")
+    return await send_json(send, 404, {"error": "Not found"})
@@ -2,9 +2,29 @@
 
 import os
 import json
-import boto3
-from botocore.exceptions import BotoCoreError, ClientError
-from errors import ConfigurationError, BedrockInvocationError
+import asyncio
+import contextvars
+import functools
+import metrics
+from client_pool import get_async_runtime_client, get_io_executor
+from errors import ConfigurationError, BedrockInvocationError, ThrottlingError
+from lazy_import import lazy_module
+
+# Imported on first use, so importing this module (and app.py) stays cheap
+boto3 = lazy_module("boto3")
+botocore_exceptions = lazy_module("botocore.exceptions")
+
+# Error codes Bedrock uses when a call is rejected for exceeding quota
+THROTTLING_CODES = ("ThrottlingException", "TooManyRequestsException")
+
+def wrap_aws_error(message: str, aws_err: Exception) -> BedrockInvocationError:
+    """
+    Wrap a botocore error, returning a ThrottlingError when Bedrock
+    rejected the call for exceeding quota.
+    """
+    if isinstance(aws_err, botocore_exceptions.ClientError) and aws_err.response.get("Error", {}).get("Code") in THROTTLING_CODES:
+        return ThrottlingError(f"{message}: {aws_err}", original_exception=aws_err)
+    return BedrockInvocationError(f"{message}: {aws_err}", original_exception=aws_err)
 
 class BedrockClient:
     """
@@ -13,21 +33,49 @@ class BedrockClient:
     then falls back to "completion", "text", "choices", and "messages".
     """
 
-    def __init__(self):
-        region = os.getenv("AWS_REGION")
-        model_id = os.getenv("BEDROCK_MODEL_ID")
+    def __init__(self, region=None, model_id=None, client=None, async_client=None, retry_policy=None):
+        """
+        `region` and `model_id` default to AWS_REGION / BEDROCK_MODEL_ID.
+        Pass `client` to reuse an existing bedrock-runtime client (see
+        client_pool.get_bedrock_client); otherwise a new one is created.
+        `async_client` overrides the aiobotocore client used by ainvoke().
+        `retry_policy` (a retry_policy.RetryPolicy) adds retries and hedging;
+        without it every call makes exactly one attempt.
+        """
+        region = region or os.getenv("AWS_REGION")
+        model_id = model_id or os.getenv("BEDROCK_MODEL_ID")
 
         if not region:
             raise ConfigurationError("Missing AWS_REGION environment variable.")
         if not model_id:
             raise ConfigurationError("Missing BEDROCK_MODEL_ID environment variable.")
 
+        self.region = region
         self.model_id = model_id
+        self.async_client = async_client
+        self.retry_policy = retry_policy
+        if client is not None:
+            self.client = client
+            return
         try:
             self.client = boto3.client("bedrock-runtime", region_name=region)
         except Exception as e:
             raise ConfigurationError(f"Failed to create Bedrock client: {e}")
 
+    def _invoke_args(self, prompt, max_gen_len, temperature, top_p) -> dict:
+        body_dict = {
+            "prompt": prompt,
+            "max_gen_len": max_gen_len,
+            "temperature": temperature,
+            "top_p": top_p
+        }
+        return {
+            "modelId": self.model_id,
+            "contentType": "application/json",
+            "accept": "application/json",
+            "body": json.dumps(body_dict).encode("utf-8")
+        }
+
     def invoke(
         self,
         prompt: str,
@@ -47,27 +95,62 @@ class BedrockClient:
           5) parsed["messages"][0]["content"][0]["text"]
         """
 
-        body_dict = {
-            "prompt": prompt,
-            "max_gen_len": max_gen_len,
-            "temperature": temperature,
-            "top_p": top_p
-        }
+        invoke_args = self._invoke_args(prompt, max_gen_len, temperature, top_p)
+        if self.retry_policy is None:
+            return self._invoke_once(invoke_args)
+        return self.retry_policy.call(functools.partial(self._invoke_once, invoke_args))
 
-        invoke_args = {
-            "modelId": self.model_id,
-            "contentType": "application/json",
-            "accept": "application/json",
-            "body": json.dumps(body_dict).encode("utf-8")
-        }
+    def _invoke_once(self, invoke_args: dict) -> str:
+        with metrics.stage("bedrock"):
+            try:
+                response = self.client.invoke_model(**invoke_args)
+            except (botocore_exceptions.BotoCoreError, botocore_exceptions.ClientError) as aws_err:
+                raise wrap_aws_error("Failed to invoke Bedrock model", aws_err)
 
-        try:
-            response = self.client.invoke_model(**invoke_args)
-        except (BotoCoreError, ClientError) as aws_err:
-            raise BedrockInvocationError(f"Failed to invoke Bedrock model: {aws_err}", original_exception=aws_err)
+            try:
+                raw_bytes = response["body"].read()
+            except Exception as parse_err:
+                raise BedrockInvocationError(f"Failed to parse Bedrock response body: {parse_err}", original_exception=parse_err)
+        with metrics.stage("parse_reply"):
+            return self._parse_reply(raw_bytes)
+
+    async def ainvoke(
+        self,
+        prompt: str,
+        max_gen_len: int = 512,
+        temperature: float = 0.5,
+        top_p: float = 0.9
+    ) -> str:
+        """
+        Async variant of invoke() for the ASGI app. Uses the native async
+        client from client_pool when aiobotocore is installed; otherwise the
+        blocking call runs on the shared I/O thread pool so the event loop
+        stays free.
+        """
+        async_client = self.async_client or await get_async_runtime_client(self.region)
+        if async_client is None:
+            loop = asyncio.get_running_loop()
+            # Run in a copy of this context so stage timings reach the request
+            call = functools.partial(self.invoke, prompt, max_gen_len, temperature, top_p)
+            return await loop.run_in_executor(get_io_executor(), contextvars.copy_context().run, call)
+
+        invoke_args = self._invoke_args(prompt, max_gen_len, temperature, top_p)
+        if self.retry_policy is None:
+            return await self._ainvoke_once(async_client, invoke_args)
+        return await self.retry_policy.acall(functools.partial(self._ainvoke_once, async_client, invoke_args))
 
+    async def _ainvoke_once(self, async_client, invoke_args: dict) -> str:
+        with metrics.stage("bedrock"):
+            try:
+                response = await async_client.invoke_model(**invoke_args)
+                raw_bytes = await response["body"].read()
+            except (botocore_exceptions.BotoCoreError, botocore_exceptions.ClientError) as aws_err:
+                raise wrap_aws_error("Failed to invoke Bedrock model", aws_err)
+        with metrics.stage("parse_reply"):
+            return self._parse_reply(raw_bytes)
+
+    def _parse_reply(self, raw_bytes: bytes) -> str:
         try:
-            raw_bytes = response["body"].read()
             decoded = raw_bytes.decode("utf-8")
             parsed = json.loads(decoded)
         except Exception as parse_err:
@@ -76,16 +159,19 @@ class BedrockClient:
         # 1) Try top-level "generation"
         gen = parsed.get("generation")
         if isinstance(gen, str) and gen.strip():
+            metrics.count(metrics.RESPONSE_SHAPES, self.model_id, "generation")
             return gen.strip()
 
         # 2) Try top-level "completion"
         comp = parsed.get("completion")
         if isinstance(comp, str) and comp.strip():
+            metrics.count(metrics.RESPONSE_SHAPES, self.model_id, "completion")
             return comp.strip()
 
         # 3) Try top-level "text"
         txt = parsed.get("text")
         if isinstance(txt, str) and txt.strip():
+            metrics.count(metrics.RESPONSE_SHAPES, self.model_id, "text")
             return txt.strip()
 
         # 4) Try "choices"[0]["message"]["content"][0]["text"]
@@ -103,6 +189,7 @@ class BedrockClient:
                 first = content_list[0]
                 text_val = first.get("text")
                 if isinstance(text_val, str) and text_val.strip():
+                    metrics.count(metrics.RESPONSE_SHAPES, self.model_id, "choices")
                     return text_val.strip()
 
         # 5) Try "messages"[0]["content"][0]["text"]
@@ -118,7 +205,67 @@ class BedrockClient:
                 first = content_list[0]
                 text_val = first.get("text")
                 if isinstance(text_val, str) and text_val.strip():
+                    metrics.count(metrics.RESPONSE_SHAPES, self.model_id, "messages")
                     return text_val.strip()
 
         # If none returned non-empty text, throw an error with full parsed output
+        metrics.count(metrics.RESPONSE_SHAPES, self.model_id, "none")
         raise BedrockInvocationError(f"No valid text found in Bedrock response: {parsed}")
+
+    def invoke_stream(
+        self,
+        prompt: str,
+        max_gen_len: int = 512,
+        temperature: float = 0.5,
+        top_p: float = 0.9
+    ):
+        """
+        Generator version of invoke() built on invoke_model_with_response_stream.
+        Yields text chunks as Bedrock produces them. Each stream event looks like:
+          { "chunk": { "bytes": b'{"generation": "...", "stop_reason": null}' } }
+        Leading whitespace of the reply is dropped, mirroring invoke()'s strip().
+        Closing the generator closes the Bedrock stream.
+        """
+        invoke_args = self._invoke_args(prompt, max_gen_len, temperature, top_p)
+
+        def open_stream():
+            try:
+                return self.client.invoke_model_with_response_stream(**invoke_args)["body"]
+            except (botocore_exceptions.BotoCoreError, botocore_exceptions.ClientError) as aws_err:
+                raise wrap_aws_error("Failed to invoke Bedrock model", aws_err)
+
+        # Only opening the stream is retried: once text has been yielded a
+        # retry would repeat it.
+        if self.retry_policy is None:
+            events = open_stream()
+        else:
+            events = self.retry_policy.call(open_stream, hedge=False)
+
+        started = False
+        try:
+            for event in events:
+                chunk = event.get("chunk")
+                if chunk is None:
+                    # Mid-stream errors arrive as events such as
+                    # {"modelStreamErrorException": {"message": "..."}}
+                    if "throttlingException" in event:
+                        raise ThrottlingError(f"Bedrock stream throttled: {event}")
+                    raise BedrockInvocationError(f"Bedrock stream error: {event}")
+                parsed = json.loads(chunk["bytes"].decode("utf-8"))
+                text = parsed.get("generation") or parsed.get("completion") or parsed.get("text") or ""
+                if not started:
+                    text = text.lstrip()
+                    if not text:
+                        continue
+                    started = True
+                yield text
+        except (botocore_exceptions.BotoCoreError, botocore_exceptions.ClientError) as aws_err:
+            raise wrap_aws_error("Bedrock stream failed", aws_err)
+        except (ValueError, KeyError, AttributeError) as parse_err:
+            raise BedrockInvocationError(f"Failed to parse Bedrock stream chunk: {parse_err}", original_exception=parse_err)
+        finally:
+            # A caller that stops early (close()) also ends the HTTP
+            # response, so Bedrock stops generating for it
+            close = getattr(events, "close", None)
+            if close is not None:
+                close()
@@ -0,0 +1,350 @@
+# bedrock_emulator.py
+#
+# Local stand-in for the boto3 "bedrock-runtime" client, for load tests
+# and benchmarks that must not spend real Bedrock quota. It implements the
+# two calls the wrappers make (invoke_model and
+# invoke_model_with_response_stream) with configurable latency, throttling
+# and error injection, and can replay responses captured from the real
+# service with RecordingRuntime.
+#
+#   BEDROCK_EMULATOR=1 AWS_REGION=local BEDROCK_MODEL_ID=meta.llama3 python app.py
+
+import hashlib
+import json
+import math
+import os
+import random
+import struct
+import threading
+import time
+from lazy_import import lazy_module
+
+botocore_exceptions = lazy_module("botocore.exceptions")
+
+DEFAULT_REPLY = (
+    "This is an emulated reply from the local Bedrock stand-in. It has roughly the "
+    "shape of a short model answer so that parsing, caching and streaming behave "
+    "as they would against the real service."
+)
+
+
+class LatencyModel:
+    """
+    Service time distribution, parsed from a spec string (milliseconds):
+      fixed:50            always 50 ms
+      uniform:20,80       uniformly between 20 and 80 ms
+      lognormal:300,0.5   log-normal with median 300 ms and sigma 0.5
+    Any spec may end in ";tail:0.01,2000" to make 1% of calls take 2000 ms,
+    the long tail seen on shared model capacity.
+    """
+
+    def __init__(self, spec: str = "fixed:0"):
+        self.spec = spec
+        main, _, tail = spec.partition(";")
+        self.kind, _, params = main.partition(":")
+        self.params = [float(p) for p in params.split(",") if p]
+        if self.kind not in ("fixed", "uniform", "lognormal"):
+            raise ValueError(f"Unknown latency distribution: {spec}")
+        self.tail_fraction, self.tail_ms = 0.0, 0.0
+        if tail:
+            name, _, tail_params = tail.partition(":")
+            if name != "tail":
+                raise ValueError(f"Unknown latency modifier: {spec}")
+            self.tail_fraction, self.tail_ms = (float(p) for p in tail_params.split(","))
+
+    def sample(self, rng: random.Random) -> float:
+        """
+        One service time in seconds.
+        """
+        if self.tail_fraction and rng.random() < self.tail_fraction:
+            return self.tail_ms / 1000
+        if self.kind == "fixed":
+            ms = self.params[0] if self.params else 0.0
+        elif self.kind == "uniform":
+            ms = rng.uniform(self.params[0], self.params[1])
+        else:
+            ms = self.params[0] * math.exp(rng.gauss(0.0, self.params[1]))
+        return ms / 1000
+
+
+class EmulatedBody:
+    """
+    Minimal botocore StreamingBody: read() returns the whole payload.
+    """
+
+    def __init__(self, payload: bytes):
+        self._payload = payload
+
+    def read(self) -> bytes:
+        return self._payload
+
+
+class EmulatedStream:
+    """
+    Minimal botocore EventStream: iterates the stream's events and holds the
+    call's concurrency slot until the events run out, an error ends them or
+    the stream is closed or garbage collected, whether or not it was ever
+    started (a generator's finally would not run for one never started).
+    """
+
+    def __init__(self, events, release):
+        self._events = events
+        self._release = release
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        try:
+            return next(self._events)
+        except BaseException:
+            # StopIteration included: the stream is over
+            self.close()
+            raise
+
+    def close(self):
+        release, self._release = self._release, None
+        if release is not None:
+            self._events.close()
+            release()
+
+    def __del__(self):
+        self.close()
+
+
+def _error(code: str, operation: str) -> Exception:
+    return botocore_exceptions.ClientError({"Error": {"Code": code, "Message": f"Emulated {code}"}}, operation)
+
+
+def request_key(model_id: str, body) -> str:
+    """
+    Key under which a request's response is recorded and replayed.
+    """
+    if isinstance(body, str):
+        body = body.encode("utf-8")
+    return hashlib.sha256(model_id.encode("utf-8") + b"\0" + body).hexdigest()
+
+
+class BedrockEmulator:
+    """
+    Drop-in for the bedrock-runtime client used by BedrockClient and
+    EmbedClient.
+
+    - latency:          LatencyModel spec for each call (time to the first
+                        stream chunk when streaming)
+    - token_ms:         extra delay per generated word, so long replies
+                        take longer and streams arrive word by word
+    - throttle_rate:    fraction of calls rejected with ThrottlingException
+    - error_rate:       fraction failed with ServiceUnavailableException
+    - max_concurrency:  calls beyond this many in flight are throttled,
+                        like an account quota (None for no limit)
+    - replay_path:      JSONL written by RecordingRuntime; recorded
+                        requests get their recorded response, others a
+                        synthetic one
+    Chat models answer with `reply_words` words of DEFAULT_REPLY (capped by
+    max_gen_len); models whose request carries "inputText" get a
+    deterministic embedding derived from the text.
+    """
+
+    def __init__(
+        self,
+        latency: str = "fixed:0",
+        token_ms: float = 0.0,
+        throttle_rate: float = 0.0,
+        error_rate: float = 0.0,
+        max_concurrency: int = None,
+        reply_words: int = 32,
+        replay_path: str = None,
+        seed: int = None,
+        sleep=time.sleep,
+    ):
+        self.latency = LatencyModel(latency)
+        self.token_ms = token_ms
+        self.throttle_rate = throttle_rate
+        self.error_rate = error_rate
+        self.max_concurrency = max_concurrency
+        self.reply_words = reply_words
+        self.replay = load_recording(replay_path) if replay_path else {}
+        self.sleep = sleep
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.calls = 0
+        self.throttled = 0
+        self.errors = 0
+        self.replayed = 0
+
+    @classmethod
+    def from_env(cls):
+        """
+        BEDROCK_EMULATOR=1 enables the emulator; EMULATOR_LATENCY,
+        EMULATOR_TOKEN_MS, EMULATOR_THROTTLE_RATE, EMULATOR_ERROR_RATE,
+        EMULATOR_MAX_CONCURRENCY and EMULATOR_REPLAY configure it. Returns
+        None when disabled.
+        """
+        if os.getenv("BEDROCK_EMULATOR", "0") != "1":
+            return None
+        max_concurrency = os.getenv("EMULATOR_MAX_CONCURRENCY")
+        return cls(
+            latency=os.getenv("EMULATOR_LATENCY", "lognormal:300,0.4"),
+            token_ms=float(os.getenv("EMULATOR_TOKEN_MS", "0")),
+            throttle_rate=float(os.getenv("EMULATOR_THROTTLE_RATE", "0")),
+            error_rate=float(os.getenv("EMULATOR_ERROR_RATE", "0")),
+            max_concurrency=int(max_concurrency) if max_concurrency else None,
+            replay_path=os.getenv("EMULATOR_REPLAY") or None,
+        )
+
+    def _admit(self, operation: str):
+        with self._lock:
+            self.calls += 1
+            roll = self._rng.random()
+            over_quota = self.max_concurrency is not None and self.in_flight >= self.max_concurrency
+            if over_quota or roll < self.throttle_rate:
+                self.throttled += 1
+                raise _error("ThrottlingException", operation)
+            if roll < self.throttle_rate + self.error_rate:
+                self.errors += 1
+                raise _error("ServiceUnavailableException", operation)
+            self.in_flight += 1
+            return self.latency.sample(self._rng)
+
+    def _done(self):
+        with self._lock:
+            self.in_flight -= 1
+
+    def _respond(self, model_id: str, body) -> tuple[dict, list]:
+        """
+        (response JSON, reply words) for a request, recorded or synthetic.
+        """
+        recorded = self.replay.get(request_key(model_id, body))
+        if recorded is not None:
+            with self._lock:
+                self.replayed += 1
+            if "chunks" in recorded:
+                words = [json.loads(c).get("generation", "") for c in recorded["chunks"]]
+                return {"generation": "".join(words)}, words
+            return json.loads(recorded["response"]), []
+
+        request = json.loads(body)
+        if "inputText" in request:
+            return {
+                "embedding": _fake_embedding(request["inputText"], request.get("dimensions", 512)),
+                "inputTextTokenCount": len(request["inputText"].split()),
+            }, []
+        words = DEFAULT_REPLY.split()
+        count = min(self.reply_words, request.get("max_gen_len", 512))
+        words = [w if i == 0 else f" {w}" for i, w in enumerate((words * (count // len(words) + 1))[:count])]
+        return {
+            "generation": "".join(words),
+            "prompt_token_count": len(request.get("prompt", "").split()),
+            "generation_token_count": len(words),
+            "stop_reason": "stop" if count < request.get("max_gen_len", 512) else "length",
+        }, words
+
+    def invoke_model(self, modelId: str, body, **kwargs) -> dict:
+        delay = self._admit("InvokeModel")
+        try:
+            payload, words = self._respond(modelId, body)
+            self.sleep(delay + len(words) * self.token_ms / 1000)
+        finally:
+            self._done()
+        return {"body": EmulatedBody(json.dumps(payload).encode("utf-8")), "contentType": "application/json"}
+
+    def invoke_model_with_response_stream(self, modelId: str, body, **kwargs) -> dict:
+        delay = self._admit("InvokeModelWithResponseStream")
+        try:
+            payload, words = self._respond(modelId, body)
+        except BaseException:
+            self._done()
+            raise
+        return {"body": EmulatedStream(self._stream(delay, words or [payload.get("generation", "")]), self._done)}
+
+    def _stream(self, delay: float, words: list):
+        self.sleep(delay)
+        for i, word in enumerate(words):
+            if i and self.token_ms:
+                self.sleep(self.token_ms / 1000)
+            stop = "stop" if i == len(words) - 1 else None
+            yield {"chunk": {"bytes": json.dumps({"generation": word, "stop_reason": stop}).encode("utf-8")}}
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "in_flight": self.in_flight,
+                "throttled": self.throttled,
+                "errors": self.errors,
+                "replayed": self.replayed,
+            }
+
+
+def _fake_embedding(text: str, dimensions: int) -> list:
+    # Deterministic unit vector seeded by the text
+    seed = struct.unpack("<Q", hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest())[0]
+    rng = random.Random(seed)
+    vector = [rng.gauss(0.0, 1.0) for _ in range(dimensions)]
+    norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+    return [v / norm for v in vector]
+
+
+def load_recording(path: str) -> dict:
+    """
+    {request_key: record} from a RecordingRuntime JSONL file; the last
+    record of a request wins.
+    """
+    recording = {}
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                record = json.loads(line)
+                recording[record["key"]] = record
+    return recording
+
+
+class RecordingRuntime:
+    """
+    Wraps a real bedrock-runtime client and appends every successful
+    request/response pair to a JSONL file that BedrockEmulator can replay.
+    Each line holds the request key, model id and body, plus the response
+    body ("response") or the list of stream chunk payloads ("chunks").
+    """
+
+    def __init__(self, client, path: str):
+        self.client = client
+        self.path = path
+        self._lock = threading.Lock()
+
+    def _append(self, record: dict):
+        line = json.dumps(record) + "\n"
+        with self._lock, open(self.path, "a", encoding="utf-8") as f:
+            f.write(line)
+
+    def invoke_model(self, modelId: str, body, **kwargs) -> dict:
+        response = self.client.invoke_model(modelId=modelId, body=body, **kwargs)
+        payload = response["body"].read()
+        self._append({
+            "key": request_key(modelId, body),
+            "modelId": modelId,
+            "body": body.decode("utf-8") if isinstance(body, bytes) else body,
+            "response": payload.decode("utf-8"),
+        })
+        return {**response, "body": EmulatedBody(payload)}
+
+    def invoke_model_with_response_stream(self, modelId: str, body, **kwargs) -> dict:
+        response = self.client.invoke_model_with_response_stream(modelId=modelId, body=body, **kwargs)
+
+        def events():
+            chunks = []
+            for event in response["body"]:
+                if "chunk" in event:
+                    chunks.append(event["chunk"]["bytes"].decode("utf-8"))
+                yield event
+            self._append({
+                "key": request_key(modelId, body),
+                "modelId": modelId,
+                "body": body.decode("utf-8") if isinstance(body, bytes) else body,
+                "chunks": chunks,
+            })
+        # Closing (or dropping) the recorded stream closes the real one and
+        # releases its connection, read to the end or not
+        return {**response, "body": EmulatedStream(events(), response["body"].close)}
@@ -0,0 +1,106 @@
+# benchmarks/bench_async.py
+#
+# Concurrency scaling of the Flask app versus the ASGI app against a local
+# fake Bedrock with artificial latency. N requests are issued at once and
+# the wall time to finish all of them is measured.
+#
+#   flask       WSGI-style: each in-flight request holds one of --threads threads
+#   asgi+pool   asgi_app with BedrockClient.ainvoke on the shared I/O pool
+#   asgi+native asgi_app with a native async client (as with aiobotocore)
+#
+#   python benchmarks/bench_async.py [--latency-ms 500] [--concurrency 50,200,1000]
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as chat_app
+import asgi_app
+from bedrock_client import BedrockClient
+from response_cache import ResponseCache
+
+REPLY = json.dumps({"generation": "fake reply"}).encode("utf-8")
+
+
+class SlowBody:
+    def read(self):
+        return REPLY
+
+
+class SlowRuntime:
+    def __init__(self, latency):
+        self.latency = latency
+
+    def invoke_model(self, **kwargs):
+        time.sleep(self.latency)
+        return {"body": SlowBody()}
+
+
+class SlowAsyncRuntime:
+    class Body:
+        async def read(self):
+            return REPLY
+
+    def __init__(self, latency):
+        self.latency = latency
+
+    async def invoke_model(self, **kwargs):
+        await asyncio.sleep(self.latency)
+        return {"body": self.Body()}
+
+
+def bench_flask(n, threads):
+    def one(i):
+        with chat_app.app.test_client() as c:
+            return c.post("/chat", data=json.dumps({"message": f"m{i}"}), content_type="application/json").status_code
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        statuses = list(pool.map(one, range(n)))
+    assert statuses == [200] * n
+    return time.perf_counter() - start
+
+
+def bench_asgi(n):
+    async def run():
+        results = await asyncio.gather(*(asgi_app.chat(json.dumps({"message": f"m{i}"}).encode()) for i in range(n)))
+        assert [status for status, _ in results] == [200] * n
+
+    start = time.perf_counter()
+    asyncio.run(run())
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--latency-ms", type=float, default=500)
+    parser.add_argument("--concurrency", default="50,200,1000")
+    parser.add_argument("--threads", type=int, default=32, help="Flask worker threads")
+    args = parser.parse_args()
+
+    latency = args.latency_ms / 1000
+    chat_app.response_cache = ResponseCache(max_entries=0)
+    pooled = BedrockClient(region="us-east-2", model_id="fake", client=SlowRuntime(latency))
+    native = BedrockClient(region="us-east-2", model_id="fake", client=SlowRuntime(latency),
+                           async_client=SlowAsyncRuntime(latency))
+
+    print(f"fake Bedrock latency {args.latency_ms:.0f} ms; req/s (wall time)")
+    for n in (int(c) for c in args.concurrency.split(",")):
+        chat_app.get_bedrock_client = lambda: pooled
+        flask_s = bench_flask(n, args.threads)
+        asgi_app.get_bedrock_client = lambda: pooled
+        pool_s = bench_asgi(n)
+        asgi_app.get_bedrock_client = lambda: native
+        native_s = bench_asgi(n)
+        print(f"{n:>6} in flight  flask {n / flask_s:8.1f} ({flask_s:5.2f}s)  "
+              f"asgi+pool {n / pool_s:8.1f} ({pool_s:5.2f}s)  asgi+native {n / native_s:8.1f} ({native_s:5.2f}s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+# benchmarks/bench_batch.py
+#
+# Answering N prompts by looping over /chat versus one /chat/batch request,
+# against the in-process Flask app and the Bedrock emulator (see
+# bench_load.py). Reports total time and time to the first answer.
+#
+#   python benchmarks/bench_batch.py [--prompts 200] [--parallelism 8,32]
+
+import argparse
+import http.client
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+os.environ.setdefault("EMULATOR_LATENCY", "lognormal:200,0.3")
+os.environ.setdefault("RESPONSE_CACHE_SIZE", "0")
+from bench_load import Client, start_local_server
+
+
+def batch(host, port, prompts, parallelism):
+    conn = http.client.HTTPConnection(host, port, timeout=300)
+    start = time.monotonic()
+    conn.request("POST", "/chat/batch", json.dumps({"messages": prompts, "parallelism": parallelism}),
+                 {"Content-Type": "application/json"})
+    response = conn.getresponse()
+    first = None
+    answered = 0
+    for line in response:
+        result = json.loads(line)
+        if "reply" in result:
+            answered += 1
+            if first is None:
+                first = time.monotonic() - start
+    return time.monotonic() - start, first, answered
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--prompts", type=int, default=200)
+    parser.add_argument("--parallelism", default="8,32")
+    args = parser.parse_args()
+
+    url = start_local_server()
+    client = Client(url, timeout=60)
+    run = time.time_ns()    # fresh prompts per mode so no mode hits the other's cache
+    print(f"{args.prompts} prompts, emulated latency {os.environ['EMULATOR_LATENCY']}")
+    print(f"{'mode':<22} {'total s':>8} {'first s':>8} {'answered':>9}")
+
+    start = time.monotonic()
+    first = None
+    answered = 0
+    for i in range(args.prompts):
+        if client.post("/chat", {"message": f"serial {run} {i}"}) == 200:
+            answered += 1
+        if first is None:
+            first = time.monotonic() - start
+    print(f"{'serial /chat loop':<22} {time.monotonic() - start:>8.2f} {first:>8.2f} {answered:>9}")
+
+    for parallelism in (int(p) for p in args.parallelism.split(",")):
+        prompts = [f"batch {run} {parallelism} {i}" for i in range(args.prompts)]
+        total, first, answered = batch(client.host, client.port, prompts, parallelism)
+        print(f"{f'/chat/batch x{parallelism}':<22} {total:>8.2f} {first:>8.2f} {answered:>9}")
+
+
+if __name__ == "__main__":
+    main()
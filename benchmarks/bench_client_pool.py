@@ -0,0 +1,70 @@
+# benchmarks/bench_client_pool.py
+#
+# Requests/sec of POST /chat against a stubbed Bedrock, with and without the
+# shared client pool. The stub replaces botocore's API call, so client
+# construction (session, endpoint resolution, credentials) is real while no
+# network traffic is made. Every request sends a different message and the
+# reply caches are off, so each one reaches the Bedrock client.
+#
+#   python benchmarks/bench_client_pool.py [--requests 500] [--threads 8]
+
+import argparse
+import io
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from botocore.client import BaseClient
+
+import app as app_module
+import client_pool
+from bedrock_client import BedrockClient
+from response_cache import ResponseCache
+
+
+def _fake_api_call(self, operation_name, api_params):
+    body = json.dumps({"generation": "stub reply"}).encode("utf-8")
+    return {"body": io.BytesIO(body)}
+
+
+def run(label, getter, total, threads):
+    app_module.get_bedrock_client = getter
+    client_pool.reset_pool()
+    app_module.response_cache = ResponseCache(max_entries=0)
+    app_module.semantic_cache = None
+
+    def one(i):
+        payload = json.dumps({"message": f"Hello {label} {i}"})
+        with app_module.app.test_client() as c:
+            resp = c.post("/chat", data=payload, content_type="application/json")
+            assert resp.status_code == 200, resp.get_data(as_text=True)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(one, range(total)))
+    elapsed = time.perf_counter() - start
+    print(f"{label:<12} {total / elapsed:10.1f} req/s  ({elapsed * 1000 / total:.2f} ms/req)")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--threads", type=int, default=8)
+    args = parser.parse_args()
+
+    os.environ.setdefault("AWS_REGION", "us-east-2")
+    os.environ.setdefault("BEDROCK_MODEL_ID", "meta.llama3-3-70b-instruct-v1:0")
+    os.environ.setdefault("AWS_ACCESS_KEY_ID", "bench")
+    os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "bench")
+    BaseClient._make_api_call = _fake_api_call
+
+    run("per-request", BedrockClient, args.requests, args.threads)
+    run("pooled", client_pool.get_bedrock_client, args.requests, args.threads)
+
+
+if __name__ == "__main__":
+    main()
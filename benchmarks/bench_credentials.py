@@ -0,0 +1,104 @@
+# benchmarks/bench_credentials.py
+#
+# How long signing waits for credentials when they expire. Threads standing
+# in for request handlers call get_frozen_credentials() (what botocore does
+# for every request) in a loop while short-lived credentials keep expiring:
+#   botocore   RefreshableCredentials, refreshed by whichever request first
+#              finds them close to expiry
+#   managed    CredentialManager, refreshed by its background thread
+# Lifetimes and refresh windows are scaled down from hours and minutes to
+# seconds; the fetch latency is what instance metadata typically costs.
+#
+#   python benchmarks/bench_credentials.py [--fetch-ms 200] [--duration 10]
+
+import argparse
+import datetime
+import os
+import sys
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from botocore.credentials import RefreshableCredentials
+from credential_manager import CredentialManager
+
+
+def make_fetch(fetch_s: float, lifetime: float):
+    counter = [0]
+
+    def fetch():
+        time.sleep(fetch_s)
+        counter[0] += 1
+        return {"access_key": f"key-{counter[0]}", "secret_key": "secret", "token": "token",
+                "expiry_time": time.time() + lifetime}
+    return fetch, counter
+
+
+def botocore_credentials(fetch, advisory: float, mandatory: float):
+    def refresh():
+        fetched = fetch()
+        expiry = datetime.datetime.fromtimestamp(fetched["expiry_time"], datetime.timezone.utc)
+        return {"access_key": fetched["access_key"], "secret_key": fetched["secret_key"],
+                "token": fetched["token"], "expiry_time": expiry.isoformat()}
+    credentials = RefreshableCredentials.create_from_metadata(refresh(), refresh, "iam-role")
+    credentials._advisory_refresh_timeout = advisory
+    credentials._mandatory_refresh_timeout = mandatory
+    return credentials
+
+
+def hammer(credentials, threads: int, duration: float) -> list:
+    """
+    Latency (ms) of every get_frozen_credentials() call made by `threads`
+    threads over `duration` seconds.
+    """
+    samples = [[] for _ in range(threads)]
+    stop = time.monotonic() + duration
+
+    def worker(out):
+        while time.monotonic() < stop:
+            started = time.perf_counter()
+            credentials.get_frozen_credentials()
+            out.append((time.perf_counter() - started) * 1000)
+            time.sleep(0.001)
+    workers = [threading.Thread(target=worker, args=(out,)) for out in samples]
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    return sorted(ms for out in samples for ms in out)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--fetch-ms", type=float, default=200.0, help="latency of one credential fetch")
+    parser.add_argument("--lifetime", type=float, default=3.0, help="seconds credentials stay valid")
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=10.0)
+    args = parser.parse_args()
+
+    # Same proportions as botocore's defaults against a 1 hour lifetime:
+    # advisory refresh 15 min and mandatory 10 min before expiry
+    advisory, mandatory = args.lifetime * 0.25, args.lifetime / 6
+    rows = []
+    fetch, fetches = make_fetch(args.fetch_ms / 1000, args.lifetime)
+    rows.append(("botocore", hammer(botocore_credentials(fetch, advisory, mandatory), args.threads, args.duration),
+                 fetches))
+    fetch, fetches = make_fetch(args.fetch_ms / 1000, args.lifetime)
+    manager = CredentialManager(fetch, refresh_margin=advisory, retry_interval=0.05, min_remaining=mandatory)
+    manager.start()
+    rows.append(("managed", hammer(manager, args.threads, args.duration), fetches))
+    manager.stop()
+
+    print(f"{args.threads} threads for {args.duration:.0f} s, {args.fetch_ms:.0f} ms fetches, "
+          f"{args.lifetime:.0f} s lifetime")
+    print(f"{'credentials':<12} {'calls':>8} {'fetches':>8} {'waited':>7} {'p99.9 ms':>9} {'max ms':>8}")
+    for name, latencies, fetches in rows:
+        waited = sum(1 for ms in latencies if ms >= args.fetch_ms / 2)
+        p999 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.999))]
+        print(f"{name:<12} {len(latencies):>8} {fetches[0]:>8} {waited:>7} {p999:>9.3f} {latencies[-1]:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+# benchmarks/bench_dedup.py
+#
+# Throughput and accuracy of near-duplicate clustering (run_dedup.py) on a
+# synthetic prompt log: random sentences, each repeated a few times with
+# small word edits (the planted near-duplicates). Reports lines/sec of the
+# whole JSONL pipeline, how well the clusters match the planted groups,
+# the index's memory per cluster and peak RSS (which includes the corpus,
+# held in memory here). With --embed, a stub EmbedClient (one vector per
+# planted group) confirms the weaker matches, and the share of lines that
+# needed embedding is reported.
+#
+#   python benchmarks/bench_dedup.py [--lines 100000,1000000] [--embed]
+
+import argparse
+import io
+import json
+import os
+import resource
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from embed_client import EmbeddingBatch
+from near_dedup import NearDuplicateIndex
+from run_dedup import dedup_jsonl
+
+
+def corpus(rng, lines, copies, edits):
+    """
+    JSONL bytes of `lines` prompts and the planted group of each line.
+    """
+    vocabulary = [f"w{i}" for i in range(20000)]
+    groups = []
+    out = []
+    group = 0
+    while len(out) < lines:
+        base = rng.integers(0, len(vocabulary), rng.integers(15, 40)).tolist()
+        for _ in range(min(int(rng.integers(1, 2 * copies)), lines - len(out))):
+            words = list(base)
+            for _ in range(int(rng.integers(0, edits + 1))):
+                words[int(rng.integers(len(words)))] = int(rng.integers(len(vocabulary)))
+            out.append(json.dumps({"message": " ".join(vocabulary[w] for w in words)}))
+            groups.append(group)
+        group += 1
+    order = rng.permutation(len(out))
+    return ("\n".join(out[i] for i in order) + "\n").encode("utf-8"), np.asarray(groups)[order]
+
+
+class StubEmbedder:
+    """
+    Embeddings close to a per-group direction, found by the text's index.
+    """
+
+    def __init__(self, texts, groups, dimensions=64):
+        rng = np.random.default_rng(1)
+        self.group = dict(zip(texts, groups.tolist()))
+        self.directions = rng.standard_normal((int(groups.max()) + 1, dimensions)).astype(np.float32)
+        self.dimensions = dimensions
+
+    def embed_many(self, texts, concurrency=8, dimensions=512):
+        vectors = self.directions[[self.group[text] for text in texts]]
+        return EmbeddingBatch(vectors / np.linalg.norm(vectors, axis=1, keepdims=True), {})
+
+
+def pair_scores(clusters, groups):
+    """
+    Precision and recall of "same cluster" over all pairs of lines, against
+    the planted groups.
+    """
+    def pairs(labels):
+        _, counts = np.unique(labels, return_counts=True)
+        return int((counts * (counts - 1) // 2).sum())
+    both = pairs(clusters.astype(np.int64) * (int(groups.max()) + 1) + groups)
+    found, planted = pairs(clusters), pairs(groups)
+    return both / found if found else 1.0, both / planted if planted else 1.0
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--lines", default="100000,1000000")
+    parser.add_argument("--copies", type=int, default=3, help="mean copies per planted group")
+    parser.add_argument("--edits", type=int, default=2, help="max words replaced per copy")
+    parser.add_argument("--threshold", type=float, default=0.7)
+    parser.add_argument("--embed-threshold", type=float, default=0.4)
+    parser.add_argument("--embed", action="store_true", help="confirm less similar pairs with a stub EmbedClient")
+    parser.add_argument("--batch-size", type=int, default=10000)
+    args = parser.parse_args()
+
+    print(f"{'lines':>9} {'lines/s':>9} {'clusters':>9} {'planted':>8} {'precision':>9} {'recall':>7} "
+          f"{'embedded':>9} {'B/cluster':>10} {'peak RSS MB':>12}")
+    for lines in (int(n) for n in args.lines.split(",")):
+        rng = np.random.default_rng(0)
+        data, groups = corpus(rng, lines, args.copies, args.edits)
+        embedder = None
+        if args.embed:
+            texts = [json.loads(line)["message"] for line in data.splitlines()]
+            embedder = StubEmbedder(texts, groups)
+            del texts
+        index = NearDuplicateIndex(threshold=args.threshold, embed_threshold=args.embed_threshold,
+                                   embed_client=embedder, dimensions=64)
+        out = io.StringIO()
+        started = time.perf_counter()
+        stats = dedup_jsonl(index, io.BytesIO(data), out, batch_size=args.batch_size, progress_every=0)
+        elapsed = time.perf_counter() - started
+        clusters = np.asarray([json.loads(line)["cluster"] for line in out.getvalue().splitlines()])
+        precision, recall = pair_scores(clusters, groups)
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        print(f"{lines:>9} {lines / elapsed:>9.0f} {stats['clusters']:>9} {int(groups.max()) + 1:>8} "
+              f"{precision:>9.3f} {recall:>7.3f} {stats['embedded'] / lines:>9.1%} "
+              f"{stats['memory_bytes'] / max(1, stats['clusters']):>10.0f} {peak:>12.0f}")
+
+
+if __name__ == "__main__":
+    main()
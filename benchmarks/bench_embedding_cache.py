@@ -0,0 +1,95 @@
+# benchmarks/bench_embedding_cache.py
+#
+# EmbeddingCache hit latency and throughput: one thread, then `--threads`
+# threads sharing one cache, then the same while another process keeps
+# appending new vectors to the directory (as a second worker would).
+#
+#   python benchmarks/bench_embedding_cache.py [--entries 100000] [--threads 8] [--lookups 20000]
+
+import argparse
+import multiprocessing
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from embedding_cache import EmbeddingCache
+
+MODEL = "amazon.titan-embed-text-v2:0"
+DIMENSIONS = 256
+
+
+def keep_appending(directory, stop):
+    cache = EmbeddingCache(directory)
+    rng = np.random.default_rng(1)
+    i = 0
+    while not stop.is_set():
+        cache.put_many(MODEL, [f"new text {i}-{j}" for j in range(8)],
+                       rng.standard_normal((8, DIMENSIONS)).astype(np.float32), dimensions=DIMENSIONS)
+        i += 1
+        time.sleep(0.001)
+
+
+def run(cache, texts, threads, lookups):
+    """
+    (hits per second, p50 us, p99 us) for `threads` threads each making
+    `lookups` single-text lookups.
+    """
+    latencies = [[] for _ in range(threads)]
+
+    def worker(n):
+        rng = np.random.default_rng(n)
+        out = latencies[n]
+        for i in rng.integers(0, len(texts), lookups):
+            start = time.perf_counter()
+            assert cache.get(MODEL, texts[i], dimensions=DIMENSIONS) is not None
+            out.append(time.perf_counter() - start)
+    pool = [threading.Thread(target=worker, args=(n,)) for n in range(threads)]
+    start = time.perf_counter()
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    elapsed = time.perf_counter() - start
+    merged = sorted(x for out in latencies for x in out)
+    return len(merged) / elapsed, merged[len(merged) // 2] * 1e6, merged[int(len(merged) * 0.99)] * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--entries", type=int, default=100000)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--lookups", type=int, default=20000, help="lookups per thread")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        texts = [f"cached text {i}" for i in range(args.entries)]
+        vectors = np.random.default_rng(0).standard_normal((args.entries, DIMENSIONS)).astype(np.float32)
+        EmbeddingCache(tmp).put_many(MODEL, texts, vectors, dimensions=DIMENSIONS)
+        cache = EmbeddingCache(tmp)
+        cache.get(MODEL, texts[0], dimensions=DIMENSIONS)    # load the index
+
+        print(f"{'case':<28} {'hits/s':>10} {'p50 us':>8} {'p99 us':>8}")
+        for name, threads in (("1 thread", 1), (f"{args.threads} threads", args.threads)):
+            rate, p50, p99 = run(cache, texts, threads, args.lookups)
+            print(f"{name:<28} {rate:>10.0f} {p50:>8.1f} {p99:>8.1f}")
+
+        stop = multiprocessing.Event()
+        writer = multiprocessing.Process(target=keep_appending, args=(tmp, stop))
+        writer.start()
+        try:
+            time.sleep(0.2)
+            rate, p50, p99 = run(cache, texts, args.threads, args.lookups)
+            print(f"{f'{args.threads} threads + appender':<28} {rate:>10.0f} {p50:>8.1f} {p99:>8.1f}")
+        finally:
+            stop.set()
+            writer.join()
+
+
+if __name__ == "__main__":
+    main()
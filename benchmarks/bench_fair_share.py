@@ -0,0 +1,95 @@
+# benchmarks/bench_fair_share.py
+#
+# One bulk client against a handful of interactive users, sharing a limiter
+# with --capacity slots and a fake Bedrock call of --latency-ms. The bulk
+# client keeps --bulk-threads calls in flight back to back (a batch job);
+# each of --users users sends one call, then thinks for --think-ms. Modes:
+#
+#   fifo        FAIR_SHARE=0: one queue, served in arrival order
+#   fair        per-client queues served by deficit round robin
+#   fair+rate   fair, plus a --bulk-rate calls/s limit on the bulk client
+#
+# Latency is measured from the call to the reply, queueing included.
+#
+#   python benchmarks/bench_fair_share.py [--bulk-threads 64] [--users 8]
+
+import argparse
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from concurrency_limiter import AdaptiveLimiter
+from errors import OverloadedError
+from fair_share import FairShare, set_client
+
+
+def run(limiter, args):
+    counts = {"bulk": [0, 0], "user": [0, 0]}   # ok, rejected
+    latencies = []
+    lock = threading.Lock()
+    latency = args.latency_ms / 1000
+    deadline = time.monotonic() + args.seconds
+
+    def worker(client, kind, think):
+        set_client(client)
+        while time.monotonic() < deadline:
+            start = time.monotonic()
+            try:
+                limiter.call(time.sleep, latency)
+                ok = True
+            except OverloadedError as oe:
+                ok = False
+                time.sleep(min(oe.retry_after, 0.2))
+            with lock:
+                counts[kind][0 if ok else 1] += 1
+                if ok and kind == "user":
+                    latencies.append(time.monotonic() - start)
+            if think:
+                time.sleep(think)
+
+    threads = [threading.Thread(target=worker, args=("key:bulk", "bulk", 0)) for _ in range(args.bulk_threads)]
+    threads += [threading.Thread(target=worker, args=(f"key:user{i}", "user", args.think_ms / 1000))
+                for i in range(args.users)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    latencies.sort()
+    p = lambda q: latencies[int(q * (len(latencies) - 1))] * 1000 if latencies else float("nan")
+    return counts, p(0.5), p(0.99)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--capacity", type=int, default=16)
+    parser.add_argument("--latency-ms", type=float, default=50)
+    parser.add_argument("--bulk-threads", type=int, default=64)
+    parser.add_argument("--users", type=int, default=8)
+    parser.add_argument("--think-ms", type=float, default=200)
+    parser.add_argument("--bulk-rate", type=float, default=100, help="bulk calls/s in fair+rate mode")
+    parser.add_argument("--seconds", type=float, default=5)
+    args = parser.parse_args()
+
+    modes = (
+        ("fifo", None),
+        ("fair", FairShare()),
+        ("fair+rate", FairShare(rates={"key:bulk": args.bulk_rate})),
+    )
+    print(f"capacity {args.capacity}, {args.latency_ms:.0f} ms calls, {args.bulk_threads} bulk threads, "
+          f"{args.users} users, {args.seconds:.0f}s each")
+    print(f"{'mode':<10} {'bulk ok/s':>10} {'bulk 429/s':>11} {'user ok/s':>10} {'user 429/s':>11} "
+          f"{'user p50 ms':>12} {'user p99 ms':>12}")
+    for name, share in modes:
+        limiter = AdaptiveLimiter(initial_limit=args.capacity, min_limit=args.capacity, max_limit=args.capacity,
+                                  queue_timeout=5, fair_share=share)
+        counts, p50, p99 = run(limiter, args)
+        bulk, user = (tuple(v / args.seconds for v in counts[k]) for k in ("bulk", "user"))
+        print(f"{name:<10} {bulk[0]:>10.0f} {bulk[1]:>11.0f} {user[0]:>10.1f} {user[1]:>11.1f} "
+              f"{p50:>12.0f} {p99:>12.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+# benchmarks/bench_generation.py
+#
+# Fixed max_gen_len=512 against the generation policy on a mix of chat
+# messages. A fake Llama answers each message with a reply whose length
+# depends on what was asked (short questions ~25 tokens, ordinary ones
+# ~120, long-form requests ~350), and in --ramble of the cases goes on
+# inventing "User:"/"Assistant:" turns until max_gen_len runs out, as the
+# single-turn prompt format invites. Every token costs --token-ms after a
+# --first-token-ms wait. For each mode, on both invoke() and invoke_stream():
+#
+#   tokens      tokens generated (and paid for) per request
+#   invented    replies that reached the client with invented turns
+#   p50 / p99   request latency
+#   saved ms    mean latency saving the policy reported for itself
+#
+#   python benchmarks/bench_generation.py [--requests 400] [--token-ms 2]
+
+import argparse
+import json
+import os
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bedrock_client import BedrockClient
+from generation_policy import GenerationPolicy, StopScanner, split_continuation
+from prompt_utils import SINGLE_TURN_SYSTEM
+
+MESSAGES = {
+    "short": ["hi!", "What is the capital of France?", "thanks", "How tall is Everest?", "Is 97 prime?"],
+    "default": [
+        "My sourdough starter smells like nail polish remover after I moved it to the fridge last week, "
+        "is that something to worry about or can I still bake with it this weekend?",
+        "We have a team offsite next month and half the people are remote; what are good ways to "
+        "make sure the remote folks are not left out of the discussions and decisions?",
+    ],
+    "long": ["Write a short story about a lighthouse keeper", "Explain how TCP congestion control works",
+             "Summarize the causes of the French Revolution", "Write a Python function that merges intervals"],
+}
+ANSWER_TOKENS = {"short": 25, "default": 120, "long": 350}
+INVENTED = ["\nUser:", " Thanks!", " Can", " you", " say", " more?", "\nAssistant:", " Of", " course,", " here", " is", " more."]
+
+
+class TalkativeRuntime:
+    def __init__(self, first_token, token_time, ramble, seed):
+        self.first_token = first_token
+        self.token_time = token_time
+        self.ramble = ramble
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.tokens = 0     # generated, i.e. billed and waited for
+
+    def _words(self, body):
+        request = json.loads(body)
+        prompt, cap = request["prompt"], request["max_gen_len"]
+        kind = next(k for k, texts in MESSAGES.items() if any(f"User: {t}\n" in prompt for t in texts))
+        with self.lock:
+            answer = max(1, int(self.rng.gauss(ANSWER_TOKENS[kind], ANSWER_TOKENS[kind] / 4)))
+            rambles = self.rng.random() < self.ramble
+        words = [" word"] * answer
+        if rambles:
+            words += INVENTED * (cap // len(INVENTED) + 1)
+        return words[:cap]
+
+    def invoke_model(self, modelId, body, **kwargs):
+        words = self._words(body)
+        with self.lock:
+            self.tokens += len(words)
+        time.sleep(self.first_token + len(words) * self.token_time)
+        return {"body": Body(json.dumps({"generation": "".join(words)}).encode())}
+
+    def invoke_model_with_response_stream(self, modelId, body, **kwargs):
+        words = self._words(body)
+
+        def events():
+            time.sleep(self.first_token)
+            for i, word in enumerate(words):
+                if i:
+                    time.sleep(self.token_time)
+                with self.lock:
+                    self.tokens += 1
+                yield {"chunk": {"bytes": json.dumps({"generation": word}).encode()}}
+        return {"body": events()}
+
+
+class Body:
+    def __init__(self, data):
+        self.data = data
+
+    def read(self):
+        return self.data
+
+
+def ask(bedrock, policy, message, stream):
+    """
+    (latency, reply has invented turns, reported saved ms)
+    """
+    prompt = f"{SINGLE_TURN_SYSTEM}\nUser: {message}\nAssistant:"
+    max_gen_len = policy.max_gen_len(message) if policy else 512
+    start = time.monotonic()
+    if not stream:
+        generated = bedrock.invoke(prompt, max_gen_len=max_gen_len)
+        reply, report = policy.finish(generated, max_gen_len) if policy else (generated, None)
+    else:
+        chunks = bedrock.invoke_stream(prompt, max_gen_len=max_gen_len)
+        scanner = StopScanner() if policy else None
+        received = []
+        for chunk in chunks:
+            received.append(chunk)
+            if scanner is not None:
+                scanner.feed(chunk)
+                if scanner.stopped:
+                    chunks.close()
+                    break
+        generated = "".join(received)
+        reply, report = (policy.finish(generated, max_gen_len, stopped=scanner.stopped) if policy
+                         else (generated, None))
+    latency = time.monotonic() - start
+    invented = bool(split_continuation(reply)[1])
+    return latency, invented, report["saved_ms"] if report else 0
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--first-token-ms", type=float, default=40)
+    parser.add_argument("--token-ms", type=float, default=2, help="per token (real Llama 3.3 70B: ~25)")
+    parser.add_argument("--ramble", type=float, default=0.3, help="fraction of replies that go on inventing turns")
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    kinds = rng.choices(["short", "default", "long"], weights=[0.4, 0.4, 0.2], k=args.requests)
+    messages = [rng.choice(MESSAGES[kind]) for kind in kinds]
+
+    print(f"{args.requests} requests, {args.ramble:.0%} rambling, {args.first_token_ms:.0f} ms to first token, "
+          f"{args.token_ms:g} ms/token")
+    print(f"{'mode':<20} {'tokens':>7} {'invented':>9} {'p50 ms':>8} {'p99 ms':>8} {'mean ms':>8} {'saved ms':>9}")
+    for stream in (False, True):
+        for name, policy in (("fixed-512", None), ("policy", GenerationPolicy(tokens_per_second=1000 / args.token_ms))):
+            runtime = TalkativeRuntime(args.first_token_ms / 1000, args.token_ms / 1000, args.ramble, seed=1)
+            bedrock = BedrockClient(region="us-east-1", model_id="bench-model", client=runtime)
+            with ThreadPoolExecutor(args.concurrency) as pool:
+                results = list(pool.map(lambda m: ask(bedrock, policy, m, stream), messages))
+            latencies = sorted(r[0] for r in results)
+            p = lambda q: latencies[int(q * (len(latencies) - 1))] * 1000
+            label = f"{name} ({'stream' if stream else 'invoke'})"
+            print(f"{label:<20} {runtime.tokens / len(results):>7.0f} "
+                  f"{sum(r[1] for r in results):>9} {p(0.5):>8.0f} {p(0.99):>8.0f} "
+                  f"{sum(latencies) / len(latencies) * 1000:>8.0f} {sum(r[2] for r in results) / len(results):>9.0f}")
+
+
+if __name__ == "__main__":
+    main()
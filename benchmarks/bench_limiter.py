@@ -0,0 +1,115 @@
+# benchmarks/bench_limiter.py
+#
+# Burst behaviour with and without the adaptive concurrency limiter. A fake
+# Bedrock serves at most --capacity calls at once with --latency-ms latency
+# and answers anything beyond that with a ThrottlingException after
+# --throttle-ms. --clients threads send requests back to back for
+# --seconds; every outcome is counted:
+#
+#   ok          reply returned
+#   throttled   Bedrock throttled the call (a full round trip wasted)
+#   rejected    limiter answered 429 without calling Bedrock
+#
+#   python benchmarks/bench_limiter.py [--clients 200] [--capacity 40]
+
+import argparse
+import os
+import sys
+import threading
+import time
+from botocore.exceptions import ClientError
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bedrock_client import BedrockClient
+from concurrency_limiter import AdaptiveLimiter
+from errors import OverloadedError, ThrottlingError
+
+
+class CappedRuntime:
+    def __init__(self, capacity, latency, throttle_latency):
+        self.capacity = capacity
+        self.latency = latency
+        self.throttle_latency = throttle_latency
+        self.active = 0
+        self.lock = threading.Lock()
+
+    def invoke_model(self, **kwargs):
+        with self.lock:
+            admitted = self.active < self.capacity
+            if admitted:
+                self.active += 1
+        if not admitted:
+            time.sleep(self.throttle_latency)
+            raise ClientError({"Error": {"Code": "ThrottlingException", "Message": "Too many requests"}}, "InvokeModel")
+        try:
+            time.sleep(self.latency)
+            return {"body": Body()}
+        finally:
+            with self.lock:
+                self.active -= 1
+
+
+class Body:
+    def read(self):
+        return b'{"generation": "ok"}'
+
+
+def run(bedrock, limiter, clients, seconds):
+    counts = {"ok": 0, "throttled": 0, "rejected": 0}
+    latencies = []
+    lock = threading.Lock()
+    deadline = time.monotonic() + seconds
+
+    def client():
+        while time.monotonic() < deadline:
+            start = time.monotonic()
+            try:
+                if limiter is None:
+                    bedrock.invoke("prompt")
+                else:
+                    limiter.call(bedrock.invoke, "prompt")
+                outcome = "ok"
+            except ThrottlingError:
+                outcome = "throttled"
+            except OverloadedError as oe:
+                outcome = "rejected"
+                time.sleep(min(oe.retry_after, 0.2))
+            with lock:
+                counts[outcome] += 1
+                if outcome == "ok":
+                    latencies.append(time.monotonic() - start)
+
+    threads = [threading.Thread(target=client) for _ in range(clients)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    latencies.sort()
+    p = lambda q: latencies[int(q * (len(latencies) - 1))] * 1000 if latencies else float("nan")
+    return counts, p(0.5), p(0.99)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--clients", type=int, default=200)
+    parser.add_argument("--capacity", type=int, default=40)
+    parser.add_argument("--latency-ms", type=float, default=100)
+    parser.add_argument("--throttle-ms", type=float, default=20)
+    parser.add_argument("--seconds", type=float, default=5)
+    args = parser.parse_args()
+
+    runtime = CappedRuntime(args.capacity, args.latency_ms / 1000, args.throttle_ms / 1000)
+    bedrock = BedrockClient(region="us-east-1", model_id="bench-model", client=runtime)
+
+    print(f"{args.clients} clients, Bedrock capacity {args.capacity}, {args.seconds:.0f}s each")
+    print(f"{'mode':<10} {'ok/s':>8} {'throttled/s':>12} {'rejected/s':>11} {'p50 ms':>8} {'p99 ms':>8}  final limit")
+    for name, limiter in (("none", None), ("adaptive", AdaptiveLimiter(initial_limit=args.clients))):
+        counts, p50, p99 = run(bedrock, limiter, args.clients, args.seconds)
+        rate = {k: v / args.seconds for k, v in counts.items()}
+        final = limiter.limit if limiter else "-"
+        print(f"{name:<10} {rate['ok']:>8.0f} {rate['throttled']:>12.0f} {rate['rejected']:>11.0f} {p50:>8.0f} {p99:>8.0f}  {final}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+# benchmarks/bench_load.py
+#
+# Open-loop HTTP load test of /chat. Requests are sent at a fixed arrival
+# rate whether or not earlier ones have finished, and latency is measured
+# from each request's scheduled send time, so a stalled server shows up as
+# queueing delay instead of a quietly lower request rate.
+#
+# Without --url the Flask app is started in-process on a free port with
+# the Bedrock emulator (bedrock_emulator.py) in place of Bedrock; its
+# latency and fault injection come from the EMULATOR_* variables. Results
+# are printed as one JSON object per rate.
+#
+#   python benchmarks/bench_load.py [--rates 20,50,100] [--duration 10]
+#   python benchmarks/bench_load.py --url http://127.0.0.1:5000 --rates 10
+
+import argparse
+import http.client
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def start_local_server() -> str:
+    """
+    Serve app.py on 127.0.0.1 with the emulator; returns its base URL.
+    """
+    os.environ.setdefault("BEDROCK_EMULATOR", "1")
+    os.environ.setdefault("AWS_REGION", "local")
+    os.environ.setdefault("BEDROCK_MODEL_ID", "meta.llama3-3-70b-instruct-v1:0")
+    from werkzeug.serving import make_server
+    import app as chat_app
+
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)   # no per-request log lines
+    server = make_server("127.0.0.1", 0, chat_app.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_port}"
+
+
+class Client:
+    """
+    One keep-alive HTTP connection per worker thread.
+    """
+
+    def __init__(self, url: str, timeout: float):
+        parts = urlsplit(url)
+        self.host, self.port = parts.hostname, parts.port or 80
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def post(self, path: str, payload: dict) -> int:
+        body = json.dumps(payload)
+        for attempt in range(2):
+            conn = getattr(self._local, "conn", None)
+            if conn is None:
+                conn = self._local.conn = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+            try:
+                conn.request("POST", path, body, {"Content-Type": "application/json"})
+                response = conn.getresponse()
+                response.read()
+                return response.status
+            except (http.client.HTTPException, ConnectionError):
+                # Stale keep-alive connection: reconnect once
+                conn.close()
+                self._local.conn = None
+                if attempt:
+                    raise
+
+
+def percentile(sorted_values: list, q: float):
+    if not sorted_values:
+        return None
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+def run_rate(client: Client, rate: float, duration: float, path: str, unique: bool, workers: int) -> dict:
+    total = int(rate * duration)
+    results = [None] * total     # (status or None, latency seconds)
+    start = time.monotonic() + 0.05
+
+    def one(i):
+        scheduled = start + i / rate
+        message = f"Load test question number {i}" if unique else "Load test question"
+        try:
+            status = client.post(path, {"message": message})
+        except OSError:
+            status = None
+        results[i] = (status, time.monotonic() - scheduled)
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for i in range(total):
+            delay = start + i / rate - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            pool.submit(one, i)
+    elapsed = time.monotonic() - start
+
+    statuses = {}
+    ok_latencies = []
+    for status, latency in results:
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+        if status == 200:
+            ok_latencies.append(latency)
+    ok_latencies.sort()
+    ms = lambda v: None if v is None else round(v * 1000, 1)
+    return {
+        "rate": rate,
+        "duration_s": round(elapsed, 2),
+        "sent": total,
+        "ok": len(ok_latencies),
+        "throughput_rps": round(len(ok_latencies) / elapsed, 1),
+        "error_rate": round(1 - len(ok_latencies) / total, 4) if total else 0.0,
+        "status_counts": statuses,
+        "p50_ms": ms(percentile(ok_latencies, 0.50)),
+        "p95_ms": ms(percentile(ok_latencies, 0.95)),
+        "p99_ms": ms(percentile(ok_latencies, 0.99)),
+        "max_ms": ms(ok_latencies[-1] if ok_latencies else None),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", help="server to test; default starts app.py locally with the emulator")
+    parser.add_argument("--path", default="/chat")
+    parser.add_argument("--rates", default="20,50,100", help="comma-separated requests per second")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds per rate")
+    parser.add_argument("--workers", type=int, default=512, help="max requests in flight")
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--repeat", action="store_true",
+                        help="send the same message every time (exercises caches and coalescing)")
+    parser.add_argument("--output", help="also write the results as a JSON array to this file")
+    args = parser.parse_args()
+
+    url = args.url or start_local_server()
+    client = Client(url, args.timeout)
+    results = []
+    for rate in (float(r) for r in args.rates.split(",")):
+        result = run_rate(client, rate, args.duration, args.path, not args.repeat, args.workers)
+        result["url"] = url + args.path
+        print(json.dumps(result), flush=True)
+        results.append(result)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
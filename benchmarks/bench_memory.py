@@ -0,0 +1,110 @@
+# benchmarks/bench_memory.py
+#
+# Slot extraction cost on long messages with many slot patterns: the
+# compiled single-pass SlotExtractor versus the old approach of lowercasing
+# the message and scanning it once per phrase ("phrase in lower" followed
+# by index/split).
+#
+#   python benchmarks/bench_memory.py [--patterns 120] [--length 4000]
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from memory import DEFAULT_PATTERNS, Memory, SlotExtractor, SlotPattern
+
+SUBJECTS = ["favorite", "least favorite", "usual", "preferred", "first", "current", "old", "best"]
+THINGS = ["color", "food", "city", "team", "book", "movie", "song", "car", "language", "sport",
+          "drink", "band", "game", "editor", "airline", "hotel"]
+FILLER = ("the quick brown fox jumps over the lazy dog while my friend reads about "
+          "weather and my plans for the weekend are still open ").split()
+
+
+def make_patterns(count):
+    patterns = list(DEFAULT_PATTERNS)
+    for subject in SUBJECTS:
+        for thing in THINGS:
+            if len(patterns) >= count:
+                return patterns
+            name = f"{subject.replace(' ', '_')}_{thing}"
+            patterns.append(SlotPattern(name, f"my {subject} {thing} is", f"Their {subject} {thing} is {{}}."))
+    return patterns
+
+
+def make_message(rng, patterns, length, mentions):
+    words = []
+    while sum(len(w) + 1 for w in words) < length:
+        words.append(rng.choice(FILLER))
+    for _ in range(mentions):
+        phrase = rng.choice(rng.choice(patterns).phrases)
+        words.insert(rng.randrange(len(words)), f"{phrase} value{rng.randrange(100)}")
+    return " ".join(words)
+
+
+def naive_extract(patterns, text):
+    lower = text.lower()
+    found = {}
+    for pattern in patterns:
+        for phrase in pattern.phrases:
+            key = phrase + " "
+            if key in lower:
+                idx = lower.index(key) + len(key)
+                rest = text[idx:].split()
+                if rest:
+                    found[pattern.name] = getattr(str, pattern.normalize)(rest[0])
+    return found
+
+
+def timed(fn, messages, rounds):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for message in messages:
+            fn(message)
+    return (time.perf_counter() - start) / (rounds * len(messages))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--patterns", type=int, default=120)
+    parser.add_argument("--length", type=int, default=4000, help="characters per message")
+    parser.add_argument("--mentions", type=int, default=3, help="slot phrases per message")
+    parser.add_argument("--messages", type=int, default=50)
+    parser.add_argument("--rounds", type=int, default=20)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    patterns = make_patterns(args.patterns)
+    messages = [make_message(rng, patterns, args.length, args.mentions) for _ in range(args.messages)]
+    start = time.perf_counter()
+    extractor = SlotExtractor(patterns)
+    compile_ms = (time.perf_counter() - start) * 1000
+
+    compiled = timed(extractor.extract, messages, args.rounds)
+    naive = timed(lambda m: naive_extract(patterns, m), messages, args.rounds)
+    print(f"{len(patterns)} slot patterns, {args.length}-char messages, {args.mentions} mentions each "
+          f"(compiled in {compile_ms:.1f} ms)")
+    print(f"{'extractor':<22} {'us/message':>10}")
+    print(f"{'per-phrase scans':<22} {naive * 1e6:>10.1f}")
+    print(f"{'compiled single pass':<22} {compiled * 1e6:>10.1f}   ({naive / compiled:.1f}x)")
+
+    memory = Memory(extractor)
+    memory.parse_and_store(messages[0])
+    rounds = 100_000
+    start = time.perf_counter()
+    for _ in range(rounds):
+        memory.to_prompt()
+    cached = (time.perf_counter() - start) / rounds
+    start = time.perf_counter()
+    for _ in range(rounds):
+        memory._prompt = None
+        memory.to_prompt()
+    rebuilt = (time.perf_counter() - start) / rounds
+    print(f"to_prompt ({len(memory.slots)} slots)  cached {cached * 1e9:.0f} ns, rebuilt {rebuilt * 1e9:.0f} ns")
+
+
+if __name__ == "__main__":
+    main()
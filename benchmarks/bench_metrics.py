@@ -0,0 +1,60 @@
+# benchmarks/bench_metrics.py
+#
+# Per-call overhead of the hot-path instrumentation: an empty
+# `with metrics.stage(...)` block with metrics enabled (histogram observe,
+# inside and outside a request) and disabled (METRICS=0), next to an
+# uninstrumented empty loop.
+#
+#   python benchmarks/bench_metrics.py [--calls 1000000]
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import metrics
+
+
+def per_call(fn, calls):
+    start = time.perf_counter()
+    fn(calls)
+    return (time.perf_counter() - start) / calls * 1e9
+
+
+def empty(calls):
+    for _ in range(calls):
+        pass
+
+
+def staged(calls):
+    stage = metrics.stage
+    for _ in range(calls):
+        with stage("prompt"):
+            pass
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--calls", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    baseline = per_call(empty, args.calls)
+    metrics.enabled = False
+    disabled = per_call(staged, args.calls)
+    metrics.enabled = True
+    enabled = per_call(staged, args.calls)
+    metrics.start_request()
+    in_request = per_call(staged, args.calls)
+    metrics.finish_request("/bench", 200)
+
+    print(f"{'mode':<24} {'ns/stage':>9}")
+    print(f"{'uninstrumented loop':<24} {baseline:>9.0f}")
+    print(f"{'METRICS=0':<24} {disabled - baseline:>9.0f}")
+    print(f"{'enabled':<24} {enabled - baseline:>9.0f}")
+    print(f"{'enabled, in a request':<24} {in_request - baseline:>9.0f}")
+
+
+if __name__ == "__main__":
+    main()
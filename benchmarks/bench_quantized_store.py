@@ -0,0 +1,80 @@
+# benchmarks/bench_quantized_store.py
+#
+# Recall, memory and query latency of QuantizedVectorStore against the
+# float32 VectorStore (flat search, the exact reference), at each dimension:
+#   float32          VectorStore
+#   int8 / binary    codes only, scores estimated from the codes
+#   ... + rescore    candidates rescored against the memory-mapped originals
+# recall@k is the overlap of each top-k with VectorStore's. Vectors have
+# low-rank structure plus noise, like real embeddings, rather than being
+# uniformly random (where every neighbour but the first is a near-tie).
+#
+#   python benchmarks/bench_quantized_store.py [--size 200000] [--dimensions 512,1024]
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from quantized_store import QuantizedVectorStore
+from vector_store import VectorStore
+
+
+def embeddings(rng, n, dimensions, rank):
+    basis = rng.standard_normal((rank, dimensions), dtype=np.float32)
+    for start in range(0, n, 100_000):
+        rows = min(100_000, n - start)
+        yield (rng.standard_normal((rows, rank), dtype=np.float32) @ basis
+               + 0.5 * np.sqrt(rank) * rng.standard_normal((rows, dimensions), dtype=np.float32))
+
+
+def timed_queries(store, queries, k):
+    store.search(queries[0], k=k)
+    start = time.perf_counter()
+    results = [[r[0] for r in store.search(q, k=k)] for q in queries]
+    return (time.perf_counter() - start) / len(queries) * 1000, results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size", type=int, default=200_000)
+    parser.add_argument("--dimensions", default="512,1024")
+    parser.add_argument("--rank", type=int, default=64, help="rank of the shared structure in the vectors")
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--k", type=int, default=10)
+    args = parser.parse_args()
+
+    for dimensions in (int(d) for d in args.dimensions.split(",")):
+        rng = np.random.default_rng(0)
+        flat = VectorStore(dimensions)
+        stores = {(q, keep): QuantizedVectorStore(dimensions, q, keep_originals=keep)
+                  for q in ("int8", "binary") for keep in (False, True)}
+        start = 0
+        for block in embeddings(rng, args.size, dimensions, args.rank):
+            ids = range(start, start + len(block))
+            flat.add(ids, block)
+            for store in stores.values():
+                store.add(ids, block)
+            start += len(block)
+        targets = rng.integers(0, args.size, args.queries)
+        queries = flat._matrix[targets] + 0.02 * rng.standard_normal((args.queries, dimensions), dtype=np.float32)
+
+        exact_ms, exact = timed_queries(flat, queries, args.k)
+        float_mb = flat._matrix[:len(flat)].nbytes / 1e6
+        print(f"{args.size} x {dimensions}, rank {args.rank}, {args.queries} queries, k={args.k}")
+        print(f"{'store':<18} {'memory MB':>10} {'query ms':>9} {f'recall@{args.k}':>10}")
+        print(f"{'float32':<18} {float_mb:>10.1f} {exact_ms:>9.2f} {1.0:>10.3f}")
+        for (quantization, keep), store in stores.items():
+            ms, results = timed_queries(store, queries, args.k)
+            recall = np.mean([len(set(a) & set(b)) / args.k for a, b in zip(exact, results)])
+            name = quantization + (f" + rescore x{store.oversample}" if keep else "")
+            print(f"{name:<18} {store.memory_bytes() / 1e6:>10.1f} {ms:>9.2f} {recall:>10.3f}")
+        print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+# benchmarks/bench_response_cache.py
+#
+# Lookup latency of ResponseCache hits (memory tier and SQLite tier).
+#
+#   python benchmarks/bench_response_cache.py [--entries 10000] [--lookups 100000]
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from response_cache import ResponseCache
+
+
+def bench(label, cache, keys, lookups):
+    start = time.perf_counter()
+    for i in range(lookups):
+        cache.get(keys[i % len(keys)])
+    elapsed = time.perf_counter() - start
+    print(f"{label:<14} {elapsed / lookups * 1e6:8.2f} us/hit")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--entries", type=int, default=10000)
+    parser.add_argument("--lookups", type=int, default=100000)
+    args = parser.parse_args()
+
+    keys = [ResponseCache.make_key("model", f"prompt {i}", 512, 0.5, 0.9) for i in range(args.entries)]
+    memory = ResponseCache(max_entries=args.entries)
+    for k in keys:
+        memory.put(k, "reply " * 50)
+    bench("memory", memory, keys, args.lookups)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = os.path.join(tmp, "responses.db")
+        writer = ResponseCache(max_entries=0, db_path=db)
+        for k in keys:
+            writer.put(k, "reply " * 50)
+        bench("sqlite", ResponseCache(max_entries=0, db_path=db), keys, min(args.lookups, 20000))
+
+
+if __name__ == "__main__":
+    main()
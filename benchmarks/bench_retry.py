@@ -0,0 +1,105 @@
+# benchmarks/bench_retry.py
+#
+# Tail latency and success rate of BedrockClient.invoke with no retry
+# policy, with retries, and with retries plus hedging. The fake Bedrock
+# draws each call's latency from a long-tailed mix (--slow-fraction of calls
+# take --slow-ms, the rest about --fast-ms) and fails --fault-rate of calls
+# with ServiceUnavailableException.
+#
+#   python benchmarks/bench_retry.py [--requests 2000] [--threads 32]
+
+import argparse
+import json
+import os
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from botocore.exceptions import ClientError
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bedrock_client import BedrockClient
+from errors import BedrockInvocationError
+from retry_policy import RetryPolicy
+
+REPLY = json.dumps({"generation": "ok"}).encode("utf-8")
+
+
+class Body:
+    def read(self):
+        return REPLY
+
+
+class TailRuntime:
+    def __init__(self, fast, slow, slow_fraction, fault_rate):
+        self.fast = fast
+        self.slow = slow
+        self.slow_fraction = slow_fraction
+        self.fault_rate = fault_rate
+        self.calls = 0
+        self.lock = threading.Lock()
+
+    def invoke_model(self, **kwargs):
+        with self.lock:
+            self.calls += 1
+        slow = random.random() < self.slow_fraction
+        time.sleep(self.slow if slow else random.uniform(0.8, 1.2) * self.fast)
+        if random.random() < self.fault_rate:
+            raise ClientError({"Error": {"Code": "ServiceUnavailableException", "Message": "x"}}, "InvokeModel")
+        return {"body": Body()}
+
+
+def run(runtime, policy, requests, threads):
+    bc = BedrockClient(region="us-east-1", model_id="bench-model", client=runtime, retry_policy=policy)
+    latencies, failures = [], 0
+
+    def one(_):
+        start = time.monotonic()
+        try:
+            bc.invoke("prompt")
+        except BedrockInvocationError:
+            return None
+        return time.monotonic() - start
+
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        for latency in pool.map(one, range(requests)):
+            if latency is None:
+                failures += 1
+            else:
+                latencies.append(latency)
+    latencies.sort()
+    p = lambda q: latencies[int(q * (len(latencies) - 1))] * 1000
+    return p(0.5), p(0.99), p(0.999), failures
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--threads", type=int, default=32)
+    parser.add_argument("--fast-ms", type=float, default=50)
+    parser.add_argument("--slow-ms", type=float, default=1000)
+    parser.add_argument("--slow-fraction", type=float, default=0.03)
+    parser.add_argument("--fault-rate", type=float, default=0.02)
+    args = parser.parse_args()
+
+    modes = (
+        ("single attempt", None),
+        ("retries", RetryPolicy(max_attempts=3, base_delay=0.02)),
+        ("retries+hedge", RetryPolicy(max_attempts=3, base_delay=0.02, hedge=True)),
+    )
+    print(f"{args.requests} requests, {args.threads} threads, "
+          f"{args.slow_fraction:.0%} slow ({args.slow_ms:.0f} ms), {args.fault_rate:.0%} faults")
+    print(f"{'mode':<16} {'p50 ms':>8} {'p99 ms':>8} {'p99.9 ms':>9} {'failed':>7} {'calls':>7}")
+    for name, policy in modes:
+        random.seed(0)
+        runtime = TailRuntime(args.fast_ms / 1000, args.slow_ms / 1000, args.slow_fraction, args.fault_rate)
+        p50, p99, p999, failed = run(runtime, policy, args.requests, args.threads)
+        print(f"{name:<16} {p50:>8.0f} {p99:>8.0f} {p999:>9.0f} {failed:>7} {runtime.calls:>7}")
+        if policy is not None:
+            print(f"{'':<16} {json.dumps({k: v for k, v in policy.stats().items() if k != 'failures'})}")
+
+
+if __name__ == "__main__":
+    main()
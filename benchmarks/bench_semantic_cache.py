@@ -0,0 +1,74 @@
+# benchmarks/bench_semantic_cache.py
+#
+# SemanticCache.lookup latency as the cache grows (embedding time excluded),
+# partitioned as in production against a cache that always scans every
+# entry. Half of the lookups are paraphrases of stored messages (cosine
+# ~0.98); "hits" is the share of those the cache still finds.
+#
+#   python benchmarks/bench_semantic_cache.py [--dimensions 256] [--lookups 400]
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from semantic_cache import SemanticCache
+
+
+def unit(rows):
+    return rows / np.linalg.norm(rows, axis=1, keepdims=True)
+
+
+def measure(cache, queries):
+    """
+    (p50 ms, p95 ms, replies found) over `queries`.
+    """
+    times, found = [], 0
+    for q in queries:
+        start = time.perf_counter()
+        found += cache.lookup(q) is not None
+        times.append(time.perf_counter() - start)
+    times.sort()
+    return times[len(times) // 2] * 1000, times[int(0.95 * (len(times) - 1))] * 1000, found
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--dimensions", type=int, default=256)
+    parser.add_argument("--lookups", type=int, default=400)
+    parser.add_argument("--sizes", default="1000,10000,50000,100000")
+    args = parser.parse_args()
+
+    sizes = [int(s) for s in args.sizes.split(",")]
+    rng = np.random.default_rng(0)
+    capacity = max(sizes)
+    caches = {
+        "partitioned": SemanticCache(embed_fn=None, threshold=0.95, capacity=capacity),
+        "full scan": SemanticCache(embed_fn=None, threshold=0.95, capacity=capacity, ivf_min_entries=capacity + 1),
+    }
+    stored = unit(rng.standard_normal((capacity, args.dimensions)).astype(np.float32))
+    unrelated = unit(rng.standard_normal((args.lookups // 2, args.dimensions)).astype(np.float32))
+
+    print(f"{'entries':>8}  {'mode':<12} {'p50 ms':>8} {'p95 ms':>8} {'hits':>6}")
+    filled = 0
+    for size in sizes:
+        for cache in caches.values():
+            for row in stored[filled:size]:
+                cache.add(row, "reply")
+        filled = size
+        picks = rng.choice(size, size=args.lookups // 2, replace=False)
+        noise = rng.standard_normal((picks.size, args.dimensions)).astype(np.float32) * 0.012
+        paraphrases = unit(stored[picks] + noise)
+        queries = np.concatenate([paraphrases, unrelated])
+        rng.shuffle(queries)
+        for name, cache in caches.items():
+            p50, p95, found = measure(cache, queries)
+            print(f"{size:>8}  {name:<12} {p50:>8.3f} {p95:>8.3f} {found / picks.size:>6.1%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+# benchmarks/bench_serving.py
+#
+# Flask's development server (`python app.py`) versus the production
+# gunicorn setup (`gunicorn -c gunicorn.conf.py app:app`) on this machine.
+# Each server runs as a subprocess against the Bedrock emulator and is
+# driven by the open-loop generator from bench_load.py at the same rates.
+# Also reports the time from launch until each server answers, and how
+# many of 20 in-flight chats complete when it is sent SIGTERM, and whether
+# long SQLite-backed sessions get their history summarized: under gunicorn
+# that happens on the compactor of the forked worker that served the turn.
+#
+#   python benchmarks/bench_serving.py [--rates 50,200,400] [--duration 5]
+
+import argparse
+import http.client
+import json
+import os
+import shutil
+import signal
+import socket
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from bench_load import Client, run_rate
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_ready(port: int, timeout: float = 30.0) -> float:
+    start = time.monotonic()
+    while time.monotonic() - start < timeout:
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=1)
+            conn.request("GET", "/")
+            if conn.getresponse().status == 200:
+                return time.monotonic() - start
+        except OSError:
+            time.sleep(0.05)
+    raise RuntimeError(f"server on port {port} did not start")
+
+
+def launch(command: list, port: int, env: dict) -> subprocess.Popen:
+    return subprocess.Popen(
+        command, cwd=ROOT, env={**os.environ, **env, "PORT": str(port)},
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+
+
+def check_compaction(command: list, env: dict, sessions: int = 8, turns: int = 12) -> str:
+    """
+    Run `sessions` conversations of `turns` messages against a fresh server
+    with SQLite sessions and a small prompt budget, then count the sessions
+    that have a summary in the database.
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "sessions.db")
+        port = free_port()
+        proc = launch(command, port, {**env, "SESSION_STORE": "sqlite", "SESSION_DB": db_path,
+                                       "PROMPT_TOKEN_BUDGET": "256"})
+        try:
+            wait_ready(port)
+            client = Client(f"http://127.0.0.1:{port}", timeout=30.0)
+
+            def converse(s):
+                for t in range(turns):
+                    client.post("/chat", {"session_id": f"bench-{s}",
+                                          "message": f"Session {s}, question {t}: tell me more about topic {t}."})
+            talkers = [threading.Thread(target=converse, args=(s,)) for s in range(sessions)]
+            for t in talkers:
+                t.start()
+            for t in talkers:
+                t.join()
+            # Summaries are written in the background; give them a moment
+            deadline = time.monotonic() + 10
+            while True:
+                with sqlite3.connect(db_path) as db:
+                    rows = db.execute("SELECT data FROM sessions").fetchall()
+                done = sum(1 for (data,) in rows if json.loads(data).get("summary"))
+                if done == sessions or time.monotonic() > deadline:
+                    return f"{done}/{sessions}"
+                time.sleep(0.2)
+        finally:
+            proc.send_signal(signal.SIGTERM)
+            try:
+                proc.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+                proc.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rates", default="50,200,400")
+    parser.add_argument("--duration", type=float, default=5.0)
+    parser.add_argument("--latency", default="lognormal:200,0.3", help="EMULATOR_LATENCY for both servers")
+    parser.add_argument("--workers", default="4", help="GUNICORN_WORKERS")
+    parser.add_argument("--threads", default="32", help="GUNICORN_THREADS")
+    args = parser.parse_args()
+
+    env = {
+        "BEDROCK_EMULATOR": "1",
+        "AWS_REGION": "local",
+        "BEDROCK_MODEL_ID": "meta.llama3-3-70b-instruct-v1:0",
+        "EMULATOR_LATENCY": args.latency,
+        "GUNICORN_WORKERS": args.workers,
+        "GUNICORN_THREADS": args.threads,
+        "RESPONSE_CACHE_SIZE": "0",
+    }
+    servers = [("flask dev server", [sys.executable, "app.py"])]
+    if shutil.which("gunicorn"):
+        servers.append((f"gunicorn {args.workers}x{args.threads}", ["gunicorn", "-c", "gunicorn.conf.py", "app:app"]))
+    else:
+        print("gunicorn not installed; only the dev server is measured")
+
+    rows = []
+    for name, command in servers:
+        port = free_port()
+        proc = launch(command, port, env)
+        try:
+            startup = wait_ready(port)
+            client = Client(f"http://127.0.0.1:{port}", timeout=30.0)
+            for rate in (float(r) for r in args.rates.split(",")):
+                result = run_rate(client, rate, args.duration, "/chat", True, 1024)
+                rows.append((name, startup, result))
+                print(json.dumps({"server": name, **result}), flush=True)
+
+            # Shut down with chats in flight: they should complete, not fail
+            statuses = []
+
+            def send(i):
+                try:
+                    statuses.append(client.post("/chat", {"message": f"drain me {i}"}))
+                except OSError:
+                    statuses.append(None)
+            senders = [threading.Thread(target=send, args=(i,)) for i in range(20)]
+            for t in senders:
+                t.start()
+            time.sleep(0.05)
+            stop = time.monotonic()
+            proc.send_signal(signal.SIGTERM)
+            for t in senders:
+                t.join()
+            proc.wait(timeout=90)
+            drained = sum(1 for s in statuses if s == 200)
+            print(json.dumps({"server": name, "shutdown_s": round(time.monotonic() - stop, 2),
+                              "in_flight_completed": f"{drained}/{len(senders)}"}), flush=True)
+        except Exception as e:
+            print(json.dumps({"server": name, "error": str(e)}), flush=True)
+        finally:
+            if proc.poll() is None:
+                proc.kill()
+                proc.wait()
+        try:
+            compacted = check_compaction(command, env)
+            print(json.dumps({"server": name, "sessions_compacted": compacted}), flush=True)
+        except Exception as e:
+            print(json.dumps({"server": name, "error": str(e)}), flush=True)
+
+    print()
+    print(f"{'server':<20} {'startup s':>9} {'rate':>6} {'ok/s':>7} {'p50 ms':>8} {'p99 ms':>8} {'errors':>7}")
+    for name, startup, r in rows:
+        print(f"{name:<20} {startup:>9.2f} {r['rate']:>6.0f} {r['throughput_rps']:>7.1f} "
+              f"{r['p50_ms'] or 0:>8.0f} {r['p99_ms'] or 0:>8.0f} {r['error_rate']:>7.1%}")
+
+
+if __name__ == "__main__":
+    main()
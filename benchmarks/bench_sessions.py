@@ -0,0 +1,141 @@
+# benchmarks/bench_sessions.py
+#
+# Memory held by idle sessions and the cost of assembling the next prompt.
+#
+#   memory     MemorySessionStore with --sessions idle sessions of --turns
+#              exchanges each, measured with tracemalloc, next to a naive
+#              dict of per-session lists of (role, text) tuples
+#   sqlite     size of the SqliteSessionStore database for the same sessions
+#   prompt     building the next prompt from Session.history versus
+#              re-formatting every stored turn
+#   budget     building a token-budgeted prompt for a session of 50 messages
+#              with the cached per-turn counts versus re-estimating every
+#              turn, and the cost of adding a turn
+#
+#   python benchmarks/bench_sessions.py [--sessions 100000] [--turns 3]
+
+import argparse
+import gc
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as chat_app
+from session_store import ASSISTANT, USER, MemorySessionStore, Session, SqliteSessionStore
+from token_budget import estimate_tokens
+
+
+def messages(i, turns, length):
+    for t in range(turns):
+        yield f"user {i} turn {t} ".ljust(length, "u"), f"assistant {i} turn {t} ".ljust(length, "a")
+
+
+def measure(build):
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    kept = build()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return kept, after - before
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sessions", type=int, default=100_000)
+    parser.add_argument("--turns", type=int, default=3, help="exchanges per session")
+    parser.add_argument("--length", type=int, default=120, help="characters per message")
+    args = parser.parse_args()
+    n = args.sessions
+    text_bytes = n * args.turns * 2 * args.length
+
+    def build_store():
+        store = MemorySessionStore(max_turns=args.turns * 2, max_bytes=1 << 40)
+        for i in range(n):
+            for user, reply in messages(i, args.turns, args.length):
+                store.record(f"session-{i}", user, reply)
+        return store
+
+    def build_naive():
+        naive = {}
+        for i in range(n):
+            history = naive.setdefault(f"session-{i}", [])
+            for user, reply in messages(i, args.turns, args.length):
+                history.append(("user", user))
+                history.append(("assistant", reply))
+        return naive
+
+    store, store_bytes = measure(build_store)
+    naive, naive_bytes = measure(build_naive)
+    print(f"{n} idle sessions x {args.turns} exchanges x {args.length} chars "
+          f"({text_bytes / 2**20:.0f} MiB of message text)")
+    print(f"memory store     {store_bytes / 2**20:8.1f} MiB  {store_bytes / n:6.0f} B/session"
+          f"  (store accounts {store.stats()['bytes'] / n:.0f} B/session)")
+    print(f"naive tuples     {naive_bytes / 2**20:8.1f} MiB  {naive_bytes / n:6.0f} B/session")
+    del naive
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = SqliteSessionStore(os.path.join(tmp, "sessions.db"), max_turns=args.turns * 2, max_bytes=1 << 40)
+        sample = min(n, 20_000)
+        for i in range(sample):
+            for user, reply in messages(i, args.turns, args.length):
+                db.record(f"session-{i}", user, reply)
+        size = sum(os.path.getsize(os.path.join(tmp, f)) for f in os.listdir(tmp))
+        print(f"sqlite store     {size / sample * n / 2**20:8.1f} MiB  {size / sample:6.0f} B/session"
+              f"  (extrapolated from {sample})")
+
+    session = store.get("session-0")
+    history = session.messages()
+    rounds = 100_000
+    start = time.perf_counter()
+    for _ in range(rounds):
+        chat_app.build_prompt_multi_turn(session, "next question")
+    incremental = (time.perf_counter() - start) / rounds
+    start = time.perf_counter()
+    for _ in range(rounds):
+        lines = [chat_app.MULTI_TURN_SYSTEM]
+        for role, text in history:
+            lines.append(f"{'User:' if role == 'user' else 'Assistant:'} {text}")
+        lines.append("User: next question")
+        lines.append("Assistant:")
+        "\n".join(lines)
+    rejoin = (time.perf_counter() - start) / rounds
+    print(f"prompt assembly  incremental {incremental * 1e6:.2f} us, re-format all turns {rejoin * 1e6:.2f} us")
+
+    long_session = Session("long")
+    for user, reply in messages(0, 25, args.length):
+        long_session.add(USER, user)
+        long_session.add(ASSISTANT, reply)
+    long_history = long_session.messages()
+    budget = chat_app.prompt_budget.max_prompt_tokens
+    rounds = 20_000
+    start = time.perf_counter()
+    for _ in range(rounds):
+        chat_app.build_prompt_multi_turn(long_session, "next question")
+    cached = (time.perf_counter() - start) / rounds
+    start = time.perf_counter()
+    for _ in range(rounds):
+        room, kept = budget - 100, []
+        for role, text in reversed(long_history):
+            line = f"{'User:' if role == 'user' else 'Assistant:'} {text}"
+            cost = estimate_tokens(line) + 1
+            if cost > room:
+                break
+            room -= cost
+            kept.append(line)
+        "\n".join([chat_app.MULTI_TURN_SYSTEM, *reversed(kept), "User: next question", "Assistant:"])
+    recount = (time.perf_counter() - start) / rounds
+    start = time.perf_counter()
+    for i in range(rounds):
+        long_session.add(USER, f"user turn {i} ".ljust(args.length, "u"))
+    add = (time.perf_counter() - start) / rounds
+    print(f"budgeted prompt  cached counts {cached * 1e6:.2f} us, re-estimate turns {recount * 1e6:.2f} us"
+          f"  (50 messages, {budget} token budget); add turn {add * 1e6:.2f} us")
+
+
+if __name__ == "__main__":
+    main()
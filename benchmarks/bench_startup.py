@@ -0,0 +1,157 @@
+# benchmarks/bench_startup.py
+#
+# Cold-start cost of the service and CLIs, each measured in fresh Python
+# processes:
+#   - import time of each entry module, over a bare interpreter start, next
+#     to what it would be if boto3/botocore and numpy were imported eagerly
+#   - for `python app.py`: time until the server answers, and until
+#     /healthz leaves "starting" (the Bedrock client is built and, against
+#     the real endpoint, a connection opened)
+# --profile MODULE prints the slowest imports under MODULE (from
+# `python -X importtime`), and --history FILE appends the results as one
+# JSON line, with the commit, and prints the change since the last line.
+#
+#   python benchmarks/bench_startup.py [--runs 7] [--profile app] [--history startup.jsonl]
+
+import argparse
+import datetime
+import http.client
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from bench_serving import free_port
+
+EAGER = "import boto3, botocore.config, numpy"
+MODULES = ("app", "asgi_app", "run_inference", "run_embedding")
+ENV = {"AWS_REGION": "us-east-2", "BEDROCK_MODEL_ID": "meta.llama3-3-70b-instruct-v1:0"}
+
+
+def time_process(code: str, runs: int) -> float:
+    """
+    Median wall time (ms) of `python -c code` in a fresh process.
+    """
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-c", code], cwd=ROOT, env={**os.environ, **ENV}, check=True,
+                       stdout=subprocess.DEVNULL)
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def import_profile(module: str, top: int) -> list:
+    """
+    (cumulative ms, self ms, name) of the `top` slowest imports under `module`.
+    """
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"], cwd=ROOT,
+                            env={**os.environ, **ENV}, capture_output=True, text=True, check=True)
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        own, cumulative, name = line[len("import time:"):].split("|")
+        rows.append((int(cumulative) / 1000, int(own) / 1000, name.rstrip()))
+    return sorted(rows, reverse=True)[:top]
+
+
+def time_to_ready(emulator: bool, timeout: float = 30.0) -> dict:
+    """
+    Launch `python app.py` and poll /healthz: seconds until the first
+    response and until warm-up finished, plus the final readiness payload.
+    """
+    port = free_port()
+    env = {**os.environ, **ENV, "PORT": str(port), "BEDROCK_EMULATOR": "1" if emulator else "0"}
+    start = time.perf_counter()
+    proc = subprocess.Popen([sys.executable, "app.py"], cwd=ROOT, env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    listening = None
+    try:
+        while time.perf_counter() - start < timeout:
+            try:
+                conn = http.client.HTTPConnection("127.0.0.1", port, timeout=2)
+                conn.request("GET", "/healthz")
+                response = conn.getresponse()
+                state = json.loads(response.read())
+            except OSError:
+                time.sleep(0.005)
+                continue
+            listening = listening or time.perf_counter() - start
+            if state["status"] != "starting":
+                return {"listen_s": listening, "warm_s": time.perf_counter() - start, **state}
+            time.sleep(0.005)
+        raise RuntimeError("app.py did not finish warming up")
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+def git_commit() -> str:
+    result = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True)
+    return result.stdout.strip() or "unknown"
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=7, help="processes per measurement (median)")
+    parser.add_argument("--profile", metavar="MODULE", help="print the slowest imports under MODULE")
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--history", metavar="FILE", help="append results to this JSONL file")
+    args = parser.parse_args()
+
+    if args.profile:
+        print(f"slowest imports under {args.profile}:")
+        print(f"{'cumulative ms':>13} {'self ms':>8}  module")
+        for cumulative, own, name in import_profile(args.profile, args.top):
+            print(f"{cumulative:>13.1f} {own:>8.1f}  {name}")
+        print()
+
+    baseline = time_process("pass", args.runs)
+    eager = time_process(EAGER, args.runs) - baseline
+    results = {"interpreter_ms": round(baseline, 1), "eager_deps_ms": round(eager, 1)}
+    print(f"interpreter start {baseline:.0f} ms; boto3+botocore+numpy alone {eager:.0f} ms")
+    print(f"{'module':<16} {'import ms':>10} {'+ eager deps':>13}")
+    for module in MODULES:
+        lazy = time_process(f"import {module}", args.runs) - baseline
+        eager_total = time_process(f"{EAGER}; import {module}", args.runs) - baseline
+        results[f"import_{module}_ms"] = round(lazy, 1)
+        print(f"{module:<16} {lazy:>10.0f} {eager_total:>13.0f}")
+
+    print()
+    print(f"{'app.py against':<16} {'listen s':>9} {'warm-up s':>10} {'client ms':>10}  status")
+    for name, emulator in (("emulator", True), ("bedrock", False)):
+        ready = time_to_ready(emulator)
+        results[f"{name}_listen_s"] = round(ready["listen_s"], 3)
+        results[f"{name}_warm_s"] = round(ready["warm_s"], 3)
+        print(f"{name:<16} {ready['listen_s']:>9.2f} {ready['warm_s']:>10.2f} "
+              f"{ready.get('client_ms', 0):>10.1f}  {ready['status']}")
+
+    if args.history:
+        previous = None
+        if os.path.exists(args.history):
+            with open(args.history, encoding="utf-8") as f:
+                lines = [line for line in f if line.strip()]
+            previous = json.loads(lines[-1]) if lines else None
+        record = {
+            "time": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+            "commit": git_commit(), "python": platform.python_version(), **results,
+        }
+        with open(args.history, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record) + "\n")
+        if previous is not None:
+            print()
+            print(f"change since {previous['commit']} ({previous['time']}):")
+            for key, value in results.items():
+                if key in previous and previous[key]:
+                    print(f"  {key:<24} {previous[key]:>9} -> {value:<9} ({(value / previous[key] - 1):+.0%})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+# benchmarks/bench_stream.py
+#
+# Time-to-first-token of POST /chat/stream versus total latency of POST /chat,
+# against a local fake Bedrock that emits one token every --token-ms.
+#
+#   python benchmarks/bench_stream.py [--tokens 100] [--token-ms 20] [--runs 5]
+
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as app_module
+from bedrock_client import BedrockClient
+
+
+class FakeStreamingRuntime:
+    def __init__(self, tokens, token_delay):
+        self.tokens = tokens
+        self.token_delay = token_delay
+
+    def _events(self):
+        for i in range(self.tokens):
+            time.sleep(self.token_delay)
+            yield {"chunk": {"bytes": json.dumps({"generation": f" tok{i}"}).encode("utf-8")}}
+
+    def invoke_model_with_response_stream(self, **kwargs):
+        return {"body": self._events()}
+
+    def invoke_model(self, **kwargs):
+        text = "".join(event["chunk"]["bytes"].decode("utf-8") for event in self._events())
+
+        class Body:
+            def read(self):
+                return json.dumps({"generation": text}).encode("utf-8")
+        return {"body": Body()}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tokens", type=int, default=100)
+    parser.add_argument("--token-ms", type=float, default=20.0)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    fake = FakeStreamingRuntime(args.tokens, args.token_ms / 1000.0)
+    bedrock = BedrockClient(region="us-east-2", model_id="fake-model", client=fake)
+    app_module.get_bedrock_client = lambda: bedrock
+    payload = json.dumps({"message": "Hello"})
+
+    with app_module.app.test_client() as c:
+        blocking = []
+        for _ in range(args.runs):
+            start = time.perf_counter()
+            c.post("/chat", data=payload, content_type="application/json").get_data()
+            blocking.append(time.perf_counter() - start)
+
+        ttft, total = [], []
+        for _ in range(args.runs):
+            start = time.perf_counter()
+            resp = c.post("/chat/stream", data=payload, content_type="application/json", buffered=False)
+            chunks = resp.response
+            next(iter(chunks))
+            ttft.append(time.perf_counter() - start)
+            for _ in chunks:
+                pass
+            total.append(time.perf_counter() - start)
+            resp.close()
+
+    ms = lambda xs: sum(xs) / len(xs) * 1000
+    print(f"/chat         first byte {ms(blocking):8.1f} ms")
+    print(f"/chat/stream  first token {ms(ttft):7.1f} ms   complete {ms(total):8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+# benchmarks/bench_vector_store.py
+#
+# VectorStore top-k query latency (flat and IVF) at several index sizes.
+#
+#   python benchmarks/bench_vector_store.py [--sizes 10000,100000,1000000] [--dimensions 512]
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from vector_store import VectorStore
+
+
+def timed_queries(store, queries, k, **kwargs):
+    start = time.perf_counter()
+    results = [store.search(q, k=k, **kwargs) for q in queries]
+    return (time.perf_counter() - start) / len(queries) * 1000, results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", default="10000,100000,1000000")
+    parser.add_argument("--dimensions", type=int, default=512)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--nprobe", type=int, default=8)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    for size in (int(s) for s in args.sizes.split(",")):
+        store = VectorStore(args.dimensions)
+        for start in range(0, size, 100_000):
+            n = min(100_000, size - start)
+            store.add(range(start, start + n), rng.standard_normal((n, args.dimensions), dtype=np.float32))
+        # Queries are noisy copies of stored vectors so top-1 has a known answer
+        targets = rng.integers(0, size, args.queries)
+        queries = store._matrix[targets] + 0.05 * rng.standard_normal((args.queries, args.dimensions), dtype=np.float32)
+
+        flat_ms, flat = timed_queries(store, queries, args.k)
+        nlist = max(16, int(np.sqrt(size)))
+        start = time.perf_counter()
+        store.build_ivf(nlist)
+        build_s = time.perf_counter() - start
+        ivf_ms, ivf = timed_queries(store, queries, args.k, nprobe=args.nprobe)
+        recall = np.mean([a[0][0] == b[0][0] for a, b in zip(flat, ivf)])
+        print(f"{size:>8} x {args.dimensions}  flat {flat_ms:8.2f} ms  "
+              f"ivf(nlist={nlist}, nprobe={args.nprobe}) {ivf_ms:7.2f} ms  "
+              f"recall@1 {recall:.2f}  build {build_s:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,320 @@
+# client_pool.py
+
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from bedrock_emulator import BedrockEmulator, RecordingRuntime
+from errors import ConfigurationError
+from lazy_import import lazy_module
+
+# boto3/botocore are most of this process's import time; they load when the
+# first client is built (normally by the background warm-up)
+boto3 = lazy_module("boto3")
+botocore_config = lazy_module("botocore.config")
+botocore_session = lazy_module("botocore.session")
+
+DEFAULT_POOL_SIZE = 50
+DEFAULT_ASYNC_THREADS = 256
+
+_lock = threading.Lock()
+_runtime_clients = {}   # region -> boto3 "bedrock-runtime" client
+_wrappers = {}          # (kind, region, model_id) -> BedrockClient / EmbedClient
+_async_clients = {}     # (event loop, region) -> task resolving to an aiobotocore client
+_io_executor = None
+_credentials = None     # credential_manager.CredentialManager, once a real client is built
+_warm_up_thread = None
+_readiness = {"status": "starting"}   # see readiness()
+
+
+def pool_config():
+    """
+    Connection settings shared by every bedrock-runtime client we build:
+      - BEDROCK_POOL_SIZE   max sockets kept per client (default 50)
+      - tcp_keepalive       keep idle connections alive between requests
+      - one attempt per call: botocore's own retries are off because the
+        wrappers retry through retry_policy.RetryPolicy, and throttling
+        must reach the concurrency limiter instead of being retried blindly
+    """
+    pool_size = int(os.getenv("BEDROCK_POOL_SIZE", DEFAULT_POOL_SIZE))
+    return botocore_config.Config(max_pool_connections=pool_size, tcp_keepalive=True, retries={"total_max_attempts": 1})
+
+
+def _resolve_env(model_env: str = "BEDROCK_MODEL_ID") -> tuple[str, str]:
+    region = os.getenv("AWS_REGION")
+    model_id = os.getenv(model_env) or os.getenv("BEDROCK_MODEL_ID")
+    if not region:
+        raise ConfigurationError("Missing AWS_REGION environment variable.")
+    if not model_id:
+        raise ConfigurationError(f"Missing {model_env} environment variable.")
+    return region, model_id
+
+
+def _install_credentials_locked():
+    """
+    Build the process-wide CredentialManager (unless CREDENTIAL_REFRESH=0)
+    and make it the credential source of boto3's default session, so every
+    client made with boto3.client(), pooled or not, signs with it.
+    """
+    global _credentials
+    if _credentials is not None:
+        return
+    from credential_manager import CredentialManager
+
+    manager = CredentialManager.from_env()
+    if manager is None:
+        return
+    session = botocore_session.get_session()
+    manager.install(session)
+    boto3.setup_default_session(botocore_session=session)
+    _credentials = manager
+
+
+def credential_manager():
+    """
+    The shared CredentialManager, or None before the first real client is
+    built (and always with CREDENTIAL_REFRESH=0 or the emulator).
+    """
+    return _credentials
+
+
+def get_runtime_client(region: str):
+    """
+    Return the process-wide boto3 bedrock-runtime client for `region`.
+    boto3 clients are thread-safe, so one client (and its urllib3 pool) is
+    shared by every BedrockClient / EmbedClient in that region.
+    BEDROCK_EMULATOR=1 substitutes the local bedrock_emulator.BedrockEmulator,
+    and BEDROCK_RECORD=<path> records the real client's responses there.
+    Real clients sign with the shared CredentialManager.
+    """
+    client = _runtime_clients.get(region)
+    if client is not None:
+        return client
+    with _lock:
+        client = _runtime_clients.get(region)
+        if client is None:
+            client = BedrockEmulator.from_env()
+            if client is None:
+                try:
+                    _install_credentials_locked()
+                    client = boto3.client("bedrock-runtime", region_name=region, config=pool_config())
+                except Exception as e:
+                    raise ConfigurationError(f"Failed to create Bedrock client: {e}")
+                if os.getenv("BEDROCK_RECORD"):
+                    client = RecordingRuntime(client, os.getenv("BEDROCK_RECORD"))
+            _runtime_clients[region] = client
+    return client
+
+
+def _get_wrapper(kind: str, factory, model_env: str):
+    region, model_id = _resolve_env(model_env)
+    key = (kind, region, model_id)
+    wrapper = _wrappers.get(key)
+    if wrapper is not None:
+        return wrapper
+    runtime = get_runtime_client(region)
+    with _lock:
+        wrapper = _wrappers.get(key)
+        if wrapper is None:
+            wrapper = factory(region=region, model_id=model_id, client=runtime)
+            _wrappers[key] = wrapper
+    return wrapper
+
+
+def get_bedrock_client():
+    """
+    Shared BedrockClient for the current AWS_REGION / BEDROCK_MODEL_ID.
+    Raises ConfigurationError if either variable is missing.
+    """
+    from bedrock_client import BedrockClient
+    from retry_policy import RetryPolicy
+
+    def factory(region, model_id, client):
+        return BedrockClient(region=region, model_id=model_id, client=client, retry_policy=RetryPolicy.from_env())
+    return _get_wrapper("chat", factory, "BEDROCK_MODEL_ID")
+
+
+def get_embed_client():
+    """
+    Shared EmbedClient for the current AWS_REGION / BEDROCK_EMBED_MODEL_ID.
+    Falls back to BEDROCK_MODEL_ID so run_embedding.py keeps working when
+    only that variable is set. Embeddings are cached on disk when
+    EMBED_CACHE_DIR is set.
+    """
+    from embed_client import EmbedClient
+    from embedding_cache import EmbeddingCache
+    from retry_policy import RetryPolicy
+
+    def factory(region, model_id, client):
+        return EmbedClient(
+            region=region, model_id=model_id, client=client,
+            cache=EmbeddingCache.from_env(), retry_policy=RetryPolicy.from_env(),
+        )
+    return _get_wrapper("embed", factory, "BEDROCK_EMBED_MODEL_ID")
+
+
+def get_io_executor() -> ThreadPoolExecutor:
+    """
+    Thread pool used by the async API (BedrockClient.ainvoke, EmbedClient.
+    aembed_text) when no native async client is available. Sized by
+    BEDROCK_ASYNC_THREADS (default 256).
+    """
+    global _io_executor
+    if _io_executor is None:
+        with _lock:
+            if _io_executor is None:
+                workers = int(os.getenv("BEDROCK_ASYNC_THREADS", DEFAULT_ASYNC_THREADS))
+                _io_executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bedrock-io")
+    return _io_executor
+
+
+async def get_async_runtime_client(region: str):
+    """
+    Return an aiobotocore bedrock-runtime client bound to the running event
+    loop, or None when aiobotocore is not installed (or when the emulator or
+    recording is on, whose clients are blocking). aiobotocore pins an exact
+    botocore range, so it is optional rather than a requirement. The client
+    signs with the same CredentialManager as the boto3 clients.
+    """
+    if os.getenv("BEDROCK_EMULATOR", "0") == "1" or os.getenv("BEDROCK_RECORD"):
+        return None
+    try:
+        from aiobotocore.config import AioConfig
+        from aiobotocore.session import get_session
+    except ImportError:
+        return None
+
+    key = (asyncio.get_running_loop(), region)
+    task = _async_clients.get(key)
+    if task is None:
+        with _lock:
+            _install_credentials_locked()
+            manager = _credentials
+        session = get_session()
+        if manager is not None:
+            manager.install_async(session)
+        pool_size = int(os.getenv("BEDROCK_POOL_SIZE", DEFAULT_POOL_SIZE))
+        context = session.create_client(
+            "bedrock-runtime", region_name=region,
+            config=AioConfig(max_pool_connections=pool_size, retries={"total_max_attempts": 1}),
+        )
+        task = _async_clients[key] = asyncio.ensure_future(context.__aenter__())
+    return await task
+
+
+def open_connection(runtime) -> bool:
+    """
+    Open one connection from `runtime`'s pool to its endpoint and leave it
+    there, so the first Bedrock call skips DNS, TCP and TLS setup. The
+    request is an unsigned GET whose (error) response is read and dropped.
+    Returns False for local stand-ins, which have nothing to connect to;
+    botocore's connection errors propagate.
+    """
+    if isinstance(runtime, RecordingRuntime):
+        runtime = runtime.client
+    endpoint = getattr(runtime, "_endpoint", None)
+    if endpoint is None:
+        return False
+    from botocore.awsrequest import AWSRequest
+
+    endpoint.http_session.send(AWSRequest(method="GET", url=endpoint.host + "/").prepare())
+    return True
+
+
+def warm_up(connect: bool = True) -> bool:
+    """
+    Build the shared chat client ahead of the first request so that endpoint
+    resolution and credential lookup happen at startup rather than on the
+    request path: fetch credentials and start their background refresh,
+    and with `connect` open a connection to the endpoint. Returns False
+    (instead of raising) when configuration or credentials are missing or
+    the endpoint is unreachable, so callers can start anyway and report the
+    error per request; readiness() tells which.
+    """
+    global _readiness
+    started = time.perf_counter()
+    try:
+        bedrock = get_bedrock_client()
+    except ConfigurationError as ce:
+        _readiness = {"status": "unconfigured", "error": str(ce)}
+        return False
+    manager = _credentials
+    if manager is not None:
+        try:
+            manager.start()
+        except Exception as e:
+            _readiness = {"status": "no_credentials", "error": str(e)}
+            return False
+    built = time.perf_counter()
+    if connect:
+        try:
+            open_connection(bedrock.client)
+        except Exception as e:
+            _readiness = {"status": "unreachable", "error": str(e), "client_ms": round((built - started) * 1000, 1)}
+            return False
+    _readiness = {
+        "status": "ready",
+        "client_ms": round((built - started) * 1000, 1),
+        "connect_ms": round((time.perf_counter() - built) * 1000, 1),
+    }
+    return True
+
+
+def _warm_up_until_ready(retry_interval: float, report):
+    while not warm_up():
+        if report is not None:
+            report(readiness())
+        if _readiness["status"] not in ("no_credentials", "unreachable"):
+            return
+        time.sleep(retry_interval)
+
+
+def start_warm_up(retry_interval: float = 5.0, report=None) -> threading.Thread:
+    """
+    Run warm_up() in a background thread so the server can accept
+    connections straight away; readiness() turns "ready" when it is done.
+    Missing credentials and an unreachable endpoint are retried every
+    `retry_interval` seconds, missing configuration is not. `report` is called with readiness()
+    after each failed attempt. Returns the warm-up thread (the running one
+    if a warm-up is already under way).
+    """
+    global _warm_up_thread
+    with _lock:
+        if _warm_up_thread is not None and _warm_up_thread.is_alive():
+            return _warm_up_thread
+        thread = _warm_up_thread = threading.Thread(
+            target=_warm_up_until_ready, args=(retry_interval, report), name="bedrock-warm-up", daemon=True,
+        )
+    thread.start()
+    return thread
+
+
+def readiness() -> dict:
+    """
+    Warm-up state for readiness probes:
+      - status      "starting", "ready", "unconfigured" (missing settings,
+                    not retried), "no_credentials" or "unreachable"
+                    (both retried)
+      - error       why it is not ready, when known
+      - client_ms   time taken to build the client and fetch credentials
+      - connect_ms  time taken to open the first connection, once ready
+    """
+    return dict(_readiness)
+
+
+def reset_pool():
+    """
+    Drop every cached client and the warm-up state. Mainly useful for tests
+    and after fork.
+    """
+    global _warm_up_thread, _readiness, _credentials
+    with _lock:
+        if _credentials is not None:
+            _credentials.stop()
+            _credentials = None
+        _warm_up_thread = None
+        _readiness = {"status": "starting"}
+        _runtime_clients.clear()
+        _wrappers.clear()
+        _async_clients.clear()
@@ -0,0 +1,315 @@
+# concurrency_limiter.py
+
+import asyncio
+import math
+import os
+import threading
+import time
+from errors import OverloadedError, RateLimitedError, ThrottlingError
+from fair_share import FairQueue, FairShare, current_client
+
+
+class _Waiter:
+    __slots__ = ("event", "loop", "future", "client", "granted", "rejected")
+
+    def __init__(self, loop=None, client=None):
+        self.loop = loop
+        self.event = None if loop else threading.Event()
+        self.future = loop.create_future() if loop else None
+        self.client = client
+        self.granted = False
+        self.rejected = False
+
+    def wake(self):
+        self.granted = True
+        self._signal()
+
+    def reject(self):
+        self.rejected = True
+        self._signal()
+
+    def _signal(self):
+        if self.loop is None:
+            self.event.set()
+        else:
+            self.loop.call_soon_threadsafe(_resolve, self.future)
+
+
+def _resolve(future):
+    if not future.done():
+        future.set_result(None)
+
+
+class AdaptiveLimiter:
+    """
+    Adaptive (AIMD) cap on concurrent Bedrock calls with a bounded wait queue.
+
+    Callers take a slot with acquire()/aacquire() and give it back with
+    release(). When every slot is busy they wait for up to `queue_timeout`
+    seconds; if `max_queue` callers are already waiting, or the deadline
+    passes, OverloadedError is raised at once so the server can answer 429
+    instead of piling up work.
+
+    Waiters are served in FIFO order, unless a `fair_share` (FairShare) is
+    given: then each call is checked against the current client's rate
+    limit (RateLimitedError when over it) and charged to it once admitted,
+    slots go to waiting clients by deficit
+    round robin in proportion to their weights, and a full queue pushes
+    out the newest waiter of the client with the longest queue instead of
+    refusing a client with fewer waiters.
+
+    The limit is learned from what each call reports on release:
+      - a successful call whose latency stays within `latency_tolerance` x the
+        smoothed baseline grows the limit by 1/limit (about +1 per full
+        window of calls), but only while the limit is actually being used;
+      - a ThrottlingError, or a latency above that bound, multiplies the
+        limit by `backoff`, unless the call started before the previous
+        decrease, so one burst of throttles counts as a single signal.
+    Other failures are neutral: they free the slot without moving the limit.
+    """
+
+    def __init__(
+        self,
+        initial_limit: int = 32,
+        min_limit: int = 1,
+        max_limit: int = 512,
+        max_queue: int = 256,
+        queue_timeout: float = 10.0,
+        backoff: float = 0.9,
+        latency_tolerance: float = 2.0,
+        smoothing: float = 0.05,
+        fair_share: FairShare = None,
+    ):
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.backoff = backoff
+        self.latency_tolerance = latency_tolerance
+        self.smoothing = smoothing
+        self.fair_share = fair_share
+        self.admitted = 0
+        self.rejected = 0
+        self.rate_limited = 0
+        self.throttled = 0
+        self._limit = float(min(max(initial_limit, min_limit), max_limit))
+        self._in_flight = 0
+        self._baseline = None           # smoothed latency of healthy calls (seconds)
+        self._last_decrease = float("-inf")
+        self._waiters = FairQueue(fair_share.weight if fair_share is not None else lambda client: 1.0)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls):
+        """
+        Build a limiter from BEDROCK_CONCURRENCY_INITIAL, BEDROCK_CONCURRENCY_MIN,
+        BEDROCK_CONCURRENCY_MAX, BEDROCK_QUEUE_SIZE and BEDROCK_QUEUE_TIMEOUT
+        (seconds), with per-client scheduling from FairShare.from_env().
+        """
+        return cls(
+            initial_limit=int(os.getenv("BEDROCK_CONCURRENCY_INITIAL", "32")),
+            min_limit=int(os.getenv("BEDROCK_CONCURRENCY_MIN", "1")),
+            max_limit=int(os.getenv("BEDROCK_CONCURRENCY_MAX", "512")),
+            max_queue=int(os.getenv("BEDROCK_QUEUE_SIZE", "256")),
+            queue_timeout=float(os.getenv("BEDROCK_QUEUE_TIMEOUT", "10")),
+            fair_share=FairShare.from_env(),
+        )
+
+    @property
+    def limit(self) -> int:
+        return int(self._limit)
+
+    def retry_after(self) -> int:
+        """
+        Seconds a rejected client should wait: roughly the time for the
+        current queue to drain at the current limit.
+        """
+        with self._lock:
+            return self._retry_after_locked()
+
+    def _retry_after_locked(self) -> int:
+        latency = self._baseline or 1.0
+        drain = latency * (len(self._waiters) + 1) / max(self.limit, 1)
+        return int(min(max(math.ceil(drain), 1), 60))
+
+    def _reject_locked(self, reason: str):
+        self.rejected += 1
+        return OverloadedError(reason, retry_after=self._retry_after_locked())
+
+    def _client(self):
+        return current_client() if self.fair_share is not None else None
+
+    def _admit_locked(self, client):
+        self._in_flight += 1
+        self.admitted += 1
+        # Only admitted calls spend the client's tokens, not refused ones
+        if self.fair_share is not None:
+            self.fair_share.charge(client)
+
+    def _try_enter_locked(self, client) -> bool:
+        if self.fair_share is not None:
+            retry_after = self.fair_share.check(client)
+            if retry_after:
+                self.rate_limited += 1
+                raise RateLimitedError("Rate limit exceeded for this client.", retry_after=retry_after)
+        if self._in_flight < self.limit and not self._waiters:
+            self._admit_locked(client)
+            return True
+        if len(self._waiters) >= self.max_queue:
+            heaviest = self._waiters.longest()
+            # Only push out a client with clearly more waiters than this one
+            if heaviest is None or self._waiters.depth(heaviest) <= self._waiters.depth(client) + 1:
+                raise self._reject_locked("Too many requests waiting for Bedrock.")
+            self.rejected += 1
+            self._waiters.pop_newest(heaviest).reject()
+        return False
+
+    def _rejected_waiter_locked(self):
+        # Counted when it was pushed out
+        return OverloadedError("Too many requests waiting for Bedrock.", retry_after=self._retry_after_locked())
+
+    def _grant_locked(self):
+        while self._waiters and self._in_flight < self.limit:
+            waiter = self._waiters.popleft()
+            self._admit_locked(waiter.client)
+            waiter.wake()
+
+    def acquire(self, timeout: float = None):
+        """
+        Take a slot, waiting up to `timeout` (default queue_timeout) seconds.
+        Raises OverloadedError if the queue is full or the wait times out.
+        """
+        client = self._client()
+        with self._lock:
+            if self._try_enter_locked(client):
+                return
+            waiter = _Waiter(client=client)
+            self._waiters.append(waiter)
+        waiter.event.wait(self.queue_timeout if timeout is None else timeout)
+        with self._lock:
+            if waiter.granted:
+                return
+            if waiter.rejected:
+                raise self._rejected_waiter_locked()
+            self._waiters.remove(waiter)
+            raise self._reject_locked("Timed out waiting for a Bedrock slot.")
+
+    async def aacquire(self, timeout: float = None):
+        """
+        Coroutine version of acquire(); waiting does not block the event loop.
+        """
+        client = self._client()
+        with self._lock:
+            if self._try_enter_locked(client):
+                return
+            waiter = _Waiter(asyncio.get_running_loop(), client)
+            self._waiters.append(waiter)
+        try:
+            await asyncio.wait_for(waiter.future, self.queue_timeout if timeout is None else timeout)
+            if waiter.granted:
+                return
+        except asyncio.TimeoutError:
+            pass
+        except asyncio.CancelledError:
+            with self._lock:
+                if waiter.granted:
+                    self._release_locked()
+                elif not waiter.rejected:
+                    self._waiters.remove(waiter)
+            raise
+        with self._lock:
+            if waiter.granted:
+                return
+            if waiter.rejected:
+                raise self._rejected_waiter_locked()
+            self._waiters.remove(waiter)
+            raise self._reject_locked("Timed out waiting for a Bedrock slot.")
+
+    def release(self, latency: float = None, throttled: bool = False):
+        """
+        Return a slot. Pass the call's `latency` (seconds) for a success, and
+        also throttled=True when Bedrock throttled it; omit both for other
+        failures, which leave the limit unchanged.
+        """
+        with self._lock:
+            if throttled:
+                self.throttled += 1
+                self._decrease_locked(time.monotonic() - (latency or 0.0))
+            elif latency is not None:
+                self._observe_locked(latency)
+            self._release_locked()
+
+    def _release_locked(self):
+        self._in_flight -= 1
+        self._grant_locked()
+
+    def _observe_locked(self, latency: float):
+        if self._baseline is None:
+            self._baseline = latency
+        congested = latency > self._baseline * self.latency_tolerance
+        # Slow samples move the baseline too, so a workload whose replies are
+        # simply long settles instead of backing off forever.
+        self._baseline += self.smoothing * (latency - self._baseline)
+        if congested:
+            self._decrease_locked(time.monotonic() - latency)
+            return
+        # Only grow while the limit is the bottleneck, so an idle service
+        # does not drift up to max_limit and then flood Bedrock in a burst.
+        if self._in_flight >= self._limit / 2:
+            self._limit = min(self._limit + 1 / self._limit, self.max_limit)
+
+    def _decrease_locked(self, started: float):
+        if started < self._last_decrease:
+            return
+        self._last_decrease = time.monotonic()
+        self._limit = max(self._limit * self.backoff, self.min_limit)
+
+    def call(self, fn, *args, **kwargs):
+        """
+        Run `fn(*args, **kwargs)` in a slot and report its outcome.
+        """
+        self.acquire()
+        start = time.monotonic()
+        try:
+            result = fn(*args, **kwargs)
+        except ThrottlingError:
+            self.release(time.monotonic() - start, throttled=True)
+            raise
+        except BaseException:
+            self.release()
+            raise
+        self.release(time.monotonic() - start)
+        return result
+
+    async def acall(self, coro_fn, *args, **kwargs):
+        """
+        Coroutine version of call().
+        """
+        await self.aacquire()
+        start = time.monotonic()
+        try:
+            result = await coro_fn(*args, **kwargs)
+        except ThrottlingError:
+            self.release(time.monotonic() - start, throttled=True)
+            raise
+        except BaseException:
+            self.release()
+            raise
+        self.release(time.monotonic() - start)
+        return result
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = {
+                "limit": self.limit,
+                "in_flight": self._in_flight,
+                "queue_depth": len(self._waiters),
+                "latency_baseline_ms": None if self._baseline is None else round(self._baseline * 1000, 1),
+                "admitted": self.admitted,
+                "rejected": self.rejected,
+                "throttled": self.throttled,
+            }
+            if self.fair_share is not None:
+                stats["rate_limited"] = self.rate_limited
+                stats["clients_waiting"] = self._waiters.clients()
+            return stats
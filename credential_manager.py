@@ -0,0 +1,288 @@
+# credential_manager.py
+#
+# Process-wide AWS credentials for the Bedrock clients, refreshed ahead of
+# expiry in the background. botocore refreshes temporary credentials (the
+# App Runner instance role, container roles, assumed roles) lazily, inside
+# the first request signed close to expiry, so one unlucky /chat pays the
+# credential fetch on top of the model call. With a CredentialManager
+# installed, signing only reads the current credentials; a refresher
+# thread fetches new ones before they expire and swaps them in.
+#
+# Imported by client_pool only when a real boto3 client is built.
+
+import asyncio
+import os
+import threading
+import time
+import botocore.session
+from botocore.credentials import CredentialResolver, ReadOnlyCredentials
+from botocore.exceptions import CredentialRetrievalError, NoCredentialsError
+import metrics
+
+
+def botocore_provider():
+    """
+    Provider backed by botocore's default chain (environment, shared files,
+    SSO, assumed roles, container and instance roles). Each call resolves
+    afresh and returns a credentials dict (see CredentialManager), or None
+    when no credentials are configured.
+    """
+    resolver = botocore.session.get_session().get_component("credential_provider")
+
+    def fetch():
+        credentials = resolver.load_credentials()
+        if credentials is None:
+            return None
+        frozen = credentials.get_frozen_credentials()
+        expiry = getattr(credentials, "_expiry_time", None)
+        return {
+            "access_key": frozen.access_key,
+            "secret_key": frozen.secret_key,
+            "token": frozen.token,
+            "account_id": getattr(frozen, "account_id", None),
+            "expiry_time": expiry.timestamp() if expiry is not None else None,
+        }
+    return fetch
+
+
+class _ManagedProvider:
+    """
+    The only entry of a session's credential chain once a manager is
+    installed: botocore resolves credentials once per client and then
+    calls get_frozen_credentials() on what it got for every request.
+    """
+
+    METHOD = "managed"
+    CANONICAL_NAME = "managed"
+
+    def __init__(self, manager):
+        self.manager = manager
+
+    def load(self):
+        return self.manager
+
+
+class _AsyncCredentials:
+    """
+    The manager as aiobotocore sees it: its signer awaits
+    get_frozen_credentials() (and the endpoint resolver get_account_id()).
+    The current snapshot is returned directly; an inline fetch, when there
+    is nothing usable, runs on a worker thread instead of the event loop.
+    """
+
+    method = "managed"
+
+    def __init__(self, manager):
+        self.manager = manager
+
+    async def get_frozen_credentials(self):
+        current = self.manager._current
+        if current is not None and self.manager._usable(current):
+            return current[0]
+        return await asyncio.get_running_loop().run_in_executor(None, self.manager.get_frozen_credentials)
+
+    async def get_account_id(self):
+        return (await self.get_frozen_credentials()).account_id
+
+    def get_deferred_property(self, name: str):
+        return self.manager.get_deferred_property(name)
+
+
+class _AsyncResolver:
+    """
+    Credential provider component of an aiobotocore session, whose
+    load_credentials() is a coroutine.
+    """
+
+    def __init__(self, manager):
+        self.credentials = _AsyncCredentials(manager)
+
+    async def load_credentials(self):
+        return self.credentials
+
+
+class CredentialManager:
+    """
+    Current credentials for every client in the process.
+
+    `provider()` returns {"access_key", "secret_key", "token", "account_id",
+    "expiry_time"} (expiry in epoch seconds, None for long-lived keys), or
+    None when there are no credentials. After start(), a background thread
+    calls it again `refresh_margin` seconds before expiry (retrying every
+    `retry_interval` seconds until it gets credentials that expire later)
+    and swaps the result in as one reference.
+
+    get_frozen_credentials() is what botocore calls to sign each request.
+    It reads the current snapshot and only fetches inline when there is
+    none yet or it is within `min_remaining` seconds of expiry, i.e. the
+    background refresh has been failing for that long.
+    """
+
+    method = "managed"
+
+    def __init__(self, provider, refresh_margin: float = 600.0, retry_interval: float = 60.0,
+                 min_remaining: float = 60.0, clock=time.time):
+        self.provider = provider
+        self.refresh_margin = refresh_margin
+        self.retry_interval = retry_interval
+        self.min_remaining = min_remaining
+        self.clock = clock
+        self._current = None            # (ReadOnlyCredentials, expiry_time or None)
+        self._refresh_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._counts = {"refreshes": 0, "failures": 0, "inline_refreshes": 0}
+        self._last_refresh_ms = None
+        self._last_error = None
+
+    @classmethod
+    def from_env(cls):
+        """
+        Manager over botocore's default chain, or None with
+        CREDENTIAL_REFRESH=0 (botocore then refreshes on the request path as
+        usual). CREDENTIAL_REFRESH_MARGIN (default 600 s) and
+        CREDENTIAL_RETRY_INTERVAL (default 60 s) set the schedule.
+        """
+        if os.getenv("CREDENTIAL_REFRESH", "1") == "0":
+            return None
+        return cls(
+            botocore_provider(),
+            refresh_margin=float(os.getenv("CREDENTIAL_REFRESH_MARGIN", "600")),
+            retry_interval=float(os.getenv("CREDENTIAL_RETRY_INTERVAL", "60")),
+        )
+
+    def install(self, session):
+        """
+        Make `session` (a botocore Session) sign with these credentials.
+        """
+        session.register_component("credential_provider", CredentialResolver([_ManagedProvider(self)]))
+
+    def install_async(self, session):
+        """
+        Same for an aiobotocore AioSession, whose clients await their
+        credentials: they share this manager's snapshot and refresh thread.
+        """
+        session.register_component("credential_provider", _AsyncResolver(self))
+
+    def _usable(self, current) -> bool:
+        expiry = current[1]
+        return expiry is None or expiry - self.clock() > self.min_remaining
+
+    def _refresh_locked(self, mode: str):
+        started = time.perf_counter()
+        try:
+            fetched = self.provider()
+            if fetched is None:
+                raise NoCredentialsError()
+            frozen = ReadOnlyCredentials(
+                fetched["access_key"], fetched["secret_key"], fetched.get("token"), fetched.get("account_id"),
+            )
+        except Exception as e:
+            elapsed = time.perf_counter() - started
+            self._counts["failures"] += 1
+            self._last_error = str(e) or type(e).__name__
+            if metrics.enabled:
+                metrics.CREDENTIAL_REFRESH_SECONDS.observe(elapsed, mode, "error")
+            if isinstance(e, NoCredentialsError):
+                raise
+            raise CredentialRetrievalError(provider=self.method, error_msg=self._last_error) from e
+        elapsed = time.perf_counter() - started
+        self._current = (frozen, fetched.get("expiry_time"))
+        self._counts["refreshes"] += 1
+        self._last_refresh_ms = round(elapsed * 1000, 1)
+        self._last_error = None
+        if metrics.enabled:
+            metrics.CREDENTIAL_REFRESH_SECONDS.observe(elapsed, mode, "ok")
+        return frozen
+
+    def refresh(self):
+        """
+        Fetch new credentials now and swap them in. Raises botocore's
+        NoCredentialsError or CredentialRetrievalError on failure, keeping
+        the current credentials.
+        """
+        with self._refresh_lock:
+            return self._refresh_locked("background")
+
+    def get_frozen_credentials(self):
+        current = self._current
+        if current is not None and self._usable(current):
+            return current[0]
+        # Nothing usable: fetch inline, once, while other callers wait
+        with self._refresh_lock:
+            current = self._current
+            if current is not None and self._usable(current):
+                return current[0]
+            self._counts["inline_refreshes"] += 1
+            return self._refresh_locked("inline")
+
+    # The attributes botocore reads from a Credentials object
+    def get_deferred_property(self, name: str):
+        return lambda: getattr(self, name, None)
+
+    @property
+    def access_key(self):
+        return self.get_frozen_credentials().access_key
+
+    @property
+    def secret_key(self):
+        return self.get_frozen_credentials().secret_key
+
+    @property
+    def token(self):
+        return self.get_frozen_credentials().token
+
+    @property
+    def account_id(self):
+        return self.get_frozen_credentials().account_id
+
+    def _next_refresh_in(self):
+        current = self._current
+        if current is None:
+            return self.retry_interval
+        if current[1] is None:
+            return None     # long-lived keys never need refreshing
+        return max(current[1] - self.refresh_margin - self.clock(), self.retry_interval)
+
+    def _run(self):
+        while True:
+            delay = self._next_refresh_in()
+            if delay is None or self._stop.wait(delay):
+                return
+            try:
+                self.refresh()
+            except (NoCredentialsError, CredentialRetrievalError):
+                pass    # counted; the current credentials stay in use until retried
+
+    def start(self):
+        """
+        Fetch credentials now unless some are held already, then keep them
+        fresh in a background thread. Raises if that first fetch fails.
+        """
+        with self._refresh_lock:
+            current = self._current
+            if current is None or not self._usable(current):
+                self._refresh_locked("startup")
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="credential-refresh", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: float = None):
+        self._stop.set()
+        thread = self._thread
+        if thread is not None and thread.is_alive():
+            thread.join(timeout)
+
+    def stats(self) -> dict:
+        current = self._current
+        expires_in = None
+        if current is not None and current[1] is not None:
+            expires_in = round(current[1] - self.clock(), 1)
+        return {
+            **self._counts,
+            "expires_in_s": expires_in,
+            "last_refresh_ms": self._last_refresh_ms,
+            "last_error": self._last_error,
+        }
@@ -2,8 +2,35 @@
 
 import os
 import json
-import boto3
-from botocore.exceptions import BotoCoreError, ClientError
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from client_pool import get_async_runtime_client, get_io_executor
+from lazy_import import lazy_module
+
+boto3 = lazy_module("boto3")
+botocore_exceptions = lazy_module("botocore.exceptions")
+
+
+class EmbeddingBatch:
+    """
+    Result of EmbedClient.embed_many():
+      - vectors: (len(texts), dimensions) float32 array in input order;
+                 rows whose text failed are NaN
+      - errors:  { input_index: "error message" } for the failed rows
+    """
+
+    def __init__(self, vectors, errors):
+        self.vectors = vectors
+        self.errors = errors
+
+    def __len__(self):
+        return len(self.vectors)
+
+    @property
+    def ok(self) -> bool:
+        return not self.errors
 
 class EmbedClient:
     """
@@ -13,16 +40,28 @@ class EmbedClient:
       - BEDROCK_MODEL_ID (e.g. "amazon.titan-embed-text-v2:0")
     """
 
-    def __init__(self):
-        region = os.getenv("AWS_REGION")
-        model_id = os.getenv("BEDROCK_MODEL_ID")
+    def __init__(self, region=None, model_id=None, client=None, cache=None, retry_policy=None):
+        """
+        `cache` is an optional embedding_cache.EmbeddingCache consulted before
+        every Bedrock call (see EMBED_CACHE_DIR in client_pool).
+        `retry_policy` (a retry_policy.RetryPolicy) retries transient failures.
+        """
+        region = region or os.getenv("AWS_REGION")
+        model_id = model_id or os.getenv("BEDROCK_MODEL_ID")
 
         if not region:
             raise RuntimeError("Missing AWS_REGION environment variable.")
         if not model_id:
             raise RuntimeError("Missing BEDROCK_MODEL_ID environment variable.")
 
+        self.region = region
         self.model_id = model_id
+        self.cache = cache
+        self.retry_policy = retry_policy
+        if client is not None:
+            # Shared client from client_pool.get_embed_client()
+            self.client = client
+            return
         try:
             self.client = boto3.client("bedrock-runtime", region_name=region)
         except Exception as e:
@@ -33,6 +72,41 @@ class EmbedClient:
         Send `text` to Titan Embed Text v2 and return the embedding (list of floats).
         By default, it requests 512 dimensions and applies normalization.
         """
+        if self.cache is not None:
+            cached = self.cache.get(self.model_id, text, dimensions, normalize)
+            if cached is not None:
+                return cached.tolist()
+        embedding = self._invoke_embedding(text, dimensions, normalize)
+        if self.cache is not None and len(embedding) == dimensions:
+            self.cache.put(self.model_id, text, embedding, dimensions, normalize)
+        return embedding
+
+    async def aembed_text(self, text: str, dimensions: int = 512, normalize: bool = True) -> list[float]:
+        """
+        Async variant of embed_text(); see BedrockClient.ainvoke for how the
+        call is scheduled.
+        """
+        async_client = await get_async_runtime_client(self.region)
+        if async_client is None or self.cache is not None:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(
+                get_io_executor(), functools.partial(self.embed_text, text, dimensions, normalize)
+            )
+        embed_args = self._embed_args(text, dimensions, normalize)
+
+        async def attempt():
+            try:
+                response = await async_client.invoke_model(**embed_args)
+                raw_bytes = await response["body"].read()
+            except (botocore_exceptions.BotoCoreError, botocore_exceptions.ClientError) as aws_err:
+                raise RuntimeError(f"Failed to invoke Bedrock embedding model: {aws_err}") from aws_err
+            return self._parse_embedding(raw_bytes)
+
+        if self.retry_policy is None:
+            return await attempt()
+        return await self.retry_policy.acall(attempt)
+
+    def _embed_args(self, text: str, dimensions: int, normalize: bool) -> dict:
         # Build the JSON body exactly as the API expects:
         payload_body = {
             "inputText": text,
@@ -41,20 +115,29 @@ class EmbedClient:
         }
 
         # The API wants "body" as a JSON-string in the outer invocation JSON:
-        invoke_args = {
+        return {
             "modelId": self.model_id,
             "contentType": "application/json",
             "accept": "*/*",
             "body": json.dumps(payload_body).encode("utf-8")
         }
 
-        try:
-            response = self.client.invoke_model(**invoke_args)
-        except (BotoCoreError, ClientError) as aws_err:
-            raise RuntimeError(f"Failed to invoke Bedrock embedding model: {aws_err}")
+    def _invoke_embedding(self, text: str, dimensions: int, normalize: bool) -> list[float]:
+        embed_args = self._embed_args(text, dimensions, normalize)
+
+        def attempt():
+            try:
+                response = self.client.invoke_model(**embed_args)
+            except (botocore_exceptions.BotoCoreError, botocore_exceptions.ClientError) as aws_err:
+                raise RuntimeError(f"Failed to invoke Bedrock embedding model: {aws_err}") from aws_err
+            return self._parse_embedding(response["body"].read())
+
+        if self.retry_policy is None:
+            return attempt()
+        return self.retry_policy.call(attempt)
 
+    def _parse_embedding(self, raw_bytes: bytes) -> list[float]:
         # The response body is raw bytes; decode, then parse JSON:
-        raw_bytes = response["body"].read()
         text_resp = raw_bytes.decode("utf-8")
         parsed = json.loads(text_resp)
 
@@ -66,3 +149,51 @@ class EmbedClient:
         if embedding is None:
             raise RuntimeError(f"No 'embedding' field in response: {parsed}")
         return embedding
+
+    def embed_many(self, texts, concurrency: int = 8, dimensions: int = 512, normalize: bool = True) -> EmbeddingBatch:
+        """
+        Embed a list of strings with up to `concurrency` requests in flight.
+        Identical texts are sent once. The boto3 client (and its connection
+        pool, see BEDROCK_POOL_SIZE) is shared by all worker threads, so keep
+        `concurrency` at or below the pool size. A failing text is recorded in
+        the returned batch's `errors` instead of aborting the whole batch.
+        """
+        positions = {}   # unique text -> indexes in `texts`
+        for i, text in enumerate(texts):
+            positions.setdefault(text, []).append(i)
+
+        vectors = np.full((len(texts), dimensions), np.nan, dtype=np.float32)
+        errors = {}
+        pending = list(positions)
+        if self.cache is not None and pending:
+            cached = self.cache.get_many(self.model_id, pending, dimensions, normalize)
+            for text, vector in zip(pending, cached):
+                if vector is not None:
+                    vectors[positions[text]] = vector
+            pending = [text for text, vector in zip(pending, cached) if vector is None]
+        if not pending:
+            return EmbeddingBatch(vectors, errors)
+
+        def embed_one(text):
+            try:
+                return text, self._invoke_embedding(text, dimensions, normalize), None
+            except Exception as e:
+                return text, None, str(e)
+
+        fresh_texts, fresh_vectors = [], []
+        workers = max(1, min(concurrency, len(pending)))
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            for text, embedding, error in pool.map(embed_one, pending):
+                rows = positions[text]
+                if error is None and len(embedding) != dimensions:
+                    error = f"Expected {dimensions} dimensions, got {len(embedding)}"
+                if error is None:
+                    vectors[rows] = embedding
+                    fresh_texts.append(text)
+                    fresh_vectors.append(embedding)
+                else:
+                    for i in rows:
+                        errors[i] = error
+        if self.cache is not None and fresh_texts:
+            self.cache.put_many(self.model_id, fresh_texts, fresh_vectors, dimensions, normalize)
+        return EmbeddingBatch(vectors, errors)
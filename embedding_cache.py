@@ -0,0 +1,302 @@
+# embedding_cache.py
+
+import fcntl
+import hashlib
+import os
+import threading
+from contextlib import contextmanager
+import numpy as np
+
+# One index record per cached vector: 64-bit content hash -> row in the vector file
+INDEX_DTYPE = np.dtype([("key", "<u8"), ("row", "<u8")])
+
+
+def embedding_key(model_id: str, dimensions: int, normalize: bool, text: str) -> int:
+    """
+    64-bit content address of one embedding request.
+    """
+    raw = f"{model_id}\0{dimensions}\0{int(bool(normalize))}\0{text}".encode("utf-8")
+    return int.from_bytes(hashlib.blake2b(raw, digest_size=8).digest(), "little")
+
+
+class _View:
+    """
+    Immutable snapshot of a shard's index: sorted key/row arrays, a dict of
+    records not merged into them yet, and the vector file mapped far enough
+    to cover every row. refresh() builds a new one and swaps it in whole, so
+    lookups read it without a lock.
+    """
+
+    __slots__ = ("inode", "index_bytes", "sorted_keys", "sorted_rows", "recent", "vectors")
+
+    def __init__(self, inode: int, index_bytes: int = 0, sorted_keys=None, sorted_rows=None, recent=None, vectors=None):
+        self.inode = inode
+        self.index_bytes = index_bytes
+        self.sorted_keys = np.empty(0, dtype="<u8") if sorted_keys is None else sorted_keys
+        self.sorted_rows = np.empty(0, dtype="<u8") if sorted_rows is None else sorted_rows
+        self.recent = {} if recent is None else recent   # key -> row
+        self.vectors = vectors
+
+    def find(self, key: int):
+        row = self.recent.get(key)
+        if row is not None:
+            return row
+        # As np.uint64: a Python int above 2**63 would make searchsorted
+        # convert the whole key array on every lookup
+        key = np.uint64(key)
+        i = np.searchsorted(self.sorted_keys, key)
+        if i < len(self.sorted_keys) and self.sorted_keys[i] == key:
+            return int(self.sorted_rows[i])
+        return None
+
+
+class _Shard:
+    """
+    Files for one vector size inside the cache directory:
+      vectors-<dim>.f32   append-only float32 rows, memory-mapped for reads
+      index-<dim>.bin     append-only INDEX_DTYPE records
+    A record is only appended after its vector row is on disk, so a reader
+    never sees a key whose vector is missing. Compaction replaces the index
+    before the vectors, so a reader that mapped new vectors against the old
+    index sees the index inode change and reloads.
+    """
+
+    def __init__(self, directory: str, dimensions: int):
+        self.dimensions = dimensions
+        self.row_bytes = dimensions * 4
+        self.vectors_path = os.path.join(directory, f"vectors-{dimensions}.f32")
+        self.index_path = os.path.join(directory, f"index-{dimensions}.bin")
+        self.lock_path = os.path.join(directory, f"lock-{dimensions}")
+        for path in (self.vectors_path, self.index_path):
+            open(path, "ab").close()
+        self._view = _View(inode=-1)
+        self._refresh_lock = threading.Lock()
+
+    @contextmanager
+    def locked(self, mode=fcntl.LOCK_EX):
+        """
+        Cross-process lock on this shard: writers (append/compact) take it
+        exclusively; a reader reloading after compaction takes it shared so
+        it cannot pair one compaction's index with another's vectors.
+        """
+        with open(self.lock_path, "a") as lock:
+            fcntl.flock(lock, mode)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def current(self) -> _View:
+        """
+        The snapshot to read from. If the index file has not grown or been
+        replaced since it was taken (one stat()), it is returned as is;
+        otherwise it is refreshed first.
+        """
+        view = self._view
+        st = os.stat(self.index_path)
+        if st.st_ino == view.inode and st.st_size - view.index_bytes < INDEX_DTYPE.itemsize:
+            return view
+        return self.refresh()
+
+    def refresh(self, file_locked: bool = False) -> _View:
+        """
+        Pick up records appended by other processes, or reload entirely if
+        the files were replaced by compaction. Pass `file_locked` when the
+        caller already holds the exclusive file lock.
+        """
+        with self._refresh_lock:
+            with open(self.index_path, "rb") as f:
+                if os.fstat(f.fileno()).st_ino == self._view.inode:
+                    view = self._extend(self._view, f)
+                    if file_locked or os.stat(self.index_path).st_ino == view.inode:
+                        self._view = view
+                        return view
+            if file_locked:
+                return self._reload()
+            with self.locked(fcntl.LOCK_SH):
+                return self._reload()
+
+    def _reload(self) -> _View:
+        with open(self.index_path, "rb") as f:
+            self._view = self._extend(_View(os.fstat(f.fileno()).st_ino), f)
+        return self._view
+
+    def _extend(self, view: _View, f) -> _View:
+        """
+        `view` plus the whole records appended to the open index file `f`
+        after it.
+        """
+        f.seek(view.index_bytes)
+        tail = f.read()
+        usable = len(tail) - len(tail) % INDEX_DTYPE.itemsize
+        if not usable:
+            return view
+        records = np.frombuffer(tail[:usable], dtype=INDEX_DTYPE)
+        keys, rows, recent = view.sorted_keys, view.sorted_rows, view.recent
+        if len(recent) + len(records) > 4096:
+            keys = np.concatenate([keys, np.fromiter(recent, dtype="<u8", count=len(recent)), records["key"]])
+            rows = np.concatenate([rows, np.fromiter(recent.values(), dtype="<u8", count=len(recent)), records["row"]])
+            order = np.argsort(keys, kind="stable")
+            keys, rows, recent = keys[order], rows[order], {}
+        else:
+            recent = dict(recent)
+            recent.update(zip(records["key"].tolist(), records["row"].tolist()))
+        vectors = view.vectors
+        if vectors is None or int(records["row"].max()) >= len(vectors):
+            count = os.path.getsize(self.vectors_path) // self.row_bytes
+            vectors = np.memmap(self.vectors_path, dtype=np.float32, mode="r", shape=(count, self.dimensions))
+        return _View(view.inode, view.index_bytes + usable, keys, rows, recent, vectors)
+
+    def entries(self) -> int:
+        return self._view.index_bytes // INDEX_DTYPE.itemsize
+
+    def append(self, items):
+        """
+        Append (key, vector) pairs under an exclusive file lock shared by all
+        processes using this cache directory.
+        """
+        with self.locked():
+            view = self.refresh(file_locked=True)
+            items = [(key, vec) for key, vec in items if view.find(key) is None]
+            if not items:
+                return
+            start = os.path.getsize(self.vectors_path) // self.row_bytes
+            block = np.asarray([vec for _, vec in items], dtype=np.float32)
+            records = np.empty(len(items), dtype=INDEX_DTYPE)
+            records["key"] = [key for key, _ in items]
+            records["row"] = np.arange(start, start + len(items))
+            with open(self.vectors_path, "ab") as f:
+                f.write(block.tobytes())
+            with open(self.index_path, "ab") as f:
+                f.write(records.tobytes())
+            self.refresh(file_locked=True)
+
+    def compact(self, keep: int):
+        """
+        Rewrite the shard keeping only the `keep` most recently added vectors.
+        """
+        with self.locked():
+            records = np.fromfile(self.index_path, dtype=INDEX_DTYPE)
+            if keep <= 0:
+                records = records[:0]
+            elif keep < len(records):
+                records = records[-keep:]
+            if records.size:
+                old = np.memmap(self.vectors_path, dtype=np.float32, mode="r").reshape(-1, self.dimensions)
+                vectors = np.ascontiguousarray(old[records["row"]])
+                del old
+            else:
+                vectors = np.empty((0, self.dimensions), dtype=np.float32)
+            new_records = records.copy()
+            new_records["row"] = np.arange(len(records))
+            vectors.tofile(self.vectors_path + ".tmp")
+            new_records.tofile(self.index_path + ".tmp")
+            os.replace(self.index_path + ".tmp", self.index_path)
+            os.replace(self.vectors_path + ".tmp", self.vectors_path)
+            self.refresh(file_locked=True)
+
+    def disk_bytes(self) -> int:
+        return os.path.getsize(self.vectors_path) + os.path.getsize(self.index_path)
+
+
+class EmbeddingCache:
+    """
+    Persistent, content-addressed cache of Titan embeddings.
+
+    Vectors are keyed by hash(model_id, dimensions, normalize, text) and live
+    in append-only float32 files (one per vector size) that are memory-mapped,
+    so get() returns a read-only view into the page cache rather than a copy,
+    and several processes can share one directory. When a shard holds more
+    than `max_entries` vectors it is compacted down to the newest half.
+    """
+
+    def __init__(self, directory: str, max_entries: int = 1_000_000):
+        self.directory = directory
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._shards = {}
+        self._lock = threading.Lock()         # counters and the shard table
+        self._write_lock = threading.Lock()   # appends and compaction in this process
+        os.makedirs(directory, exist_ok=True)
+
+    @classmethod
+    def from_env(cls):
+        """
+        EMBED_CACHE_DIR enables the cache; EMBED_CACHE_MAX_ENTRIES bounds each
+        shard. Returns None when disabled.
+        """
+        directory = os.getenv("EMBED_CACHE_DIR")
+        if not directory:
+            return None
+        return cls(directory, max_entries=int(os.getenv("EMBED_CACHE_MAX_ENTRIES", "1000000")))
+
+    def _shard(self, dimensions: int) -> _Shard:
+        shard = self._shards.get(dimensions)
+        if shard is None:
+            with self._lock:
+                shard = self._shards.get(dimensions)
+                if shard is None:
+                    shard = self._shards[dimensions] = _Shard(self.directory, dimensions)
+        return shard
+
+    def get_many(self, model_id: str, texts, dimensions: int, normalize: bool = True) -> list:
+        """
+        Return a list aligned with `texts` holding a float32 view for each
+        cached text and None for each miss. Reads one snapshot of the index
+        without taking the file lock; the process lock only guards the
+        hit/miss counters.
+        """
+        view = self._shard(dimensions).current()
+        found = []
+        for text in texts:
+            row = view.find(embedding_key(model_id, dimensions, normalize, text))
+            found.append(None if row is None else view.vectors[row])
+        hits = sum(v is not None for v in found)
+        with self._lock:
+            self.hits += hits
+            self.misses += len(found) - hits
+        return found
+
+    def get(self, model_id: str, text: str, dimensions: int, normalize: bool = True):
+        return self.get_many(model_id, [text], dimensions, normalize)[0]
+
+    def put_many(self, model_id: str, texts, vectors, dimensions: int, normalize: bool = True):
+        items = [(embedding_key(model_id, dimensions, normalize, t), v) for t, v in zip(texts, vectors)]
+        shard = self._shard(dimensions)
+        with self._write_lock:
+            shard.append(items)
+            if shard.entries() > self.max_entries:
+                shard.compact(self.max_entries // 2)
+
+    def put(self, model_id: str, text: str, vector, dimensions: int, normalize: bool = True):
+        self.put_many(model_id, [text], [vector], dimensions, normalize)
+
+    def compact(self, keep: int = None):
+        """
+        Compact every shard, keeping the newest `keep` vectors (default: all).
+        """
+        with self._write_lock:
+            for name in os.listdir(self.directory):
+                if name.startswith("index-") and name.endswith(".bin"):
+                    shard = self._shard(int(name[len("index-"):-len(".bin")]))
+                    shard.current()
+                    shard.compact(shard.entries() if keep is None else keep)
+
+    def stats(self) -> dict:
+        shards = {}
+        for name in sorted(os.listdir(self.directory)):
+            if name.startswith("index-") and name.endswith(".bin"):
+                shard = self._shard(int(name[len("index-"):-len(".bin")]))
+                shard.current()
+                shards[shard.dimensions] = {"entries": shard.entries(), "bytes": shard.disk_bytes()}
+        with self._lock:
+            hits, misses = self.hits, self.misses
+        return {
+            "directory": self.directory,
+            "hits": hits,
+            "misses": misses,
+            "entries": sum(s["entries"] for s in shards.values()),
+            "bytes": sum(s["bytes"] for s in shards.values()),
+            "shards": shards,
+        }
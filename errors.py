@@ -13,3 +13,27 @@ class BedrockInvocationError(Exception):
     def __init__(self, message, original_exception=None):
         super().__init__(message)
         self.original_exception = original_exception
+
+class ThrottlingError(BedrockInvocationError):
+    """
+    Raised when Bedrock rejects a call because the account is over its
+    request or token quota (ThrottlingException). Callers should back off
+    rather than treat it as a generic failure.
+    """
+    pass
+
+class OverloadedError(Exception):
+    """
+    Raised when a request is refused locally because too many Bedrock calls
+    are already queued. `retry_after` is a hint in seconds for the client.
+    """
+    def __init__(self, message, retry_after=1):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+class RateLimitedError(OverloadedError):
+    """
+    Raised when a client is over its own Bedrock call rate (see
+    fair_share.FairShare), however idle the service is.
+    """
+    pass
@@ -0,0 +1,236 @@
+# fair_share.py
+#
+# Per-client fairness for the Bedrock concurrency limiter. Requests are
+# tagged with a client identity (a configured API key, else the IP address)
+# for the duration of the request; the limiter then
+#   - refuses a Bedrock call with RateLimitedError (429) when the client's
+#     token bucket is empty, and charges it once the call is admitted,
+#   - queues waiting calls per client and hands out freed slots by deficit
+#     round robin, so each waiting client gets slots in proportion to its
+#     weight however many calls it has queued,
+#   - when the shared queue is full, pushes out the newest waiter of the
+#     client with the longest queue rather than refusing a lighter client.
+
+import math
+import os
+import threading
+from collections import OrderedDict, deque
+from contextvars import ContextVar
+from rate_limit import TokenBucket
+
+_client = ContextVar("client", default=None)
+
+
+def set_client(client):
+    """
+    Tag the current request (thread or task) with `client`.
+    """
+    _client.set(client)
+
+
+def current_client():
+    return _client.get()
+
+
+def parse_client_map(value: str) -> dict:
+    """
+    "key:bulk=0.25,ip:10.0.0.7=2" -> {"key:bulk": 0.25, "ip:10.0.0.7": 2.0}.
+    The value is taken after the last "=", so keys may contain "=".
+    """
+    result = {}
+    for entry in (value or "").split(","):
+        if not entry.strip():
+            continue
+        client, sep, number = entry.strip().rpartition("=")
+        if not sep or not client:
+            raise ValueError(f"Expected CLIENT=NUMBER, got {entry.strip()!r}.")
+        result[client] = float(number)
+    return result
+
+
+class FairQueue:
+    """
+    Waiters (objects with a `client` attribute) queued per client and
+    dequeued by deficit round robin: a client at the head of the rotation
+    is served while its deficit lasts, one unit per waiter, and earns
+    `weight(client)` more each time it comes round again. With a single
+    client this is a FIFO queue.
+    """
+
+    def __init__(self, weight=lambda client: 1.0):
+        self.weight = weight
+        self._queues = {}           # client -> deque of waiters
+        self._deficit = {}
+        self._active = deque()      # clients with waiters, in rotation order
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    def append(self, waiter):
+        queue = self._queues.get(waiter.client)
+        if queue is None:
+            queue = self._queues[waiter.client] = deque()
+            self._deficit[waiter.client] = 0.0
+            self._active.append(waiter.client)
+        queue.append(waiter)
+        self._size += 1
+
+    def popleft(self):
+        if not self._size:
+            raise IndexError("pop from an empty FairQueue")
+        while True:
+            client = self._active[0]
+            if self._deficit[client] < 1:
+                self._deficit[client] += self.weight(client)
+                if self._deficit[client] < 1:
+                    self._active.rotate(-1)
+                    continue
+            self._deficit[client] -= 1
+            queue = self._queues[client]
+            waiter = queue.popleft()
+            self._size -= 1
+            if not queue:
+                self._drop(client)
+            elif self._deficit[client] < 1:
+                self._active.rotate(-1)
+            return waiter
+
+    def remove(self, waiter):
+        queue = self._queues[waiter.client]
+        queue.remove(waiter)
+        self._size -= 1
+        if not queue:
+            self._drop(waiter.client)
+
+    def _drop(self, client):
+        # An idle client keeps no credit for its next burst
+        del self._queues[client]
+        del self._deficit[client]
+        self._active.remove(client)
+
+    def depth(self, client) -> int:
+        queue = self._queues.get(client)
+        return len(queue) if queue is not None else 0
+
+    def longest(self):
+        """
+        The client with the most waiters, or None when empty.
+        """
+        return max(self._queues, key=lambda client: len(self._queues[client]), default=None)
+
+    def pop_newest(self, client):
+        queue = self._queues[client]
+        waiter = queue.pop()
+        self._size -= 1
+        if not queue:
+            self._drop(client)
+        return waiter
+
+    def clients(self) -> int:
+        return len(self._queues)
+
+
+class FairShare:
+    """
+    Per-client weights and Bedrock call rate limits.
+
+    `rate` calls per second (burst `burst`) apply to every client, with
+    per-client overrides in `rates`; 0 means unlimited. `weights` default to
+    1. Buckets of the `max_clients` most recently seen clients are kept; a
+    client seen again after eviction starts with a full bucket.
+
+    Only known API keys identify a client: those in `api_keys` and those
+    named ("key:<key>") in `rates` or `weights`. Any other key is ignored,
+    so a caller cannot get a fresh bucket and queue by inventing keys.
+    """
+
+    def __init__(self, rate: float = 0.0, burst: float = None, rates: dict = None, weights: dict = None,
+                 header: str = "X-API-Key", trust_forwarded: bool = False, max_clients: int = 10000,
+                 api_keys=()):
+        for name, value in (weights or {}).items():
+            if value <= 0:
+                raise ValueError(f"Weight of {name!r} must be positive.")
+        self.rate = rate
+        self.burst = burst
+        self.rates = dict(rates or {})
+        self.weights = dict(weights or {})
+        self.header = header
+        self.trust_forwarded = trust_forwarded
+        self.max_clients = max_clients
+        self.api_keys = set(api_keys)
+        for name in (*self.rates, *self.weights):
+            if name.startswith("key:"):
+                self.api_keys.add(name[len("key:"):])
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls):
+        """
+        FAIR_SHARE=0 disables per-client scheduling (one FIFO queue, no
+        rate limits) and returns None. CLIENT_RATE_LIMIT and
+        CLIENT_RATE_BURST set the default rate, CLIENT_RATE_LIMITS and
+        CLIENT_WEIGHTS per-client values ("CLIENT=NUMBER,..."),
+        CLIENT_ID_HEADER the header carrying the API key and CLIENT_API_KEYS
+        further keys to honour ("KEY,..."). CLIENT_TRUST_FORWARDED=1 takes
+        the client IP from X-Forwarded-For (only behind a proxy that sets it).
+        """
+        if os.getenv("FAIR_SHARE", "1") == "0":
+            return None
+        burst = os.getenv("CLIENT_RATE_BURST")
+        return cls(
+            rate=float(os.getenv("CLIENT_RATE_LIMIT", "0")),
+            burst=float(burst) if burst else None,
+            rates=parse_client_map(os.getenv("CLIENT_RATE_LIMITS", "")),
+            weights=parse_client_map(os.getenv("CLIENT_WEIGHTS", "")),
+            header=os.getenv("CLIENT_ID_HEADER", "X-API-Key"),
+            trust_forwarded=os.getenv("CLIENT_TRUST_FORWARDED", "0") == "1",
+            api_keys=[key.strip() for key in os.getenv("CLIENT_API_KEYS", "").split(",") if key.strip()],
+        )
+
+    def identify(self, api_key: str = None, forwarded_for: str = None, remote_addr: str = None) -> str:
+        """
+        "key:<api key>" when a known key was sent, else "ip:<address>": the
+        peer, or with `trust_forwarded` the last X-Forwarded-For hop (the
+        address the nearest proxy, e.g. the App Runner front end, saw).
+        """
+        if api_key and api_key in self.api_keys:
+            return "key:" + api_key
+        if forwarded_for and self.trust_forwarded:
+            hop = forwarded_for.rsplit(",", 1)[-1].strip()
+            if hop:
+                return "ip:" + hop
+        return "ip:" + (remote_addr or "unknown")
+
+    def weight(self, client) -> float:
+        return self.weights.get(client, 1.0)
+
+    def _bucket(self, client):
+        with self._lock:
+            bucket = self._buckets.get(client)
+            if bucket is not None:
+                self._buckets.move_to_end(client)
+                return bucket
+            bucket = TokenBucket(self.rates.get(client, self.rate), self.burst)
+            self._buckets[client] = bucket
+            if len(self._buckets) > self.max_clients:
+                self._buckets.popitem(last=False)
+            return bucket
+
+    def check(self, client) -> int:
+        """
+        0 if `client` may make a Bedrock call now, else the whole seconds
+        until its bucket has a token again. Nothing is spent.
+        """
+        if not self.rate and not self.rates:
+            return 0
+        wait = self._bucket(client).wait_time()
+        return max(1, math.ceil(wait)) if wait > 0 else 0
+
+    def charge(self, client):
+        """
+        Spend one of `client`'s tokens on an admitted call.
+        """
+        if self.rate or self.rates:
+            self._bucket(client).charge()
@@ -0,0 +1,191 @@
+# generation_policy.py
+#
+# Per-request generation settings. Instead of a fixed max_gen_len of 512
+# for every message, the cap is picked from the kind of message (a greeting
+# or short question needs far fewer tokens than "write a report") and an
+# optional client latency budget. Replies are cut at the first line where
+# the model starts inventing a new "User:"/"System:" turn, which the
+# single-turn prompt format invites; the native Llama request body on
+# Bedrock has no stop-sequence field, so this is done on our side, and
+# streams are closed as soon as such a line appears.
+
+import os
+import re
+import threading
+from token_budget import estimate_tokens
+
+# The fixed cap every request used before; savings are reported against it
+BASELINE_MAX_GEN_LEN = 512
+
+# Lines that begin a new turn of the prompt format
+STOP_SEQUENCES = ("\nUser:", "\nSystem:", "\nAssistant:")
+
+# Requests for long-form output
+_LONG_FORM = re.compile(
+    r"\b(write|explain|describe|essay|story|article|report|summari[sz]e|code|implement|program|script|"
+    r"function|list|steps?|detail(ed)?|compare|plan|draft|translate|outline|guide|tutorial)\b",
+    re.IGNORECASE,
+)
+
+
+def split_continuation(text: str, stops=STOP_SEQUENCES) -> tuple[str, str]:
+    """
+    (reply, continuation): `text` up to the first stop sequence, without
+    trailing whitespace, and the invented turns after it ("" if none).
+    """
+    cut = min((i for i in (text.find(stop) for stop in stops) if i >= 0), default=-1)
+    if cut < 0:
+        return text, ""
+    return text[:cut].rstrip(), text[cut:]
+
+
+class StopScanner:
+    """
+    Applies split_continuation to a stream of chunks: feed() returns the
+    text that can be sent on, holding back a tail that could still turn out
+    to be the start of a stop sequence (or trailing whitespace before one),
+    and sets `stopped` once a stop sequence has been seen.
+    """
+
+    def __init__(self, stops=STOP_SEQUENCES):
+        self.stops = stops
+        self.stopped = False
+        self.generated = []     # every chunk received, continuation included
+        self._hold = max(len(stop) for stop in stops) - 1
+        self._pending = ""
+
+    def feed(self, chunk: str) -> str:
+        self.generated.append(chunk)
+        if self.stopped:
+            return ""
+        text = self._pending + chunk
+        reply, continuation = split_continuation(text, self.stops)
+        if continuation:
+            self.stopped = True
+            self._pending = ""
+            return reply
+        safe = len(text)
+        for i in range(max(0, len(text) - self._hold), len(text)):
+            if any(stop.startswith(text[i:]) for stop in self.stops):
+                safe = i
+                break
+        while safe and text[safe - 1].isspace():
+            safe -= 1
+        self._pending = text[safe:]
+        return text[:safe]
+
+    def flush(self) -> str:
+        """
+        The held-back tail once the stream has ended.
+        """
+        tail, self._pending = self._pending, ""
+        return tail
+
+
+class GenerationPolicy:
+    """
+    Chooses max_gen_len per request and accounts for what the choice saved.
+
+    Messages are classed as "short" (a few words, no request for long-form
+    output), "long" (asks to write, explain, list, ...) or "default", each
+    with its own cap. A client latency budget lowers the cap to the tokens
+    that can be generated in time at the current decode rate, which starts
+    at `tokens_per_second` and is learned from completed streams.
+    """
+
+    def __init__(self, short_len: int = 128, default_len: int = 384, long_len: int = 512, min_len: int = 16,
+                 tokens_per_second: float = 40.0, first_token_ms: float = 400.0,
+                 baseline: int = BASELINE_MAX_GEN_LEN, smoothing: float = 0.1):
+        self.caps = {"short": short_len, "default": default_len, "long": long_len}
+        self.min_len = min_len
+        self.tokens_per_second = tokens_per_second
+        self.first_token_ms = first_token_ms
+        self.baseline = baseline
+        self.smoothing = smoothing
+        self._lock = threading.Lock()
+        self._totals = {"requests": 0, "tokens": 0, "trimmed": 0, "trimmed_tokens": 0,
+                        "stopped_early": 0, "saved_tokens": 0, "saved_ms": 0}
+
+    @classmethod
+    def from_env(cls):
+        """
+        GENERATION_POLICY=0 keeps the fixed max_gen_len and untrimmed
+        replies and returns None. GENERATION_MAX_LEN_SHORT / _DEFAULT /
+        _LONG set the caps per message class; GENERATION_TOKENS_PER_SECOND
+        and GENERATION_FIRST_TOKEN_MS seed the latency model.
+        """
+        if os.getenv("GENERATION_POLICY", "1") == "0":
+            return None
+        return cls(
+            short_len=int(os.getenv("GENERATION_MAX_LEN_SHORT", "128")),
+            default_len=int(os.getenv("GENERATION_MAX_LEN_DEFAULT", "384")),
+            long_len=int(os.getenv("GENERATION_MAX_LEN_LONG", "512")),
+            tokens_per_second=float(os.getenv("GENERATION_TOKENS_PER_SECOND", "40")),
+            first_token_ms=float(os.getenv("GENERATION_FIRST_TOKEN_MS", "400")),
+        )
+
+    def classify(self, message: str) -> str:
+        if _LONG_FORM.search(message):
+            return "long"
+        return "short" if estimate_tokens(message) <= 16 else "default"
+
+    def max_gen_len(self, message: str, latency_budget_ms: float = None) -> int:
+        cap = self.caps[self.classify(message)]
+        if latency_budget_ms is not None:
+            in_time = (latency_budget_ms - self.first_token_ms) / 1000 * self.tokens_per_second
+            cap = min(cap, max(self.min_len, int(in_time)))
+        return cap
+
+    def observe(self, tokens: int, decode_seconds: float):
+        """
+        Learn the decode rate from a stream that ran to completion:
+        `tokens` generated in `decode_seconds` after the first one.
+        """
+        if tokens < 32 or decode_seconds <= 0:
+            return
+        rate = tokens / decode_seconds
+        self.tokens_per_second += self.smoothing * (rate - self.tokens_per_second)
+
+    def finish(self, generated: str, max_gen_len: int, stopped: bool = False) -> tuple[str, dict]:
+        """
+        Trim `generated` (the model's text for a request capped at
+        `max_gen_len`; for a stream closed early, `stopped`=True, the text
+        received until then) and report on it. Returns (reply, report).
+
+        A generation that ended by itself before the cap would have ended the
+        same way under the baseline cap, so it saved nothing. One that hit
+        the cap or was closed early would have run on to the baseline cap:
+        the report counts those tokens and their decode time as saved, an
+        upper bound.
+        """
+        reply, continuation = split_continuation(generated)
+        tokens = estimate_tokens(generated)
+        trimmed = estimate_tokens(continuation)
+        capped = stopped or tokens >= 0.9 * max_gen_len
+        saved = max(0, self.baseline - tokens) if capped else 0
+        saved_ms = round(saved / self.tokens_per_second * 1000)
+        with self._lock:
+            totals = self._totals
+            totals["requests"] += 1
+            totals["tokens"] += tokens
+            totals["trimmed"] += bool(continuation)
+            totals["trimmed_tokens"] += trimmed
+            totals["stopped_early"] += stopped
+            totals["saved_tokens"] += saved
+            totals["saved_ms"] += saved_ms
+        report = {"max_gen_len": max_gen_len, "tokens": tokens, "trimmed_tokens": trimmed,
+                  "saved_tokens": saved, "saved_ms": saved_ms}
+        return reply, report
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._totals)
+        stats["tokens_per_second"] = round(self.tokens_per_second, 1)
+        return stats
+
+
+def format_report(report: dict) -> str:
+    """
+    A report as a header value: "max_gen_len=128, tokens=42, ...".
+    """
+    return ", ".join(f"{name}={value}" for name, value in report.items())
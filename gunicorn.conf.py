@@ -0,0 +1,83 @@
+# gunicorn.conf.py
+#
+# Production entry point for the Flask app: a pre-fork gunicorn server
+# with threaded workers.
+#
+#   gunicorn -c gunicorn.conf.py app:app
+#
+# app.py is imported once in the master (preload_app) and the workers are
+# forked from it, so imports and module-level setup are paid once. Each
+# worker then builds its own Bedrock clients (boto3 clients and their
+# connection pools must not be shared across fork). On SIGTERM the workers
+# stop accepting connections and finish in-flight chats for up to
+# graceful_timeout seconds, and each worker is recycled after about
+# max_requests requests.
+#
+# Anything that holds threads or open SQLite handles is per process: the
+# session HistoryCompactor is rebuilt in post_fork, and the SQLite-backed
+# response cache and session store open their own connections on first use
+# in each worker (sqlite_local.LocalConnection).
+
+import multiprocessing
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8080')}"
+
+# Workers are processes; each serves `threads` requests at once. Chats spend
+# almost all their time waiting on Bedrock, so a few processes with many
+# threads go further than one process per request.
+workers = int(os.getenv("GUNICORN_WORKERS", str(min(multiprocessing.cpu_count() * 2, 8))))
+threads = int(os.getenv("GUNICORN_THREADS", "32"))
+worker_class = "gthread"
+
+preload_app = True
+
+# Recycle workers to bound slow leaks; the jitter keeps them from all
+# restarting at once
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", "10000"))
+max_requests_jitter = max(1, max_requests // 10) if max_requests else 0
+
+# Long generations take tens of seconds; a worker silent for `timeout` is
+# killed, and shutdown waits `graceful_timeout` for in-flight chats
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "120"))
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", "60"))
+keepalive = 5
+
+accesslog = os.getenv("GUNICORN_ACCESS_LOG") or None
+errorlog = "-"
+
+
+def on_starting(server):
+    # app.py defers importing boto3/botocore until a client is built, which
+    # would make every worker import them after fork. Import them once in
+    # the master instead, so the workers share the loaded modules.
+    import boto3
+    import botocore.awsrequest
+    import botocore.config
+
+
+def post_fork(server, worker):
+    # Drop any clients inherited from the master and build this worker's
+    # own in the background, so the first request does not pay for endpoint
+    # resolution, credentials and TLS setup; /healthz turns ready when done
+    import app
+    from client_pool import reset_pool, start_warm_up
+
+    def report(state):
+        worker.log.warning("Bedrock warm-up failed (%s): %s", state["status"], state.get("error"))
+
+    reset_pool()
+    start_warm_up(report=report)
+
+    # The master's compactor was built before fork; its executor threads
+    # and queue are not this worker's
+    app.start_history_compactor()
+
+
+def worker_exit(server, worker):
+    # In-flight requests have drained by now; let a running history
+    # summary finish writing rather than dropping it
+    import app
+
+    if app.sessions is not None and app.sessions.compactor is not None:
+        app.sessions.compactor.shutdown()
@@ -0,0 +1,54 @@
+# lazy_import.py
+#
+# Deferred imports for heavy dependencies. boto3/botocore and numpy take
+# most of the time to import app.py, but a process only needs them once it
+# builds a Bedrock client or touches a vector, so modules bind them as
+#
+#   boto3 = lazy_module("boto3")
+#
+# and the real import happens on the first attribute access.
+
+import importlib
+import sys
+import types
+
+
+class LazyModule(types.ModuleType):
+    """
+    Stand-in for a module that is imported on first attribute access.
+    Attribute reads, writes and deletes all go to the real module, so
+    `monkeypatch.setattr("bedrock_client.boto3.client", ...)` patches boto3
+    itself, exactly as with a plain `import boto3`.
+    """
+
+    def __init__(self, name: str):
+        super().__init__(name)
+        self.__dict__["_module"] = None
+
+    def _load(self):
+        module = self.__dict__["_module"]
+        if module is None:
+            module = self.__dict__["_module"] = importlib.import_module(self.__name__)
+        return module
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __setattr__(self, attr, value):
+        setattr(self._load(), attr, value)
+
+    def __delattr__(self, attr):
+        delattr(self._load(), attr)
+
+    def __repr__(self):
+        state = "loaded" if self.__dict__["_module"] is not None else "not loaded"
+        return f"<lazy module {self.__name__!r} ({state})>"
+
+
+def lazy_module(name: str) -> types.ModuleType:
+    """
+    The module `name` if it is already imported, else a LazyModule that
+    imports it when first used.
+    """
+    module = sys.modules.get(name)
+    return module if module is not None else LazyModule(name)
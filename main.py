@@ -85,8 +85,9 @@
 # main.py
 
 import sys
-from bedrock_client import BedrockClient
+from client_pool import get_bedrock_client
 from errors import ConfigurationError, BedrockInvocationError
+from generation_policy import GenerationPolicy
 
 def build_prompt_single_turn(user_input: str) -> str:
     """
@@ -105,10 +106,11 @@ def build_prompt_single_turn(user_input: str) -> str:
 
 def run_cli():
     try:
-        bedrock = BedrockClient()
+        bedrock = get_bedrock_client()
     except ConfigurationError as ce:
         print(f"[Configuration Error] {ce}")
         sys.exit(1)
+    policy = GenerationPolicy.from_env()
 
     print("=== Chat with Llama 3.3 70B Instruct (type 'exit' to quit) ===")
     while True:
@@ -127,16 +129,20 @@ def run_cli():
         # Build a single-turn prompt with no history or memory
         prompt_text = build_prompt_single_turn(user_input)
 
+        # Cap the reply length by the kind of message (see generation_policy.py)
+        max_gen_len = policy.max_gen_len(user_input) if policy is not None else 512
         try:
             reply = bedrock.invoke(
                 prompt_text,
-                max_gen_len=512,
+                max_gen_len=max_gen_len,
                 temperature=0.5,
                 top_p=0.9
             )
         except BedrockInvocationError as bie:
             print(f"[Error] Could not get response from Llama: {bie}")
             continue
+        if policy is not None:
+            reply, _ = policy.finish(reply, max_gen_len)
 
         print(f"Assistant: {reply}\n")
 
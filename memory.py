@@ -1,5 +1,94 @@
 # memory.py
 
+import re
+
+
+class SlotPattern:
+    """
+    Declarative definition of one memory slot:
+      - name:      slot key, e.g. "user_name"
+      - phrases:   lead-in phrases; the first word after any of them is the value
+      - template:  sentence for to_prompt(), with {} for the value
+      - normalize: str method applied to the value ("title", "lower", ...)
+    Phrases match case-insensitively and with any whitespace between words.
+    """
+    __slots__ = ("name", "phrases", "template", "normalize")
+
+    def __init__(self, name: str, phrases, template: str, normalize: str = "strip"):
+        self.name = name
+        self.phrases = (phrases,) if isinstance(phrases, str) else tuple(phrases)
+        self.template = template
+        self.normalize = normalize
+
+
+class SlotExtractor:
+    """
+    All phrases of all patterns compiled into one regex, so extract() finds
+    every slot in a single pass over the message however many patterns
+    there are. Phrases are merged into a word trie before compiling, so
+    phrases that share leading words ("my name is", "my favorite color
+    is") are tried together rather than one after another.
+    """
+
+    def __init__(self, patterns):
+        self.patterns = tuple(patterns)
+        # slot name -> (position, template), for to_prompt()
+        self.templates = {p.name: (i, p.template) for i, p in enumerate(self.patterns)}
+        self._by_phrase = {}    # normalized phrase -> (slot name, normalize method)
+        trie = {}
+        for pattern in self.patterns:
+            normalize = getattr(str, pattern.normalize)
+            for phrase in pattern.phrases:
+                words = phrase.lower().split()
+                self._by_phrase[" ".join(words)] = (pattern.name, normalize)
+                node = trie
+                for word in words:
+                    node = node.setdefault(word, {})
+                node[""] = {}   # end of a phrase
+        # No (?<!\w) in the regex: a leading lookbehind stops re from
+        # skipping ahead on the phrases' common first letters, so the word
+        # boundary is checked in extract() instead
+        self._regex = re.compile(
+            rf"(?P<phrase>{self._trie_regex(trie)})\s+(?P<value>[^\s.,!?;:]+)",
+            re.IGNORECASE,
+        )
+
+    @classmethod
+    def _trie_regex(cls, node: dict) -> str:
+        branches = []
+        for word in sorted((w for w in node if w), key=len, reverse=True):
+            child = node[word]
+            branch = re.escape(word)
+            if set(child) != {""}:
+                rest = rf"\s+{cls._trie_regex(child)}"
+                # "" marks a phrase ending at this word, so the rest is optional
+                branch += f"(?:{rest})?" if "" in child else rest
+            branches.append(branch)
+        return branches[0] if len(branches) == 1 else f"(?:{'|'.join(branches)})"
+
+    def extract(self, text: str) -> dict:
+        """
+        {slot name: normalized value} for every phrase found in `text`;
+        when a slot is mentioned twice the later value wins.
+        """
+        found = {}
+        for match in self._regex.finditer(text):
+            start = match.start()
+            if start and (text[start - 1].isalnum() or text[start - 1] == "_"):
+                continue
+            name, normalize = self._by_phrase[" ".join(match.group("phrase").lower().split())]
+            found[name] = normalize(match.group("value"))
+        return found
+
+
+# Slots remembered by default, in the order to_prompt() mentions them
+DEFAULT_PATTERNS = (
+    SlotPattern("user_name", "my name is", "You are talking to {}.", normalize="title"),
+    SlotPattern("favorite_color", "my favorite color is", "The user likes {}.", normalize="lower"),
+)
+DEFAULT_EXTRACTOR = SlotExtractor(DEFAULT_PATTERNS)
+
+
 class Memory:
     """
     A simple in-memory store for a couple of “slots”:
@@ -12,43 +101,47 @@ class Memory:
 
     to_prompt() will return a short string like:
       "You are talking to Alice. The user likes green."
+
+    Slots are defined by the SlotPatterns of `extractor`; the to_prompt()
+    text is cached until a slot changes.
     """
+    __slots__ = ("slots", "extractor", "_prompt")
 
-    def __init__(self):
+    def __init__(self, extractor: SlotExtractor = DEFAULT_EXTRACTOR):
         self.slots = {}   # holds e.g. { "user_name": "Alice" }
+        self.extractor = extractor
+        self._prompt = None
 
     def get(self, key, default=None):
         return self.slots.get(key, default)
 
     def set(self, key, value):
-        self.slots[key] = value
+        if self.slots.get(key) != value:
+            self.slots[key] = value
+            self._prompt = None
+
+    def update(self, slots: dict):
+        for key, value in slots.items():
+            self.set(key, value)
 
     def to_prompt(self) -> str:
         """
         Compose a short piece of text from stored slots.
         """
-        parts = []
-        if "user_name" in self.slots:
-            parts.append(f"You are talking to {self.slots['user_name']}.")
-        if "favorite_color" in self.slots:
-            parts.append(f"The user likes {self.slots['favorite_color']}.")
-        return " ".join(parts)
+        if self._prompt is None:
+            templates = self.extractor.templates
+            parts = sorted(
+                (templates[key][0], templates[key][1].format(value))
+                for key, value in self.slots.items()
+                if key in templates
+            )
+            self._prompt = " ".join(text for _, text in parts)
+        return self._prompt
 
     def parse_and_store(self, user_input: str):
         """
-        Naively parse:
-          - “My name is X”  → store user_name = X (first word after that phrase).
-          - “My favorite color is Y” → store favorite_color = Y (first word after that phrase).
+        Store every slot found in one pass over the message, e.g.
+          - “My name is X”  → user_name = X (first word after that phrase).
+          - “My favorite color is Y” → favorite_color = Y (first word after that phrase).
         """
-        text = user_input.strip()
-        lower = text.lower()
-
-        if lower.startswith("my name is "):
-            remainder = text[len("my name is "):].strip()
-            name = remainder.split()[0]
-            self.set("user_name", name.title())
-        elif "my favorite color is " in lower:
-            idx = lower.index("my favorite color is ") + len("my favorite color is ")
-            remainder = text[idx:].strip()
-            color = remainder.split()[0]
-            self.set("favorite_color", color.lower())
+        self.update(self.extractor.extract(user_input))
@@ -0,0 +1,203 @@
+# metrics.py
+#
+# Lightweight in-process metrics: counters and latency histograms rendered
+# in the Prometheus text format, plus per-request stage timings for the
+# Server-Timing header. With METRICS=0, stage() returns a shared no-op
+# context manager and count() returns immediately, so instrumented hot
+# paths cost one global lookup and a call.
+
+import contextlib
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+
+# Upper bounds (seconds) of the latency histogram buckets; Bedrock calls
+# span milliseconds (cache hits) to tens of seconds (long generations)
+DEFAULT_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+    1.0, 2.5, 5.0, 10.0, 30.0,
+)
+
+enabled = os.getenv("METRICS", "1") != "0"
+
+# Stage durations (ms) of the request being handled, for Server-Timing
+_request_timings = ContextVar("request_timings", default=None)
+_NOOP = contextlib.nullcontext()
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names: tuple, values: tuple, extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    """
+    Monotonic counter with optional labels.
+    """
+
+    def __init__(self, name: str, help_text: str, labelnames: tuple = ()):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = labelnames
+        self._values = {}   # label values tuple -> count
+        self._lock = threading.Lock()
+
+    def inc(self, *labelvalues, amount: float = 1):
+        with self._lock:
+            self._values[labelvalues] = self._values.get(labelvalues, 0) + amount
+
+    def value(self, *labelvalues) -> float:
+        return self._values.get(labelvalues, 0)
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for labelvalues, value in items:
+            lines.append(f"{self.name}{_labels(self.labelnames, labelvalues)} {value}")
+        return lines
+
+
+class Histogram:
+    """
+    Cumulative-bucket histogram with optional labels. observe() does one
+    bisect and three additions under a lock.
+    """
+
+    def __init__(self, name: str, help_text: str, labelnames: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = labelnames
+        self.buckets = tuple(buckets)
+        self._series = {}   # label values tuple -> [bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labelvalues):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labelvalues)
+            if series is None:
+                series = self._series[labelvalues] = [0] * (len(self.buckets) + 2)
+            series[index] += 1
+            series[-1] += value
+
+    def count(self, *labelvalues) -> int:
+        series = self._series.get(labelvalues)
+        return sum(series[:-1]) if series else 0
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = sorted((k, list(v)) for k, v in self._series.items())
+        for labelvalues, series in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), series):
+                cumulative += count
+                le = _labels(self.labelnames, labelvalues, f'le="{bound}"')
+                lines.append(f"{self.name}_bucket{le} {cumulative}")
+            labels = _labels(self.labelnames, labelvalues)
+            lines.append(f"{self.name}_sum{labels} {series[-1]}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+STAGE_SECONDS = Histogram(
+    "chat_stage_seconds", "Time spent in each stage of handling a chat request.", ("stage",),
+)
+REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds", "Time to produce the response (headers, for streams).", ("path", "status"),
+)
+RESPONSE_SHAPES = Counter(
+    "bedrock_response_shape_total", "Bedrock replies by the response field the text was found in.",
+    ("model", "shape"),
+)
+CREDENTIAL_REFRESH_SECONDS = Histogram(
+    "aws_credential_refresh_seconds",
+    "Time to fetch AWS credentials, by mode (startup, background, or inline on a request) and outcome.",
+    ("mode", "outcome"),
+)
+REGISTRY = [STAGE_SECONDS, REQUEST_SECONDS, RESPONSE_SHAPES, CREDENTIAL_REFRESH_SECONDS]
+
+
+class _Stage:
+    __slots__ = ("name", "start")
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        elapsed = time.perf_counter() - self.start
+        STAGE_SECONDS.observe(elapsed, self.name)
+        timings = _request_timings.get()
+        if timings is not None:
+            timings[self.name] = timings.get(self.name, 0.0) + elapsed * 1000
+        return False
+
+
+def stage(name: str):
+    """
+    Context manager timing one stage: `with metrics.stage("prompt"): ...`.
+    The duration goes to chat_stage_seconds and the current request's
+    Server-Timing entries.
+    """
+    return _Stage(name) if enabled else _NOOP
+
+
+def count(counter: Counter, *labelvalues):
+    if enabled:
+        counter.inc(*labelvalues)
+
+
+def start_request():
+    """
+    Begin collecting stage timings for the request handled in this context.
+    """
+    if enabled:
+        _request_timings.set({"_start": time.perf_counter()})
+
+
+def finish_request(path: str, status: int):
+    """
+    Record the request duration and return its Server-Timing header value
+    (None when metrics are off or no request was started).
+    """
+    timings = _request_timings.get()
+    if timings is None:
+        return None
+    _request_timings.set(None)
+    total = time.perf_counter() - timings.pop("_start")
+    REQUEST_SECONDS.observe(total, path, str(status))
+    entries = [f"{name};dur={ms:.2f}" for name, ms in timings.items()]
+    entries.append(f"total;dur={total * 1000:.2f}")
+    return ", ".join(entries)
+
+
+def render() -> str:
+    """
+    All metrics in the Prometheus text exposition format.
+    """
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+def reset():
+    """
+    Drop all recorded values (for tests).
+    """
+    for metric in REGISTRY:
+        with metric._lock:
+            (metric._values if isinstance(metric, Counter) else metric._series).clear()
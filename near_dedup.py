@@ -0,0 +1,353 @@
+# near_dedup.py
+#
+# Streaming near-duplicate clustering for prompt logs and document sets.
+# Each text gets a MinHash signature over byte shingles of its normalized
+# form; LSH banding finds earlier cluster representatives that share a band
+# with it, and the signatures estimate their Jaccard similarity. Close
+# matches join the representative's cluster. With an EmbedClient, weaker
+# matches are settled by cosine similarity of Titan embeddings, so only
+# those texts are embedded; everything else starts a new cluster.
+#
+# Memory grows with the number of clusters, not lines or text: per
+# representative, its band keys (16 bytes per band), a 16-bit signature
+# (2 bytes per permutation) and, when embeddings are used, its text in an
+# unlinked temporary file.
+
+import os
+import tempfile
+from array import array
+from lazy_import import lazy_module
+
+np = lazy_module("numpy")
+
+_MIX1 = 0xBF58476D1CE4E5B9
+_MIX2 = 0x94D049BB133111EB
+_ROLL = 0x100000001B3
+
+# Shingle hashes (8 bytes each) per MinHash run, sized to stay in L2 cache
+_BLOCK_SHINGLES = 32768
+
+
+def normalize(text: str) -> str:
+    """
+    Lowercase with runs of whitespace collapsed to one space, so texts that
+    only differ in case or spacing have identical shingles.
+    """
+    return " ".join(text.lower().split())
+
+
+def _mix(x):
+    # splitmix64 finalizer, in place on a uint64 array
+    x ^= x >> np.uint64(30)
+    x *= np.uint64(_MIX1)
+    x ^= x >> np.uint64(27)
+    x *= np.uint64(_MIX2)
+    x ^= x >> np.uint64(31)
+    return x
+
+
+def shingle_hashes(texts, shingle: int = 5):
+    """
+    64-bit hashes of every `shingle`-byte window of each normalized text,
+    concatenated, and the offset of each text's first hash. Texts shorter
+    than a shingle are zero-padded to one.
+    """
+    encoded = [normalize(text).encode("utf-8").ljust(shingle, b"\0") for text in texts]
+    lengths = np.fromiter((len(e) for e in encoded), dtype=np.int64, count=len(encoded))
+    data = np.frombuffer(b"".join(encoded) + b"\0" * (shingle - 1), dtype=np.uint8).astype(np.uint64)
+    size = data.size - shingle + 1
+    # Polynomial hash of each window, one byte offset at a time
+    rolled = np.zeros(size, dtype=np.uint64)
+    for j in range(shingle):
+        rolled *= np.uint64(_ROLL)
+        rolled += data[j:j + size]
+    counts = lengths - shingle + 1
+    firsts = np.zeros(len(encoded), dtype=np.int64)
+    np.cumsum(counts[:-1], out=firsts[1:])
+    starts = np.zeros(len(encoded), dtype=np.int64)
+    np.cumsum(lengths[:-1], out=starts[1:])
+    windows = np.repeat(starts - firsts, counts) + np.arange(counts.sum())
+    return _mix(rolled[windows]), firsts
+
+
+def lsh_params(threshold: float, num_perm: int) -> tuple:
+    """
+    (bands, rows) with bands * rows <= num_perm that minimize the expected
+    false positive plus false negative rate of the banding for pairs around
+    `threshold` Jaccard similarity.
+    """
+    s = np.linspace(0, 1, 201)
+    below, above = s < threshold, s >= threshold
+    best, best_error = (1, num_perm), float("inf")
+    for bands in range(1, num_perm + 1):
+        rows = num_perm // bands
+        candidate = 1 - (1 - s ** rows) ** bands
+        error = candidate[below].sum() + (1 - candidate[above]).sum()
+        if error < best_error:
+            best, best_error = (bands, rows), error
+    return best
+
+
+class MinHasher:
+    """
+    `num_perm` MinHash values per text from multiply-shift hashes of its
+    shingle hashes. A batch is hashed in runs of whole texts of about
+    `_BLOCK_SHINGLES` shingles, so every permutation of a run works on
+    cached data (about 3x faster than whole-batch passes).
+    """
+
+    def __init__(self, num_perm: int = 128, shingle: int = 5, seed: int = 1):
+        rng = np.random.default_rng(seed)
+        self.num_perm = num_perm
+        self.shingle = shingle
+        self._a = rng.integers(0, 2 ** 63, num_perm, dtype=np.uint64) * np.uint64(2) + np.uint64(1)
+        self._b = rng.integers(0, 2 ** 63, num_perm, dtype=np.uint64)
+
+    def signatures(self, texts):
+        """
+        (len(texts), num_perm) uint32 signatures.
+        """
+        hashes, firsts = shingle_hashes(texts, self.shingle)
+        count = len(firsts)
+        signatures = np.empty((count, self.num_perm), dtype=np.uint32)
+        ends = np.append(firsts[1:], hashes.size)
+        start = 0
+        while start < count:
+            stop = max(start + 1, int(np.searchsorted(firsts, firsts[start] + _BLOCK_SHINGLES, side="right")))
+            run = hashes[firsts[start]:ends[stop - 1]]
+            offsets = firsts[start:stop] - firsts[start]
+            permuted = np.empty_like(run)
+            for i in range(self.num_perm):
+                np.multiply(run, self._a[i], out=permuted)
+                permuted += self._b[i]
+                # The top 32 bits of the minimum are the minimum of the top 32 bits
+                signatures[start:stop, i] = np.minimum.reduceat(permuted, offsets) >> np.uint64(32)
+            start = stop
+        return signatures
+
+
+class _BandTable:
+    """
+    Band key -> representative for one LSH band: a sorted array pair that
+    batches are looked up in with one searchsorted, plus a dict of recent
+    insertions, merged into the arrays between batches once it grows to an
+    eighth of their size (so each key is re-sorted O(log n) times).
+    """
+
+    def __init__(self):
+        self.keys = np.empty(0, dtype=np.uint64)
+        self.reps = np.empty(0, dtype=np.int64)
+        self.recent = {}
+
+    def lookup(self, keys):
+        """
+        Representative per key from the sorted arrays, -1 where absent.
+        """
+        if self.keys.size == 0:
+            return np.full(keys.size, -1, dtype=np.int64)
+        pos = np.minimum(np.searchsorted(self.keys, keys), self.keys.size - 1)
+        return np.where(self.keys[pos] == keys, self.reps[pos], -1)
+
+    def insert(self, key: int, rep: int):
+        self.recent.setdefault(key, rep)
+
+    def maybe_merge(self):
+        if len(self.recent) > max(4096, self.keys.size // 8):
+            self.merge()
+
+    def merge(self):
+        keys = np.concatenate([self.keys, np.fromiter(self.recent, dtype=np.uint64, count=len(self.recent))])
+        reps = np.concatenate([self.reps, np.fromiter(self.recent.values(), dtype=np.int64, count=len(self.recent))])
+        order = np.argsort(keys, kind="stable")
+        keys, reps = keys[order], reps[order]
+        # A key already present keeps its earlier representative
+        first = np.ones(keys.size, dtype=bool)
+        first[1:] = keys[1:] != keys[:-1]
+        self.keys, self.reps = keys[first], reps[first]
+        self.recent = {}
+
+    def nbytes(self) -> int:
+        return self.keys.nbytes + self.reps.nbytes
+
+
+class _TextLog:
+    """
+    Representative texts in an unlinked temporary file, read back by index.
+    """
+
+    def __init__(self):
+        self.file = tempfile.TemporaryFile()
+        self.offsets = array("q", [0])
+
+    def append(self, text: str):
+        data = text.encode("utf-8")
+        self.file.seek(self.offsets[-1])
+        self.file.write(data)
+        self.offsets.append(self.offsets[-1] + len(data))
+
+    def get(self, index: int) -> str:
+        self.file.flush()
+        start, end = self.offsets[index], self.offsets[index + 1]
+        return os.pread(self.file.fileno(), end - start, start).decode("utf-8")
+
+
+class NearDuplicateIndex:
+    """
+    Assigns each text of a stream to a cluster of near-duplicates; the first
+    text of a cluster is its representative.
+
+    A text joins the cluster of the most similar representative found by
+    LSH if their estimated Jaccard similarity is at least `threshold`. With
+    an `embed_client`, a representative between `embed_threshold` and
+    `threshold` (reworded or lightly edited copies) is also accepted if the
+    two texts' embeddings have cosine similarity at least `min_cosine`, so
+    only those texts are embedded. They are embedded together at the end of
+    each add_many() batch; a text that becomes a representative there is
+    not a candidate for later texts of the same batch.
+    """
+
+    def __init__(self, threshold: float = 0.7, embed_threshold: float = 0.4, num_perm: int = 128,
+                 shingle: int = 5, embed_client=None, min_cosine: float = 0.95, dimensions: int = 512,
+                 concurrency: int = 8, seed: int = 1):
+        if not 0 < threshold <= 1:
+            raise ValueError("threshold must be in (0, 1].")
+        if embed_client is not None and not 0 < embed_threshold <= threshold:
+            raise ValueError("embed_threshold must be in (0, threshold].")
+        self.threshold = threshold
+        # Lowest similarity that LSH has to find
+        self.floor = embed_threshold if embed_client is not None else threshold
+        self.hasher = MinHasher(num_perm, shingle, seed)
+        self.bands, self.rows = lsh_params(self.floor, num_perm)
+        self.embed_client = embed_client
+        self.min_cosine = min_cosine
+        self.dimensions = dimensions
+        self.concurrency = concurrency
+        self._tables = [_BandTable() for _ in range(self.bands)]
+        self._signatures = np.empty((0, num_perm), dtype=np.uint16)
+        self._positions = array("q")      # representative -> stream position
+        self._texts = _TextLog() if embed_client is not None else None
+        self._seen = 0
+        self._counts = {"lines": 0, "clusters": 0, "lexical": 0, "embedded": 0, "semantic": 0, "embed_errors": 0}
+
+    def __len__(self):
+        return len(self._positions)
+
+    def _band_keys(self, signatures):
+        rows = signatures[:, :self.bands * self.rows].reshape(len(signatures), self.bands, self.rows)
+        keys = np.zeros((len(signatures), self.bands), dtype=np.uint64)
+        for j in range(self.rows):
+            keys ^= rows[:, :, j]
+            keys = _mix(keys)
+        return keys
+
+    def _similarity(self, signature, reps) -> tuple:
+        if len(reps) == 1:
+            return reps[0], np.count_nonzero(self._signatures[reps[0]] == signature) / signature.size
+        matches = np.count_nonzero(self._signatures[reps] == signature, axis=1)
+        best = int(np.argmax(matches))
+        return reps[best], int(matches[best]) / signature.size
+
+    def _add_representative(self, keys: list, signature, position: int, text: str):
+        rep = len(self._positions)
+        if rep == self._signatures.shape[0]:
+            grown = np.empty((max(1024, 2 * rep), self._signatures.shape[1]), dtype=np.uint16)
+            grown[:rep] = self._signatures
+            self._signatures = grown
+        self._signatures[rep] = signature
+        self._positions.append(position)
+        for table, key in zip(self._tables, keys):
+            table.insert(key, rep)
+        if self._texts is not None:
+            self._texts.append(text)
+        self._counts["clusters"] += 1
+        return position
+
+    def add_many(self, texts, positions=None) -> list:
+        """
+        Cluster the next texts of the stream. Returns one (cluster,
+        similarity) per text: `cluster` is the position of the cluster's
+        representative, equal to the text's own position when it starts a
+        cluster, and `similarity` the estimated Jaccard similarity (or
+        embedding cosine) to it, 1.0 for representatives. Positions are
+        given (e.g. input line numbers) or count texts from 0 over all
+        add_many calls.
+        """
+        texts = list(texts)
+        if not texts:
+            return []
+        if positions is None:
+            positions = range(self._seen, self._seen + len(texts))
+        positions = list(positions)
+        signatures = self.hasher.signatures(texts)
+        keys = self._band_keys(signatures)
+        short = signatures.astype(np.uint16)
+        stored = [table.lookup(keys[:, j]) for j, table in enumerate(self._tables)]
+        stored = np.stack(stored, axis=1).tolist()
+        keys = keys.tolist()
+        results = [None] * len(texts)
+        grey = []       # (index, representative, similarity)
+        for i, text in enumerate(texts):
+            found = {rep for rep in stored[i] if rep >= 0}
+            for table, key in zip(self._tables, keys[i]):
+                rep = table.recent.get(key)
+                if rep is not None:
+                    found.add(rep)
+            if found:
+                rep, similarity = self._similarity(short[i], list(found))
+                if similarity >= self.threshold:
+                    results[i] = (self._positions[rep], similarity)
+                    self._counts["lexical"] += 1
+                    continue
+                if similarity >= self.floor:
+                    grey.append((i, rep, similarity))
+                    continue
+            results[i] = (self._add_representative(keys[i], short[i], positions[i], text), 1.0)
+        if grey:
+            self._settle(texts, positions, grey, keys, short, results)
+        for table in self._tables:
+            table.maybe_merge()
+        self._seen += len(texts)
+        self._counts["lines"] += len(texts)
+        return results
+
+    def _settle(self, texts, positions, grey, keys, short, results):
+        """
+        Embed grey-zone texts and their representatives in one batch and
+        decide each by cosine similarity. A text whose embedding fails
+        starts its own cluster, since keeping a duplicate is cheaper than
+        dropping a distinct text.
+        """
+        pairs = [(texts[i], self._texts.get(rep)) for i, rep, _ in grey]
+        unique = list(dict.fromkeys(text for pair in pairs for text in pair))
+        batch = self.embed_client.embed_many(unique, concurrency=self.concurrency, dimensions=self.dimensions)
+        rows = {text: row for row, text in enumerate(unique)}
+        self._counts["embedded"] += len(unique)
+        for (i, rep, _), (text, rep_text) in zip(grey, pairs):
+            a, b = rows[text], rows[rep_text]
+            if a in batch.errors or b in batch.errors:
+                self._counts["embed_errors"] += 1
+                cosine = -1.0
+            else:
+                cosine = float(batch.vectors[a] @ batch.vectors[b])
+            if cosine >= self.min_cosine:
+                results[i] = (self._positions[rep], cosine)
+                self._counts["semantic"] += 1
+            else:
+                results[i] = (self._add_representative(keys[i], short[i], positions[i], text), 1.0)
+
+    def memory_bytes(self) -> int:
+        """
+        Bytes held for the representatives (band tables, signatures and
+        positions), excluding the dicts of not yet merged band keys.
+        """
+        return (sum(table.nbytes() for table in self._tables) + self._signatures[:len(self)].nbytes
+                + self._positions.itemsize * len(self._positions))
+
+    def stats(self) -> dict:
+        return {
+            **self._counts,
+            "duplicates": self._counts["lines"] - self._counts["clusters"],
+            "bands": self.bands,
+            "rows": self.rows,
+            "memory_bytes": self.memory_bytes(),
+        }
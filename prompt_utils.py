@@ -0,0 +1,87 @@
+# prompt_utils.py
+#
+# Single-turn prompts, the default generation settings and validation of
+# /chat/batch items, shared by app.py and the offline run_inference.py.
+# Nothing here imports Flask or builds app.py's caches, limiter or session
+# store, so the CLI gets the same prompts without that start-up cost.
+
+from token_budget import TokenBudget, estimate_tokens
+
+# Generation settings used for every single-turn reply
+GENERATION_PARAMS = {"max_gen_len": 512, "temperature": 0.5, "top_p": 0.9}
+
+# Allowed ranges of per-item generation parameters
+PARAM_RANGES = {"max_gen_len": (int, 1, 2048), "temperature": (float, 0.0, 1.0), "top_p": (float, 0.0, 1.0)}
+
+# System line for one-off prompts, and the header of retrieved passages
+SINGLE_TURN_SYSTEM = (
+    "System: Respond ONLY with the assistant’s direct reply to the user message. "
+    "Do NOT include any previous conversation or extra commentary."
+)
+CONTEXT_HEADER = "Context (use it if it is relevant to the user message):"
+
+# Token estimates of the fixed lines, counted once
+SINGLE_TURN_SYSTEM_TOKENS = estimate_tokens(SINGLE_TURN_SYSTEM)
+CONTEXT_HEADER_TOKENS = estimate_tokens(CONTEXT_HEADER)
+FRAME_TOKENS = estimate_tokens("User: \nAssistant:") + 1
+
+
+def fit_passages(lines: list, used: int, passages, budget: TokenBudget) -> int:
+    """
+    Append the context header and as many passages as fit in `budget` to
+    `lines`. Returns the tokens used afterwards.
+    """
+    if not passages:
+        return used
+    kept, after = budget.fit(used + CONTEXT_HEADER_TOKENS + 1, [f"- {p}" for p in passages])
+    if not kept:
+        return used
+    lines.append(CONTEXT_HEADER)
+    lines.extend(kept)
+    return after
+
+
+def build_prompt_single_turn(user_input: str, passages: list[str] = None, budget: TokenBudget = None) -> str:
+    """
+    Build a one-off prompt that tells Llama to ignore history and only reply directly:
+      System: Respond ONLY with the assistant’s direct reply to the user message. Do NOT include any previous conversation or extra commentary.
+      Context:            (only when retrieved passages are given)
+      - <passage>
+      User: <user_input>
+      Assistant:
+    Passages that would push the prompt past `budget` (default: from
+    PROMPT_TOKEN_BUDGET) are dropped.
+    """
+    lines = [SINGLE_TURN_SYSTEM]
+    used = SINGLE_TURN_SYSTEM_TOKENS + FRAME_TOKENS + estimate_tokens(user_input)
+    if passages:
+        fit_passages(lines, used, passages, budget or TokenBudget.from_env())
+    lines.append(f"User: {user_input}")
+    lines.append("Assistant:")
+    return "\n".join(lines)
+
+
+def read_batch_item(item):
+    """
+    One entry of a /chat/batch "messages" list: a string, or an object with
+    "message" and optional max_gen_len / temperature / top_p.
+    Returns (user_input, params) or raises ValueError.
+    """
+    if isinstance(item, str):
+        item = {"message": item}
+    if not isinstance(item, dict) or not isinstance(item.get("message"), str):
+        raise ValueError("Each item must be a string or an object with a 'message' string.")
+    user_input = item["message"].strip()
+    if not user_input:
+        raise ValueError("Message cannot be empty.")
+    params = dict(GENERATION_PARAMS)
+    for name, (kind, low, high) in PARAM_RANGES.items():
+        if name not in item:
+            continue
+        value = item[name]
+        if isinstance(value, bool) or not isinstance(value, (int, float)) or (kind is int and value != int(value)):
+            raise ValueError(f"'{name}' must be a number.")
+        if not low <= value <= high:
+            raise ValueError(f"'{name}' must be between {low} and {high}.")
+        params[name] = kind(value)
+    return user_input, params
@@ -0,0 +1,369 @@
+# quantized_store.py
+
+import json
+import os
+import tempfile
+import threading
+from lazy_import import lazy_module
+from vector_store import dedupe_ids, index_array_files
+
+np = lazy_module("numpy")
+
+QUANTIZATIONS = ("int8", "binary")
+
+# Candidates scored exactly per result wanted, when originals are kept;
+# sign bits lose more information than int8 codes, so they need more
+DEFAULT_OVERSAMPLE = {"int8": 4, "binary": 16}
+
+# float32 rows converted per block when scoring int8 codes (~512 KiB, so the
+# block stays in cache between the conversion and the dot product)
+_BLOCK_BYTES = 512 * 1024
+
+
+def quantize_int8(vectors):
+    """
+    Symmetric per-row int8 codes: row i is approximately codes[i] * scales[i].
+    """
+    peak = np.abs(vectors).max(axis=1)
+    scales = np.where(peak > 0, peak / 127, 1).astype(np.float32)
+    codes = np.rint(vectors / scales[:, None]).astype(np.int8)
+    return codes, scales
+
+
+def quantize_binary(vectors):
+    """
+    Sign bits, packed into uint64 words (zero-padded to a multiple of 64
+    dimensions) so Hamming distance is XOR plus popcount per word.
+    """
+    bits = np.packbits(vectors > 0, axis=1)
+    pad = -bits.shape[1] % 8
+    if pad:
+        bits = np.pad(bits, ((0, 0), (0, pad)))
+    return np.ascontiguousarray(bits).view(np.uint64)
+
+
+_byte_bits = None
+
+
+def _popcount(words):
+    """
+    Set bits per element (numpy >= 2.0), or per byte of each element with a
+    lookup table on older numpy; either way the row sums are the same.
+    """
+    global _byte_bits
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(words)
+    if _byte_bits is None:
+        _byte_bits = np.unpackbits(np.arange(256, dtype=np.uint8)[:, None], axis=1).sum(axis=1).astype(np.uint8)
+    return _byte_bits[words.view(np.uint8)]
+
+
+def is_quantized_index(directory: str) -> bool:
+    """
+    Whether `directory` holds a QuantizedVectorStore (rather than a
+    VectorStore) index.
+    """
+    path = os.path.join(directory, "meta.json")
+    if not os.path.exists(path):
+        return False
+    with open(path, encoding="utf-8") as f:
+        return "quantization" in json.load(f)
+
+
+class _FloatFile:
+    """
+    Raw float32 rows in a file, appended at the end and read back through a
+    read-only memory map that is re-created as the file grows.
+    """
+
+    def __init__(self, file, dimensions: int, rows: int = 0, writable: bool = True):
+        self.file = file
+        self.dimensions = dimensions
+        self.rows = rows
+        self.writable = writable
+        self._map = None
+        self._mapped = 0
+
+    @classmethod
+    def private(cls, dimensions: int, directory: str = None):
+        """
+        A new file that is unlinked straight away, so it disappears with the
+        process (or the store) and never needs cleaning up.
+        """
+        fd, path = tempfile.mkstemp(prefix="originals-", suffix=".f32", dir=directory)
+        os.unlink(path)
+        return cls(os.fdopen(fd, "w+b"), dimensions)
+
+    def append(self, vectors):
+        self.file.seek(self.rows * self.dimensions * 4)
+        self.file.write(np.ascontiguousarray(vectors, dtype=np.float32).tobytes())
+        self.file.flush()
+        self.rows += len(vectors)
+
+    def take(self, rows):
+        if self._mapped < self.rows:
+            self._map = np.memmap(self.file, dtype=np.float32, mode="r", shape=(self.rows, self.dimensions))
+            self._mapped = self.rows
+        return self._map[rows]
+
+    def private_copy(self, directory: str = None):
+        copy = _FloatFile.private(self.dimensions, directory)
+        block = max(1, (64 << 20) // (self.dimensions * 4))
+        for start in range(0, self.rows, block):
+            copy.append(self.take(slice(start, start + block)))
+        return copy
+
+
+class QuantizedVectorStore:
+    """
+    Cosine-similarity index over Titan embeddings kept compressed, for
+    indexes too large to hold as float32 rows:
+      int8    one signed byte per dimension plus a float32 scale per row
+              (about 4x smaller than VectorStore's matrix)
+      binary  one sign bit per dimension (32x smaller)
+
+    search() scores every row against the codes: a dot product over int8
+    codes converted to float32 one cache-sized block at a time, or XOR and
+    popcount Hamming distance over 64-bit words. With `keep_originals`, the
+    float32 vectors are also appended to a raw file that is memory-mapped,
+    and the best `oversample * k` candidates are rescored exactly, so the
+    originals cost disk and page cache rather than heap and only the
+    candidates' pages are read.
+
+    Same add/delete/search/save/load interface as VectorStore (without IVF
+    partitions), so Retriever works with either.
+    """
+
+    def __init__(self, dimensions: int, quantization: str = "int8", keep_originals: bool = True,
+                 oversample: int = None, directory: str = None):
+        if quantization not in QUANTIZATIONS:
+            raise ValueError(f"quantization must be one of {QUANTIZATIONS}, not {quantization!r}.")
+        self.dimensions = dimensions
+        self.quantization = quantization
+        self.oversample = oversample or DEFAULT_OVERSAMPLE[quantization]
+        self._words = -(-dimensions // 64)
+        if quantization == "int8":
+            self._codes = np.zeros((0, dimensions), dtype=np.int8)
+        else:
+            self._codes = np.zeros((0, self._words), dtype=np.uint64)
+        self._scales = np.zeros(0, dtype=np.float32)
+        self._alive = np.zeros(0, dtype=bool)
+        self._count = 0
+        self._ids = []
+        self._texts = []
+        self._rows = {}            # id -> row
+        self._originals = _FloatFile.private(dimensions, directory) if keep_originals else None
+        self._directory = directory
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._rows)
+
+    @property
+    def has_originals(self) -> bool:
+        return self._originals is not None
+
+    def memory_bytes(self) -> int:
+        """
+        Heap (or mapped) bytes of the searchable arrays, excluding ids, texts
+        and the originals file.
+        """
+        return self._codes[:self._count].nbytes + self._scales[:self._count].nbytes + self._count
+
+    def _reserve(self, extra: int):
+        needed = self._count + extra
+        if needed <= self._codes.shape[0] and self._codes.flags.writeable:
+            return
+        capacity = max(needed, 2 * self._codes.shape[0], 1024)
+        codes = np.zeros((capacity,) + self._codes.shape[1:], dtype=self._codes.dtype)
+        codes[:self._count] = self._codes[:self._count]
+        scales = self._scales
+        if self.quantization == "int8":
+            scales = np.zeros(capacity, dtype=np.float32)
+            scales[:self._count] = self._scales[:self._count]
+        alive = np.zeros(capacity, dtype=bool)
+        alive[:self._count] = self._alive[:self._count]
+        self._codes, self._scales, self._alive = codes, scales, alive
+
+    def add(self, ids, vectors, texts=None):
+        """
+        Add (or replace) documents. `vectors` is any (n, dimensions) array-like;
+        `texts` are the passages returned by search(). An id repeated within
+        the batch keeps its last vector.
+        """
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(-1, self.dimensions)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors = vectors / np.where(norms > 0, norms, 1)
+        ids = list(ids)
+        texts = list(texts) if texts is not None else [None] * len(vectors)
+        if len(ids) != len(vectors) or len(texts) != len(vectors):
+            raise ValueError("ids, vectors and texts must have the same length.")
+        ids, vectors, texts = dedupe_ids(ids, vectors, texts)
+        with self._lock:
+            for doc_id in ids:
+                self._tombstone(doc_id)
+            self._reserve(len(vectors))
+            start, end = self._count, self._count + len(vectors)
+            if self.quantization == "int8":
+                self._codes[start:end], self._scales[start:end] = quantize_int8(vectors)
+            else:
+                self._codes[start:end] = quantize_binary(vectors)
+            if self._originals is not None:
+                if not self._originals.writable:
+                    # Loaded store: copy the shared file before appending to it
+                    self._originals = self._originals.private_copy(self._directory)
+                self._originals.append(vectors)
+            self._alive[start:end] = True
+            for offset, doc_id in enumerate(ids):
+                self._rows[doc_id] = start + offset
+            self._ids.extend(ids)
+            self._texts.extend(texts)
+            self._count = end
+
+    def _tombstone(self, doc_id):
+        row = self._rows.pop(doc_id, None)
+        if row is not None:
+            if not self._alive.flags.writeable:
+                self._alive = self._alive.copy()
+            self._alive[row] = False
+
+    def delete(self, ids):
+        with self._lock:
+            for doc_id in ids:
+                self._tombstone(doc_id)
+
+    def _int8_scores(self, query):
+        count = self._count
+        scores = np.empty(count, dtype=np.float32)
+        block = max(1, _BLOCK_BYTES // (4 * self.dimensions))
+        buffer = np.empty((block, self.dimensions), dtype=np.float32)
+        for start in range(0, count, block):
+            codes = self._codes[start:min(start + block, count)]
+            rows = buffer[:len(codes)]
+            np.copyto(rows, codes, casting="unsafe")
+            np.dot(rows, query, out=scores[start:start + len(codes)])
+        scores *= self._scales[:count]
+        return scores
+
+    def _hamming(self, query):
+        words = quantize_binary(query[None, :])[0]
+        return _popcount(self._codes[:self._count] ^ words).sum(axis=1, dtype=np.int32)
+
+    def search(self, query, k: int = 5, oversample: int = None):
+        """
+        Return up to `k` (id, score, text) tuples by descending cosine
+        similarity. Scores are exact when originals are kept, and estimated
+        from the codes otherwise.
+        """
+        query = np.asarray(query, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if norm > 0:
+            query = query / norm
+        with self._lock:
+            if self._count == 0:
+                return []
+            live = self._alive[:self._count]
+            if self.quantization == "int8":
+                ranking = self._int8_scores(query)
+                ranking[~live] = -np.inf
+            else:
+                ranking = -self._hamming(query).astype(np.float32)
+                ranking[~live] = -np.inf
+            wanted = k * (oversample or self.oversample) if self._originals is not None else k
+            wanted = min(wanted, ranking.shape[0])
+            top = np.argpartition(-ranking, wanted - 1)[:wanted]
+            top = np.sort(top[ranking[top] > -np.inf])
+            if top.size == 0:
+                return []
+            if self._originals is not None:
+                scores = self._originals.take(top) @ query
+            elif self.quantization == "int8":
+                scores = ranking[top]
+            else:
+                # Angle estimate from the fraction of differing sign bits
+                scores = np.cos(np.pi * -ranking[top] / self.dimensions)
+            order = np.argsort(-scores)[:k]
+            return [(self._ids[row], float(scores[i]), self._texts[row])
+                    for i, row in zip(order.tolist(), top[order].tolist())]
+
+    @classmethod
+    def from_vector_store(cls, store, quantization: str = "int8", keep_originals: bool = True,
+                          block: int = 65536, **kwargs):
+        """
+        Quantize the live rows of a VectorStore, `block` rows at a time.
+        """
+        quantized = cls(store.dimensions, quantization, keep_originals, **kwargs)
+        live = np.flatnonzero(store._alive[:store._count])
+        for start in range(0, live.size, block):
+            rows = live[start:start + block]
+            quantized.add([store._ids[i] for i in rows.tolist()], store._matrix[rows],
+                          [store._texts[i] for i in rows.tolist()])
+        return quantized
+
+    def save(self, directory: str):
+        """
+        Write the live rows to `directory` (compacting away deleted rows):
+        codes.npy, scales.npy for int8, vectors.f32 with the originals and
+        meta.json.
+        """
+        with self._lock:
+            os.makedirs(directory, exist_ok=True)
+            live = np.flatnonzero(self._alive[:self._count])
+            # Write-then-rename so processes that mapped the old files keep valid views
+            arrays = {"codes.npy": self._codes[live]}
+            if self.quantization == "int8":
+                arrays["scales.npy"] = self._scales[live]
+            for name, array in arrays.items():
+                path = os.path.join(directory, name)
+                with open(path + ".tmp", "wb") as f:
+                    np.save(f, array)
+                os.replace(path + ".tmp", path)
+            vectors_path = os.path.join(directory, "vectors.f32")
+            if self._originals is not None:
+                block = max(1, (64 << 20) // (self.dimensions * 4))
+                with open(vectors_path + ".tmp", "wb") as f:
+                    for start in range(0, live.size, block):
+                        f.write(self._originals.take(live[start:start + block]).tobytes())
+                os.replace(vectors_path + ".tmp", vectors_path)
+            elif os.path.exists(vectors_path):
+                os.remove(vectors_path)
+            meta = {
+                "dimensions": self.dimensions,
+                "quantization": self.quantization,
+                "oversample": self.oversample,
+                "originals": self._originals is not None,
+                "ids": [self._ids[i] for i in live.tolist()],
+                "texts": [self._texts[i] for i in live.tolist()],
+            }
+            with open(os.path.join(directory, "meta.json"), "w", encoding="utf-8") as f:
+                json.dump(meta, f)
+            # Left over when a VectorStore index was converted in place
+            for path, _ in index_array_files(directory):
+                os.remove(path)
+
+    @classmethod
+    def load(cls, directory: str, mmap: bool = True):
+        """
+        Open a store written by save(). With mmap=True the codes are mapped
+        read-only; the first add() copies them into memory, and the
+        originals file into a private one.
+        """
+        with open(os.path.join(directory, "meta.json"), encoding="utf-8") as f:
+            meta = json.load(f)
+        store = cls(meta["dimensions"], meta["quantization"], keep_originals=False,
+                    oversample=meta["oversample"], directory=directory)
+        mode = "r" if mmap else None
+        store._codes = np.load(os.path.join(directory, "codes.npy"), mmap_mode=mode)
+        if store.quantization == "int8":
+            store._scales = np.load(os.path.join(directory, "scales.npy"), mmap_mode=mode)
+        store._count = store._codes.shape[0]
+        store._alive = np.ones(store._count, dtype=bool)
+        store._ids = meta["ids"]
+        store._texts = meta["texts"]
+        store._rows = {doc_id: row for row, doc_id in enumerate(store._ids)}
+        if meta["originals"] and store._count:
+            f = open(os.path.join(directory, "vectors.f32"), "rb")
+            store._originals = _FloatFile(f, store.dimensions, store._count, writable=False)
+        elif meta["originals"]:
+            store._originals = _FloatFile.private(store.dimensions, directory)
+        return store
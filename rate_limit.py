@@ -0,0 +1,69 @@
+# rate_limit.py
+
+import threading
+import time
+
+
+class TokenBucket:
+    """
+    Token-bucket rate limiter: `rate` tokens per second accrue up to
+    `burst`, and each call spends one (or `tokens`). acquire() sleeps until
+    enough tokens are available; try_acquire() never blocks. A rate of 0
+    means unlimited.
+    """
+
+    def __init__(self, rate: float, burst: float = None, clock=time.monotonic, sleep=time.sleep):
+        self.rate = rate
+        self.burst = burst if burst is not None else max(1.0, rate)
+        self.clock = clock
+        self.sleep = sleep
+        self._tokens = self.burst
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def _refill_locked(self, now: float):
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_acquire(self, tokens: float = 1.0) -> bool:
+        if not self.rate:
+            return True
+        with self._lock:
+            self._refill_locked(self.clock())
+            if self._tokens >= tokens:
+                self._tokens -= tokens
+                return True
+            return False
+
+    def charge(self, tokens: float = 1.0):
+        """
+        Spend `tokens` unconditionally; the balance may go negative, which
+        pushes back the next call that has to wait for tokens.
+        """
+        if not self.rate:
+            return
+        with self._lock:
+            self._refill_locked(self.clock())
+            self._tokens -= tokens
+
+    def wait_time(self, tokens: float = 1.0) -> float:
+        """
+        Seconds until `tokens` would be available (0 if they are now).
+        """
+        if not self.rate:
+            return 0.0
+        with self._lock:
+            self._refill_locked(self.clock())
+            return max(0.0, (tokens - self._tokens) / self.rate)
+
+    def acquire(self, tokens: float = 1.0):
+        if not self.rate:
+            return
+        with self._lock:
+            self._refill_locked(self.clock())
+            # Reserve now (the balance may go negative) so concurrent
+            # callers queue up behind each other instead of all waking at once
+            self._tokens -= tokens
+            delay = -self._tokens / self.rate if self._tokens < 0 else 0.0
+        if delay:
+            self.sleep(delay)
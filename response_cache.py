@@ -0,0 +1,128 @@
+# response_cache.py
+
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from sqlite_local import LocalConnection
+
+
+class ResponseCache:
+    """
+    Exact-match cache for single-turn replies.
+
+    Entries are keyed on (model_id, prompt, max_gen_len, temperature, top_p)
+    and kept in an in-process LRU of at most `max_entries` items, each
+    expiring `ttl` seconds after it was stored. If `db_path` is given, entries
+    are also written to a SQLite table so that other worker processes (and
+    restarts) can reuse them; the SQLite tier is consulted on a memory miss.
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl: float = 3600.0, db_path: str = None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.db_path = db_path
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()   # key -> (expires_at, reply)
+        self._lock = threading.Lock()
+        self._db = LocalConnection(db_path) if db_path else None
+        if db_path:
+            self._db().execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                " key TEXT PRIMARY KEY, reply TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+
+    @classmethod
+    def from_env(cls):
+        """
+        Build a cache from RESPONSE_CACHE_SIZE (0 disables the memory tier),
+        RESPONSE_CACHE_TTL (seconds) and RESPONSE_CACHE_DB (SQLite path).
+        """
+        return cls(
+            max_entries=int(os.getenv("RESPONSE_CACHE_SIZE", "1024")),
+            ttl=float(os.getenv("RESPONSE_CACHE_TTL", "3600")),
+            db_path=os.getenv("RESPONSE_CACHE_DB") or None,
+        )
+
+    @staticmethod
+    def make_key(model_id: str, prompt: str, max_gen_len: int, temperature: float, top_p: float) -> str:
+        raw = json.dumps([model_id, prompt, max_gen_len, temperature, top_p], ensure_ascii=False)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0 or bool(self.db_path)
+
+    def get(self, key: str):
+        """
+        Return the cached reply for `key`, or None on a miss / expired entry.
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[1]
+                del self._entries[key]
+
+        if self.db_path:
+            row = self._db().execute(
+                "SELECT reply, expires_at FROM responses WHERE key = ? AND expires_at > ?", (key, now)
+            ).fetchone()
+            if row is not None:
+                self._remember(key, row[0], row[1])
+                with self._lock:
+                    self.hits += 1
+                    self.disk_hits += 1
+                return row[0]
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key: str, reply: str):
+        expires_at = time.time() + self.ttl
+        self._remember(key, reply, expires_at)
+        if self.db_path:
+            self._db().execute(
+                "INSERT OR REPLACE INTO responses (key, reply, expires_at) VALUES (?, ?, ?)",
+                (key, reply, expires_at),
+            )
+
+    def _remember(self, key, reply, expires_at):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (expires_at, reply)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def purge_expired(self):
+        """
+        Drop expired rows from the SQLite tier (memory entries expire lazily).
+        """
+        if self.db_path:
+            self._db().execute("DELETE FROM responses WHERE expires_at <= ?", (time.time(),))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.disk_hits = self.misses = 0
+        if self.db_path:
+            self._db().execute("DELETE FROM responses")
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+            }
@@ -0,0 +1,332 @@
+# retry_policy.py
+
+import asyncio
+import contextvars
+import os
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from botocore.exceptions import ClientError, ConnectionError, HTTPClientError
+from errors import ThrottlingError
+
+# Service-side error codes worth another attempt: the request itself was fine
+RETRYABLE_CODES = (
+    "InternalServerException",
+    "ServiceUnavailableException",
+    "ModelNotReadyException",
+    "ModelTimeoutException",
+)
+
+
+def aws_error_code(err: Exception) -> str:
+    """
+    The Bedrock error code behind `err` (following BedrockInvocationError.
+    original_exception and `raise ... from`), else the exception class name.
+    """
+    cause = getattr(err, "original_exception", None) or err.__cause__ or err
+    if isinstance(cause, ClientError):
+        return cause.response.get("Error", {}).get("Code", "ClientError")
+    return type(cause).__name__
+
+
+def is_retryable(err: Exception, retry_throttling: bool = False) -> bool:
+    """
+    True for transient failures: connection/timeouts and 5xx-style service
+    errors. Throttling is only retried when `retry_throttling` is set; by
+    default it is left to the concurrency limiter, which backs off globally.
+    """
+    if isinstance(err, ThrottlingError):
+        return retry_throttling
+    cause = getattr(err, "original_exception", None) or err.__cause__ or err
+    if isinstance(cause, (ConnectionError, HTTPClientError)):
+        return True
+    return isinstance(cause, ClientError) and aws_error_code(cause) in RETRYABLE_CODES
+
+
+class RetryBudget:
+    """
+    Caps retries and hedges at `ratio` of call volume. Every call deposits
+    `ratio` tokens and every extra attempt spends one; the balance starts at
+    and never exceeds `reserve`, so a quiet service can still retry a little
+    while an outage cannot multiply load by max_attempts.
+    """
+
+    def __init__(self, ratio: float = 0.1, reserve: float = 10.0):
+        self.ratio = ratio
+        self.reserve = reserve
+        self._balance = reserve
+        self._lock = threading.Lock()
+
+    def deposit(self):
+        with self._lock:
+            self._balance = min(self._balance + self.ratio, self.reserve)
+
+    def withdraw(self) -> bool:
+        with self._lock:
+            if self._balance < 1:
+                return False
+            self._balance -= 1
+            return True
+
+    @property
+    def balance(self) -> float:
+        return self._balance
+
+
+class LatencyTracker:
+    """
+    Sliding window of recent successful attempt latencies with cached
+    quantiles (re-sorted every `refresh` samples).
+    """
+
+    def __init__(self, window: int = 512, refresh: int = 32):
+        self.refresh = refresh
+        self._samples = deque(maxlen=window)
+        self._sorted = []
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._samples)
+
+    def add(self, seconds: float):
+        with self._lock:
+            self._samples.append(seconds)
+            self._pending += 1
+            if self._pending >= self.refresh or len(self._samples) < self.refresh:
+                self._sorted = sorted(self._samples)
+                self._pending = 0
+
+    def quantile(self, q: float):
+        ordered = self._sorted
+        if not ordered:
+            return None
+        return ordered[min(int(q * len(ordered)), len(ordered) - 1)]
+
+
+class RetryPolicy:
+    """
+    Runs one logical Bedrock call as one or more attempts.
+
+    Retries: a failed attempt that is_retryable() is retried up to
+    `max_attempts` in total, sleeping a random time in
+    [0, min(max_delay, base_delay * 2**n)] first ("full jitter"), as long as
+    the RetryBudget allows it.
+
+    Hedging (hedge=True): once `hedge_min_samples` latencies have been seen,
+    an attempt still running after the `hedge_quantile` latency gets a
+    duplicate; whichever finishes first wins. The blocking loser cannot be
+    interrupted, so its result is discarded; in acall() it is cancelled.
+    Hedges spend from the same budget as retries. The policy runs inside
+    the caller's concurrency-limiter slot, so a hedge is not counted as a
+    second call in flight: the retry budget and `hedge_threads` bound how
+    many extra Bedrock calls hedging can add.
+
+    stats() reports per-attempt counts, failures by error code and latency
+    quantiles.
+    """
+
+    def __init__(
+        self,
+        max_attempts: int = 3,
+        base_delay: float = 0.1,
+        max_delay: float = 2.0,
+        budget: RetryBudget = None,
+        retry_throttling: bool = False,
+        hedge: bool = False,
+        hedge_quantile: float = 0.95,
+        hedge_min_samples: int = 20,
+        hedge_threads: int = 128,
+        sleep=time.sleep,
+    ):
+        self.max_attempts = max(max_attempts, 1)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.budget = budget or RetryBudget()
+        self.retry_throttling = retry_throttling
+        self.hedge = hedge
+        self.hedge_quantile = hedge_quantile
+        self.hedge_min_samples = hedge_min_samples
+        self.hedge_threads = hedge_threads
+        self.latency = LatencyTracker()
+        self._sleep = sleep
+        self._executor = None
+        self._lock = threading.Lock()
+        self._counts = {
+            "calls": 0, "attempts": 0, "retries": 0, "hedges": 0,
+            "hedge_wins": 0, "budget_exhausted": 0,
+        }
+        self._failures = {}     # error code -> failed attempts
+
+    @classmethod
+    def from_env(cls):
+        """
+        Build a policy from BEDROCK_MAX_ATTEMPTS, BEDROCK_RETRY_BASE_DELAY,
+        BEDROCK_RETRY_MAX_DELAY, BEDROCK_RETRY_BUDGET (fraction of calls),
+        BEDROCK_RETRY_THROTTLING=1, BEDROCK_HEDGE=1 and BEDROCK_HEDGE_QUANTILE.
+        """
+        return cls(
+            max_attempts=int(os.getenv("BEDROCK_MAX_ATTEMPTS", "3")),
+            base_delay=float(os.getenv("BEDROCK_RETRY_BASE_DELAY", "0.1")),
+            max_delay=float(os.getenv("BEDROCK_RETRY_MAX_DELAY", "2")),
+            budget=RetryBudget(ratio=float(os.getenv("BEDROCK_RETRY_BUDGET", "0.1"))),
+            retry_throttling=os.getenv("BEDROCK_RETRY_THROTTLING") == "1",
+            hedge=os.getenv("BEDROCK_HEDGE") == "1",
+            hedge_quantile=float(os.getenv("BEDROCK_HEDGE_QUANTILE", "0.95")),
+        )
+
+    def _count(self, name: str):
+        with self._lock:
+            self._counts[name] += 1
+
+    def backoff(self, retry: int) -> float:
+        """
+        Full-jitter delay before retry number `retry` (0-based).
+        """
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** retry))
+
+    def hedge_delay(self):
+        """
+        Seconds after which an attempt is hedged, or None while hedging is
+        off or there are too few samples.
+        """
+        if not self.hedge or len(self.latency) < self.hedge_min_samples:
+            return None
+        return self.latency.quantile(self.hedge_quantile)
+
+    def _should_retry(self, err: Exception, attempt: int) -> bool:
+        if attempt + 1 >= self.max_attempts or not is_retryable(err, self.retry_throttling):
+            return False
+        if not self.budget.withdraw():
+            self._count("budget_exhausted")
+            return False
+        self._count("retries")
+        return True
+
+    def _timed(self, fn, record: bool = True):
+        self._count("attempts")
+        start = time.monotonic()
+        try:
+            result = fn()
+        except Exception as e:
+            code = aws_error_code(e)
+            with self._lock:
+                self._failures[code] = self._failures.get(code, 0) + 1
+            raise
+        if record:
+            self.latency.add(time.monotonic() - start)
+        return result
+
+    def call(self, fn, hedge: bool = True):
+        """
+        Return fn() under this policy; `fn` makes one attempt. Pass
+        hedge=False for calls that must not be duplicated (such as opening
+        a stream); their latency is also kept out of the hedge threshold.
+        """
+        self._count("calls")
+        self.budget.deposit()
+        attempt = 0
+        while True:
+            try:
+                if hedge and self.hedge_delay() is not None:
+                    return self._hedged(fn)
+                return self._timed(fn, record=hedge)
+            except Exception as e:
+                if not self._should_retry(e, attempt):
+                    raise
+            self._sleep(self.backoff(attempt))
+            attempt += 1
+
+    def _hedge_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=self.hedge_threads, thread_name_prefix="bedrock-hedge")
+        return self._executor
+
+    def _hedged(self, fn):
+        executor = self._hedge_executor()
+        # Each attempt runs in a copy of the caller's context so stage
+        # timings reach the request, as in BedrockClient.ainvoke()
+        first = executor.submit(contextvars.copy_context().run, self._timed, fn)
+        done, _ = wait([first], timeout=self.hedge_delay())
+        if done or not self.budget.withdraw():
+            return first.result()
+        self._count("hedges")
+        second = executor.submit(contextvars.copy_context().run, self._timed, fn)
+        pending, error = {first, second}, None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    if future is second:
+                        self._count("hedge_wins")
+                    return future.result()
+                error = future.exception()
+        raise error
+
+    async def acall(self, coro_fn, hedge: bool = True):
+        """
+        Coroutine version of call(); `coro_fn()` makes one attempt.
+        """
+        self._count("calls")
+        self.budget.deposit()
+        attempt = 0
+        while True:
+            try:
+                if hedge and self.hedge_delay() is not None:
+                    return await self._ahedged(coro_fn)
+                return await self._atimed(coro_fn)
+            except Exception as e:
+                if not self._should_retry(e, attempt):
+                    raise
+            await asyncio.sleep(self.backoff(attempt))
+            attempt += 1
+
+    async def _atimed(self, coro_fn):
+        self._count("attempts")
+        start = time.monotonic()
+        try:
+            result = await coro_fn()
+        except Exception as e:
+            code = aws_error_code(e)
+            with self._lock:
+                self._failures[code] = self._failures.get(code, 0) + 1
+            raise
+        self.latency.add(time.monotonic() - start)
+        return result
+
+    async def _ahedged(self, coro_fn):
+        first = asyncio.ensure_future(self._atimed(coro_fn))
+        done, _ = await asyncio.wait([first], timeout=self.hedge_delay())
+        if done or not self.budget.withdraw():
+            return await first
+        self._count("hedges")
+        second = asyncio.ensure_future(self._atimed(coro_fn))
+        pending, error = {first, second}, None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is second:
+                            self._count("hedge_wins")
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    def stats(self) -> dict:
+        p50, p95 = self.latency.quantile(0.5), self.latency.quantile(0.95)
+        with self._lock:
+            return {
+                **self._counts,
+                "failures": dict(self._failures),
+                "budget_balance": round(self.budget.balance, 2),
+                "latency_p50_ms": None if p50 is None else round(p50 * 1000, 1),
+                "latency_p95_ms": None if p95 is None else round(p95 * 1000, 1),
+            }
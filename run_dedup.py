@@ -0,0 +1,147 @@
+# run_dedup.py
+#
+# Near-duplicate clustering of a JSONL prompt log or document set, before
+# paying Bedrock for every copy in a bulk job.
+#
+#   python run_dedup.py prompts.jsonl --out clusters.jsonl [--unique unique.jsonl] [--embed]
+#
+# Input lines are a JSON string or an object whose text is in "text" or
+# "message" (or --field). Output lines are {"id", "line", "cluster",
+# "similarity"} in input order, where "cluster" is the line number of the
+# cluster's representative (its first line), or {"id", "line", "error"}.
+# --unique copies each representative's input line unchanged, giving a
+# deduplicated file that run_inference.py or run_embedding.py can consume.
+#
+# The input is streamed in batches; see near_dedup.py for what is kept in
+# memory per cluster.
+
+import argparse
+import json
+import sys
+import time
+from near_dedup import NearDuplicateIndex
+
+
+def read_records(source, field=None):
+    """
+    Yield (line_no, raw line, id, text or ValueError) for the non-blank
+    lines of a binary JSONL stream.
+    """
+    for line_no, line in enumerate(source):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+            if isinstance(record, str):
+                yield line_no, line, line_no, record
+                continue
+            if not isinstance(record, dict):
+                raise ValueError("expected a JSON string or object")
+            text = record.get(field) if field else record.get("text", record.get("message"))
+            if not isinstance(text, str):
+                raise ValueError(f"no text in {field or 'text or message'}")
+            yield line_no, line, record.get("id", line_no), text
+        except ValueError as ve:
+            yield line_no, line, line_no, ve
+
+
+def dedup_jsonl(index, source, out, unique=None, field=None, batch_size=10000,
+                progress_every=10.0, log=sys.stderr) -> dict:
+    """
+    Cluster every line of `source` (binary) with `index` (a
+    NearDuplicateIndex), writing one JSON line per input line to `out` and
+    representatives' lines to `unique` as each batch finishes. Returns the
+    index stats plus "errors", "seconds" and "lines_per_s".
+    """
+    started = last_report = time.monotonic()
+    errors = 0
+    batch = []
+
+    def flush():
+        nonlocal errors
+        good = [item for item in batch if not isinstance(item[3], ValueError)]
+        clusters = iter(index.add_many([item[3] for item in good], positions=[item[0] for item in good]))
+        for line_no, line, record_id, text in batch:
+            if isinstance(text, ValueError):
+                errors += 1
+                out.write(json.dumps({"id": record_id, "line": line_no, "error": f"Invalid input: {text}"}) + "\n")
+                continue
+            cluster, similarity = next(clusters)
+            out.write(json.dumps({"id": record_id, "line": line_no, "cluster": cluster,
+                                  "similarity": round(similarity, 4)}) + "\n")
+            if unique is not None and cluster == line_no:
+                unique.write(line if line.endswith(b"\n") else line + b"\n")
+        batch.clear()
+
+    def report():
+        stats = index.stats()
+        elapsed = max(time.monotonic() - started, 1e-9)
+        print(f"{stats['lines']} lines, {stats['clusters']} clusters, {stats['duplicates']} duplicates, "
+              f"{stats['lines'] / elapsed:.0f} lines/s", file=log, flush=True)
+
+    for item in read_records(source, field):
+        batch.append(item)
+        if len(batch) >= batch_size:
+            flush()
+            if progress_every and time.monotonic() - last_report >= progress_every:
+                report()
+                last_report = time.monotonic()
+    if batch:
+        flush()
+    out.flush()
+    if unique is not None:
+        unique.flush()
+    elapsed = time.monotonic() - started
+    stats = index.stats()
+    return {**stats, "errors": errors, "seconds": round(elapsed, 3),
+            "lines_per_s": round(stats["lines"] / elapsed, 1) if elapsed > 0 else None}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cluster near-duplicate lines of a JSONL prompt or document file.")
+    parser.add_argument("input", help="JSONL: a string or an object with \"text\" or \"message\" per line ('-' for stdin)")
+    parser.add_argument("--out", default="-", help="JSONL cluster assignments (default: stdout)")
+    parser.add_argument("--unique", metavar="PATH", help="write each cluster representative's input line here")
+    parser.add_argument("--field", help="object field holding the text")
+    parser.add_argument("--threshold", type=float, default=0.7, help="min estimated Jaccard similarity of duplicates")
+    parser.add_argument("--embed-threshold", type=float, default=0.4,
+                        help="with --embed, min Jaccard similarity of pairs confirmed by embeddings")
+    parser.add_argument("--num-perm", type=int, default=128, help="MinHash permutations")
+    parser.add_argument("--shingle", type=int, default=5, help="shingle size in bytes")
+    parser.add_argument("--embed", action="store_true", help="also accept less similar pairs whose Titan embeddings match")
+    parser.add_argument("--min-cosine", type=float, default=0.95, help="with --embed, min cosine similarity")
+    parser.add_argument("--dimensions", type=int, default=512)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--batch-size", type=int, default=10000)
+    parser.add_argument("--progress-every", type=float, default=10.0, help="seconds between progress lines")
+    args = parser.parse_args()
+
+    embed_client = None
+    if args.embed:
+        from client_pool import get_embed_client
+        embed_client = get_embed_client()
+    try:
+        index = NearDuplicateIndex(
+            threshold=args.threshold, embed_threshold=args.embed_threshold,
+            num_perm=args.num_perm, shingle=args.shingle, embed_client=embed_client,
+            min_cosine=args.min_cosine, dimensions=args.dimensions, concurrency=args.concurrency,
+        )
+    except ValueError as ve:
+        print(f"[Error] {ve}")
+        sys.exit(1)
+
+    source = sys.stdin.buffer if args.input == "-" else open(args.input, "rb")
+    out = sys.stdout if args.out == "-" else open(args.out, "w", encoding="utf-8")
+    unique = open(args.unique, "wb") if args.unique else None
+    try:
+        stats = dedup_jsonl(index, source, out, unique, field=args.field, batch_size=args.batch_size,
+                            progress_every=args.progress_every)
+    finally:
+        for f in (source, out, unique):
+            if f not in (None, sys.stdin.buffer, sys.stdout):
+                f.close()
+    print(json.dumps(stats), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
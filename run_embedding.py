@@ -1,17 +1,152 @@
 # run_embedding.py
 
+import argparse
+import json
+import os
 import sys
-from embed_client import EmbedClient
+from client_pool import get_embed_client
+from embedding_cache import EmbeddingCache
+from quantized_store import QUANTIZATIONS, QuantizedVectorStore, is_quantized_index
+from vector_store import VectorStore
+
+def read_texts(stream):
+    """
+    Yield (id, text) from JSONL lines. Each line is either a JSON string or
+    an object with a "text" field and an optional "id" (defaults to the
+    line number).
+    """
+    for line_no, line in enumerate(stream):
+        line = line.strip()
+        if not line:
+            continue
+        record = json.loads(line)
+        if isinstance(record, str):
+            yield line_no, record
+        else:
+            yield record.get("id", line_no), record["text"]
+
+def embed_jsonl(client, source, out, batch_size=256, concurrency=8, dimensions=512, store=None):
+    """
+    Stream texts from `source`, embed them `batch_size` at a time and write one
+    JSON line per input to `out` as soon as its batch finishes:
+      {"id": ..., "embedding": [...]}   or   {"id": ..., "error": "..."}
+    If `store` (a VectorStore) is given, embedded texts are also added to it;
+    `out` may then be None. Returns (embedded, failed) counts.
+    """
+    embedded = failed = 0
+    batch = []
+
+    def flush():
+        nonlocal embedded, failed
+        result = client.embed_many([text for _, text in batch], concurrency=concurrency, dimensions=dimensions)
+        good = [i for i in range(len(batch)) if i not in result.errors]
+        failed += len(result.errors)
+        embedded += len(good)
+        if store is not None:
+            store.add([batch[i][0] for i in good], result.vectors[good], [batch[i][1] for i in good])
+        if out is not None:
+            for i, (record_id, _) in enumerate(batch):
+                if i in result.errors:
+                    out.write(json.dumps({"id": record_id, "error": result.errors[i]}) + "\n")
+                else:
+                    out.write(json.dumps({"id": record_id, "embedding": result.vectors[i].tolist()}) + "\n")
+            out.flush()
+        batch.clear()
+
+    for item in read_texts(source):
+        batch.append(item)
+        if len(batch) >= batch_size:
+            flush()
+    if batch:
+        flush()
+    return embedded, failed
 
 def main():
-    if len(sys.argv) < 2:
+    parser = argparse.ArgumentParser(description="Embed text with Titan Embed Text v2.")
+    parser.add_argument("text", nargs="?", help="single text to embed")
+    parser.add_argument("--jsonl", metavar="PATH", help="embed every line of a JSONL file ('-' for stdin)")
+    parser.add_argument("--out", metavar="PATH", help="write JSONL vectors here (default: stdout)")
+    parser.add_argument("--batch-size", type=int, default=256)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--dimensions", type=int, default=512)
+    parser.add_argument("--cache-dir", metavar="PATH", help="persistent embedding cache (default: $EMBED_CACHE_DIR)")
+    parser.add_argument("--cache-stats", action="store_true", help="print embedding cache statistics and exit")
+    parser.add_argument("--index", metavar="DIR", help="add embedded texts to the vector store in DIR (used by RAG_INDEX_PATH)")
+    parser.add_argument("--ivf-lists", type=int, default=0, help="partition the --index store into this many IVF clusters")
+    parser.add_argument("--quantize", choices=QUANTIZATIONS, help="store --index vectors as int8 or binary codes")
+    parser.add_argument("--no-originals", action="store_true",
+                        help="with --quantize, drop the float32 vectors used to rescore candidates")
+    args = parser.parse_args()
+
+    if args.cache_dir:
+        os.environ["EMBED_CACHE_DIR"] = args.cache_dir
+    if args.cache_stats:
+        cache = EmbeddingCache.from_env()
+        if cache is None:
+            print("[Error] No cache directory: pass --cache-dir or set EMBED_CACHE_DIR")
+            sys.exit(1)
+        print(json.dumps(cache.stats(), indent=2))
+        return
+
+    if not args.text and not args.jsonl:
         print("Usage: python run_embedding.py \"Your text here\"")
+        print("       python run_embedding.py --jsonl texts.jsonl [--out vectors.jsonl]")
         sys.exit(1)
 
-    text_to_embed = sys.argv[1]
-    client = EmbedClient()
+    client = get_embed_client()
+
+    if args.jsonl:
+        source = sys.stdin if args.jsonl == "-" else open(args.jsonl, encoding="utf-8")
+        if args.out:
+            out = open(args.out, "w", encoding="utf-8")
+        else:
+            out = None if args.index else sys.stdout
+        store = None
+        if args.index and args.quantize:
+            if args.ivf_lists:
+                print("[Error] --ivf-lists cannot be combined with --quantize")
+                sys.exit(1)
+            if is_quantized_index(args.index):
+                store = QuantizedVectorStore.load(args.index)
+            elif os.path.exists(os.path.join(args.index, "meta.json")):
+                # Convert an existing float32 index, then add to it
+                store = QuantizedVectorStore.from_vector_store(
+                    VectorStore.load(args.index), args.quantize, keep_originals=not args.no_originals,
+                )
+            else:
+                store = QuantizedVectorStore(args.dimensions, args.quantize, keep_originals=not args.no_originals)
+        elif args.index:
+            if is_quantized_index(args.index):
+                print("[Error] The --index store is quantized; pass --quantize to add to it")
+                sys.exit(1)
+            if os.path.exists(os.path.join(args.index, "meta.json")):
+                store = VectorStore.load(args.index)
+            else:
+                store = VectorStore(args.dimensions)
+        try:
+            embedded, failed = embed_jsonl(
+                client, source, out,
+                batch_size=args.batch_size,
+                concurrency=args.concurrency,
+                dimensions=args.dimensions,
+                store=store,
+            )
+        finally:
+            if source is not sys.stdin:
+                source.close()
+            if out not in (None, sys.stdout):
+                out.close()
+        if store is not None:
+            if args.ivf_lists:
+                store.build_ivf(args.ivf_lists)
+            store.save(args.index)
+            print(f"Vector store at {args.index} holds {len(store)} documents", file=sys.stderr)
+        print(f"Embedded {embedded} texts, {failed} failed", file=sys.stderr)
+        return
+
+    text_to_embed = args.text
     try:
-        vector = client.embed_text(text_to_embed)
+        vector = client.embed_text(text_to_embed, dimensions=args.dimensions)
     except Exception as e:
         print(f"[Error] {e}")
         sys.exit(1)
@@ -0,0 +1,289 @@
+# run_inference.py
+#
+# Offline bulk inference: run every prompt of a JSONL file through the
+# shared BedrockClient and write one JSON line per prompt.
+#
+#   python run_inference.py prompts.jsonl --out replies.jsonl [--concurrency 8] [--rate 5]
+#
+# Input lines are a JSON string or an object with "message" and optional
+# "id", max_gen_len, temperature and top_p (as for /chat/batch). Output
+# lines are {"id", "line", "reply"} or {"id", "line", "error"}, in
+# completion order. Prompts are built with the same
+# prompt_utils.build_prompt_single_turn as /chat's single-turn prompts
+# (with retrieved passages when RAG_INDEX_PATH is set), and like /chat,
+# prompts without their own max_gen_len get the generation policy's cap
+# and replies are cut at invented turns.
+#
+# The input is read line by line and progress is checkpointed to
+# <out>.ckpt. Re-running the same command after a crash or Ctrl-C resumes
+# where it stopped: output written after the last checkpoint is truncated
+# and those prompts are redone, so every prompt appears exactly once.
+
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from client_pool import get_bedrock_client
+from errors import BedrockInvocationError, ConfigurationError, ThrottlingError
+from generation_policy import GenerationPolicy
+from prompt_utils import build_prompt_single_turn, read_batch_item
+from rate_limit import TokenBucket
+from token_budget import TokenBudget
+from vector_store import Retriever
+
+# Built from the same settings as app.py's, so prompts and generation caps
+# match /chat without importing the web app (Flask, caches, session store)
+generation_policy = GenerationPolicy.from_env()
+prompt_budget = TokenBudget.from_env()
+retriever = Retriever.from_env()
+
+
+class Progress:
+    """
+    Which input lines are finished, in O(concurrency) memory: every line
+    below `watermark` is done, plus the lines in `done` above it (results
+    arrive out of order, but never more than the in-flight window ahead).
+    `input_offset` is the byte offset of the watermark line and
+    `output_offset` the output size matching this state.
+    """
+
+    def __init__(self, watermark=0, input_offset=0, done=(), output_offset=0, written=0, failed=0):
+        self.watermark = watermark
+        self.input_offset = input_offset
+        self.done = set(done)
+        self.output_offset = output_offset
+        self.written = written
+        self.failed = failed
+
+    def is_done(self, line_no: int) -> bool:
+        return line_no < self.watermark or line_no in self.done
+
+    def mark(self, line_no: int, offsets: dict):
+        """
+        Record `line_no` as finished; `offsets` maps line numbers from the
+        watermark up to the next unread line to their input byte offsets,
+        and is pruned as the watermark passes.
+        """
+        self.done.add(line_no)
+        while self.watermark in self.done:
+            self.done.discard(self.watermark)
+            offsets.pop(self.watermark, None)
+            self.watermark += 1
+        self.input_offset = offsets[self.watermark]
+
+    def save(self, path: str):
+        state = {
+            "watermark": self.watermark,
+            "input_offset": self.input_offset,
+            "done": sorted(self.done),
+            "output_offset": self.output_offset,
+            "written": self.written,
+            "failed": self.failed,
+        }
+        tmp = path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(state, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str):
+        if not os.path.exists(path):
+            return cls()
+        with open(path, encoding="utf-8") as f:
+            return cls(**json.load(f))
+
+
+def read_prompts(source, progress: Progress, offsets: dict):
+    """
+    Yield (line_no, record) for unfinished lines of a binary file, starting
+    at the checkpointed offset. Records each line's offset (and the next
+    one's) in `offsets` and marks blank and already finished lines done
+    straight away. Malformed lines yield the ValueError as the record.
+    """
+    source.seek(progress.input_offset)
+    line_no = progress.watermark
+    while True:
+        offset = source.tell()
+        line = source.readline()
+        if not line:
+            return
+        offsets[line_no] = offset
+        offsets[line_no + 1] = source.tell()
+        if not line.strip() or progress.is_done(line_no):
+            progress.mark(line_no, offsets)
+        else:
+            try:
+                record = json.loads(line)
+            except ValueError as ve:
+                record = ve
+            yield line_no, record
+        line_no += 1
+
+
+def run_one(bedrock, line_no: int, record, throttle_retries: int) -> dict:
+    """
+    One output line. Throttled prompts are retried with exponential backoff
+    before being reported, since a bulk run prefers slower to lossy.
+    """
+    record_id = record.get("id", line_no) if isinstance(record, dict) else line_no
+    try:
+        if isinstance(record, ValueError):
+            raise record
+        user_input, params = read_batch_item(record)
+    except ValueError as ve:
+        return {"id": record_id, "line": line_no, "error": f"Invalid input: {ve}"}
+    passages = retriever.retrieve(user_input) if retriever is not None else None
+    prompt_text = build_prompt_single_turn(user_input, passages, prompt_budget)
+    policy = generation_policy
+    if policy is not None and not (isinstance(record, dict) and "max_gen_len" in record):
+        params["max_gen_len"] = policy.max_gen_len(user_input)
+    for attempt in range(throttle_retries + 1):
+        try:
+            generated = bedrock.invoke(prompt_text, **params)
+            reply = policy.finish(generated, params["max_gen_len"])[0] if policy is not None else generated
+            reply = reply or generated
+            return {"id": record_id, "line": line_no, "reply": reply}
+        except ThrottlingError as te:
+            if attempt == throttle_retries:
+                return {"id": record_id, "line": line_no, "error": f"Llama invocation throttled: {te}"}
+            time.sleep(min(30.0, 0.5 * 2 ** attempt))
+        except BedrockInvocationError as be:
+            return {"id": record_id, "line": line_no, "error": f"Llama invocation failed: {be}"}
+
+
+def format_eta(seconds: float) -> str:
+    seconds = int(seconds)
+    return f"{seconds // 3600}:{seconds // 60 % 60:02d}:{seconds % 60:02d}"
+
+
+def run(bedrock, input_path, out_path, checkpoint_path, concurrency=8, rate=0.0,
+        throttle_retries=5, checkpoint_every=5.0, progress_every=10.0, log=sys.stderr) -> Progress:
+    """
+    Process every unfinished line of `input_path`, appending to `out_path`
+    and checkpointing to `checkpoint_path`. Returns the final Progress;
+    KeyboardInterrupt stops new work, lets in-flight prompts finish and
+    checkpoints before re-raising.
+    """
+    progress = Progress.load(checkpoint_path)
+    bucket = TokenBucket(rate)
+    total_bytes = os.path.getsize(input_path)
+    offsets = {}        # line -> input offset, for lines not yet below the watermark
+    started = time.monotonic()
+    start_offset = progress.input_offset
+    start_written = progress.written
+    last_checkpoint = last_report = started
+
+    def report(final=False):
+        elapsed = max(time.monotonic() - started, 1e-9)
+        done_bytes = progress.input_offset - start_offset
+        per_second = (progress.written - start_written) / elapsed
+        if done_bytes > 0 and not final:
+            eta = format_eta((total_bytes - progress.input_offset) * elapsed / done_bytes)
+        else:
+            eta = "-"
+        percent = 100.0 * progress.input_offset / total_bytes if total_bytes else 100.0
+        print(f"[{percent:5.1f}%] {progress.written} done, {progress.failed} failed, "
+              f"{per_second:.1f}/s, ETA {eta}", file=log, flush=True)
+
+    with open(input_path, "rb") as source, open(out_path, "a+b") as out:
+        # Drop results written after the last checkpoint; they are redone
+        out.truncate(progress.output_offset)
+        out.seek(progress.output_offset)
+        pool = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="bulk-inference")
+        pending = {}
+        prompts = read_prompts(source, progress, offsets)
+        exhausted = False
+        try:
+            while True:
+                while not exhausted and len(pending) < concurrency:
+                    item = next(prompts, None)
+                    if item is None:
+                        exhausted = True
+                        break
+                    line_no, record = item
+                    bucket.acquire()
+                    pending[pool.submit(run_one, bedrock, line_no, record, throttle_retries)] = line_no
+                if not pending:
+                    break
+                finished, _ = wait(pending, timeout=1.0, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    line_no = pending.pop(future)
+                    result = future.result()
+                    out.write((json.dumps(result) + "\n").encode("utf-8"))
+                    progress.written += 1
+                    progress.failed += "error" in result
+                    progress.mark(line_no, offsets)
+                now = time.monotonic()
+                if now - last_checkpoint >= checkpoint_every:
+                    out.flush()
+                    progress.output_offset = out.tell()
+                    progress.save(checkpoint_path)
+                    last_checkpoint = now
+                if progress_every and now - last_report >= progress_every:
+                    report()
+                    last_report = now
+        except KeyboardInterrupt:
+            print("Interrupted: finishing in-flight prompts, then saving progress...", file=log, flush=True)
+            for future, line_no in pending.items():
+                result = future.result()
+                out.write((json.dumps(result) + "\n").encode("utf-8"))
+                progress.written += 1
+                progress.failed += "error" in result
+                progress.mark(line_no, offsets)
+            raise
+        finally:
+            pool.shutdown(wait=False, cancel_futures=True)
+            out.flush()
+            os.fsync(out.fileno())
+            progress.output_offset = out.tell()
+            progress.save(checkpoint_path)
+    report(final=True)
+    return progress
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a JSONL file of prompts through Llama on Bedrock.")
+    parser.add_argument("input", help="JSONL prompts: a string or {\"message\", \"id\", ...} per line")
+    parser.add_argument("--out", required=True, help="JSONL results, appended to across resumed runs")
+    parser.add_argument("--checkpoint", help="progress file (default: <out>.ckpt)")
+    parser.add_argument("--concurrency", type=int, default=8, help="prompts in flight")
+    parser.add_argument("--rate", type=float, default=0.0, help="max prompts started per second (0 = no limit)")
+    parser.add_argument("--throttle-retries", type=int, default=5)
+    parser.add_argument("--checkpoint-every", type=float, default=5.0, help="seconds between checkpoints")
+    parser.add_argument("--progress-every", type=float, default=10.0, help="seconds between progress lines")
+    parser.add_argument("--restart", action="store_true", help="ignore and replace an existing checkpoint and output")
+    args = parser.parse_args()
+
+    checkpoint = args.checkpoint or args.out + ".ckpt"
+    if args.restart:
+        for path in (checkpoint, args.out):
+            if os.path.exists(path):
+                os.remove(path)
+    elif os.path.exists(args.out) and not os.path.exists(checkpoint) and os.path.getsize(args.out):
+        print(f"[Error] {args.out} exists without a checkpoint; pass --restart to overwrite it")
+        sys.exit(1)
+
+    try:
+        bedrock = get_bedrock_client()
+    except ConfigurationError as ce:
+        print(f"[Configuration Error] {ce}")
+        sys.exit(1)
+
+    try:
+        progress = run(
+            bedrock, args.input, args.out, checkpoint,
+            concurrency=args.concurrency, rate=args.rate, throttle_retries=args.throttle_retries,
+            checkpoint_every=args.checkpoint_every, progress_every=args.progress_every,
+        )
+    except KeyboardInterrupt:
+        print("Progress saved; re-run the same command to resume.", file=sys.stderr)
+        sys.exit(130)
+    print(f"Wrote {progress.written} results to {args.out}, {progress.failed} failed", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,206 @@
+# semantic_cache.py
+
+import os
+import threading
+from errors import ConfigurationError
+from lazy_import import lazy_module
+from vector_store import nearest_centroids, spherical_kmeans
+
+# numpy is imported when the first vector is handled, not at startup
+np = lazy_module("numpy")
+
+
+class SemanticCache:
+    """
+    Reply cache that matches paraphrases instead of exact prompts.
+
+    Each answered message is embedded (Titan, normalized) and stored as a
+    float32 row; a lookup is a cosine top-1 over the stored messages, and
+    the stored reply is returned if the best score reaches `threshold`.
+    Once `capacity` entries are stored, new ones overwrite the oldest
+    (ring buffer).
+
+    Below `ivf_min_entries` entries the rows form one preallocated matrix
+    and a lookup scans them all with one matrix-vector product. When the
+    cache reaches that size it is partitioned into `nlist` clusters
+    (spherical k-means, as in VectorStore.build_ivf) and each cluster keeps
+    its rows in its own contiguous block; a lookup scores the centroids and
+    then only the blocks of the `nprobe` closest clusters, so its cost
+    stays flat as the cache grows to 100k entries. New entries go to their
+    nearest centroid, and an overwritten entry leaves its block by swapping
+    in the block's last row. A paraphrase close enough to reach `threshold`
+    almost always falls in the same cluster as the stored message, so the
+    approximate search loses next to no hits.
+
+    Scoring runs outside the lock, so lookups and inserts do not queue
+    behind each other.
+    """
+
+    def __init__(self, embed_fn, threshold: float = 0.95, capacity: int = 10000,
+                 nlist: int = None, nprobe: int = 8, ivf_min_entries: int = 4096):
+        self.embed_fn = embed_fn
+        self.threshold = threshold
+        self.capacity = capacity
+        # About 2 * sqrt(capacity) clusters balances scoring the centroids
+        # against scanning the probed blocks
+        self.nlist = nlist or max(1, int(2 * capacity ** 0.5))
+        self.nprobe = min(nprobe, self.nlist)
+        self.ivf_min_entries = ivf_min_entries
+        self.hits = 0
+        self.misses = 0
+        self._matrix = None      # (capacity, dim) float32, allocated on first add; None once partitioned
+        self._replies = [None] * capacity
+        self._count = 0          # entries in use
+        self._next = 0           # entry the next add() overwrites
+        self._centroids = None   # (nlist, dim) once partitioned
+        self._partitioning = False
+        self._assign = None      # entry -> cluster
+        self._slot = None        # entry -> position in its cluster's block
+        self._blocks = []        # cluster -> (rows, dim) vectors, grown by doubling
+        self._block_entries = [] # cluster -> entry stored at each position
+        self._block_sizes = []   # cluster -> positions in use
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls):
+        """
+        Opt-in via SEMANTIC_CACHE=1. Tunables: SEMANTIC_CACHE_THRESHOLD,
+        SEMANTIC_CACHE_SIZE and SEMANTIC_CACHE_DIMENSIONS (256/512/1024).
+        Returns None when disabled.
+        """
+        if os.getenv("SEMANTIC_CACHE", "0").lower() not in ("1", "true", "yes"):
+            return None
+        from client_pool import get_embed_client
+        dimensions = int(os.getenv("SEMANTIC_CACHE_DIMENSIONS", "256"))
+        return cls(
+            embed_fn=lambda text: get_embed_client().embed_text(text, dimensions=dimensions),
+            threshold=float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.95")),
+            capacity=int(os.getenv("SEMANTIC_CACHE_SIZE", "10000")),
+        )
+
+    def __len__(self):
+        return self._count
+
+    def embed(self, text: str):
+        """
+        Embed `text` as a unit-length float32 vector. Returns None if the
+        embedding call fails, so callers can fall through to Bedrock.
+        """
+        try:
+            vector = np.asarray(self.embed_fn(text), dtype=np.float32)
+        except (RuntimeError, ConfigurationError):
+            return None
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
+
+    def lookup(self, vector):
+        """
+        Return the reply stored for the nearest message if its cosine
+        similarity to `vector` is at least `threshold`, else None.
+        """
+        with self._lock:
+            if self._centroids is None:
+                parts = [(self._matrix, None, self._count)] if self._count else []
+            else:
+                probe = np.argpartition(-(self._centroids @ vector), self.nprobe - 1)[:self.nprobe]
+                parts = [(self._blocks[c], self._block_entries[c], self._block_sizes[c]) for c in probe.tolist()]
+        # Entries are overwritten (and blocks reordered) in place, so a row
+        # may change under the scan; the winner is checked again under the lock
+        best, best_score = None, -np.inf
+        for vectors, entries, size in parts:
+            if not size:
+                continue
+            scores = vectors[:size] @ vector
+            i = int(np.argmax(scores))
+            if scores[i] > best_score:
+                best, best_score = (i if entries is None else int(entries[i])), scores[i]
+        with self._lock:
+            if best is not None and best < self._count and float(self._vector_locked(best) @ vector) >= self.threshold:
+                self.hits += 1
+                return self._replies[best]
+            self.misses += 1
+            return None
+
+    def add(self, vector, reply: str):
+        sample = None
+        with self._lock:
+            entry = self._next
+            if self._centroids is not None:
+                if entry < self._count:
+                    self._remove_locked(entry)
+                self._insert_locked(entry, int(np.argmax(self._centroids @ vector)), vector)
+            else:
+                if self._matrix is None:
+                    self._matrix = np.zeros((self.capacity, vector.shape[0]), dtype=np.float32)
+                self._matrix[entry] = vector
+            self._replies[entry] = reply
+            self._next = (entry + 1) % self.capacity
+            self._count = min(self._count + 1, self.capacity)
+            if (self._centroids is None and not self._partitioning
+                    and self._count >= max(self.ivf_min_entries, self.nlist)):
+                self._partitioning = True
+                sample = self._matrix[:self._count].copy()
+        if sample is not None:
+            # Train the centroids (a few hundred ms, once) without holding
+            # up lookups; only the assignment of rows takes the lock
+            centroids = spherical_kmeans(sample, self.nlist)
+            with self._lock:
+                self._partition_locked(centroids)
+
+    def _vector_locked(self, entry: int):
+        if self._centroids is None:
+            return self._matrix[entry]
+        return self._blocks[self._assign[entry]][self._slot[entry]]
+
+    def _partition_locked(self, centroids):
+        # Once, when the cache first reaches ivf_min_entries entries; the
+        # flat matrix is then replaced by the per-cluster blocks
+        vectors = self._matrix[:self._count]
+        self._centroids = centroids
+        labels = nearest_centroids(vectors, centroids)
+        self._assign = np.zeros(self.capacity, dtype=np.int32)
+        self._slot = np.zeros(self.capacity, dtype=np.int32)
+        dimensions = vectors.shape[1]
+        self._blocks, self._block_entries, self._block_sizes = [], [], []
+        for cluster in range(self.nlist):
+            members = np.flatnonzero(labels == cluster)
+            room = max(16, 2 * members.size)
+            block = np.zeros((room, dimensions), dtype=np.float32)
+            block[:members.size] = vectors[members]
+            entries = np.zeros(room, dtype=np.int32)
+            entries[:members.size] = members
+            self._blocks.append(block)
+            self._block_entries.append(entries)
+            self._block_sizes.append(members.size)
+            self._assign[members] = cluster
+            self._slot[members] = np.arange(members.size)
+        self._matrix = None
+
+    def _insert_locked(self, entry: int, cluster: int, vector):
+        size = self._block_sizes[cluster]
+        if size == self._blocks[cluster].shape[0]:
+            # Grow into new arrays: lookups may still be scanning the old ones
+            block = np.zeros((2 * size, self._blocks[cluster].shape[1]), dtype=np.float32)
+            block[:size] = self._blocks[cluster]
+            entries = np.zeros(2 * size, dtype=np.int32)
+            entries[:size] = self._block_entries[cluster]
+            self._blocks[cluster], self._block_entries[cluster] = block, entries
+        self._blocks[cluster][size] = vector
+        self._block_entries[cluster][size] = entry
+        self._block_sizes[cluster] = size + 1
+        self._assign[entry] = cluster
+        self._slot[entry] = size
+
+    def _remove_locked(self, entry: int):
+        cluster, slot = int(self._assign[entry]), int(self._slot[entry])
+        last = self._block_sizes[cluster] - 1
+        if slot != last:
+            moved = int(self._block_entries[cluster][last])
+            self._blocks[cluster][slot] = self._blocks[cluster][last]
+            self._block_entries[cluster][slot] = moved
+            self._slot[moved] = slot
+        self._block_sizes[cluster] = last
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"entries": self._count, "hits": self.hits, "misses": self.misses}
@@ -0,0 +1,517 @@
+# session_store.py
+
+import json
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from memory import Memory
+from sqlite_local import LocalConnection
+from token_budget import estimate_tokens
+
+# Prompt prefix for each Turn.role
+ROLE_PREFIXES = ("User:", "Assistant:")
+USER, ASSISTANT = 0, 1
+
+# Approximate bytes held per Turn record and per Session beyond their text,
+# used for the global memory cap (measured with benchmarks/bench_sessions.py)
+TURN_OVERHEAD = 72
+SESSION_OVERHEAD = 330
+
+
+class Turn:
+    """
+    One message of a conversation. The text itself lives in the owning
+    session's `history` string; a turn only records its role, the length
+    of its rendered "User: ..." / "Assistant: ..." line and that line's
+    estimated token count, computed once when the turn is added.
+    """
+    __slots__ = ("role", "size", "tokens")
+
+    def __init__(self, role: int, size: int, tokens: int):
+        self.role = role
+        self.size = size
+        self.tokens = tokens
+
+
+class Session:
+    """
+    Up to `max_turns` recent turns of one conversation, a rolling summary
+    of older turns, and its Memory slots.
+
+    `history` is the rendered prompt block for the stored turns, one line
+    per turn. add() appends the new line and cuts the oldest off the front,
+    so building the next prompt never re-formats earlier turns, and keeps
+    a running token total so recent_history() only walks the turns it
+    returns. Turns are numbered from `first_seq` (the oldest stored turn)
+    so a background summary can say which turns it replaces.
+    """
+    __slots__ = (
+        "session_id", "max_turns", "turns", "history", "tokens", "first_seq",
+        "summary", "memory", "last_seen",
+    )
+
+    def __init__(self, session_id: str, max_turns: int = 50):
+        self.session_id = session_id
+        self.max_turns = max_turns
+        self.turns = deque()
+        self.history = ""
+        self.tokens = 0         # estimated tokens of `history`
+        self.first_seq = 0
+        self.summary = ""
+        self.memory = None      # Memory, created once a slot is found
+        self.last_seen = time.time()
+
+    def add(self, role: int, text: str):
+        line = f"{ROLE_PREFIXES[role]} {text}"
+        self.history = f"{self.history}\n{line}" if self.history else line
+        turn = Turn(role, len(line), estimate_tokens(line))
+        self.turns.append(turn)
+        self.tokens += turn.tokens
+        while len(self.turns) > self.max_turns:
+            self._drop_oldest()
+
+    def _drop_oldest(self):
+        dropped = self.turns.popleft()
+        self.history = self.history[dropped.size + 1:]
+        self.tokens -= dropped.tokens
+        self.first_seq += 1
+
+    def remember(self, user_text: str):
+        """
+        Store any "My name is ..." / "My favorite color is ..." slots.
+        """
+        memory = self.memory or Memory()
+        memory.parse_and_store(user_text)
+        if memory.slots:
+            self.memory = memory
+
+    def recent_history(self, max_tokens: int) -> str:
+        """
+        The rendered lines of the most recent turns whose estimated tokens
+        (plus one per line break) fit in `max_tokens`.
+        """
+        used = chars = 0
+        for turn in reversed(self.turns):
+            if used + turn.tokens + 1 > max_tokens:
+                break
+            used += turn.tokens + 1
+            chars += turn.size + 1
+        return self.history[len(self.history) - chars + 1:] if chars else ""
+
+    def compactable(self, keep_tokens: int):
+        """
+        The oldest turns to fold into the summary so that at most
+        `keep_tokens` of history remain, as (end_seq, transcript), or None
+        when the history is already small enough.
+        """
+        excess = self.tokens - keep_tokens
+        if excess <= 0:
+            return None
+        count = chars = tokens = 0
+        for turn in self.turns:
+            if tokens >= excess:
+                break
+            count += 1
+            chars += turn.size + 1
+            tokens += turn.tokens
+        return self.first_seq + count, self.history[:chars - 1]
+
+    def apply_summary(self, end_seq: int, summary: str):
+        """
+        Replace the summary and drop the turns it covers (those numbered
+        below `end_seq` that are still stored).
+        """
+        while self.turns and self.first_seq < end_seq:
+            self._drop_oldest()
+        self.summary = summary
+
+    def _texts(self):
+        start = 0
+        for turn in self.turns:
+            prefix_len = len(ROLE_PREFIXES[turn.role]) + 1
+            yield turn.role, self.history[start + prefix_len:start + turn.size]
+            start += turn.size + 1
+
+    def messages(self) -> list:
+        """
+        [(role, text), ...] oldest first, with role "user" or "assistant".
+        """
+        return [("user" if role == USER else "assistant", text) for role, text in self._texts()]
+
+    def snapshot(self):
+        """
+        A copy that later add() / apply_summary() / remember() calls on this
+        session do not touch, for building a prompt outside the store's lock.
+        Turn records are never modified, so only the deque is copied.
+        """
+        copy = Session(self.session_id, self.max_turns)
+        copy.turns = self.turns.copy()
+        copy.history = self.history
+        copy.tokens = self.tokens
+        copy.first_seq = self.first_seq
+        copy.summary = self.summary
+        if self.memory is not None:
+            copy.memory = Memory(self.memory.extractor)
+            copy.memory.update(self.memory.slots)
+        copy.last_seen = self.last_seen
+        return copy
+
+    def nbytes(self) -> int:
+        size = SESSION_OVERHEAD + sys.getsizeof(self.history) + TURN_OVERHEAD * len(self.turns)
+        if self.summary:
+            size += sys.getsizeof(self.summary)
+        if self.memory is not None:
+            size += sum(sys.getsizeof(k) + sys.getsizeof(v) for k, v in self.memory.slots.items())
+        return size
+
+    def to_json(self) -> str:
+        # Token counts are stored with the turns so from_json() need not
+        # re-estimate them
+        return json.dumps({
+            "turns": [[turn.role, text, turn.tokens] for turn, (_, text) in zip(self.turns, self._texts())],
+            "first_seq": self.first_seq,
+            "summary": self.summary,
+            "slots": self.memory.slots if self.memory is not None else {},
+        })
+
+    @classmethod
+    def from_json(cls, session_id: str, data: str, max_turns: int, last_seen: float):
+        session = cls(session_id, max_turns)
+        parsed = json.loads(data)
+        lines = []
+        for role, text, *tokens in parsed["turns"][-max_turns:]:
+            line = f"{ROLE_PREFIXES[role]} {text}"
+            turn = Turn(role, len(line), tokens[0] if tokens else estimate_tokens(line))
+            session.turns.append(turn)
+            session.tokens += turn.tokens
+            lines.append(line)
+        session.history = "\n".join(lines)
+        session.first_seq = parsed.get("first_seq", 0)
+        session.summary = parsed.get("summary", "")
+        if parsed["slots"]:
+            session.memory = Memory()
+            session.memory.update(parsed["slots"])
+        session.last_seen = last_seen
+        return session
+
+
+class HistoryCompactor:
+    """
+    Folds old turns into each session's rolling summary on a background
+    thread, off the request path.
+
+    After a turn is recorded, a session whose history exceeds
+    `trigger_tokens` gets a job that calls
+    `summarize_fn(previous_summary, transcript)` on its oldest turns (enough
+    to leave `keep_tokens`) and stores the result with apply_summary(). One
+    job per session runs at a time; a failed summary is simply retried
+    after a later turn.
+    """
+
+    def __init__(self, summarize_fn, trigger_tokens: int, keep_tokens: int, workers: int = 1):
+        self.summarize_fn = summarize_fn
+        self.trigger_tokens = trigger_tokens
+        self.keep_tokens = keep_tokens
+        self.compacted = 0
+        self.failed = 0
+        self._pending = set()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="history-compactor")
+        self._lock = threading.Lock()
+        self._idle = threading.Condition(self._lock)
+
+    def maybe_schedule(self, store, session: Session):
+        if session.tokens <= self.trigger_tokens:
+            return
+        job = session.compactable(self.keep_tokens)
+        if job is None:
+            return
+        with self._lock:
+            if session.session_id in self._pending:
+                return
+            self._pending.add(session.session_id)
+        end_seq, transcript = job
+        try:
+            self._executor.submit(self._run, store, session.session_id, session.summary, transcript, end_seq)
+        except RuntimeError:
+            # Shut down: leave the turns for the next process to compact
+            with self._lock:
+                self._pending.discard(session.session_id)
+
+    def _run(self, store, session_id, previous_summary, transcript, end_seq):
+        try:
+            summary = self.summarize_fn(previous_summary, transcript)
+            store.apply_summary(session_id, end_seq, summary)
+            succeeded = True
+        except Exception:
+            succeeded = False
+        with self._lock:
+            if succeeded:
+                self.compacted += 1
+            else:
+                self.failed += 1
+            self._pending.discard(session_id)
+            self._idle.notify_all()
+
+    def wait_idle(self, timeout: float = None) -> bool:
+        """
+        Block until no summaries are being generated (used by tests and
+        benchmarks). Returns False on timeout.
+        """
+        with self._lock:
+            return self._idle.wait_for(lambda: not self._pending, timeout)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"pending": len(self._pending), "compacted": self.compacted, "failed": self.failed}
+
+    def shutdown(self, wait: bool = True):
+        """
+        Stop taking new jobs; with `wait`, let queued summaries finish.
+        """
+        self._executor.shutdown(wait=wait)
+
+
+class SessionStore:
+    """
+    Conversation store keyed by session id. Sessions idle for more than
+    `idle_ttl` seconds are dropped, and once the store holds more than
+    `max_bytes` the least recently used sessions are evicted.
+
+    get() returns the session (or None) as a copy that later writes do not
+    change; record() appends one user message
+    and its reply and hands the session to `compactor` (a HistoryCompactor,
+    if set); apply_summary() stores a summary that replaces old turns.
+    Backends: MemorySessionStore (one process) and SqliteSessionStore
+    (shared by worker processes).
+    """
+
+    def __init__(self, max_turns: int = 50, idle_ttl: float = 1800.0, max_bytes: int = 256 * 1024 * 1024):
+        self.max_turns = max_turns
+        self.idle_ttl = idle_ttl
+        self.max_bytes = max_bytes
+        self.compactor = None
+        self.evicted = 0
+        self.expired = 0
+
+    @classmethod
+    def from_env(cls):
+        """
+        SESSION_STORE=memory or SESSION_STORE=sqlite (with SESSION_DB as the
+        database path) enables sessions; SESSION_MAX_TURNS (messages stored per
+        session), SESSION_IDLE_TTL (seconds) and SESSION_MAX_MB tune them. Returns None when disabled.
+        """
+        backend = os.getenv("SESSION_STORE", "").lower()
+        if not backend:
+            return None
+        options = dict(
+            max_turns=int(os.getenv("SESSION_MAX_TURNS", "50")),
+            idle_ttl=float(os.getenv("SESSION_IDLE_TTL", "1800")),
+            max_bytes=int(float(os.getenv("SESSION_MAX_MB", "256")) * 1024 * 1024),
+        )
+        if backend == "memory":
+            return MemorySessionStore(**options)
+        if backend == "sqlite":
+            return SqliteSessionStore(os.getenv("SESSION_DB", "sessions.db"), **options)
+        raise ValueError(f"Unknown SESSION_STORE backend: {backend}")
+
+
+class MemorySessionStore(SessionStore):
+    """
+    In-process backend: an LRU OrderedDict of Session objects.
+    """
+
+    def __init__(self, **options):
+        super().__init__(**options)
+        self._sessions = OrderedDict()  # session_id -> Session, least recent first
+        self._sizes = {}                # session_id -> bytes counted
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def get(self, session_id: str):
+        with self._lock:
+            self._expire_locked(time.time())
+            session = self._sessions.get(session_id)
+            if session is None:
+                return None
+            session.last_seen = time.time()
+            self._sessions.move_to_end(session_id)
+            return session.snapshot()
+
+    def record(self, session_id: str, user_text: str, reply: str) -> Session:
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                session = self._sessions[session_id] = Session(session_id, self.max_turns)
+            session.remember(user_text)
+            session.add(USER, user_text)
+            session.add(ASSISTANT, reply)
+            session.last_seen = time.time()
+            self._sessions.move_to_end(session_id)
+            size = session.nbytes()
+            self._bytes += size - self._sizes.get(session_id, 0)
+            self._sizes[session_id] = size
+            self._expire_locked(session.last_seen)
+            while self._bytes > self.max_bytes and len(self._sessions) > 1:
+                self._drop_locked(next(iter(self._sessions)))
+                self.evicted += 1
+            if self.compactor is not None:
+                self.compactor.maybe_schedule(self, session)
+            return session
+
+    def apply_summary(self, session_id: str, end_seq: int, summary: str):
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                return
+            session.apply_summary(end_seq, summary)
+            size = session.nbytes()
+            self._bytes += size - self._sizes[session_id]
+            self._sizes[session_id] = size
+
+    def delete(self, session_id: str):
+        with self._lock:
+            if session_id in self._sessions:
+                self._drop_locked(session_id)
+
+    def _drop_locked(self, session_id: str):
+        del self._sessions[session_id]
+        self._bytes -= self._sizes.pop(session_id)
+
+    def _expire_locked(self, now: float):
+        # Least recently used first, so stop at the first live session
+        while self._sessions:
+            session_id, session = next(iter(self._sessions.items()))
+            if now - session.last_seen <= self.idle_ttl:
+                break
+            self._drop_locked(session_id)
+            self.expired += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "backend": "memory",
+                "sessions": len(self._sessions),
+                "bytes": self._bytes,
+                "evicted": self.evicted,
+                "expired": self.expired,
+            }
+
+
+class SqliteSessionStore(SessionStore):
+    """
+    SQLite (WAL) backend so every worker process sees the same sessions.
+    Each session is one row holding its turns, summary and slots as JSON;
+    record() and apply_summary() rewrite it inside an IMMEDIATE transaction, so concurrent turns of one
+    session from different processes do not lose each other's messages.
+    Expiry and the size cap are enforced every `sweep_every` writes.
+    """
+
+    def __init__(self, db_path: str, sweep_every: int = 64, **options):
+        super().__init__(**options)
+        self.db_path = db_path
+        self.sweep_every = sweep_every
+        self._writes = 0
+        self._db = LocalConnection(db_path)
+        self._db().execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            " id TEXT PRIMARY KEY, data TEXT NOT NULL, size INTEGER NOT NULL, last_seen REAL NOT NULL)"
+        )
+        self._db().execute("CREATE INDEX IF NOT EXISTS sessions_last_seen ON sessions (last_seen)")
+
+    def __len__(self):
+        return self._db().execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+
+    def get(self, session_id: str):
+        row = self._db().execute(
+            "SELECT data, last_seen FROM sessions WHERE id = ? AND last_seen > ?",
+            (session_id, time.time() - self.idle_ttl),
+        ).fetchone()
+        if row is None:
+            return None
+        return Session.from_json(session_id, row[0], self.max_turns, row[1])
+
+    def record(self, session_id: str, user_text: str, reply: str) -> Session:
+        db = self._db()
+        now = time.time()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            row = db.execute(
+                "SELECT data, last_seen FROM sessions WHERE id = ? AND last_seen > ?",
+                (session_id, now - self.idle_ttl),
+            ).fetchone()
+            if row is None:
+                session = Session(session_id, self.max_turns)
+            else:
+                session = Session.from_json(session_id, row[0], self.max_turns, row[1])
+            session.remember(user_text)
+            session.add(USER, user_text)
+            session.add(ASSISTANT, reply)
+            session.last_seen = now
+            data = session.to_json()
+            db.execute(
+                "INSERT OR REPLACE INTO sessions (id, data, size, last_seen) VALUES (?, ?, ?, ?)",
+                (session_id, data, len(data), now),
+            )
+            db.execute("COMMIT")
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+        self._writes += 1
+        if self._writes % self.sweep_every == 0:
+            self.sweep()
+        if self.compactor is not None:
+            self.compactor.maybe_schedule(self, session)
+        return session
+
+    def apply_summary(self, session_id: str, end_seq: int, summary: str):
+        db = self._db()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            row = db.execute("SELECT data, last_seen FROM sessions WHERE id = ?", (session_id,)).fetchone()
+            if row is not None:
+                session = Session.from_json(session_id, row[0], self.max_turns, row[1])
+                session.apply_summary(end_seq, summary)
+                data = session.to_json()
+                db.execute("UPDATE sessions SET data = ?, size = ? WHERE id = ?", (data, len(data), session_id))
+            db.execute("COMMIT")
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+
+    def delete(self, session_id: str):
+        self._db().execute("DELETE FROM sessions WHERE id = ?", (session_id,))
+
+    def sweep(self):
+        """
+        Delete idle sessions, then the least recently used ones until the
+        stored JSON fits in max_bytes.
+        """
+        db = self._db()
+        self.expired += db.execute("DELETE FROM sessions WHERE last_seen <= ?", (time.time() - self.idle_ttl,)).rowcount
+        total = db.execute("SELECT COALESCE(SUM(size), 0) FROM sessions").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        doomed = []
+        for session_id, size in db.execute("SELECT id, size FROM sessions ORDER BY last_seen"):
+            if total <= self.max_bytes:
+                break
+            doomed.append((session_id,))
+            total -= size
+        db.executemany("DELETE FROM sessions WHERE id = ?", doomed)
+        self.evicted += len(doomed)
+
+    def stats(self) -> dict:
+        count, size = self._db().execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM sessions").fetchone()
+        return {
+            "backend": "sqlite",
+            "sessions": count,
+            "bytes": size,
+            "evicted": self.evicted,
+            "expired": self.expired,
+        }
@@ -0,0 +1,100 @@
+# single_flight.py
+
+import asyncio
+import threading
+
+
+class _Call:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Collapses concurrent calls that share a key into one execution.
+
+    The first caller for a key (the leader) runs the function; callers that
+    arrive while it is running (followers) block until it finishes and get
+    the same result, or have the same exception raised. The key is forgotten
+    as soon as the call completes, so neither results nor errors are reused
+    by later callers. Threads use do(); coroutines use ado().
+    """
+
+    def __init__(self):
+        self.leaders = 0
+        self.collapsed = 0
+        self._calls = {}          # key -> _Call
+        self._async_calls = {}    # (event loop, key) -> asyncio.Future
+        self._lock = threading.Lock()
+
+    def do(self, key, fn, *args, **kwargs):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.leaders += 1
+            else:
+                self.collapsed += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn(*args, **kwargs)
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    async def ado(self, key, coro_fn, *args, **kwargs):
+        """
+        Coroutine version of do(): `coro_fn(*args, **kwargs)` is awaited once
+        per key per event loop.
+        """
+        full_key = (asyncio.get_running_loop(), key)
+        future = self._async_calls.get(full_key)
+        if future is not None:
+            with self._lock:
+                self.collapsed += 1
+            # shield: a cancelled follower must not cancel the leader's call
+            return await asyncio.shield(future)
+
+        future = self._async_calls[full_key] = asyncio.get_running_loop().create_future()
+        with self._lock:
+            self.leaders += 1
+        try:
+            result = await coro_fn(*args, **kwargs)
+            future.set_result(result)
+            return result
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            del self._async_calls[full_key]
+            # Retrieve the exception so asyncio does not log it as unhandled
+            # when no follower was waiting.
+            if future.done() and not future.cancelled():
+                future.exception()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "leaders": self.leaders,
+                "collapsed": self.collapsed,
+                "in_flight": len(self._calls) + len(self._async_calls),
+            }
@@ -0,0 +1,40 @@
+# sqlite_local.py
+
+import os
+import sqlite3
+import threading
+
+
+class LocalConnection:
+    """
+    Per-thread SQLite connection to `path` in WAL mode with autocommit
+    (isolation_level=None), so callers issue BEGIN themselves when they need
+    a transaction. sqlite3 connections may not be shared between threads;
+    calling the object returns the current thread's connection, opening it
+    on first use.
+
+    Connections must not cross fork() either: a process forked after the
+    object was used (a gunicorn worker of a preloaded app) opens its own
+    instead of the one the parent's thread left behind.
+    """
+
+    def __init__(self, path: str, timeout: float = 5.0):
+        self.path = path
+        self.timeout = timeout
+        self._local = threading.local()
+        self._inherited = []
+
+    def __call__(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is not None and self._local.pid == os.getpid():
+            return conn
+        if conn is not None:
+            # Belongs to the parent: keep it referenced so it is never
+            # closed (and its WAL checkpointed) from this process
+            self._inherited.append(conn)
+        conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        self._local.conn = conn
+        self._local.pid = os.getpid()
+        return conn
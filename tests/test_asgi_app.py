@@ -0,0 +1,151 @@
+# tests/test_asgi_app.py
+
+import asyncio
+import json
+import pytest
+import asgi_app
+import app as chat_app
+from bedrock_client import BedrockClient
+from concurrency_limiter import AdaptiveLimiter
+from errors import BedrockInvocationError, ThrottlingError
+from response_cache import ResponseCache
+
+class FakeAsyncBC:
+    model_id = "fake-model"
+    def __init__(self, reply="fake reply", error=None):
+        self.reply = reply
+        self.error = error
+        self.prompts = []
+    async def ainvoke(self, prompt, **params):
+        self.prompts.append(prompt)
+        await asyncio.sleep(0)
+        if self.error:
+            raise self.error
+        return self.reply
+
+def call(method, path, body=b""):
+    """
+    Drive the ASGI app once; returns (status, headers, body).
+    """
+    messages = []
+    async def receive():
+        return {"type": "http.request", "body": body, "more_body": False}
+    async def send(message):
+        messages.append(message)
+    scope = {"type": "http", "method": method, "path": path}
+    asyncio.run(asgi_app.application(scope, receive, send))
+    start, payload = messages
+    return start["status"], dict(start["headers"]), payload["body"]
+
+@pytest.fixture
+def fake_bc(monkeypatch):
+    bc = FakeAsyncBC()
+    monkeypatch.setattr(asgi_app, "get_bedrock_client", lambda: bc)
+    monkeypatch.setattr(chat_app, "response_cache", ResponseCache(max_entries=0))
+    monkeypatch.setattr(chat_app, "semantic_cache", None)
+    monkeypatch.setattr(chat_app, "retriever", None)
+    monkeypatch.setattr(chat_app, "limiter", AdaptiveLimiter())
+    return bc
+
+def test_index_page(fake_bc):
+    status, headers, body = call("GET", "/")
+    assert status == 200
+    assert headers[b"content-type"].startswith(b"text/html")
+    assert b"<title>Chat with Llama 3.3 70B Instruct</title>" in body
+
+def test_chat_success(fake_bc):
+    status, _, body = call("POST", "/chat", json.dumps({"message": "Hello"}).encode())
+    assert status == 200
+    assert json.loads(body) == {"reply": "fake reply"}
+    assert fake_bc.prompts[0].endswith("User: Hello\nAssistant:")
+
+def test_chat_bad_requests(fake_bc):
+    assert call("POST", "/chat", b"not json")[0] == 400
+    assert call("POST", "/chat", b"{}")[0] == 400
+    assert call("POST", "/chat", json.dumps({"message": "  "}).encode())[0] == 400
+    assert call("GET", "/chat")[0] == 405
+    assert call("GET", "/missing")[0] == 404
+
+def test_chat_bedrock_failure(fake_bc):
+    fake_bc.error = BedrockInvocationError("boom")
+    status, _, body = call("POST", "/chat", json.dumps({"message": "Hello"}).encode())
+    assert status == 502
+    assert "boom" in json.loads(body)["error"]
+
+def test_chat_throttled_returns_429(fake_bc):
+    fake_bc.error = ThrottlingError("slow down")
+    status, headers, body = call("POST", "/chat", json.dumps({"message": "Hello"}).encode())
+    assert status == 429
+    assert int(headers[b"retry-after"]) >= 1
+    assert chat_app.limiter.stats()["throttled"] == 1
+
+def test_chat_overloaded_returns_429(fake_bc, monkeypatch):
+    monkeypatch.setattr(chat_app, "limiter", AdaptiveLimiter(initial_limit=1, max_queue=0))
+    chat_app.limiter.acquire()
+    status, headers, body = call("POST", "/chat", json.dumps({"message": "Hello"}).encode())
+    assert status == 429
+    assert b"retry-after" in headers
+
+def test_concurrent_chats_share_one_thread(fake_bc):
+    async def many():
+        async def one(i):
+            status, payload = await asgi_app.chat(json.dumps({"message": f"m{i}"}).encode())
+            return status
+        return await asyncio.gather(*(one(i) for i in range(200)))
+    assert asyncio.run(many()) == [200] * 200
+
+class DummyBody:
+    def __init__(self, data):
+        self._data = data
+    def read(self):
+        return self._data
+
+class SyncRuntime:
+    def invoke_model(self, **kwargs):
+        return {"body": DummyBody(b'{"generation": " threaded "}')}
+
+class AsyncRuntime:
+    class Body:
+        async def read(self):
+            return b'{"generation": " native "}'
+    async def invoke_model(self, **kwargs):
+        return {"body": self.Body()}
+
+def test_ainvoke_paths():
+    bc = BedrockClient(region="us-east-2", model_id="m", client=SyncRuntime())
+    assert asyncio.run(bc.ainvoke("prompt")) in ("threaded", "native")
+    native = BedrockClient(region="us-east-2", model_id="m", client=SyncRuntime(), async_client=AsyncRuntime())
+    assert asyncio.run(native.ainvoke("prompt")) == "native"
+
+def test_chat_sessions(fake_bc, monkeypatch):
+    from session_store import MemorySessionStore
+    monkeypatch.setattr(chat_app, "sessions", MemorySessionStore())
+    status, _, body = call("POST", "/chat", json.dumps({"message": "Hello"}).encode())
+    session_id = json.loads(body)["session_id"]
+    call("POST", "/chat", json.dumps({"message": "Again", "session_id": session_id}).encode())
+    assert "User: Hello\nAssistant: fake reply\nUser: Again\nAssistant:" in fake_bc.prompts[1]
+
+def test_chat_server_timing_and_metrics(fake_bc):
+    status, headers, _ = call("POST", "/chat", json.dumps({"message": "timed"}).encode())
+    assert status == 200
+    assert b"parse;dur=" in headers[b"server-timing"] and b"total;dur=" in headers[b"server-timing"]
+    status, headers, body = call("GET", "/metrics")
+    assert headers[b"content-type"].startswith(b"text/plain")
+    assert b'http_request_duration_seconds_count{path="/chat",status="200"}' in body
+
+def test_healthz(fake_bc, monkeypatch):
+    monkeypatch.setattr(asgi_app, "readiness", lambda: {"status": "unconfigured", "error": "Missing AWS_REGION"})
+    status, _, body = call("GET", "/healthz")
+    assert status == 503 and json.loads(body)["status"] == "unconfigured"
+    monkeypatch.setattr(asgi_app, "readiness", lambda: {"status": "ready"})
+    assert call("GET", "/healthz")[0] == 200
+
+def test_chat_reports_generation_in_header(fake_bc, monkeypatch):
+    from generation_policy import GenerationPolicy
+    monkeypatch.setattr(chat_app, "generation_policy", GenerationPolicy())
+    fake_bc.reply = "Hi!\nUser: bye"
+    status, headers, body = call("POST", "/chat", json.dumps({"message": "Hello"}).encode())
+    assert json.loads(body) == {"reply": "Hi!"}
+    assert b"max_gen_len=128" in headers[b"x-generation"]
+    status, _, _ = call("POST", "/chat", json.dumps({"message": "Hello", "latency_budget_ms": -1}).encode())
+    assert status == 400
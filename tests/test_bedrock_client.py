@@ -99,3 +99,51 @@ def test_invoke_no_valid_field(monkeypatch):
     bc = BedrockClient()
     with pytest.raises(BedrockInvocationError):
         bc.invoke("prompt")
+
+class DummyStreamClient:
+    def __init__(self, events):
+        self.events = events
+
+    def invoke_model_with_response_stream(self, **kwargs):
+        return {"body": iter(self.events)}
+
+def stream_chunk(payload):
+    return {"chunk": {"bytes": json.dumps(payload).encode("utf-8")}}
+
+def test_invoke_stream_yields_chunks():
+    dummy = DummyStreamClient([
+        stream_chunk({"generation": "\n "}),
+        stream_chunk({"generation": " Hello"}),
+        stream_chunk({"generation": " world", "stop_reason": "stop"}),
+    ])
+    bc = BedrockClient(region="us-east-2", model_id="meta.llama3-3-70b-instruct-v1:0", client=dummy)
+    assert list(bc.invoke_stream("prompt")) == ["Hello", " world"]
+
+def test_invoke_stream_error_event():
+    dummy = DummyStreamClient([
+        stream_chunk({"generation": "Hi"}),
+        {"modelStreamErrorException": {"message": "boom"}},
+    ])
+    bc = BedrockClient(region="us-east-2", model_id="meta.llama3-3-70b-instruct-v1:0", client=dummy)
+    stream = bc.invoke_stream("prompt")
+    assert next(stream) == "Hi"
+    with pytest.raises(BedrockInvocationError):
+        next(stream)
+
+def test_throttling_is_distinguished():
+    from botocore.exceptions import ClientError
+    from errors import ThrottlingError
+
+    class ThrottledClient:
+        def __init__(self, code):
+            self.code = code
+        def invoke_model(self, **kwargs):
+            raise ClientError({"Error": {"Code": self.code, "Message": "x"}}, "InvokeModel")
+
+    bc = BedrockClient(region="us-east-2", model_id="m", client=ThrottledClient("ThrottlingException"))
+    with pytest.raises(ThrottlingError):
+        bc.invoke("prompt")
+    bc = BedrockClient(region="us-east-2", model_id="m", client=ThrottledClient("ValidationException"))
+    with pytest.raises(BedrockInvocationError) as excinfo:
+        bc.invoke("prompt")
+    assert not isinstance(excinfo.value, ThrottlingError)
@@ -0,0 +1,141 @@
+# tests/test_bedrock_emulator.py
+
+import json
+import random
+import threading
+import pytest
+import client_pool
+from bedrock_client import BedrockClient
+from bedrock_emulator import BedrockEmulator, LatencyModel, RecordingRuntime
+from embed_client import EmbedClient
+from errors import BedrockInvocationError, ThrottlingError
+
+def make_client(emulator):
+    return BedrockClient(region="local", model_id="meta.llama3", client=emulator)
+
+def test_latency_model_specs():
+    rng = random.Random(0)
+    assert LatencyModel("fixed:50").sample(rng) == 0.05
+    assert all(0.02 <= LatencyModel("uniform:20,80").sample(rng) <= 0.08 for _ in range(100))
+    samples = sorted(LatencyModel("lognormal:100,0.5").sample(rng) for _ in range(1001))
+    assert 0.08 < samples[500] < 0.12
+    tail = LatencyModel("fixed:1;tail:0.5,1000")
+    assert {tail.sample(rng) for _ in range(100)} == {0.001, 1.0}
+    with pytest.raises(ValueError):
+        LatencyModel("pareto:1")
+
+def test_invoke_and_stream():
+    sleeps = []
+    emulator = BedrockEmulator(latency="fixed:100", token_ms=10, reply_words=5, sleep=sleeps.append)
+    bc = make_client(emulator)
+    reply = bc.invoke("hello")
+    assert len(reply.split()) == 5
+    assert sleeps == [pytest.approx(0.1 + 5 * 0.01)]
+    assert "".join(bc.invoke_stream("hello")) == reply
+    assert bc.invoke("hello", max_gen_len=2).count(" ") == 1
+    assert emulator.stats()["calls"] == 3 and emulator.stats()["in_flight"] == 0
+
+def test_stream_slot_released_without_being_read():
+    emulator = BedrockEmulator(max_concurrency=1)
+    bc = make_client(emulator)
+    body = json.dumps({"prompt": "hi"})
+    events = emulator.invoke_model_with_response_stream(modelId="m", body=body)["body"]
+    assert emulator.stats()["in_flight"] == 1
+    del events                          # dropped before its first next()
+    assert emulator.stats()["in_flight"] == 0
+    events = emulator.invoke_model_with_response_stream(modelId="m", body=body)["body"]
+    events.close()
+    events.close()
+    assert emulator.stats()["in_flight"] == 0
+    chunks = bc.invoke_stream("read one chunk")
+    next(chunks)
+    chunks.close()
+    assert emulator.stats()["in_flight"] == 0
+    assert bc.invoke("still has a slot")
+
+def test_fault_injection():
+    bc = make_client(BedrockEmulator(throttle_rate=1.0))
+    with pytest.raises(ThrottlingError):
+        bc.invoke("hello")
+    bc = make_client(BedrockEmulator(error_rate=1.0))
+    with pytest.raises(BedrockInvocationError) as info:
+        bc.invoke("hello")
+    assert not isinstance(info.value, ThrottlingError)
+
+def test_max_concurrency_throttles():
+    release = threading.Event()
+    emulator = BedrockEmulator(max_concurrency=1, sleep=lambda _: release.wait(5))
+    bc = make_client(emulator)
+    first = threading.Thread(target=bc.invoke, args=("slow",))
+    first.start()
+    while emulator.stats()["in_flight"] == 0:
+        pass
+    with pytest.raises(ThrottlingError):
+        bc.invoke("second")
+    release.set()
+    first.join()
+    assert emulator.stats()["throttled"] == 1
+
+def test_embeddings_are_deterministic():
+    ec = EmbedClient(region="local", model_id="amazon.titan-embed-text-v2:0", client=BedrockEmulator())
+    first = ec.embed_text("hello", dimensions=64)
+    assert len(first) == 64
+    assert first == ec.embed_text("hello", dimensions=64)
+    assert first != ec.embed_text("goodbye", dimensions=64)
+
+def test_record_and_replay(tmp_path):
+    path = str(tmp_path / "recording.jsonl")
+
+    class RealRuntime(BedrockEmulator):
+        def _respond(self, model_id, body):
+            return {"generation": "recorded answer"}, ["recorded", " answer"]
+
+    recorder = make_client(RecordingRuntime(RealRuntime(), path))
+    assert recorder.invoke("one") == "recorded answer"
+    assert "".join(recorder.invoke_stream("two")) == "recorded answer"
+    lines = [json.loads(line) for line in open(path)]
+    assert [("response" in r, "chunks" in r) for r in lines] == [(True, False), (False, True)]
+
+    replay = BedrockEmulator(replay_path=path)
+    bc = make_client(replay)
+    assert bc.invoke("one") == "recorded answer"
+    assert list(bc.invoke_stream("two")) == ["recorded", " answer"]
+    assert bc.invoke("not recorded") != "recorded answer"
+    assert replay.stats()["replayed"] == 2
+
+def test_recording_stream_closes_the_real_stream(tmp_path):
+    class Stream:
+        closed = False
+        def __iter__(self):
+            yield {"chunk": {"bytes": json.dumps({"generation": "hi"}).encode()}}
+        def close(self):
+            self.closed = True
+
+    streams = []
+    class RealRuntime:
+        def invoke_model_with_response_stream(self, modelId, body):
+            streams.append(Stream())
+            return {"body": streams[-1]}
+
+    recorder = RecordingRuntime(RealRuntime(), str(tmp_path / "recording.jsonl"))
+    events = recorder.invoke_model_with_response_stream(modelId="m", body="{}")["body"]
+    del events                          # dropped before its first next()
+    events = recorder.invoke_model_with_response_stream(modelId="m", body="{}")["body"]
+    next(events)
+    events.close()
+    events = recorder.invoke_model_with_response_stream(modelId="m", body="{}")["body"]
+    assert len(list(events)) == 1
+    assert [s.closed for s in streams] == [True, True, True]
+
+def test_client_pool_uses_emulator(monkeypatch):
+    monkeypatch.setenv("BEDROCK_EMULATOR", "1")
+    monkeypatch.setenv("AWS_REGION", "local")
+    monkeypatch.setenv("BEDROCK_MODEL_ID", "meta.llama3")
+    monkeypatch.setenv("EMULATOR_LATENCY", "fixed:0")
+    client_pool.reset_pool()
+    try:
+        bc = client_pool.get_bedrock_client()
+        assert isinstance(bc.client, BedrockEmulator)
+        assert bc.invoke("hello")
+    finally:
+        client_pool.reset_pool()
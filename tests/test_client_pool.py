@@ -0,0 +1,139 @@
+# tests/test_client_pool.py
+
+import asyncio
+import sys
+import threading
+import types
+import pytest
+import client_pool
+from bedrock_client import BedrockClient
+from embed_client import EmbedClient
+from errors import ConfigurationError
+
+@pytest.fixture(autouse=True)
+def fresh_pool(monkeypatch):
+    monkeypatch.setenv("AWS_REGION", "us-east-2")
+    monkeypatch.setenv("BEDROCK_MODEL_ID", "meta.llama3-3-70b-instruct-v1:0")
+    monkeypatch.setenv("AWS_ACCESS_KEY_ID", "AKIDEXAMPLE")
+    monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "secret")
+    created = []
+    def fake_client(service, region_name=None, config=None):
+        created.append((service, region_name, config))
+        return object()
+    monkeypatch.setattr("client_pool.boto3.client", fake_client)
+    client_pool.reset_pool()
+    yield created
+    client_pool.reset_pool()
+
+def test_bedrock_client_is_shared(fresh_pool):
+    first = client_pool.get_bedrock_client()
+    second = client_pool.get_bedrock_client()
+    assert first is second
+    assert isinstance(first, BedrockClient)
+    assert len(fresh_pool) == 1
+
+def test_runtime_client_shared_with_embed_client(fresh_pool):
+    bedrock = client_pool.get_bedrock_client()
+    embed = client_pool.get_embed_client()
+    assert isinstance(embed, EmbedClient)
+    assert embed.client is bedrock.client
+    assert len(fresh_pool) == 1
+
+def test_keyed_by_region_and_model(fresh_pool, monkeypatch):
+    first = client_pool.get_bedrock_client()
+    monkeypatch.setenv("BEDROCK_MODEL_ID", "other-model")
+    second = client_pool.get_bedrock_client()
+    assert first is not second
+    assert second.model_id == "other-model"
+    monkeypatch.setenv("AWS_REGION", "us-west-2")
+    client_pool.get_bedrock_client()
+    assert [region for _, region, _ in fresh_pool] == ["us-east-2", "us-west-2"]
+
+def test_pool_size_from_env(fresh_pool, monkeypatch):
+    monkeypatch.setenv("BEDROCK_POOL_SIZE", "7")
+    client_pool.get_bedrock_client()
+    config = fresh_pool[0][2]
+    assert config.max_pool_connections == 7
+    assert config.tcp_keepalive is True
+
+def test_concurrent_first_use_builds_one_client(fresh_pool):
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(client_pool.get_bedrock_client())) for _ in range(16)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(set(map(id, results))) == 1
+    assert len(fresh_pool) == 1
+
+def test_warm_up(fresh_pool, monkeypatch):
+    assert client_pool.warm_up() is True
+    assert len(fresh_pool) == 1
+    client_pool.reset_pool()
+    monkeypatch.delenv("AWS_REGION")
+    assert client_pool.warm_up() is False
+    with pytest.raises(ConfigurationError):
+        client_pool.get_bedrock_client()
+
+def test_embed_model_env(fresh_pool, monkeypatch):
+    monkeypatch.setenv("BEDROCK_EMBED_MODEL_ID", "amazon.titan-embed-text-v2:0")
+    assert client_pool.get_embed_client().model_id == "amazon.titan-embed-text-v2:0"
+    assert client_pool.get_bedrock_client().model_id == "meta.llama3-3-70b-instruct-v1:0"
+
+def test_readiness_after_warm_up(fresh_pool, monkeypatch):
+    assert client_pool.readiness() == {"status": "starting"}
+    assert client_pool.warm_up() is True
+    state = client_pool.readiness()
+    assert state["status"] == "ready" and state["client_ms"] >= 0
+    client_pool.reset_pool()
+    monkeypatch.delenv("AWS_REGION")
+    client_pool.start_warm_up().join(timeout=5)
+    state = client_pool.readiness()
+    assert state["status"] == "unconfigured" and "AWS_REGION" in state["error"]
+
+def test_unreachable_endpoint_is_retried(fresh_pool, monkeypatch):
+    attempts = []
+    def open_connection(runtime):
+        attempts.append(runtime)
+        if len(attempts) < 3:
+            raise OSError("connection refused")
+        return True
+    monkeypatch.setattr(client_pool, "open_connection", open_connection)
+    reports = []
+    client_pool.start_warm_up(retry_interval=0.01, report=reports.append).join(timeout=5)
+    assert len(attempts) == 3
+    assert [r["status"] for r in reports] == ["unreachable", "unreachable"]
+    assert client_pool.readiness()["status"] == "ready"
+
+def test_async_client_signs_with_the_shared_manager(fresh_pool, monkeypatch):
+    # Stand-in aiobotocore (optional, usually not installed) that records
+    # the session the client is created from
+    sessions = []
+    class FakeAioSession:
+        def __init__(self):
+            self.components = {}
+            sessions.append(self)
+        def register_component(self, name, component):
+            self.components[name] = component
+        def create_client(self, service, region_name=None, config=None):
+            session = self
+            class Context:
+                async def __aenter__(self):
+                    return session
+            return Context()
+    aiobotocore = types.ModuleType("aiobotocore")
+    config = types.ModuleType("aiobotocore.config")
+    config.AioConfig = lambda **kwargs: kwargs
+    session = types.ModuleType("aiobotocore.session")
+    session.get_session = FakeAioSession
+    monkeypatch.setitem(sys.modules, "aiobotocore", aiobotocore)
+    monkeypatch.setitem(sys.modules, "aiobotocore.config", config)
+    monkeypatch.setitem(sys.modules, "aiobotocore.session", session)
+
+    async def build():
+        client = await client_pool.get_async_runtime_client("us-east-2")
+        credentials = await client.components["credential_provider"].load_credentials()
+        return credentials, await credentials.get_frozen_credentials()
+    credentials, frozen = asyncio.run(build())
+    assert credentials.manager is client_pool.credential_manager()
+    assert frozen.access_key == "AKIDEXAMPLE"
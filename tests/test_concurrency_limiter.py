@@ -0,0 +1,115 @@
+# tests/test_concurrency_limiter.py
+
+import asyncio
+import threading
+import time
+import pytest
+from concurrency_limiter import AdaptiveLimiter
+from errors import OverloadedError, ThrottlingError
+
+def test_admits_up_to_limit_then_queues():
+    limiter = AdaptiveLimiter(initial_limit=2, max_queue=4)
+    limiter.acquire()
+    limiter.acquire()
+    assert limiter.stats()["in_flight"] == 2
+
+    entered = threading.Event()
+    def waiter():
+        limiter.acquire(timeout=5)
+        entered.set()
+    t = threading.Thread(target=waiter)
+    t.start()
+    while limiter.stats()["queue_depth"] == 0:
+        time.sleep(0.001)
+    assert not entered.is_set()
+
+    limiter.release()
+    t.join()
+    assert entered.is_set()
+    assert limiter.stats()["in_flight"] == 2
+    assert limiter.stats()["queue_depth"] == 0
+
+def test_rejects_when_queue_full():
+    limiter = AdaptiveLimiter(initial_limit=1, max_queue=0)
+    limiter.acquire()
+    with pytest.raises(OverloadedError) as excinfo:
+        limiter.acquire()
+    assert excinfo.value.retry_after >= 1
+    assert limiter.stats()["rejected"] == 1
+
+def test_queue_deadline():
+    limiter = AdaptiveLimiter(initial_limit=1, max_queue=4)
+    limiter.acquire()
+    with pytest.raises(OverloadedError):
+        limiter.acquire(timeout=0.01)
+    assert limiter.stats()["queue_depth"] == 0
+    limiter.release()
+    limiter.acquire(timeout=0.01)
+
+def test_throttling_backs_off_and_success_grows():
+    limiter = AdaptiveLimiter(initial_limit=20, backoff=0.5)
+    def throttled():
+        raise ThrottlingError("slow down")
+    with pytest.raises(ThrottlingError):
+        limiter.call(throttled)
+    assert limiter.limit == 10
+    assert limiter.stats()["throttled"] == 1
+
+    # Growth only happens while the limit is in use
+    for _ in range(limiter.limit):
+        limiter.acquire()
+    for _ in range(10):
+        limiter.release(0.1)
+        limiter.acquire()
+    assert limiter.limit == 10
+    for _ in range(30):
+        limiter.release(0.1)
+        limiter.acquire()
+    assert limiter.limit > 10
+
+def test_other_errors_do_not_move_limit():
+    limiter = AdaptiveLimiter(initial_limit=8)
+    def broken():
+        raise ValueError("bad")
+    with pytest.raises(ValueError):
+        limiter.call(broken)
+    assert limiter.limit == 8
+    assert limiter.stats()["in_flight"] == 0
+
+def test_latency_spike_backs_off():
+    limiter = AdaptiveLimiter(initial_limit=8, backoff=0.5, latency_tolerance=2.0)
+    limiter.acquire()
+    limiter.release(0.0001)
+    limiter.acquire()
+    limiter.release(1.0)
+    assert limiter.limit == 4
+
+def test_async_acquire_waits_and_times_out():
+    limiter = AdaptiveLimiter(initial_limit=1, max_queue=4)
+
+    async def scenario():
+        await limiter.aacquire()
+        with pytest.raises(OverloadedError):
+            await limiter.aacquire(timeout=0.01)
+        waiting = asyncio.ensure_future(limiter.aacquire(timeout=5))
+        await asyncio.sleep(0.01)
+        assert limiter.stats()["queue_depth"] == 1
+        limiter.release()
+        await waiting
+        assert limiter.stats()["in_flight"] == 1
+
+    asyncio.run(scenario())
+
+def test_async_cancel_leaves_queue():
+    limiter = AdaptiveLimiter(initial_limit=1, max_queue=4)
+
+    async def scenario():
+        await limiter.aacquire()
+        waiting = asyncio.ensure_future(limiter.aacquire(timeout=5))
+        await asyncio.sleep(0.01)
+        waiting.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiting
+        assert limiter.stats()["queue_depth"] == 0
+
+    asyncio.run(scenario())
@@ -0,0 +1,115 @@
+# tests/test_credential_manager.py
+
+import asyncio
+import threading
+import time
+import pytest
+from botocore.exceptions import CredentialRetrievalError, NoCredentialsError
+from botocore.session import get_session
+from credential_manager import CredentialManager
+
+class FakeProvider:
+    """
+    Hands out key-1, key-2, ... each expiring `lifetime` seconds after it is
+    fetched; `fail` makes the next fetches raise, `delay` slows them down.
+    """
+    def __init__(self, lifetime=3600.0, clock=time.time):
+        self.lifetime = lifetime
+        self.clock = clock
+        self.calls = 0
+        self.fail = False
+        self.delay = 0.0
+    def __call__(self):
+        self.calls += 1
+        time.sleep(self.delay)
+        if self.fail:
+            raise OSError("metadata service unavailable")
+        return {"access_key": f"key-{self.calls}", "secret_key": "secret", "token": "token",
+                "expiry_time": self.clock() + self.lifetime}
+
+def test_refreshes_in_background_before_expiry():
+    provider = FakeProvider(lifetime=10.05)
+    manager = CredentialManager(provider, refresh_margin=10.0, retry_interval=0.01, min_remaining=1.0)
+    manager.start()
+    assert manager.get_frozen_credentials().access_key == "key-1"
+    provider.lifetime = 3600.0
+    deadline = time.monotonic() + 5
+    while manager.get_frozen_credentials().access_key == "key-1" and time.monotonic() < deadline:
+        time.sleep(0.01)
+    manager.stop()
+    assert manager.get_frozen_credentials().access_key == "key-2"
+    stats = manager.stats()
+    assert stats["refreshes"] == 2 and stats["inline_refreshes"] == 0
+    assert stats["expires_in_s"] > 3000
+
+def test_requests_do_not_wait_for_a_refresh():
+    provider = FakeProvider()
+    manager = CredentialManager(provider)
+    manager.start()
+    provider.delay = 0.5
+    refresher = threading.Thread(target=manager.refresh)
+    refresher.start()
+    time.sleep(0.05)
+    started = time.perf_counter()
+    assert manager.get_frozen_credentials().access_key == "key-1"
+    assert time.perf_counter() - started < 0.1
+    refresher.join()
+    manager.stop()
+    assert manager.get_frozen_credentials().access_key == "key-2"
+
+def test_failed_refresh_keeps_current_credentials_until_expiry():
+    now = [1000.0]
+    provider = FakeProvider(lifetime=600.0, clock=lambda: now[0])
+    manager = CredentialManager(provider, refresh_margin=300.0, min_remaining=60.0, clock=lambda: now[0])
+    manager.start()
+    manager.stop()
+    provider.fail = True
+    with pytest.raises(CredentialRetrievalError):
+        manager.refresh()
+    assert manager.get_frozen_credentials().access_key == "key-1"
+    assert manager.stats()["failures"] == 1 and "unavailable" in manager.stats()["last_error"]
+    # Close to expiry with the background refresh still failing: fetch inline
+    now[0] += 560.0
+    with pytest.raises(CredentialRetrievalError):
+        manager.get_frozen_credentials()
+    provider.fail = False
+    assert manager.get_frozen_credentials().access_key == "key-4"
+    assert manager.stats()["inline_refreshes"] == 2
+
+def test_no_credentials():
+    manager = CredentialManager(lambda: None)
+    with pytest.raises(NoCredentialsError):
+        manager.start()
+
+def test_installed_session_signs_with_manager():
+    manager = CredentialManager(FakeProvider())
+    session = get_session()
+    manager.install(session)
+    client = session.create_client("bedrock-runtime", region_name="us-east-2")
+    assert session.get_credentials() is manager
+    assert client._request_signer._credentials.get_frozen_credentials().access_key == "key-1"
+
+def test_async_session_shares_the_manager():
+    provider = FakeProvider()
+    manager = CredentialManager(provider)
+    manager.start()
+    session = get_session()
+    manager.install_async(session)
+
+    async def sign():
+        credentials = await session.get_component("credential_provider").load_credentials()
+        return credentials.method, (await credentials.get_frozen_credentials()).access_key
+    assert asyncio.run(sign()) == ("managed", "key-1")
+    assert provider.calls == 1
+    manager.stop()
+
+def test_aiobotocore_client_signs_with_manager():
+    aio_session = pytest.importorskip("aiobotocore.session")
+    manager = CredentialManager(FakeProvider())
+    session = aio_session.get_session()
+    manager.install_async(session)
+
+    async def frozen():
+        async with session.create_client("bedrock-runtime", region_name="us-east-2") as client:
+            return await client._request_signer._credentials.get_frozen_credentials()
+    assert asyncio.run(frozen()).access_key == "key-1"
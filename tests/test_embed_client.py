@@ -0,0 +1,67 @@
+# tests/test_embed_client.py
+
+import json
+import threading
+import numpy as np
+import pytest
+from embed_client import EmbedClient
+
+class DummyBody:
+    def __init__(self, data):
+        self._data = data
+    def read(self):
+        return self._data
+
+class FakeEmbedRuntime:
+    """
+    Returns [len(text), 1, 0, ...] for each text; texts starting with "bad"
+    fail with a RuntimeError-worthy empty response.
+    """
+    def __init__(self):
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def invoke_model(self, **kwargs):
+        body = json.loads(kwargs["body"])
+        with self.lock:
+            self.calls.append(body["inputText"])
+        if body["inputText"].startswith("bad"):
+            return {"body": DummyBody(b'{"message": "nope"}')}
+        vector = [float(len(body["inputText"])), 1.0] + [0.0] * (body["dimensions"] - 2)
+        return {"body": DummyBody(json.dumps({"embedding": vector}).encode("utf-8"))}
+
+@pytest.fixture
+def runtime():
+    return FakeEmbedRuntime()
+
+@pytest.fixture
+def client(runtime):
+    return EmbedClient(region="us-east-2", model_id="amazon.titan-embed-text-v2:0", client=runtime)
+
+def test_embed_text(client):
+    assert client.embed_text("abc", dimensions=4) == [3.0, 1.0, 0.0, 0.0]
+
+def test_embed_many_preserves_order(client):
+    texts = [f"text {'x' * i}" for i in range(20)]
+    batch = client.embed_many(texts, concurrency=4, dimensions=4)
+    assert batch.ok
+    assert batch.vectors.dtype == np.float32
+    assert batch.vectors.flags["C_CONTIGUOUS"]
+    assert batch.vectors[:, 0].tolist() == [float(len(t)) for t in texts]
+
+def test_embed_many_dedups(client, runtime):
+    batch = client.embed_many(["a", "bb", "a", "a"], dimensions=4)
+    assert sorted(runtime.calls) == ["a", "bb"]
+    assert batch.vectors[:, 0].tolist() == [1.0, 2.0, 1.0, 1.0]
+
+def test_embed_many_reports_failures(client):
+    batch = client.embed_many(["ok", "bad one", "fine", "bad one"], dimensions=4)
+    assert not batch.ok
+    assert sorted(batch.errors) == [1, 3]
+    assert "No 'embedding' field" in batch.errors[1]
+    assert np.isnan(batch.vectors[1]).all()
+    assert batch.vectors[2, 0] == 4.0
+
+def test_embed_many_empty(client):
+    batch = client.embed_many([], dimensions=4)
+    assert batch.vectors.shape == (0, 4)
@@ -0,0 +1,118 @@
+# tests/test_embedding_cache.py
+
+import threading
+import numpy as np
+import pytest
+from embedding_cache import EmbeddingCache, embedding_key
+from embed_client import EmbedClient
+from tests.test_embed_client import FakeEmbedRuntime
+
+def vec(*values):
+    return np.asarray(values, dtype=np.float32)
+
+@pytest.fixture
+def cache(tmp_path):
+    return EmbeddingCache(str(tmp_path / "cache"))
+
+def test_key_covers_all_request_fields():
+    base = embedding_key("m", 512, True, "hi")
+    assert base == embedding_key("m", 512, True, "hi")
+    assert base != embedding_key("m2", 512, True, "hi")
+    assert base != embedding_key("m", 256, True, "hi")
+    assert base != embedding_key("m", 512, False, "hi")
+    assert base != embedding_key("m", 512, True, "hi ")
+
+def test_put_get_returns_memory_mapped_view(cache):
+    cache.put("m", "hello", vec(1, 2, 3), dimensions=3)
+    found = cache.get("m", "hello", dimensions=3)
+    assert found.tolist() == [1.0, 2.0, 3.0]
+    assert isinstance(found.base, np.memmap) or isinstance(found, np.memmap)
+    assert cache.get("m", "other", dimensions=3) is None
+    assert (cache.hits, cache.misses) == (1, 1)
+
+def test_visible_to_second_instance(cache, tmp_path):
+    other = EmbeddingCache(str(tmp_path / "cache"))
+    assert other.get("m", "a", dimensions=2) is None
+    cache.put_many("m", ["a", "b"], [vec(1, 0), vec(0, 1)], dimensions=2)
+    assert [v.tolist() for v in other.get_many("m", ["b", "a"], dimensions=2)] == [[0.0, 1.0], [1.0, 0.0]]
+
+def test_duplicate_puts_append_once(cache):
+    cache.put("m", "a", vec(1, 0), dimensions=2)
+    cache.put("m", "a", vec(1, 0), dimensions=2)
+    assert cache.stats()["entries"] == 1
+
+def test_many_entries_merge_into_sorted_index(cache):
+    texts = [f"t{i}" for i in range(5000)]
+    vectors = np.arange(10000, dtype=np.float32).reshape(5000, 2)
+    cache.put_many("m", texts, vectors, dimensions=2)
+    reopened = EmbeddingCache(cache.directory)
+    found = reopened.get_many("m", ["t0", "t4999", "missing"], dimensions=2)
+    assert found[0].tolist() == [0.0, 1.0]
+    assert found[1].tolist() == [9998.0, 9999.0]
+    assert found[2] is None
+
+def test_size_limit_compacts_to_newest(tmp_path):
+    cache = EmbeddingCache(str(tmp_path / "cache"), max_entries=4)
+    for i in range(5):
+        cache.put("m", f"t{i}", vec(i, i), dimensions=2)
+    stats = cache.stats()
+    assert stats["entries"] == 2
+    assert stats["bytes"] == 2 * (2 * 4) + 2 * 16
+    assert cache.get("m", "t0", dimensions=2) is None
+    assert cache.get("m", "t4", dimensions=2).tolist() == [4.0, 4.0]
+
+def test_compaction_seen_by_other_instance(cache, tmp_path):
+    other = EmbeddingCache(str(tmp_path / "cache"))
+    cache.put_many("m", ["a", "b", "c"], [vec(1, 1), vec(2, 2), vec(3, 3)], dimensions=2)
+    assert other.get("m", "a", dimensions=2).tolist() == [1.0, 1.0]
+    cache.compact(keep=1)
+    assert other.get("m", "a", dimensions=2) is None
+    assert other.get("m", "c", dimensions=2).tolist() == [3.0, 3.0]
+
+def test_hits_take_no_file_lock(cache, monkeypatch):
+    cache.put("m", "a", vec(1, 2), dimensions=2)
+    assert cache.get("m", "a", dimensions=2).tolist() == [1.0, 2.0]
+    def no_flock(*args):
+        raise AssertionError("read took the file lock")
+    monkeypatch.setattr("embedding_cache.fcntl.flock", no_flock)
+    assert cache.get("m", "a", dimensions=2).tolist() == [1.0, 2.0]
+    assert cache.get("m", "b", dimensions=2) is None
+
+def test_concurrent_reads_see_matching_vectors(cache, tmp_path):
+    # Each text's vector encodes its number, so a reader that paired one
+    # index with the wrong vector file would notice
+    writer = EmbeddingCache(str(tmp_path / "cache"), max_entries=300)
+    writer.put_many("m", [f"t{i}" for i in range(200)], [vec(i, i) for i in range(200)], dimensions=2)
+    done = threading.Event()
+    wrong = []
+
+    def read():
+        while not done.is_set():
+            for i in range(0, 2000, 7):
+                found = cache.get("m", f"t{i}", dimensions=2)
+                if found is not None and found.tolist() != [i, i]:
+                    wrong.append((i, found.tolist()))
+    readers = [threading.Thread(target=read) for _ in range(4)]
+    for t in readers:
+        t.start()
+    for start in range(200, 2000, 50):
+        writer.put_many("m", [f"t{i}" for i in range(start, start + 50)],
+                        [vec(i, i) for i in range(start, start + 50)], dimensions=2)
+    done.set()
+    for t in readers:
+        t.join()
+    assert not wrong
+    assert cache.get("m", "t1999", dimensions=2).tolist() == [1999.0, 1999.0]
+    assert cache.get("m", "t0", dimensions=2) is None
+
+def test_embed_client_uses_cache(cache):
+    runtime = FakeEmbedRuntime()
+    client = EmbedClient(region="us-east-2", model_id="titan", client=runtime, cache=cache)
+    assert client.embed_text("abc", dimensions=4) == [3.0, 1.0, 0.0, 0.0]
+    assert client.embed_text("abc", dimensions=4) == [3.0, 1.0, 0.0, 0.0]
+    batch = client.embed_many(["abc", "de", "bad", "de"], dimensions=4)
+    assert runtime.calls == ["abc", "de", "bad"]
+    assert batch.vectors[:, 0].tolist()[:2] == [3.0, 2.0]
+    assert list(batch.errors) == [2]
+    client.embed_many(["de"], dimensions=4)
+    assert runtime.calls == ["abc", "de", "bad"]
@@ -0,0 +1,180 @@
+# tests/test_fair_share.py
+
+import asyncio
+import threading
+import time
+import pytest
+from concurrency_limiter import AdaptiveLimiter
+from errors import OverloadedError, RateLimitedError
+from fair_share import FairQueue, FairShare, current_client, parse_client_map, set_client
+
+class W:
+    def __init__(self, client, name):
+        self.client = client
+        self.name = name
+
+def drain(queue):
+    return [queue.popleft().name for _ in range(len(queue))]
+
+def test_fair_queue_round_robin_by_weight():
+    queue = FairQueue(weight={"bulk": 1, "vip": 2}.get)
+    for i in range(4):
+        queue.append(W("bulk", f"b{i}"))
+    for i in range(4):
+        queue.append(W("vip", f"v{i}"))
+    queue.append(W("bulk", "b4"))
+    assert drain(queue) == ["b0", "v0", "v1", "b1", "v2", "v3", "b2", "b3", "b4"]
+    assert queue.clients() == 0
+
+def test_fair_queue_fractional_weight_and_fifo_default():
+    queue = FairQueue(weight={"slow": 0.5, "fast": 1}.get)
+    for i in range(3):
+        queue.append(W("slow", f"s{i}"))
+        queue.append(W("fast", f"f{i}"))
+    assert drain(queue) == ["f0", "s0", "f1", "f2", "s1", "s2"]
+    fifo = FairQueue()
+    for i in range(3):
+        fifo.append(W(None, i))
+    assert drain(fifo) == [0, 1, 2]
+
+def test_fair_queue_remove_and_pushout():
+    queue = FairQueue()
+    waiters = [W("a", "a0"), W("a", "a1"), W("a", "a2"), W("b", "b0")]
+    for w in waiters:
+        queue.append(w)
+    assert queue.longest() == "a" and queue.depth("b") == 1
+    assert queue.pop_newest("a").name == "a2"
+    queue.remove(waiters[3])
+    assert queue.clients() == 1 and len(queue) == 2
+    assert drain(queue) == ["a0", "a1"]
+    assert queue.longest() is None
+
+def test_identify_and_parse():
+    share = FairShare(api_keys=["secret"], weights={"key:vip": 2})
+    assert share.identify("secret", "1.2.3.4", "10.0.0.1") == "key:secret"
+    assert share.identify("vip", None, "10.0.0.1") == "key:vip"
+    # Unknown keys and forwarded addresses cannot mint new clients
+    assert share.identify("made-up", None, "10.0.0.1") == "ip:10.0.0.1"
+    assert share.identify(None, "1.2.3.4", "10.0.0.1") == "ip:10.0.0.1"
+    assert share.identify(None, None, None) == "ip:unknown"
+    proxied = FairShare(trust_forwarded=True)
+    assert proxied.identify(None, "6.6.6.6, 1.2.3.4", "10.0.0.1") == "ip:1.2.3.4"
+    assert parse_client_map("key:a==2, ip:1.2.3.4=0.5,") == {"key:a=": 2.0, "ip:1.2.3.4": 0.5}
+    with pytest.raises(ValueError):
+        parse_client_map("nonsense")
+    with pytest.raises(ValueError):
+        FairShare(weights={"key:a": 0})
+
+def test_from_env(monkeypatch):
+    monkeypatch.setenv("CLIENT_RATE_LIMIT", "2")
+    monkeypatch.setenv("CLIENT_WEIGHTS", "key:vip=3")
+    monkeypatch.setenv("CLIENT_ID_HEADER", "X-Client")
+    monkeypatch.setenv("CLIENT_API_KEYS", "team-a, team-b")
+    share = FairShare.from_env()
+    assert share.rate == 2 and share.weight("key:vip") == 3 and share.weight("ip:x") == 1
+    assert share.header == "X-Client" and not share.trust_forwarded
+    assert share.api_keys == {"vip", "team-a", "team-b"}
+    monkeypatch.setenv("FAIR_SHARE", "0")
+    assert FairShare.from_env() is None
+
+def test_rate_limit_per_client():
+    share = FairShare(rate=1, burst=2, rates={"key:bulk": 0.5})
+    limiter = AdaptiveLimiter(initial_limit=10, fair_share=share)
+    set_client("key:a")
+    for _ in range(2):
+        limiter.acquire()
+    with pytest.raises(RateLimitedError) as excinfo:
+        limiter.acquire()
+    assert excinfo.value.retry_after == 1
+    assert isinstance(excinfo.value, OverloadedError)
+    set_client("key:b")
+    limiter.acquire()
+    stats = limiter.stats()
+    assert stats["rate_limited"] == 1 and stats["in_flight"] == 3
+    assert share._bucket("key:bulk").rate == 0.5
+
+def test_refused_calls_spend_no_tokens():
+    share = FairShare(rate=1, burst=2)
+    limiter = AdaptiveLimiter(initial_limit=1, min_limit=1, max_queue=0, fair_share=share)
+    set_client("key:a")
+    limiter.acquire()
+    for _ in range(3):
+        with pytest.raises(OverloadedError) as excinfo:
+            limiter.acquire()
+        assert not isinstance(excinfo.value, RateLimitedError)
+    limiter.release()
+    limiter.acquire()   # the second token is still there
+    assert limiter.stats()["rate_limited"] == 0
+
+def queue_up(limiter, client, count, outcomes):
+    threads = []
+    settled = limiter.stats()["queue_depth"] + len(outcomes)
+    for _ in range(count):
+        def run():
+            set_client(client)
+            try:
+                limiter.acquire(timeout=5)
+                outcomes.append(client)
+            except OverloadedError:
+                outcomes.append("rejected:" + client)
+        t = threading.Thread(target=run)
+        t.start()
+        threads.append(t)
+        deadline = time.monotonic() + 2
+        while len(outcomes) + limiter.stats()["queue_depth"] < settled + len(threads) and time.monotonic() < deadline:
+            time.sleep(0.001)
+    return threads
+
+def test_light_client_served_before_bulk_backlog():
+    limiter = AdaptiveLimiter(initial_limit=1, min_limit=1, max_queue=16, fair_share=FairShare())
+    set_client("key:bulk")
+    limiter.acquire()
+    outcomes = []
+    threads = queue_up(limiter, "key:bulk", 5, outcomes)
+    threads += queue_up(limiter, "key:user", 1, outcomes)
+    for _ in range(6):
+        limiter.release()
+        time.sleep(0.02)
+    for t in threads:
+        t.join()
+    # The user's one call goes second, not after the five queued bulk calls
+    assert outcomes.index("key:user") == 1
+
+def test_full_queue_pushes_out_heaviest_client():
+    limiter = AdaptiveLimiter(initial_limit=1, min_limit=1, max_queue=3, fair_share=FairShare())
+    set_client("key:bulk")
+    limiter.acquire()
+    outcomes = []
+    threads = queue_up(limiter, "key:bulk", 3, outcomes)
+    threads += queue_up(limiter, "key:user", 1, outcomes)
+    assert outcomes == ["rejected:key:bulk"]
+    assert limiter.stats()["rejected"] == 1 and limiter.stats()["clients_waiting"] == 2
+    # A client that already has the most waiters is refused itself
+    set_client("key:bulk")
+    with pytest.raises(OverloadedError):
+        limiter.acquire()
+    for _ in range(4):
+        limiter.release()
+        time.sleep(0.02)
+    for t in threads:
+        t.join()
+    assert outcomes[1:3] == ["key:bulk", "key:user"]
+
+def test_async_waiter_pushed_out():
+    async def main():
+        limiter = AdaptiveLimiter(initial_limit=1, min_limit=1, max_queue=2, fair_share=FairShare())
+        set_client("key:bulk")
+        await limiter.aacquire()
+        bulk = [asyncio.ensure_future(limiter.aacquire(timeout=5)) for _ in range(2)]
+        await asyncio.sleep(0.01)
+        set_client("key:user")
+        user = asyncio.ensure_future(limiter.aacquire(timeout=5))
+        await asyncio.sleep(0.01)
+        with pytest.raises(OverloadedError):
+            await bulk[1]
+        limiter.release()
+        await bulk[0]
+        limiter.release()
+        await user
+        assert current_client() == "key:user"
+    asyncio.run(main())
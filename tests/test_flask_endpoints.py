@@ -4,20 +4,28 @@ import os
 import json
 import pytest
 from app import app
+from concurrency_limiter import AdaptiveLimiter
+from response_cache import ResponseCache
 
 @pytest.fixture
 def client():
     os.environ["AWS_REGION"] = "us-east-2"
     os.environ["BEDROCK_MODEL_ID"] = "meta.llama3-3-70b-instruct-v1:0"
-    # Monkey‐patch BedrockClient.invoke to avoid actual AWS calls
-    import bedrock_client
+    # Monkey‐patch the shared Bedrock client to avoid actual AWS calls
+    import app as app_module
     class FakeBC:
+        model_id = "fake-model"
         def __init__(self):
             pass
         def invoke(self, prompt, max_gen_len=512, temperature=0.5, top_p=0.9):
             return "fake reply"
+        def invoke_stream(self, prompt, max_gen_len=512, temperature=0.5, top_p=0.9):
+            yield "fake"
+            yield " reply"
     monkeypatch = pytest.MonkeyPatch()
-    monkeypatch.setattr(bedrock_client, "BedrockClient", FakeBC)
+    monkeypatch.setattr(app_module, "get_bedrock_client", FakeBC)
+    monkeypatch.setattr(app_module, "response_cache", ResponseCache(max_entries=0))
+    monkeypatch.setattr(app_module, "limiter", AdaptiveLimiter())
 
     with app.test_client() as c:
         yield c
@@ -52,3 +60,359 @@ def test_chat_endpoint_bad_requests(client):
     data = {"message": "   "}
     resp = client.post("/chat", data=json.dumps(data), content_type="application/json")
     assert resp.status_code == 400
+
+def test_chat_stream_endpoint(client):
+    data = {"message": "Hello"}
+    resp = client.post("/chat/stream", data=json.dumps(data), content_type="application/json")
+    assert resp.status_code == 200
+    assert resp.mimetype == "text/event-stream"
+    body = resp.get_data(as_text=True)
+    frames = [f for f in body.split("\n\n") if f]
+    assert frames[0] == 'data: {"text": "fake"}'
+    assert frames[1] == 'data: {"text": " reply"}'
+    assert frames[2].startswith("event: done")
+
+def test_chat_stream_endpoint_empty_message(client):
+    resp = client.post("/chat/stream", data=json.dumps({"message": " "}), content_type="application/json")
+    assert resp.status_code == 400
+
+def test_chat_endpoint_serves_repeat_from_cache(client, monkeypatch):
+    import app as app_module
+    calls = []
+    class CountingBC:
+        model_id = "fake-model"
+        def invoke(self, prompt, **params):
+            calls.append(prompt)
+            return "cached reply"
+    monkeypatch.setattr(app_module, "get_bedrock_client", CountingBC)
+    monkeypatch.setattr(app_module, "response_cache", ResponseCache(max_entries=8))
+    for _ in range(3):
+        resp = client.post("/chat", data=json.dumps({"message": "Hi"}), content_type="application/json")
+        assert resp.get_json()["reply"] == "cached reply"
+    assert len(calls) == 1
+    assert app_module.response_cache.stats()["hits"] == 2
+
+def test_chat_endpoint_semantic_cache_hit(client, monkeypatch):
+    import app as app_module
+    from semantic_cache import SemanticCache
+    vectors = {"hi there": [1.0, 0.0], "hello there": [0.99, 0.1]}
+    calls = []
+    class CountingBC:
+        model_id = "fake-model"
+        def invoke(self, prompt, **params):
+            calls.append(prompt)
+            return "Hello!"
+    monkeypatch.setattr(app_module, "get_bedrock_client", CountingBC)
+    monkeypatch.setattr(app_module, "semantic_cache", SemanticCache(vectors.get, threshold=0.95))
+    for message in ("hi there", "hello there"):
+        resp = client.post("/chat", data=json.dumps({"message": message}), content_type="application/json")
+        assert resp.get_json()["reply"] == "Hello!"
+    assert len(calls) == 1
+
+def test_chat_endpoint_injects_retrieved_context(client, monkeypatch):
+    import app as app_module
+    from vector_store import VectorStore, Retriever
+    prompts = []
+    class RecordingBC:
+        model_id = "fake-model"
+        def invoke(self, prompt, **params):
+            prompts.append(prompt)
+            return "ok"
+    store = VectorStore(2)
+    store.add(["faq-1"], [[1, 0]], ["Support hours are 9 to 5."])
+    monkeypatch.setattr(app_module, "get_bedrock_client", RecordingBC)
+    monkeypatch.setattr(app_module, "retriever", Retriever(store, embed_fn=lambda text: [1, 0]))
+    client.post("/chat", data=json.dumps({"message": "When are you open?"}), content_type="application/json")
+    assert "- Support hours are 9 to 5.\nUser: When are you open?\nAssistant:" in prompts[0]
+
+def test_chat_endpoint_coalesces_identical_requests(client, monkeypatch):
+    import threading
+    import app as app_module
+    from single_flight import SingleFlight
+    release = threading.Event()
+    calls = []
+    class SlowBC:
+        model_id = "fake-model"
+        def invoke(self, prompt, **params):
+            calls.append(prompt)
+            release.wait(5)
+            return "shared reply"
+    monkeypatch.setattr(app_module, "get_bedrock_client", SlowBC)
+    monkeypatch.setattr(app_module, "inflight", SingleFlight())
+    replies = []
+    def post():
+        with app.test_client() as c:
+            resp = c.post("/chat", data=json.dumps({"message": "Hot prompt"}), content_type="application/json")
+            replies.append(resp.get_json()["reply"])
+            reports.append(resp.headers.get("X-Generation"))
+    reports = []
+    threads = [threading.Thread(target=post) for _ in range(5)]
+    for t in threads:
+        t.start()
+    while app_module.inflight.stats()["collapsed"] < 4:
+        pass
+    release.set()
+    for t in threads:
+        t.join()
+    assert replies == ["shared reply"] * 5
+    assert len(calls) == 1
+    # Only the request that made the call reports its generation
+    assert sum(report is not None for report in reports) == (app_module.generation_policy is not None)
+
+def test_chat_endpoint_overloaded(client, monkeypatch):
+    import app as app_module
+    monkeypatch.setattr(app_module, "limiter", AdaptiveLimiter(initial_limit=1, max_queue=0))
+    app_module.limiter.acquire()
+    for path in ("/chat", "/chat/stream"):
+        resp = client.post(path, data=json.dumps({"message": "Hello"}), content_type="application/json")
+        assert resp.status_code == 429
+        assert int(resp.headers["Retry-After"]) >= 1
+
+def test_chat_endpoint_throttled(client, monkeypatch):
+    import app as app_module
+    from errors import ThrottlingError
+    class ThrottledBC:
+        model_id = "fake-model"
+        def invoke(self, prompt, **params):
+            raise ThrottlingError("slow down")
+    monkeypatch.setattr(app_module, "get_bedrock_client", ThrottledBC)
+    resp = client.post("/chat", data=json.dumps({"message": "Hello"}), content_type="application/json")
+    assert resp.status_code == 429
+    assert "Retry-After" in resp.headers
+    stats = client.get("/stats").get_json()["limiter"]
+    assert stats["throttled"] == 1
+    assert stats["in_flight"] == 0
+
+def test_chat_stream_releases_slot(client):
+    import app as app_module
+    resp = client.post("/chat/stream", data=json.dumps({"message": "Hello"}), content_type="application/json")
+    resp.get_data()
+    assert app_module.limiter.stats()["in_flight"] == 0
+
+def test_chat_endpoint_sessions(client, monkeypatch):
+    import app as app_module
+    from session_store import MemorySessionStore
+    prompts = []
+    class RecordingBC:
+        model_id = "fake-model"
+        def invoke(self, prompt, **params):
+            prompts.append(prompt)
+            return f"reply {len(prompts)}"
+    monkeypatch.setattr(app_module, "get_bedrock_client", RecordingBC)
+    monkeypatch.setattr(app_module, "sessions", MemorySessionStore())
+
+    first = client.post("/chat", data=json.dumps({"message": "My name is alice"}), content_type="application/json")
+    session_id = first.get_json()["session_id"]
+    assert "session_id=" in first.headers["Set-Cookie"]
+    assert prompts[0].startswith("System: Respond ONLY")     # no history yet
+
+    # The test client sends the cookie back
+    second = client.post("/chat", data=json.dumps({"message": "What is my name?"}), content_type="application/json")
+    assert second.get_json() == {"reply": "reply 2", "session_id": session_id}
+    assert prompts[1].endswith(
+        "You are talking to Alice.\nUser: My name is alice\nAssistant: reply 1\nUser: What is my name?\nAssistant:"
+    )
+
+    other = client.post("/chat", data=json.dumps({"message": "Hi", "session_id": "other"}), content_type="application/json")
+    assert other.get_json()["session_id"] == "other"
+    assert "Assistant: reply" not in prompts[2]
+
+def test_chat_stream_endpoint_sessions(client, monkeypatch):
+    import app as app_module
+    from session_store import MemorySessionStore
+    monkeypatch.setattr(app_module, "sessions", MemorySessionStore())
+    resp = client.post("/chat/stream", data=json.dumps({"message": "Hello", "session_id": "s1"}), content_type="application/json")
+    done = resp.get_data(as_text=True).split("event: done\ndata: ")[1]
+    assert json.loads(done)["session_id"] == "s1"
+    assert app_module.sessions.get("s1").messages() == [("user", "Hello"), ("assistant", "fake reply")]
+
+def test_multi_turn_prompt_stays_within_token_budget(monkeypatch):
+    import app as app_module
+    from session_store import ASSISTANT, USER, Session
+    from token_budget import TokenBudget, estimate_tokens
+    monkeypatch.setattr(app_module, "prompt_budget", TokenBudget(max_prompt_tokens=120))
+    session = Session("s")
+    session.summary = "The user asked about tides."
+    for i in range(20):
+        session.add(USER, f"question number {i}")
+        session.add(ASSISTANT, f"answer number {i}")
+    prompt = app_module.build_prompt_multi_turn(session, "And now?", ["passage one", "x" * 2000])
+    assert estimate_tokens(prompt) <= 120
+    assert "Summary of the earlier conversation: The user asked about tides." in prompt
+    assert "- passage one" in prompt and "x" * 100 not in prompt      # oversized passage dropped
+    assert prompt.endswith("Assistant: answer number 19\nUser: And now?\nAssistant:")
+    assert "question number 0\n" not in prompt                        # oldest turns left out
+
+def test_chat_batch_streams_results_in_completion_order(client, monkeypatch):
+    import threading
+    import app as app_module
+    from errors import BedrockInvocationError
+    release_first = threading.Event()
+    class BatchBC:
+        model_id = "fake-model"
+        def invoke(self, prompt, max_gen_len=512, temperature=0.5, top_p=0.9):
+            if "slow" in prompt:
+                release_first.wait(5)
+            if "broken" in prompt:
+                raise BedrockInvocationError("boom")
+            return f"reply {max_gen_len}"
+    monkeypatch.setattr(app_module, "get_bedrock_client", BatchBC)
+
+    body = {"messages": ["slow one", {"message": "fast", "max_gen_len": 64}, "broken", {"message": ""}], "parallelism": 4}
+    resp = client.post("/chat/batch", data=json.dumps(body), content_type="application/json")
+    assert resp.mimetype == "application/x-ndjson"
+    lines = resp.response
+    results = []
+    for line in lines:
+        result = json.loads(line)
+        results.append(result)
+        if len(results) == 3:
+            release_first.set()     # the slow item finishes only after the others
+    assert results[-1] == {"done": True, "count": 4, "failed": 2}
+    by_index = {r["index"]: r for r in results[:-1]}
+    assert results[3]["index"] == 0
+    assert by_index[0]["reply"] == "reply 128"
+    assert by_index[1]["reply"] == "reply 64"
+    assert by_index[2]["status"] == 502
+    assert by_index[3] == {"index": 3, "error": "Message cannot be empty.", "status": 400}
+
+def test_chat_batch_items_get_the_policy_max_gen_len(client, monkeypatch):
+    import app as app_module
+    sent = {}
+    class PolicyBC:
+        model_id = "fake-model"
+        def invoke(self, prompt, max_gen_len=512, temperature=0.5, top_p=0.9):
+            message = prompt.rsplit("User: ", 1)[1].split("\n")[0]
+            sent[message] = max_gen_len
+            return "Sure.\nUser: and more?" if message == "hi" else "ok"
+    monkeypatch.setattr(app_module, "get_bedrock_client", PolicyBC)
+    policy = app_module.generation_policy
+    body = {"messages": ["hi", "Write a story about a fox", {"message": "hello", "max_gen_len": 32},
+                         {"message": "Explain TCP", "latency_budget_ms": -1}]}
+    resp = client.post("/chat/batch", data=json.dumps(body), content_type="application/json")
+    by_index = {r["index"]: r for r in map(json.loads, resp.get_data(as_text=True).splitlines()[:-1])}
+    assert sent == {"hi": policy.max_gen_len("hi"), "Write a story about a fox": policy.max_gen_len("write a story"),
+                    "hello": 32}
+    assert sent["hi"] < 512
+    assert by_index[0]["reply"] == "Sure."                 # invented turn cut
+    assert by_index[0]["generation"]["max_gen_len"] == sent["hi"]
+    assert by_index[3]["status"] == 400
+
+def test_chat_batch_bounded_parallelism(client, monkeypatch):
+    import threading
+    import time
+    import app as app_module
+    active, peak, lock = [0], [0], threading.Lock()
+    class CountingBC:
+        model_id = "fake-model"
+        def invoke(self, prompt, **params):
+            with lock:
+                active[0] += 1
+                peak[0] = max(peak[0], active[0])
+            time.sleep(0.01)
+            with lock:
+                active[0] -= 1
+            return "ok"
+    monkeypatch.setattr(app_module, "get_bedrock_client", CountingBC)
+    body = {"messages": [f"question {i}" for i in range(30)], "parallelism": 3}
+    resp = client.post("/chat/batch", data=json.dumps(body), content_type="application/json")
+    lines = [json.loads(line) for line in resp.get_data(as_text=True).splitlines()]
+    assert sorted(r["index"] for r in lines[:-1]) == list(range(30))
+    assert peak[0] <= 3
+
+def test_chat_batch_bad_requests(client):
+    for body in ({}, {"messages": []}, {"messages": "hi"}, {"messages": ["hi"], "parallelism": 0},
+                 {"messages": ["hi"] * 1001}):
+        resp = client.post("/chat/batch", data=json.dumps(body), content_type="application/json")
+        assert resp.status_code == 400
+    body = {"messages": [{"message": "hi", "temperature": 3}, {"message": "hi", "max_gen_len": "x"}]}
+    lines = client.post("/chat/batch", data=json.dumps(body), content_type="application/json").get_data(as_text=True)
+    assert [json.loads(line).get("status") for line in lines.splitlines()][:2] == [400, 400]
+
+def test_healthz_reports_readiness(client, monkeypatch):
+    import app as app_module
+    started = []
+    state = {"status": "starting"}
+    monkeypatch.setattr(app_module, "readiness", lambda: dict(state))
+    monkeypatch.setattr(app_module, "start_warm_up", lambda: started.append(True))
+    resp = client.get("/healthz")
+    assert resp.status_code == 503 and resp.get_json() == {"status": "starting"}
+    assert started == [True]
+    state.update(status="ready", client_ms=80.0, connect_ms=20.0)
+    resp = client.get("/healthz")
+    assert resp.status_code == 200 and resp.get_json()["status"] == "ready"
+    assert started == [True]
+
+def test_chat_trims_invented_turns_and_reports_generation(client, monkeypatch):
+    import app as app_module
+    from generation_policy import GenerationPolicy
+    calls = []
+    class RamblingBC:
+        model_id = "fake-model"
+        def invoke(self, prompt, max_gen_len=512, temperature=0.5, top_p=0.9):
+            calls.append(max_gen_len)
+            return "Paris.\nUser: And Spain?\nAssistant: Madrid."
+    monkeypatch.setattr(app_module, "get_bedrock_client", RamblingBC)
+    monkeypatch.setattr(app_module, "generation_policy", GenerationPolicy())
+    resp = client.post("/chat", data=json.dumps({"message": "Capital of France?"}), content_type="application/json")
+    assert resp.get_json() == {"reply": "Paris."}
+    assert calls == [128]
+    assert "trimmed_tokens=" in resp.headers["X-Generation"] and "max_gen_len=128" in resp.headers["X-Generation"]
+    client.post("/chat", data=json.dumps({"message": "Write a poem", "latency_budget_ms": 2400}),
+                content_type="application/json")
+    assert calls[1] == 80   # (2400 - 400) ms at 40 tokens/s
+    resp = client.post("/chat", data=json.dumps({"message": "hi", "latency_budget_ms": "soon"}),
+                       content_type="application/json")
+    assert resp.status_code == 400
+    assert app_module.generation_policy.stats()["trimmed"] == 2
+
+def test_chat_stream_closes_bedrock_stream_at_invented_turn(client, monkeypatch):
+    import app as app_module
+    from generation_policy import GenerationPolicy
+    closed = []
+    class RamblingStreamBC:
+        model_id = "fake-model"
+        def invoke_stream(self, prompt, max_gen_len=512, temperature=0.5, top_p=0.9):
+            try:
+                for chunk in ("Bonjour", " !\n", "Us", "er: thanks", "\nAssistant: You're welcome"):
+                    yield chunk
+            finally:
+                closed.append(True)
+    monkeypatch.setattr(app_module, "get_bedrock_client", RamblingStreamBC)
+    monkeypatch.setattr(app_module, "generation_policy", GenerationPolicy())
+    resp = client.post("/chat/stream", data=json.dumps({"message": "Say hello in French"}), content_type="application/json")
+    frames = [f for f in resp.get_data(as_text=True).split("\n\n") if f]
+    assert frames[:2] == ['data: {"text": "Bonjour"}', 'data: {"text": " !"}']
+    report = json.loads(frames[2].split("data: ")[1])["generation"]
+    assert report["max_gen_len"] == 128 and report["saved_tokens"] > 0
+    assert closed == [True] and app_module.generation_policy.stats()["stopped_early"] == 1
+
+def test_chat_does_not_cache_a_reply_that_is_only_an_invented_turn(client, monkeypatch):
+    import app as app_module
+    from generation_policy import GenerationPolicy
+    cache = ResponseCache(max_entries=10)
+    monkeypatch.setattr(app_module, "response_cache", cache)
+    monkeypatch.setattr(app_module, "generation_policy", GenerationPolicy())
+    class OnlyTurnBC:
+        model_id = "fake-model"
+        def invoke(self, prompt, **params):
+            return "\nUser: hello again"
+    monkeypatch.setattr(app_module, "get_bedrock_client", OnlyTurnBC)
+    resp = client.post("/chat", data=json.dumps({"message": "Hello"}), content_type="application/json")
+    assert resp.status_code == 200 and resp.get_json()["reply"] == "\nUser: hello again"
+    assert cache.stats()["entries"] == 0
+
+def test_gunicorn_post_fork_gives_the_worker_its_own_compactor(monkeypatch):
+    import runpy
+    import app as app_module
+    import client_pool
+    from session_store import MemorySessionStore
+    monkeypatch.setattr(app_module, "sessions", MemorySessionStore())
+    monkeypatch.setattr(client_pool, "reset_pool", lambda: None)
+    monkeypatch.setattr(client_pool, "start_warm_up", lambda report: None)
+    conf = runpy.run_path(os.path.join(os.path.dirname(os.path.dirname(__file__)), "gunicorn.conf.py"))
+    app_module.start_history_compactor()
+    built_in_master = app_module.sessions.compactor
+    conf["post_fork"](None, None)
+    assert app_module.sessions.compactor is not None
+    assert app_module.sessions.compactor is not built_in_master
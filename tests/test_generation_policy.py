@@ -0,0 +1,58 @@
+# tests/test_generation_policy.py
+
+import pytest
+from generation_policy import GenerationPolicy, StopScanner, format_report, split_continuation
+
+def test_split_continuation():
+    assert split_continuation("Paris is the capital.  \n\nUser: thanks\nAssistant: np") == (
+        "Paris is the capital.", "\nUser: thanks\nAssistant: np")
+    assert split_continuation("No turns here.\nUsers: are fine") == ("No turns here.\nUsers: are fine", "")
+    assert split_continuation("a\nSystem: b\nUser: c")[0] == "a"
+
+def test_stop_scanner_holds_back_partial_stop_sequences():
+    scanner = StopScanner()
+    out = [scanner.feed(chunk) for chunk in ("Hello", " there\n", "\nUs", "ing this")]
+    assert "".join(out) + scanner.flush() == "Hello there\n\nUsing this"
+    assert out[1] == " there" and not scanner.stopped
+
+    scanner = StopScanner()
+    out = [scanner.feed(chunk) for chunk in ("Done.", " \n", "Sys", "tem: ignore", " more")]
+    assert "".join(out) == "Done." and scanner.stopped
+    assert "".join(scanner.generated).endswith("System: ignore more")
+
+def test_max_gen_len_by_class_and_budget():
+    policy = GenerationPolicy(short_len=100, default_len=300, long_len=500, tokens_per_second=50, first_token_ms=200)
+    assert policy.classify("hi!") == "short"
+    assert policy.classify("Please write a short story about a fox") == "long"
+    assert policy.classify(" ".join(["word"] * 40)) == "default"
+    assert policy.max_gen_len("Explain TCP slow start") == 500
+    assert policy.max_gen_len("Explain TCP slow start", latency_budget_ms=2200) == 100
+    assert policy.max_gen_len("Explain TCP slow start", latency_budget_ms=100) == policy.min_len
+
+def test_finish_reports_savings_against_baseline():
+    policy = GenerationPolicy(tokens_per_second=50)
+    reply, report = policy.finish("Short answer.", 128)
+    assert reply == "Short answer." and report["saved_tokens"] == 0
+    rambling = "Yes." + "\nUser: more?\nAssistant: sure" * 30
+    reply, report = policy.finish(rambling, 128)
+    assert reply == "Yes." and report["tokens"] >= 0.9 * 128
+    assert report["saved_tokens"] == 512 - report["tokens"]
+    assert report["saved_ms"] == round(report["saved_tokens"] / 50 * 1000)
+    _, report = policy.finish("Hi\nUser:", 128, stopped=True)
+    assert report["saved_tokens"] == 512 - report["tokens"]
+    stats = policy.stats()
+    assert stats["requests"] == 3 and stats["trimmed"] == 2 and stats["stopped_early"] == 1
+    assert format_report({"a": 1, "b": 2}) == "a=1, b=2"
+
+def test_observe_learns_decode_rate():
+    policy = GenerationPolicy(tokens_per_second=40, smoothing=0.5)
+    policy.observe(100, 1.0)
+    assert policy.tokens_per_second == pytest.approx(70)
+    policy.observe(5, 1.0)  # too short to say anything
+    assert policy.tokens_per_second == pytest.approx(70)
+
+def test_from_env(monkeypatch):
+    monkeypatch.setenv("GENERATION_MAX_LEN_SHORT", "64")
+    assert GenerationPolicy.from_env().max_gen_len("hello") == 64
+    monkeypatch.setenv("GENERATION_POLICY", "0")
+    assert GenerationPolicy.from_env() is None
@@ -0,0 +1,40 @@
+# tests/test_lazy_import.py
+
+import os
+import subprocess
+import sys
+import types
+from lazy_import import LazyModule, lazy_module
+
+def test_imports_on_first_use(monkeypatch):
+    monkeypatch.delitem(sys.modules, "colorsys", raising=False)
+    module = lazy_module("colorsys")
+    assert isinstance(module, LazyModule)
+    assert "colorsys" not in sys.modules
+    assert module.rgb_to_hsv(1, 0, 0) == (0.0, 1.0, 1.0)
+    assert "colorsys" in sys.modules
+
+def test_already_imported_module_is_returned_as_is():
+    assert lazy_module("json") is sys.modules["json"]
+
+def test_setattr_patches_the_real_module(monkeypatch):
+    real = types.ModuleType("fake_heavy")
+    real.value = 1
+    monkeypatch.setitem(sys.modules, "fake_heavy", real)
+    proxy = LazyModule("fake_heavy")
+    monkeypatch.setattr(proxy, "value", 2)
+    assert real.value == 2 and proxy.value == 2
+    monkeypatch.undo()
+    assert real.value == 1
+
+def test_app_import_defers_boto3_and_numpy():
+    code = "import sys, app; print(sorted(m for m in ('boto3', 'botocore', 'numpy') if m in sys.modules))"
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    out = subprocess.run([sys.executable, "-c", code], cwd=root, capture_output=True, text=True, check=True).stdout
+    assert out.strip() == "[]"
+
+def test_bulk_inference_cli_does_not_import_the_web_app():
+    code = "import sys, run_inference; print(sorted(m for m in ('flask', 'app', 'session_store') if m in sys.modules))"
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    out = subprocess.run([sys.executable, "-c", code], cwd=root, capture_output=True, text=True, check=True).stdout
+    assert out.strip() == "[]"
@@ -20,7 +20,7 @@ class FailingBedrockClient:
 
 @pytest.fixture(autouse=True)
 def patch_bedrock(monkeypatch):
-    monkeypatch.setattr(main, "BedrockClient", lambda: DummyBedrockClient())
+    monkeypatch.setattr(main, "get_bedrock_client", lambda: DummyBedrockClient())
 
 @patch("builtins.input", side_effect=["hello", "exit"])
 def test_run_cli_happy_path(mock_input, capsys):
@@ -42,7 +42,7 @@ def test_run_cli_keyboard_interrupt(mock_input, capsys):
 
 @patch("builtins.input", side_effect=["test error", "exit"])
 def test_run_cli_bedrock_fails(mock_input, monkeypatch, capsys):
-    monkeypatch.setattr(main, "BedrockClient", lambda: FailingBedrockClient())
+    monkeypatch.setattr(main, "get_bedrock_client", lambda: FailingBedrockClient())
     main.run_cli()
     captured = capsys.readouterr()
     assert "[Error] Could not get response from Bedrock" in captured.out
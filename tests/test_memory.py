@@ -0,0 +1,40 @@
+# tests/test_memory.py
+
+from memory import Memory, SlotExtractor, SlotPattern
+
+def test_parse_and_store_default_slots():
+    memory = Memory()
+    memory.parse_and_store("Hi! My  name is alice. My favorite color is GREEN!")
+    assert memory.get("user_name") == "Alice"
+    assert memory.get("favorite_color") == "green"
+    assert memory.to_prompt() == "You are talking to Alice. The user likes green."
+
+def test_no_slot_or_missing_value():
+    memory = Memory()
+    memory.parse_and_store("my name is")
+    memory.parse_and_store("enemy name is bob")   # phrase must start at a word
+    assert memory.slots == {}
+    assert memory.to_prompt() == ""
+
+def test_later_mention_wins_and_prompt_cache_invalidated():
+    memory = Memory()
+    memory.parse_and_store("My name is bob")
+    assert memory.to_prompt() == "You are talking to Bob."
+    memory.parse_and_store("Sorry, my name is carol, not bob. My name is dave")
+    assert memory.to_prompt() == "You are talking to Dave."
+    memory.set("favorite_color", "red")
+    assert memory.to_prompt() == "You are talking to Dave. The user likes red."
+
+def test_custom_patterns_share_prefixes():
+    extractor = SlotExtractor([
+        SlotPattern("nickname", ["my name", "call me"], "Call them {}."),
+        SlotPattern("user_name", "my name is", "You are talking to {}.", normalize="title"),
+        SlotPattern("pet", "my dog is called", "Their dog is {}.", normalize="title"),
+    ])
+    assert extractor.extract("my name is bob, call me B and my dog is called rex") == {
+        "user_name": "Bob", "nickname": "B", "pet": "Rex",
+    }
+    assert extractor.extract("my name isabel") == {"nickname": "isabel"}
+    memory = Memory(extractor)
+    memory.parse_and_store("call me Al")
+    assert memory.to_prompt() == "Call them Al."
@@ -0,0 +1,78 @@
+# tests/test_metrics.py
+
+import json
+import pytest
+import metrics
+from bedrock_client import BedrockClient
+from bedrock_emulator import BedrockEmulator, EmulatedBody
+
+@pytest.fixture(autouse=True)
+def fresh_metrics(monkeypatch):
+    monkeypatch.setattr(metrics, "enabled", True)
+    metrics.reset()
+    yield
+    metrics.reset()
+
+def test_histogram_buckets_and_render():
+    hist = metrics.Histogram("demo_seconds", "Demo.", ("stage",), buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 3.0):
+        hist.observe(value, "a")
+    assert hist.count("a") == 4
+    lines = hist.render()
+    assert 'demo_seconds_bucket{stage="a",le="0.1"} 2' in lines
+    assert 'demo_seconds_bucket{stage="a",le="1.0"} 3' in lines
+    assert 'demo_seconds_bucket{stage="a",le="+Inf"} 4' in lines
+    assert 'demo_seconds_sum{stage="a"} 3.65' in lines
+    assert 'demo_seconds_count{stage="a"} 4' in lines
+
+def test_stage_timings_feed_server_timing():
+    metrics.start_request()
+    with metrics.stage("prompt"):
+        pass
+    with metrics.stage("bedrock"):
+        pass
+    header = metrics.finish_request("/chat", 200)
+    assert [entry.split(";")[0] for entry in header.split(", ")] == ["prompt", "bedrock", "total"]
+    assert metrics.STAGE_SECONDS.count("prompt") == 1
+    assert metrics.REQUEST_SECONDS.count("/chat", "200") == 1
+    assert metrics.finish_request("/chat", 200) is None
+
+def test_disabled_is_a_no_op(monkeypatch):
+    monkeypatch.setattr(metrics, "enabled", False)
+    metrics.start_request()
+    with metrics.stage("prompt"):
+        pass
+    metrics.count(metrics.RESPONSE_SHAPES, "m", "text")
+    assert metrics.STAGE_SECONDS.count("prompt") == 0
+    assert metrics.RESPONSE_SHAPES.value("m", "text") == 0
+
+def test_response_shapes_counted_per_model():
+    class ShapeRuntime:
+        def __init__(self, payloads):
+            self.payloads = payloads
+        def invoke_model(self, **kwargs):
+            return {"body": EmulatedBody(json.dumps(self.payloads.pop(0)).encode())}
+
+    runtime = ShapeRuntime([{"generation": "a"}, {"completion": "b"}, {"choices": [{"message": {"content": [{"text": "c"}]}}]}])
+    bc = BedrockClient(region="local", model_id="model-x", client=runtime)
+    for _ in range(3):
+        bc.invoke("hi")
+    assert [metrics.RESPONSE_SHAPES.value("model-x", s) for s in ("generation", "completion", "choices")] == [1, 1, 1]
+    assert metrics.STAGE_SECONDS.count("bedrock") == 3
+    assert 'bedrock_response_shape_total{model="model-x",shape="choices"} 1' in metrics.render()
+
+def test_flask_server_timing_and_metrics_endpoint(monkeypatch):
+    import app as app_module
+    from concurrency_limiter import AdaptiveLimiter
+    bc = BedrockClient(region="local", model_id="model-y", client=BedrockEmulator())
+    monkeypatch.setattr(app_module, "get_bedrock_client", lambda: bc)
+    monkeypatch.setattr(app_module, "limiter", AdaptiveLimiter())
+    app_module.response_cache.clear()
+    client = app_module.app.test_client()
+    resp = client.post("/chat", data=json.dumps({"message": "timing please"}), content_type="application/json")
+    stages = [entry.split(";")[0] for entry in resp.headers["Server-Timing"].split(", ")]
+    assert stages[:2] == ["parse", "session"] and "bedrock" in stages and stages[-1] == "total"
+    body = client.get("/metrics").get_data(as_text=True)
+    assert 'chat_stage_seconds_count{stage="bedrock"} 1' in body
+    assert 'http_request_duration_seconds_count{path="/chat",status="200"} 1' in body
+    assert 'bedrock_response_shape_total{model="model-y",shape="generation"} 1' in body
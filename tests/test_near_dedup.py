@@ -0,0 +1,86 @@
+# tests/test_near_dedup.py
+
+import numpy as np
+import pytest
+from embed_client import EmbeddingBatch
+from near_dedup import MinHasher, NearDuplicateIndex, lsh_params, shingle_hashes
+
+BASE = "Summarize the quarterly sales report for the northeast region in three bullet points"
+
+def test_shingles_ignore_case_and_spacing():
+    hashes, firsts = shingle_hashes(["Hello  World", "hello world", "hi"], shingle=5)
+    assert firsts.tolist() == [0, 7, 14]
+    assert hashes[0:7].tolist() == hashes[7:14].tolist()
+    assert hashes.size == 15  # a short text is one padded shingle
+
+def test_signatures_estimate_jaccard():
+    hasher = MinHasher(num_perm=256)
+    signatures = hasher.signatures([BASE, BASE.upper(), BASE.replace("three", "five"), "unrelated text entirely"])
+    agree = (signatures[0] == signatures).mean(axis=1)
+    assert agree[1] == 1.0
+    assert 0.6 < agree[2] < 0.95
+    assert agree[3] < 0.1
+
+def test_lsh_params_track_threshold():
+    bands, rows = lsh_params(0.8, 128)
+    assert bands * rows <= 128
+    assert (1 / bands) ** (1 / rows) == pytest.approx(0.8, abs=0.1)
+    assert lsh_params(0.5, 128)[0] > bands
+
+def test_clusters_near_duplicates_across_batches():
+    index = NearDuplicateIndex(threshold=0.7)
+    first = index.add_many([BASE, "What is the capital of France?", BASE + "."])
+    assert [c for c, _ in first] == [0, 1, 0]
+    assert first[2][1] > 0.7
+    second = index.add_many(["what is the capital of  france?", BASE.replace("northeast", "northwest")])
+    assert [c for c, _ in second] == [1, 0]
+    assert index.stats()["clusters"] == 2 and index.stats()["duplicates"] == 3
+
+def test_band_tables_merge_without_losing_representatives():
+    rng = np.random.default_rng(0)
+    texts = [" ".join(f"w{i}" for i in rng.integers(0, 50000, 12)) for _ in range(6000)]
+    index = NearDuplicateIndex()
+    assert [c for c, _ in index.add_many(texts)] == list(range(6000))
+    assert index._tables[0].recent == {}  # merged after the batch
+    again = index.add_many(texts[::1000], positions=range(10000, 10006))
+    assert [c for c, _ in again] == list(range(0, 6000, 1000))
+    assert index.memory_bytes() > 6000 * 128 * 2
+
+class PairEmbedder:
+    """
+    Texts in `same` get one vector, everything else another.
+    """
+    def __init__(self, same, fail=()):
+        self.same = same
+        self.fail = fail
+        self.calls = []
+    def embed_many(self, texts, concurrency=8, dimensions=512):
+        self.calls.append(list(texts))
+        vectors = np.array([[1.0, 0.0] if t in self.same else [0.0, 1.0] for t in texts], dtype=np.float32)
+        return EmbeddingBatch(vectors, {i: "boom" for i, t in enumerate(texts) if t in self.fail})
+
+def test_embeddings_confirm_weaker_matches():
+    reworded = BASE.replace("quarterly sales report", "sales report for the quarter")
+    unrelated = BASE.replace("quarterly sales report", "annual hiring plan")
+    embedder = PairEmbedder(same={BASE, reworded})
+    index = NearDuplicateIndex(threshold=0.9, embed_threshold=0.3, embed_client=embedder, dimensions=2)
+    results = index.add_many([BASE, reworded, unrelated, BASE])
+    assert [c for c, _ in results] == [0, 0, 2, 0]
+    assert results[1][1] == pytest.approx(1.0)
+    stats = index.stats()
+    assert stats["semantic"] == 1 and stats["lexical"] == 1
+    # Only the weaker matches and their representative were embedded, in one call
+    assert len(embedder.calls) == 1 and set(embedder.calls[0]) == {BASE, reworded, unrelated}
+
+def test_failed_embedding_keeps_text_distinct():
+    reworded = BASE.replace("quarterly sales report", "sales report for the quarter")
+    index = NearDuplicateIndex(threshold=0.9, embed_threshold=0.3, dimensions=2,
+                               embed_client=PairEmbedder(same={BASE, reworded}, fail={reworded}))
+    assert [c for c, _ in index.add_many([BASE, reworded])] == [0, 1]
+    assert index.stats()["embed_errors"] == 1
+
+def test_rejects_bad_thresholds():
+    with pytest.raises(ValueError):
+        NearDuplicateIndex(threshold=0)
+    with pytest.raises(ValueError):
+        NearDuplicateIndex(threshold=0.5, embed_threshold=0.8, embed_client=PairEmbedder(set()))
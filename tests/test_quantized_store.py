@@ -0,0 +1,102 @@
+# tests/test_quantized_store.py
+
+import numpy as np
+import pytest
+from quantized_store import QuantizedVectorStore, is_quantized_index, quantize_binary, quantize_int8
+from vector_store import VectorStore, Retriever
+
+def random_unit(n, dim, seed=0):
+    rng = np.random.default_rng(seed)
+    vectors = rng.standard_normal((n, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+@pytest.fixture
+def vectors():
+    return random_unit(1000, 64)
+
+def noisy_queries(vectors, n=50, noise=0.05):
+    rng = np.random.default_rng(1)
+    return vectors[:n] + noise * rng.standard_normal((n, vectors.shape[1])).astype(np.float32)
+
+def test_quantizers():
+    vectors = np.array([[0.5, -1.0, 0.25], [0, 0, 0]], dtype=np.float32)
+    codes, scales = quantize_int8(vectors)
+    assert codes.tolist() == [[64, -127, 32], [0, 0, 0]]
+    assert np.allclose(codes[0] * scales[0], vectors[0], atol=scales[0])
+    bits = quantize_binary(vectors)
+    assert bits.dtype == np.uint64 and bits.shape == (2, 1)
+    assert np.unpackbits(bits[0].view(np.uint8))[:3].tolist() == [1, 0, 1]
+
+@pytest.mark.parametrize("quantization", ["int8", "binary"])
+def test_rescored_search_matches_float_store(vectors, quantization):
+    ids = [f"doc{i}" for i in range(len(vectors))]
+    flat = VectorStore(64)
+    flat.add(ids, vectors)
+    store = QuantizedVectorStore(64, quantization)
+    store.add(ids, vectors, [f"text{i}" for i in range(len(vectors))])
+    assert store.memory_bytes() < flat._matrix[:len(flat)].nbytes / 3
+    for q in noisy_queries(vectors):
+        expected = flat.search(q, k=3)
+        got = store.search(q, k=3)
+        assert got[0][0] == expected[0][0]
+        assert got[0][1] == pytest.approx(expected[0][1], abs=1e-5)
+        assert got[0][2] == "text" + expected[0][0][3:]
+
+def test_search_without_originals_estimates_scores(vectors):
+    for quantization, tolerance in (("int8", 0.02), ("binary", 0.3)):
+        store = QuantizedVectorStore(64, quantization, keep_originals=False)
+        store.add(range(len(vectors)), vectors)
+        assert not store.has_originals
+        top = store.search(vectors[7], k=1)[0]
+        assert top[0] == 7
+        assert top[1] == pytest.approx(1.0, abs=tolerance)
+
+def test_delete_and_replace():
+    store = QuantizedVectorStore(3)
+    store.add(["a", "b", "c"], [[1, 0, 0], [0, 1, 0], [0.9, 0.1, 0]], ["alpha", "beta", "gamma"])
+    store.delete(["a"])
+    assert [r[0] for r in store.search([1, 0, 0], k=3)] == ["c", "b"]
+    store.add(["b"], [[1, 0, 0]], ["beta v2"])
+    assert len(store) == 2
+    assert store.search([1, 0, 0], k=1)[0][2] == "beta v2"
+    assert len(store.search([0, 0, 1], k=10)) == 2
+    store.add(["d", "d"], [[0, 0, 1], [0, 1, 1]], ["first", "last"])
+    assert len(store) == 3 and len(store.search([0, 0, 1], k=10)) == 3
+
+@pytest.mark.parametrize("quantization", ["int8", "binary"])
+def test_save_and_mmap_load(vectors, quantization, tmp_path):
+    store = QuantizedVectorStore(64, quantization)
+    store.add(range(len(vectors)), vectors)
+    store.delete([3])
+    store.save(str(tmp_path / "idx"))
+    assert is_quantized_index(str(tmp_path / "idx"))
+    loaded = QuantizedVectorStore.load(str(tmp_path / "idx"))
+    assert isinstance(loaded._codes, np.memmap)
+    assert len(loaded) == len(vectors) - 1 and loaded.has_originals
+    assert loaded.search(vectors[5], k=1)[0][:2] == (5, pytest.approx(1.0))
+    assert loaded.search(vectors[3], k=1)[0][0] != 3
+    extra = random_unit(1, 64, seed=2)
+    loaded.add(["new"], extra, ["fresh"])
+    assert loaded.search(extra[0], k=1)[0] == ("new", pytest.approx(1.0), "fresh")
+    # The saved files are untouched by adds to the loaded copy
+    assert len(QuantizedVectorStore.load(str(tmp_path / "idx"))) == len(vectors) - 1
+
+def test_convert_vector_store_in_place(vectors, tmp_path):
+    path = str(tmp_path / "idx")
+    flat = VectorStore(64)
+    flat.add(range(len(vectors)), vectors, [str(i) for i in range(len(vectors))])
+    flat.save(path)
+    assert not is_quantized_index(path)
+    store = QuantizedVectorStore.from_vector_store(VectorStore.load(path), "int8")
+    store.save(path)
+    assert is_quantized_index(path)
+    assert not list((tmp_path / "idx").glob("vectors*.npy"))
+    assert QuantizedVectorStore.load(path).search(vectors[9], k=1)[0][2] == "9"
+
+def test_retriever_from_env_detects_quantized_index(vectors, tmp_path, monkeypatch):
+    store = QuantizedVectorStore(64, "binary")
+    store.add(range(len(vectors)), vectors)
+    store.save(str(tmp_path / "idx"))
+    monkeypatch.setenv("RAG_INDEX_PATH", str(tmp_path / "idx"))
+    retriever = Retriever.from_env()
+    assert isinstance(retriever.store, QuantizedVectorStore)
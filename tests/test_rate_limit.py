@@ -0,0 +1,33 @@
+# tests/test_rate_limit.py
+
+from rate_limit import TokenBucket
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+    def __call__(self):
+        return self.now
+    def sleep(self, seconds):
+        self.now += seconds
+
+def test_burst_then_steady_rate():
+    clock = FakeClock()
+    bucket = TokenBucket(rate=10, burst=5, clock=clock, sleep=clock.sleep)
+    assert all(bucket.try_acquire() for _ in range(5))
+    assert not bucket.try_acquire()
+    assert bucket.wait_time() == 0.1
+    clock.now += 0.25
+    assert bucket.try_acquire() and bucket.try_acquire() and not bucket.try_acquire()
+
+def test_acquire_sleeps_and_queues_callers():
+    clock = FakeClock()
+    bucket = TokenBucket(rate=2, burst=1, clock=clock, sleep=clock.sleep)
+    for _ in range(5):
+        bucket.acquire()
+    assert clock.now == 2.0     # 1 from the burst, then 4 at 2 per second
+
+def test_zero_rate_is_unlimited():
+    bucket = TokenBucket(rate=0, sleep=lambda s: (_ for _ in ()).throw(AssertionError("slept")))
+    for _ in range(100):
+        bucket.acquire()
+    assert bucket.try_acquire() and bucket.wait_time() == 0.0
@@ -0,0 +1,69 @@
+# tests/test_response_cache.py
+
+import threading
+import pytest
+from response_cache import ResponseCache
+
+def key(prompt, temperature=0.5):
+    return ResponseCache.make_key("model", prompt, 512, temperature, 0.9)
+
+def test_key_depends_on_generation_params():
+    assert key("hi") == key("hi")
+    assert key("hi") != key("hi", temperature=0.7)
+    assert key("hi") != key("hello")
+
+def test_hit_and_miss_counters():
+    cache = ResponseCache(max_entries=4)
+    assert cache.get(key("hi")) is None
+    cache.put(key("hi"), "hello!")
+    assert cache.get(key("hi")) == "hello!"
+    assert cache.stats() == {"entries": 1, "hits": 1, "disk_hits": 0, "misses": 1}
+
+def test_lru_eviction():
+    cache = ResponseCache(max_entries=2)
+    cache.put(key("a"), "A")
+    cache.put(key("b"), "B")
+    cache.get(key("a"))          # "a" is now most recently used
+    cache.put(key("c"), "C")
+    assert cache.get(key("b")) is None
+    assert cache.get(key("a")) == "A"
+    assert cache.get(key("c")) == "C"
+
+def test_ttl_expiry(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("response_cache.time.time", lambda: now[0])
+    cache = ResponseCache(max_entries=4, ttl=10)
+    cache.put(key("a"), "A")
+    now[0] += 9
+    assert cache.get(key("a")) == "A"
+    now[0] += 2
+    assert cache.get(key("a")) is None
+    assert cache.stats()["entries"] == 0
+
+def test_disabled_cache_stores_nothing():
+    cache = ResponseCache(max_entries=0)
+    assert not cache.enabled
+    cache.put(key("a"), "A")
+    assert cache.get(key("a")) is None
+
+def test_sqlite_tier_shared_between_instances(tmp_path):
+    db = str(tmp_path / "responses.db")
+    writer = ResponseCache(max_entries=4, db_path=db)
+    writer.put(key("a"), "A")
+    reader = ResponseCache(max_entries=4, db_path=db)
+    assert reader.get(key("a")) == "A"
+    assert reader.stats()["disk_hits"] == 1
+    # Promoted into memory: the second read does not touch SQLite
+    assert reader.get(key("a")) == "A"
+    assert reader.stats()["disk_hits"] == 1
+
+def test_sqlite_tier_usable_from_threads(tmp_path):
+    cache = ResponseCache(max_entries=0, db_path=str(tmp_path / "responses.db"))
+    def worker(i):
+        cache.put(key(f"p{i}"), f"r{i}")
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert [cache.get(key(f"p{i}")) for i in range(8)] == [f"r{i}" for i in range(8)]
@@ -0,0 +1,177 @@
+# tests/test_retry_policy.py
+
+import asyncio
+import contextvars
+import json
+import random
+import threading
+import time
+import pytest
+from botocore.exceptions import ClientError, EndpointConnectionError
+from bedrock_client import BedrockClient
+from errors import BedrockInvocationError, ThrottlingError
+from retry_policy import RetryBudget, RetryPolicy, is_retryable
+
+def client_error(code):
+    return ClientError({"Error": {"Code": code, "Message": code}}, "InvokeModel")
+
+class Body:
+    def __init__(self, data):
+        self._data = data
+    def read(self):
+        return self._data
+
+class FaultyRuntime:
+    """
+    Fake bedrock-runtime client for exercising retries and hedging.
+      latency: seconds per call, or a zero-argument function drawing them
+               (e.g. lambda: random.expovariate(10))
+      faults:  exceptions (or None for success) raised by successive calls;
+               once exhausted every call succeeds
+    """
+    def __init__(self, latency=0.0, faults=(), reply="ok"):
+        self.latency = latency if callable(latency) else (lambda: latency)
+        self.faults = list(faults)
+        self.reply = reply
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def _next(self):
+        with self._lock:
+            self.calls += 1
+            fault = self.faults.pop(0) if self.faults else None
+        time.sleep(self.latency())
+        if fault is not None:
+            raise fault
+
+    def invoke_model(self, **kwargs):
+        self._next()
+        return {"body": Body(json.dumps({"generation": self.reply}).encode("utf-8"))}
+
+    def invoke_model_with_response_stream(self, **kwargs):
+        self._next()
+        chunk = {"chunk": {"bytes": json.dumps({"generation": self.reply}).encode("utf-8")}}
+        return {"body": iter([chunk])}
+
+def make_client(runtime, **policy_args):
+    policy_args.setdefault("sleep", lambda seconds: None)
+    policy = RetryPolicy(**policy_args)
+    return BedrockClient(region="us-east-1", model_id="m", client=runtime, retry_policy=policy), policy
+
+def test_transient_errors_are_retried():
+    runtime = FaultyRuntime(faults=[client_error("ServiceUnavailableException"), EndpointConnectionError(endpoint_url="x")])
+    bc, policy = make_client(runtime)
+    assert bc.invoke("hi") == "ok"
+    stats = policy.stats()
+    assert (stats["calls"], stats["attempts"], stats["retries"]) == (1, 3, 2)
+    assert stats["failures"] == {"ServiceUnavailableException": 1, "EndpointConnectionError": 1}
+
+def test_gives_up_after_max_attempts():
+    runtime = FaultyRuntime(faults=[client_error("InternalServerException")] * 5)
+    bc, policy = make_client(runtime, max_attempts=2)
+    with pytest.raises(BedrockInvocationError):
+        bc.invoke("hi")
+    assert runtime.calls == 2
+
+def test_client_errors_are_not_retried():
+    runtime = FaultyRuntime(faults=[client_error("ValidationException")])
+    bc, policy = make_client(runtime)
+    with pytest.raises(BedrockInvocationError):
+        bc.invoke("hi")
+    assert runtime.calls == 1
+
+def test_throttling_left_to_limiter_unless_enabled():
+    assert not is_retryable(ThrottlingError("x"))
+    assert is_retryable(ThrottlingError("x"), retry_throttling=True)
+    runtime = FaultyRuntime(faults=[client_error("ThrottlingException")])
+    bc, _ = make_client(runtime)
+    with pytest.raises(ThrottlingError):
+        bc.invoke("hi")
+    runtime = FaultyRuntime(faults=[client_error("ThrottlingException")])
+    bc, _ = make_client(runtime, retry_throttling=True)
+    assert bc.invoke("hi") == "ok"
+
+def test_retry_budget_caps_retries():
+    runtime = FaultyRuntime(faults=[client_error("InternalServerException")] * 10)
+    bc, policy = make_client(runtime, max_attempts=5, budget=RetryBudget(ratio=0.0, reserve=1))
+    with pytest.raises(BedrockInvocationError):
+        bc.invoke("hi")
+    assert runtime.calls == 2
+    assert policy.stats()["budget_exhausted"] == 1
+
+def test_backoff_is_full_jitter():
+    policy = RetryPolicy(base_delay=0.1, max_delay=0.3)
+    random.seed(1)
+    delays = [policy.backoff(3) for _ in range(200)]
+    assert all(0 <= d <= 0.3 for d in delays)
+    assert min(delays) < 0.05 and max(delays) > 0.25
+
+def test_stream_open_is_retried():
+    runtime = FaultyRuntime(faults=[client_error("ServiceUnavailableException")])
+    bc, policy = make_client(runtime)
+    assert list(bc.invoke_stream("hi")) == ["ok"]
+    assert policy.stats()["retries"] == 1
+
+def warm(policy, seconds, n=20):
+    for _ in range(n):
+        policy.latency.add(seconds)
+
+def test_hedge_fires_after_p95_and_wins():
+    latencies = iter([1.0] + [0.0] * 10)
+    runtime = FaultyRuntime(latency=lambda: next(latencies))
+    bc, policy = make_client(runtime, hedge=True)
+    warm(policy, 0.02)
+    start = time.monotonic()
+    assert bc.invoke("hi") == "ok"
+    assert time.monotonic() - start < 0.5
+    stats = policy.stats()
+    assert (stats["hedges"], stats["hedge_wins"]) == (1, 1)
+
+def test_no_hedge_when_fast_or_cold():
+    runtime = FaultyRuntime()
+    bc, policy = make_client(runtime, hedge=True)
+    assert bc.invoke("hi") == "ok"      # too few samples to hedge yet
+    warm(policy, 0.5)
+    assert bc.invoke("hi") == "ok"
+    assert policy.stats()["hedges"] == 0
+    assert runtime.calls == 2
+
+def test_hedged_attempts_run_in_the_callers_context():
+    request = contextvars.ContextVar("request", default=None)
+    seen = []
+    latencies = iter([0.3, 0.0])
+
+    def attempt():
+        seen.append(request.get())
+        time.sleep(next(latencies))
+        return "ok"
+
+    policy = RetryPolicy(hedge=True)
+    warm(policy, 0.02)
+    request.set("req-1")
+    assert policy.call(attempt) == "ok"
+    assert seen == ["req-1", "req-1"]
+    assert policy.stats()["hedges"] == 1
+
+def test_async_hedge_cancels_loser():
+    policy = RetryPolicy(hedge=True)
+    warm(policy, 0.02)
+    started, cancelled = [], []
+
+    async def attempt():
+        started.append(1)
+        try:
+            await asyncio.sleep(1.0 if len(started) == 1 else 0.0)
+        except asyncio.CancelledError:
+            cancelled.append(1)
+            raise
+        return len(started)
+
+    async def scenario():
+        result = await policy.acall(attempt)
+        await asyncio.sleep(0)
+        return result
+
+    assert asyncio.run(scenario()) == 2
+    assert cancelled == [1]
+    assert policy.stats()["hedge_wins"] == 1
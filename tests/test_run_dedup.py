@@ -0,0 +1,31 @@
+# tests/test_run_dedup.py
+
+import io
+import json
+from near_dedup import NearDuplicateIndex
+import run_dedup
+
+def test_dedup_jsonl_writes_clusters_and_unique_lines():
+    source = io.BytesIO(
+        b'"Translate good morning into Spanish please"\n'
+        b'{"id": "p2", "message": "translate good morning into spanish please!"}\n'
+        b'\n'
+        b'[1, 2]\n'
+        b'{"text": "Write a haiku about autumn leaves"}'
+    )
+    out, unique = io.StringIO(), io.BytesIO()
+    stats = run_dedup.dedup_jsonl(NearDuplicateIndex(), source, out, unique, batch_size=2, progress_every=0)
+    lines = [json.loads(l) for l in out.getvalue().splitlines()]
+    assert [(l["id"], l["line"], l.get("cluster")) for l in lines] == [(0, 0, 0), ("p2", 1, 0), (3, 3, None), (4, 4, 4)]
+    assert lines[1]["similarity"] > 0.7
+    assert "Invalid input" in lines[2]["error"]
+    assert unique.getvalue().splitlines() == [
+        b'"Translate good morning into Spanish please"', b'{"text": "Write a haiku about autumn leaves"}',
+    ]
+    assert (stats["lines"], stats["clusters"], stats["duplicates"], stats["errors"]) == (3, 2, 1, 1)
+
+def test_field_selects_text():
+    source = io.BytesIO(b'{"body": "same text here"}\n{"body": "same text here", "text": "other"}\n')
+    out = io.StringIO()
+    run_dedup.dedup_jsonl(NearDuplicateIndex(), source, out, field="body", progress_every=0)
+    assert [json.loads(l)["cluster"] for l in out.getvalue().splitlines()] == [0, 0]
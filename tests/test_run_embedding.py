@@ -0,0 +1,33 @@
+# tests/test_run_embedding.py
+
+import io
+import json
+import numpy as np
+from embed_client import EmbeddingBatch
+import run_embedding
+
+class FakeClient:
+    def __init__(self):
+        self.batches = []
+    def embed_many(self, texts, concurrency=8, dimensions=512):
+        self.batches.append(list(texts))
+        vectors = np.zeros((len(texts), 2), dtype=np.float32)
+        errors = {}
+        for i, text in enumerate(texts):
+            if text == "bad":
+                errors[i] = "boom"
+            else:
+                vectors[i] = [len(text), 1]
+        return EmbeddingBatch(vectors, errors)
+
+def test_embed_jsonl_streams_in_batches():
+    source = io.StringIO('"hello"\n{"id": "doc-2", "text": "hi"}\n\n"bad"\n')
+    out = io.StringIO()
+    client = FakeClient()
+    embedded, failed = run_embedding.embed_jsonl(client, source, out, batch_size=2)
+    assert (embedded, failed) == (2, 1)
+    assert client.batches == [["hello", "hi"], ["bad"]]
+    lines = [json.loads(l) for l in out.getvalue().splitlines()]
+    assert lines[0] == {"id": 0, "embedding": [5.0, 1.0]}
+    assert lines[1] == {"id": "doc-2", "embedding": [2.0, 1.0]}
+    assert lines[2] == {"id": 3, "error": "boom"}
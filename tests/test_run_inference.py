@@ -0,0 +1,96 @@
+# tests/test_run_inference.py
+
+import io
+import json
+import pytest
+import run_inference
+from errors import BedrockInvocationError, ThrottlingError
+
+class FakeBedrock:
+    def __init__(self, interrupt_after=None, throttle_first=0):
+        self.prompts = []
+        self.interrupt_after = interrupt_after
+        self.throttle_first = throttle_first
+    def invoke(self, prompt, max_gen_len=512, temperature=0.5, top_p=0.9):
+        self.prompts.append(prompt)
+        if self.interrupt_after is not None and len(self.prompts) > self.interrupt_after:
+            raise KeyboardInterrupt
+        if self.throttle_first:
+            self.throttle_first -= 1
+            raise ThrottlingError("slow down")
+        if "fail" in prompt:
+            raise BedrockInvocationError("boom")
+        if "ramble" in prompt:
+            return "Sure.\nUser: and then?"
+        return f"answer {max_gen_len}"
+
+def write_prompts(path, count):
+    with open(path, "w") as f:
+        for i in range(count):
+            f.write(json.dumps({"id": f"q{i}", "message": f"question {i}"}) + "\n")
+            if i % 7 == 0:
+                f.write("\n")
+
+def read_results(path):
+    return [json.loads(line) for line in open(path)]
+
+def test_run_writes_one_result_per_prompt(tmp_path):
+    source = tmp_path / "prompts.jsonl"
+    source.write_text('"hello"\n\n{"message": "short", "max_gen_len": 8, "id": "x"}\n{"message": "fail"}\nnot json\n{"message": 3}\n')
+    out, ckpt = str(tmp_path / "out.jsonl"), str(tmp_path / "out.ckpt")
+    bedrock = FakeBedrock()
+    progress = run_inference.run(bedrock, str(source), out, ckpt, concurrency=2, log=io.StringIO())
+    results = sorted(read_results(out), key=lambda r: r["line"])
+    assert [r["line"] for r in results] == [0, 2, 3, 4, 5]
+    # Like /chat, the generation policy caps a prompt that sets no max_gen_len
+    assert results[0] == {"id": 0, "line": 0, "reply": "answer 128"}
+    assert results[1] == {"id": "x", "line": 2, "reply": "answer 8"}
+    assert "Llama invocation failed" in results[2]["error"]
+    assert results[3]["error"].startswith("Invalid input") and results[4]["error"].startswith("Invalid input")
+    assert bedrock.prompts[0].startswith("System: Respond ONLY") and bedrock.prompts[0].endswith("User: hello\nAssistant:")
+    assert (progress.written, progress.failed, progress.watermark) == (5, 3, 6)
+
+def test_interrupted_run_resumes_exactly_once(tmp_path):
+    source = str(tmp_path / "prompts.jsonl")
+    write_prompts(source, 60)
+    out, ckpt = str(tmp_path / "out.jsonl"), str(tmp_path / "out.ckpt")
+    with pytest.raises(KeyboardInterrupt):
+        run_inference.run(FakeBedrock(interrupt_after=25), source, out, ckpt, concurrency=4,
+                          checkpoint_every=0, log=io.StringIO())
+    first = run_inference.Progress.load(ckpt)
+    assert 0 < first.written < 60
+    # A crash after the checkpoint leaves output the checkpoint does not cover
+    with open(out, "a") as f:
+        f.write('{"id": "q59", "line": 999, "reply": "partial')
+    bedrock = FakeBedrock()
+    progress = run_inference.run(bedrock, source, out, ckpt, concurrency=4, log=io.StringIO())
+    ids = [r["id"] for r in read_results(out)]
+    assert sorted(ids) == sorted(f"q{i}" for i in range(60))
+    assert progress.written == 60 and progress.done == set()
+    assert len(bedrock.prompts) == 60 - first.written
+
+def test_throttled_prompts_are_retried(tmp_path, monkeypatch):
+    monkeypatch.setattr(run_inference.time, "sleep", lambda s: None)
+    source = tmp_path / "prompts.jsonl"
+    source.write_text('"hello"\n')
+    out = str(tmp_path / "out.jsonl")
+    run_inference.run(FakeBedrock(throttle_first=2), str(source), out, out + ".ckpt", log=io.StringIO())
+    assert read_results(out) == [{"id": 0, "line": 0, "reply": "answer 128"}]
+
+def test_progress_watermark_tracks_out_of_order_completion():
+    progress = run_inference.Progress()
+    offsets = {0: 0, 1: 10, 2: 20, 3: 30}
+    progress.mark(2, offsets)
+    assert (progress.watermark, progress.done, progress.input_offset) == (0, {2}, 0)
+    progress.mark(0, offsets)
+    assert (progress.watermark, progress.input_offset) == (1, 10)
+    progress.mark(1, offsets)
+    assert (progress.watermark, progress.done, progress.input_offset) == (3, set(), 30)
+    assert progress.is_done(2) and not progress.is_done(3)
+
+def test_replies_are_trimmed_like_chat(tmp_path):
+    source = tmp_path / "prompts.jsonl"
+    source.write_text('"ramble on"\n')
+    out = str(tmp_path / "out.jsonl")
+    run_inference.run(FakeBedrock(), str(source), out, out + ".ckpt", log=io.StringIO())
+    assert read_results(out) == [{"id": 0, "line": 0, "reply": "Sure."}]
@@ -0,0 +1,129 @@
+# tests/test_semantic_cache.py
+
+import threading
+import numpy as np
+import pytest
+from semantic_cache import SemanticCache
+
+VECTORS = {
+    "hi there": [1.0, 0.0, 0.0],
+    "hello there": [0.98, 0.2, 0.0],
+    "what is the weather": [0.0, 0.0, 1.0],
+}
+
+def fake_embed(text):
+    if text not in VECTORS:
+        raise RuntimeError("embedding failed")
+    return VECTORS[text]
+
+@pytest.fixture
+def cache():
+    return SemanticCache(fake_embed, threshold=0.95, capacity=4)
+
+def test_paraphrase_hit(cache):
+    cache.add(cache.embed("hi there"), "Hello!")
+    assert cache.lookup(cache.embed("hello there")) == "Hello!"
+    assert cache.lookup(cache.embed("what is the weather")) is None
+    assert cache.stats() == {"entries": 1, "hits": 1, "misses": 1}
+
+def test_embed_normalizes_and_handles_failure(cache):
+    vector = cache.embed("hello there")
+    assert vector.dtype == np.float32
+    assert np.isclose(np.linalg.norm(vector), 1.0)
+    assert cache.embed("unknown") is None
+
+def test_empty_cache_misses(cache):
+    assert cache.lookup(cache.embed("hi there")) is None
+
+def test_ring_buffer_eviction():
+    cache = SemanticCache(fake_embed, threshold=0.99, capacity=2)
+    basis = np.eye(3, dtype=np.float32)
+    for i in range(3):
+        cache.add(basis[i], f"reply {i}")
+    assert len(cache) == 2
+    assert cache.lookup(basis[0]) is None        # overwritten by entry 2
+    assert cache.lookup(basis[1]) == "reply 1"
+    assert cache.lookup(basis[2]) == "reply 2"
+
+def test_concurrent_adds():
+    cache = SemanticCache(fake_embed, capacity=1000)
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((400, 8)).astype(np.float32)
+    def worker(rows):
+        for i in rows:
+            cache.add(vectors[i], str(i))
+    threads = [threading.Thread(target=worker, args=(range(i, 400, 4),)) for i in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(cache) == 400
+    assert sorted(int(r) for r in cache._replies if r is not None) == list(range(400))
+
+def test_lookups_during_overwrites_never_return_a_stale_reply():
+    cache = SemanticCache(fake_embed, capacity=8)
+    basis = np.eye(16, dtype=np.float32)
+    stop = threading.Event()
+    def writer():
+        i = 0
+        while not stop.is_set():
+            cache.add(basis[i % 16], str(i % 16))
+            i += 1
+    t = threading.Thread(target=writer)
+    t.start()
+    try:
+        for i in range(2000):
+            reply = cache.lookup(basis[i % 16])
+            assert reply is None or reply == str(i % 16)
+    finally:
+        stop.set()
+        t.join()
+
+def unit_rows(n, dim, seed):
+    rows = np.random.default_rng(seed).standard_normal((n, dim)).astype(np.float32)
+    return rows / np.linalg.norm(rows, axis=1, keepdims=True)
+
+def test_partitioned_cache_finds_paraphrases_and_forgets_overwritten_entries():
+    cache = SemanticCache(fake_embed, threshold=0.95, capacity=300, nlist=8, nprobe=2, ivf_min_entries=100)
+    vectors = unit_rows(500, 16, seed=1)
+    for i in range(99):
+        cache.add(vectors[i], str(i))
+    assert cache._centroids is None
+    cache.add(vectors[99], "99")
+    assert cache._centroids is not None and cache._matrix is None
+    for i in range(100, 500):            # wraps the ring: entries 0-199 are overwritten
+        cache.add(vectors[i], str(i))
+    assert len(cache) == 300 and sum(cache._block_sizes) == 300
+    noise = np.random.default_rng(2).standard_normal((300, 16)).astype(np.float32) * 0.01
+    found = [cache.lookup(v / np.linalg.norm(v)) for v in vectors[200:500] + noise]
+    assert sum(reply == str(200 + i) for i, reply in enumerate(found)) >= 290
+    assert all(cache.lookup(v) != str(i) for i, v in enumerate(vectors[:200]))
+
+def test_partitioned_lookups_during_overwrites_never_return_a_stale_reply():
+    cache = SemanticCache(fake_embed, capacity=64, nlist=4, nprobe=1, ivf_min_entries=32)
+    vectors = unit_rows(256, 8, seed=3)
+    for i in range(64):
+        cache.add(vectors[i], str(i))
+    stop = threading.Event()
+    def writer():
+        i = 64
+        while not stop.is_set():
+            cache.add(vectors[i % 256], str(i % 256))
+            i += 1
+    t = threading.Thread(target=writer)
+    t.start()
+    try:
+        for i in range(3000):
+            reply = cache.lookup(vectors[i % 256])
+            assert reply is None or reply == str(i % 256)
+    finally:
+        stop.set()
+        t.join()
+
+def test_from_env_disabled_by_default(monkeypatch):
+    monkeypatch.delenv("SEMANTIC_CACHE", raising=False)
+    assert SemanticCache.from_env() is None
+    monkeypatch.setenv("SEMANTIC_CACHE", "1")
+    monkeypatch.setenv("SEMANTIC_CACHE_THRESHOLD", "0.9")
+    cache = SemanticCache.from_env()
+    assert cache.threshold == 0.9
@@ -0,0 +1,210 @@
+# tests/test_session_store.py
+
+import os
+import time
+import pytest
+from session_store import (
+    ASSISTANT, USER, HistoryCompactor, MemorySessionStore, Session, SessionStore,
+    SqliteSessionStore,
+)
+
+def test_session_keeps_last_turns_and_history_block():
+    session = Session("s", max_turns=4)
+    for i in range(3):
+        session.add(USER, f"question {i}\nwith two lines")
+        session.add(ASSISTANT, f"answer {i}")
+    assert session.messages() == [
+        ("user", "question 1\nwith two lines"), ("assistant", "answer 1"),
+        ("user", "question 2\nwith two lines"), ("assistant", "answer 2"),
+    ]
+    assert session.history == (
+        "User: question 1\nwith two lines\nAssistant: answer 1\n"
+        "User: question 2\nwith two lines\nAssistant: answer 2"
+    )
+
+def test_session_json_round_trip():
+    session = Session("s", max_turns=4)
+    session.remember("My name is alice")
+    session.add(USER, "My name is alice")
+    session.add(ASSISTANT, "Hi Alice!")
+    copy = Session.from_json("s", session.to_json(), 4, session.last_seen)
+    assert copy.messages() == session.messages()
+    assert copy.history == session.history
+    assert copy.memory.to_prompt() == "You are talking to Alice."
+
+def test_session_memory_only_created_when_slot_found():
+    session = Session("s")
+    session.remember("hello there")
+    assert session.memory is None
+    session.remember("My favorite color is Green")
+    assert session.memory.get("favorite_color") == "green"
+
+@pytest.fixture(params=["memory", "sqlite"])
+def store(request, tmp_path):
+    if request.param == "memory":
+        return MemorySessionStore(max_turns=4)
+    return SqliteSessionStore(str(tmp_path / "sessions.db"), max_turns=4)
+
+def test_record_and_get(store):
+    assert store.get("a") is None
+    store.record("a", "hello", "hi")
+    store.record("a", "how are you?", "fine")
+    store.record("a", "bye", "see you")
+    assert [text for _, text in store.get("a").messages()] == ["how are you?", "fine", "bye", "see you"]
+    assert store.get("b") is None
+    store.delete("a")
+    assert store.get("a") is None
+
+def test_idle_sessions_expire(store):
+    store.idle_ttl = 0.05
+    store.record("a", "hello", "hi")
+    time.sleep(0.1)
+    store.record("b", "hello", "hi")
+    assert store.get("a") is None
+    assert store.get("b") is not None
+
+def test_memory_cap_evicts_least_recently_used():
+    store = MemorySessionStore(max_bytes=3000)
+    for name in "abcdef":
+        store.record(name, "x" * 200, "y" * 200)
+        store.get("a")      # keep "a" hot
+    assert store.get("a") is not None
+    assert store.get("b") is None
+    assert store.stats()["bytes"] <= 3000
+    assert store.stats()["evicted"] > 0
+
+def test_sqlite_cap_and_sharing(tmp_path):
+    path = str(tmp_path / "sessions.db")
+    writer = SqliteSessionStore(path, sweep_every=1, max_bytes=1000)
+    reader = SqliteSessionStore(path)
+    writer.record("a", "hello", "hi")
+    assert reader.get("a").messages() == [("user", "hello"), ("assistant", "hi")]
+    for i in range(10):
+        writer.record(f"s{i}", "x" * 100, "y" * 100)
+    assert writer.stats()["bytes"] <= 1000
+    assert reader.get("a") is None
+    assert reader.get("s9") is not None
+
+def test_from_env(monkeypatch, tmp_path):
+    monkeypatch.delenv("SESSION_STORE", raising=False)
+    assert SessionStore.from_env() is None
+    monkeypatch.setenv("SESSION_STORE", "memory")
+    monkeypatch.setenv("SESSION_MAX_TURNS", "10")
+    store = SessionStore.from_env()
+    assert isinstance(store, MemorySessionStore) and store.max_turns == 10
+    monkeypatch.setenv("SESSION_STORE", "sqlite")
+    monkeypatch.setenv("SESSION_DB", str(tmp_path / "s.db"))
+    assert isinstance(SessionStore.from_env(), SqliteSessionStore)
+
+def test_recent_history_uses_token_budget():
+    session = Session("s")
+    for i in range(5):
+        session.add(USER, f"question {i}")
+        session.add(ASSISTANT, f"answer {i}")
+    assert session.tokens == sum(turn.tokens for turn in session.turns)
+    per_line = session.turns[-1].tokens + 1
+    assert session.recent_history(2 * per_line) == "User: question 4\nAssistant: answer 4"
+    assert session.recent_history(0) == ""
+    assert session.recent_history(10_000) == session.history
+
+def test_compactable_and_apply_summary():
+    session = Session("s")
+    for i in range(4):
+        session.add(USER, f"question {i}")
+        session.add(ASSISTANT, f"answer {i}")
+    assert session.compactable(session.tokens) is None
+    end_seq, transcript = session.compactable(session.tokens - 1)
+    assert (end_seq, transcript) == (1, "User: question 0")
+    end_seq, transcript = session.compactable(4 * (session.turns[0].tokens))
+    session.add(USER, "question 4")     # turns added meanwhile are kept
+    session.apply_summary(end_seq, "Talked about questions.")
+    assert session.first_seq == end_seq
+    assert session.messages()[-1] == ("user", "question 4")
+    assert session.tokens == sum(turn.tokens for turn in session.turns)
+    copy = Session.from_json("s", session.to_json(), 50, session.last_seen)
+    assert (copy.summary, copy.first_seq, copy.history) == (session.summary, session.first_seq, session.history)
+
+def test_compactor_summarizes_in_background(store):
+    calls = []
+
+    def summarize(previous, transcript):
+        calls.append((previous, transcript))
+        return f"summary {len(calls)}"
+
+    store.max_turns = 50
+    store.compactor = HistoryCompactor(summarize, trigger_tokens=20, keep_tokens=10)
+    for i in range(6):
+        store.record("a", f"question number {i}", f"answer number {i}")
+        assert store.compactor.wait_idle(timeout=5)
+    session = store.get("a")
+    assert session.summary == f"summary {len(calls)}"
+    assert session.tokens <= 20
+    assert calls[0][0] == "" and calls[0][1].startswith("User: question number 0")
+    assert calls[1][0] == "summary 1"
+    assert store.compactor.stats() == {"pending": 0, "compacted": len(calls), "failed": 0}
+
+def test_compactor_failure_is_counted():
+    def summarize(previous, transcript):
+        raise RuntimeError("model down")
+
+    store = MemorySessionStore()
+    store.compactor = HistoryCompactor(summarize, trigger_tokens=5, keep_tokens=2)
+    store.record("a", "a long enough question", "and a long enough answer")
+    assert store.compactor.wait_idle(timeout=5)
+    assert store.compactor.stats()["failed"] == 1
+    assert store.get("a").summary == ""
+
+def test_compactor_shutdown_skips_new_jobs():
+    store = MemorySessionStore()
+    store.compactor = HistoryCompactor(lambda previous, transcript: "summary", trigger_tokens=5, keep_tokens=2)
+    store.compactor.shutdown()
+    store.record("a", "a long enough question", "and a long enough answer")
+    assert store.compactor.stats() == {"pending": 0, "compacted": 0, "failed": 0}
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="needs fork()")
+def test_forked_worker_compacts_with_its_own_connection(tmp_path):
+    # As under gunicorn's preload_app: the store is built and used in the
+    # parent, and the forked worker builds its own compactor
+    store = SqliteSessionStore(str(tmp_path / "sessions.db"), max_turns=50)
+    store.record("warm", "hello", "hi")
+    parent_conn = store._db()
+    pid = os.fork()
+    if pid == 0:
+        status = 1
+        try:
+            store.compactor = HistoryCompactor(lambda previous, transcript: f"summary from {os.getpid()}",
+                                               trigger_tokens=20, keep_tokens=10)
+            for i in range(6):
+                store.record("a", f"question number {i}", f"answer number {i}")
+                store.compactor.wait_idle(timeout=5)
+            if store._db() is not parent_conn and store.compactor.stats()["compacted"] > 0:
+                status = 0
+        finally:
+            os._exit(status)
+    _, status = os.waitpid(pid, 0)
+    assert os.waitstatus_to_exitcode(status) == 0
+    assert store.get("a").summary == f"summary from {pid}"
+    assert store._db() is parent_conn
+
+def test_memory_store_get_returns_a_snapshot():
+    store = MemorySessionStore(max_turns=4)
+    store.record("a", "My name is alice", "hi")
+    session = store.get("a")
+    history = session.history
+    store.record("a", "My favorite color is red", "nice")
+    store.record("a", "bye", "see you")
+    assert session.history == history and len(session.turns) == 2
+    assert session.memory.get("favorite_color") is None
+    assert store.get("a").memory.get("favorite_color") == "red"
+
+def test_from_json_does_not_re_estimate_tokens(monkeypatch):
+    import session_store
+    session = Session("s", max_turns=4)
+    for i in range(3):
+        session.add(USER, f"question {i}")
+        session.add(ASSISTANT, f"answer {i}")
+    data = session.to_json()
+    monkeypatch.setattr(session_store, "estimate_tokens", lambda text: pytest.fail("re-estimated"))
+    copy = Session.from_json("s", data, 4, session.last_seen)
+    assert copy.history == session.history and copy.tokens == session.tokens
+    assert [t.tokens for t in copy.turns] == [t.tokens for t in session.turns]
@@ -0,0 +1,81 @@
+# tests/test_single_flight.py
+
+import asyncio
+import threading
+import pytest
+from single_flight import SingleFlight
+
+def run_concurrently(flight, key, fn, n):
+    results, errors = [], []
+    def worker():
+        try:
+            results.append(flight.do(key, fn))
+        except Exception as e:
+            errors.append(e)
+    threads = [threading.Thread(target=worker) for _ in range(n)]
+    for t in threads:
+        t.start()
+    return threads, results, errors
+
+def test_followers_share_leader_result():
+    flight = SingleFlight()
+    release = threading.Event()
+    calls = []
+    def slow():
+        calls.append(1)
+        release.wait(5)
+        return "reply"
+    threads, results, errors = run_concurrently(flight, "k", slow, 10)
+    while flight.stats()["leaders"] + flight.stats()["collapsed"] < 10:
+        pass
+    release.set()
+    for t in threads:
+        t.join()
+    assert results == ["reply"] * 10
+    assert not errors
+    assert len(calls) == 1
+    assert flight.stats() == {"leaders": 1, "collapsed": 9, "in_flight": 0}
+
+def test_errors_are_shared_but_not_cached():
+    flight = SingleFlight()
+    release = threading.Event()
+    def failing():
+        release.wait(5)
+        raise ValueError("boom")
+    threads, results, errors = run_concurrently(flight, "k", failing, 5)
+    while flight.stats()["leaders"] + flight.stats()["collapsed"] < 5:
+        pass
+    release.set()
+    for t in threads:
+        t.join()
+    assert len(errors) == 5 and all(str(e) == "boom" for e in errors)
+    assert flight.do("k", lambda: "recovered") == "recovered"
+
+def test_different_keys_run_separately():
+    flight = SingleFlight()
+    assert flight.do("a", lambda: 1) == 1
+    assert flight.do("b", lambda: 2) == 2
+    assert flight.stats()["leaders"] == 2
+
+def test_async_followers_share_result_and_errors():
+    flight = SingleFlight()
+    calls = []
+    async def slow(value):
+        calls.append(value)
+        await asyncio.sleep(0.01)
+        if value == "bad":
+            raise ValueError("boom")
+        return value
+
+    async def main():
+        ok = await asyncio.gather(*(flight.ado("k", slow, "reply") for _ in range(20)))
+        bad = await asyncio.gather(*(flight.ado("k2", slow, "bad") for _ in range(3)), return_exceptions=True)
+        again = await flight.ado("k2", slow, "fine")
+        return ok, bad, again
+
+    ok, bad, again = asyncio.run(main())
+    assert ok == ["reply"] * 20
+    assert all(isinstance(e, ValueError) for e in bad)
+    assert again == "fine"
+    assert calls == ["reply", "bad", "fine"]
+    assert flight.stats() == {"leaders": 3, "collapsed": 21, "in_flight": 0}
@@ -0,0 +1,35 @@
+# tests/test_sqlite_local.py
+
+import os
+import threading
+import pytest
+from sqlite_local import LocalConnection
+
+
+def test_one_wal_connection_per_thread(tmp_path):
+    db = LocalConnection(str(tmp_path / "x.db"))
+    assert db() is db()
+    assert db().execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    db().execute("CREATE TABLE t (v INTEGER)")
+
+    seen = []
+    def worker():
+        conn = db()
+        conn.execute("INSERT INTO t VALUES (1)")   # autocommit, visible to other threads
+        seen.append(conn)
+    thread = threading.Thread(target=worker)
+    thread.start()
+    thread.join()
+    assert seen[0] is not db()
+    assert db().execute("SELECT COUNT(*) FROM t").fetchone()[0] == 1
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="needs fork()")
+def test_forked_process_opens_its_own_connection(tmp_path):
+    db = LocalConnection(str(tmp_path / "x.db"))
+    parent_conn = db()
+    pid = os.fork()
+    if pid == 0:
+        os._exit(0 if db() is not parent_conn and db() is db() else 1)
+    _, status = os.waitpid(pid, 0)
+    assert os.waitstatus_to_exitcode(status) == 0
+    assert db() is parent_conn
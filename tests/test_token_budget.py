@@ -0,0 +1,20 @@
+# tests/test_token_budget.py
+
+from token_budget import TokenBudget, estimate_tokens
+
+def test_estimate_tokens():
+    assert estimate_tokens("") == 0
+    assert estimate_tokens("hi") == 1
+    assert estimate_tokens("Hello, world!") == 4          # 2 words + 2 marks
+    assert estimate_tokens("x" * 400) == 100              # long words: ~4 chars/token
+
+def test_fit_keeps_prefix_within_budget():
+    budget = TokenBudget(max_prompt_tokens=10)
+    kept, used = budget.fit(2, ["one two", "three four", "five six", "seven"])
+    assert kept == ["one two", "three four"]
+    assert used == 9                                       # 2 + (2+1) + (3+1)
+    assert budget.fit(10, ["one"]) == ([], 10)
+
+def test_from_env(monkeypatch):
+    monkeypatch.setenv("PROMPT_TOKEN_BUDGET", "512")
+    assert TokenBudget.from_env().max_prompt_tokens == 512
@@ -0,0 +1,140 @@
+# tests/test_vector_store.py
+
+import json
+import numpy as np
+import pytest
+from embed_client import EmbeddingBatch
+from vector_store import VectorStore, Retriever
+
+def random_unit(n, dim, seed=0):
+    rng = np.random.default_rng(seed)
+    vectors = rng.standard_normal((n, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+@pytest.fixture
+def store():
+    s = VectorStore(3)
+    s.add(["a", "b", "c"], [[1, 0, 0], [0, 1, 0], [0.9, 0.1, 0]], ["alpha", "beta", "gamma"])
+    return s
+
+def test_search_orders_by_cosine(store):
+    results = store.search([1, 0, 0], k=2)
+    assert [r[0] for r in results] == ["a", "c"]
+    assert results[0][1] == pytest.approx(1.0)
+    assert results[0][2] == "alpha"
+
+def test_delete_and_replace(store):
+    store.delete(["a"])
+    assert [r[0] for r in store.search([1, 0, 0], k=3)] == ["c", "b"]
+    store.add(["b"], [[1, 0, 0]], ["beta v2"])
+    assert len(store) == 2
+    assert store.search([1, 0, 0], k=1)[0][2] == "beta v2"
+
+def test_duplicate_ids_in_one_batch_keep_the_last(store):
+    store.add(["d", "e", "d"], [[0, 0, 1], [0, 1, 1], [1, 1, 0]], ["first", "e", "last"])
+    assert len(store) == 5 and int(store._alive[:store._count].sum()) == 5
+    assert [r[2] for r in store.search([1, 1, 0], k=5)].count("first") == 0
+    assert store.search([1, 1, 0], k=1)[0][2] == "last"
+
+def test_k_larger_than_store(store):
+    assert len(store.search([0, 0, 1], k=10)) == 3
+
+def test_save_and_mmap_load(store, tmp_path):
+    store.delete(["b"])
+    store.save(str(tmp_path / "idx"))
+    loaded = VectorStore.load(str(tmp_path / "idx"))
+    assert isinstance(loaded._matrix, np.memmap)
+    assert len(loaded) == 2
+    assert loaded.search([1, 0, 0], k=1)[0][0] == "a"
+    loaded.add(["d"], [[0, 0, 1]], ["delta"])
+    assert loaded.search([0, 0, 1], k=1)[0][0] == "d"
+
+def test_ivf_matches_flat_search():
+    vectors = random_unit(2000, 16)
+    ids = [f"doc{i}" for i in range(2000)]
+    flat = VectorStore(16)
+    flat.add(ids, vectors)
+    ivf = VectorStore(16)
+    ivf.add(ids, vectors)
+    ivf.build_ivf(nlist=8)
+    queries = vectors[:50]
+    hits = sum(ivf.search(q, k=1, nprobe=8)[0][0] == flat.search(q, k=1)[0][0] for q in queries)
+    assert hits == 50  # probing every list is exact
+
+def test_ivf_incremental_add_and_persist(tmp_path):
+    store = VectorStore(8)
+    vectors = random_unit(500, 8, seed=1)
+    store.add([str(i) for i in range(500)], vectors)
+    store.build_ivf(nlist=4)
+    extra = random_unit(1, 8, seed=2)
+    store.add(["new"], extra, ["fresh"])
+    assert store.search(extra[0], k=1, nprobe=1)[0][0] == "new"
+    store.save(str(tmp_path / "idx"))
+    loaded = VectorStore.load(str(tmp_path / "idx"))
+    assert loaded.search(extra[0], k=1, nprobe=1)[0][0] == "new"
+
+def test_build_ivf_keeps_a_mapped_matrix_mapped(tmp_path):
+    store = VectorStore(8)
+    vectors = random_unit(200, 8, seed=3)
+    store.add([str(i) for i in range(200)], vectors)
+    store.save(str(tmp_path / "idx"))
+    loaded = VectorStore.load(str(tmp_path / "idx"))
+    loaded.build_ivf(nlist=4)
+    assert isinstance(loaded._matrix, np.memmap)
+    assert loaded.search(vectors[7], k=1, nprobe=4)[0][0] == "7"
+
+def test_save_commits_with_meta_and_drops_stale_ivf_files(tmp_path):
+    path = str(tmp_path / "idx")
+    store = VectorStore(8)
+    vectors = random_unit(300, 8, seed=4)
+    store.add([f"old{i}" for i in range(300)], vectors)
+    store.build_ivf(nlist=4)
+    store.save(path)
+    # A reader that got the old meta.json just before the next save...
+    old_meta = json.load(open(tmp_path / "idx" / "meta.json"))
+    replacement = VectorStore(8)
+    replacement.add([f"new{i}" for i in range(10)], vectors[:10])
+    replacement.save(path)
+    # ...still opens the arrays that meta named, not the new ones
+    reader = VectorStore._load_generation(path, old_meta, mmap=True)
+    assert len(reader) == 300 and reader.search(vectors[250], k=1, nprobe=4)[0][0] == "old250"
+    loaded = VectorStore.load(path)
+    assert loaded._centroids is None and loaded.search(vectors[3], k=1)[0][0] == "new3"
+    replacement.save(path)
+    assert sorted(p.name for p in (tmp_path / "idx").glob("*.npy")) == ["vectors-2.npy", "vectors-3.npy"]
+
+def test_load_index_saved_without_generations(tmp_path):
+    directory = tmp_path / "idx"
+    directory.mkdir()
+    vectors = random_unit(50, 4, seed=5)
+    np.save(directory / "vectors.npy", vectors)
+    json.dump({"dimensions": 4, "ids": [str(i) for i in range(50)], "texts": [None] * 50},
+              open(directory / "meta.json", "w"))
+    loaded = VectorStore.load(str(directory))
+    assert loaded.search(vectors[7], k=1)[0][0] == "7"
+    loaded.save(str(directory))
+    loaded.save(str(directory))
+    assert sorted(p.name for p in directory.glob("*.npy")) == ["vectors-1.npy", "vectors-2.npy"]
+
+class FakeEmbedder:
+    def embed_many(self, texts, concurrency=8, dimensions=3):
+        vectors = np.zeros((len(texts), dimensions), dtype=np.float32)
+        errors = {}
+        for i, text in enumerate(texts):
+            if text == "bad":
+                errors[i] = "boom"
+            else:
+                vectors[i, len(text) % dimensions] = 1
+        return EmbeddingBatch(vectors, errors)
+
+def test_ingest_skips_failures():
+    store = VectorStore(3)
+    errors = store.ingest(FakeEmbedder(), [("x", "abc"), ("y", "bad"), ("z", "ab")])
+    assert errors == {"y": "boom"}
+    assert len(store) == 2
+
+def test_retriever_filters_by_score(store):
+    retriever = Retriever(store, embed_fn=lambda text: [1, 0, 0], top_k=3, min_score=0.5)
+    assert retriever.retrieve("anything") == ["alpha", "gamma"]
+    failing = Retriever(store, embed_fn=lambda text: (_ for _ in ()).throw(RuntimeError("down")))
+    assert failing.retrieve("anything") == []
@@ -0,0 +1,52 @@
+# token_budget.py
+
+import os
+import re
+
+# Words, numbers and single punctuation marks: each is at least one token
+_PIECES = re.compile(r"\w+|[^\w\s]")
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Fast local estimate of the Llama 3 token count of `text`, without a
+    tokenizer: every word or punctuation mark is at least one token, and
+    English averages about four characters per token, so take the larger.
+    Tends to overestimate slightly, which is the safe side for a budget.
+    """
+    if not text:
+        return 0
+    return max(len(_PIECES.findall(text)), (len(text) + 3) // 4)
+
+
+class TokenBudget:
+    """
+    Upper bound on the estimated size of a prompt. Fixed parts (system
+    text, memory slots, the new user message) are always included; the
+    remaining room goes to context passages and then to as many recent
+    conversation turns as fit.
+    """
+
+    def __init__(self, max_prompt_tokens: int = 2048):
+        self.max_prompt_tokens = max_prompt_tokens
+
+    @classmethod
+    def from_env(cls):
+        """
+        PROMPT_TOKEN_BUDGET sets the maximum estimated prompt size.
+        """
+        return cls(int(os.getenv("PROMPT_TOKEN_BUDGET", "2048")))
+
+    def fit(self, used: int, texts, separator_tokens: int = 1) -> tuple[list, int]:
+        """
+        Take items of `texts` in order while they fit alongside `used`
+        tokens. Returns (kept texts, tokens used including them).
+        """
+        kept = []
+        for text in texts:
+            cost = estimate_tokens(text) + separator_tokens
+            if used + cost > self.max_prompt_tokens:
+                break
+            kept.append(text)
+            used += cost
+        return kept, used
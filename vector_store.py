@@ -0,0 +1,391 @@
+# vector_store.py
+
+import json
+import os
+import re
+import threading
+from errors import ConfigurationError
+from lazy_import import lazy_module
+
+np = lazy_module("numpy")
+
+
+def nearest_centroids(vectors, centroids, rows=None, chunk: int = 16384):
+    """
+    Index of the closest centroid for each vector (or each of `rows`),
+    computed in chunks to bound the size of the score matrix.
+    """
+    rows = np.arange(vectors.shape[0]) if rows is None else rows
+    labels = np.empty(len(rows), dtype=np.int32)
+    for start in range(0, len(rows), chunk):
+        part = vectors[rows[start:start + chunk]]
+        labels[start:start + chunk] = np.argmax(part @ centroids.T, axis=1)
+    return labels
+
+
+def spherical_kmeans(train, nlist: int, iterations: int = 10, rng=None):
+    """
+    `nlist` unit-length centroids for the unit vectors `train`, starting
+    from randomly chosen rows; a cluster that ends up empty keeps its
+    previous centroid.
+    """
+    rng = rng if rng is not None else np.random.default_rng(0)
+    centroids = train[rng.choice(train.shape[0], size=nlist, replace=False)].copy()
+    for _ in range(iterations):
+        labels = nearest_centroids(train, centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, labels, train)
+        norms = np.linalg.norm(sums, axis=1)
+        moved = norms > 0
+        centroids[moved] = sums[moved] / norms[moved, None]
+    return centroids
+
+
+def dedupe_ids(ids: list, vectors, texts: list):
+    """
+    (ids, vectors, texts) keeping only the last occurrence of each id, so a
+    batch that repeats an id adds one row for it rather than a live row
+    that no id points to.
+    """
+    last = {doc_id: i for i, doc_id in enumerate(ids)}
+    if len(last) == len(ids):
+        return ids, vectors, texts
+    keep = sorted(last.values())
+    return [ids[i] for i in keep], vectors[keep], [texts[i] for i in keep]
+
+
+class VectorStore:
+    """
+    In-process cosine-similarity index over Titan embeddings.
+
+    Vectors are L2-normalized and kept as rows of one contiguous float32
+    matrix, so a query is a single matrix-vector product plus argpartition.
+    Deletes only clear the row's `alive` flag; re-adding an id tombstones its
+    old row. save()/load() write plain .npy files, and load(mmap=True) maps
+    the matrix instead of reading it, so large indexes open instantly and
+    their pages are shared between worker processes.
+
+    For very large indexes, build_ivf() partitions rows into `nlist` clusters
+    (spherical k-means); searches then only score the `nprobe` clusters whose
+    centroids are closest to the query. New rows are assigned to their
+    nearest centroid, so adds never require a rebuild.
+    """
+
+    def __init__(self, dimensions: int):
+        self.dimensions = dimensions
+        self._matrix = np.zeros((0, dimensions), dtype=np.float32)
+        self._alive = np.zeros(0, dtype=bool)
+        self._count = 0
+        self._ids = []
+        self._texts = []
+        self._rows = {}            # id -> row
+        self._centroids = None     # (nlist, dimensions) when IVF is built
+        self._assign = np.zeros(0, dtype=np.int32)
+        self._lists = []           # cluster -> list of rows
+        self._list_arrays = {}     # cluster -> cached np.array of its rows
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._rows)
+
+
+    def _reserve(self, extra: int):
+        needed = self._count + extra
+        if needed <= self._matrix.shape[0] and self._matrix.flags.writeable:
+            return
+        capacity = max(needed, 2 * self._matrix.shape[0], 1024)
+        matrix = np.zeros((capacity, self.dimensions), dtype=np.float32)
+        matrix[:self._count] = self._matrix[:self._count]
+        alive = np.zeros(capacity, dtype=bool)
+        alive[:self._count] = self._alive[:self._count]
+        assign = np.full(capacity, -1, dtype=np.int32)
+        assign[:self._count] = self._assign[:self._count]
+        self._matrix, self._alive, self._assign = matrix, alive, assign
+
+    def add(self, ids, vectors, texts=None):
+        """
+        Add (or replace) documents. `vectors` is any (n, dimensions) array-like;
+        `texts` are the passages returned by search(). An id repeated within
+        the batch keeps its last vector.
+        """
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(-1, self.dimensions)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors = vectors / np.where(norms > 0, norms, 1)
+        ids = list(ids)
+        texts = list(texts) if texts is not None else [None] * len(vectors)
+        if len(ids) != len(vectors) or len(texts) != len(vectors):
+            raise ValueError("ids, vectors and texts must have the same length.")
+        ids, vectors, texts = dedupe_ids(ids, vectors, texts)
+        with self._lock:
+            for doc_id in ids:
+                self._tombstone(doc_id)
+            self._reserve(len(vectors))
+            start, end = self._count, self._count + len(vectors)
+            self._matrix[start:end] = vectors
+            self._alive[start:end] = True
+            for offset, doc_id in enumerate(ids):
+                self._rows[doc_id] = start + offset
+            self._ids.extend(ids)
+            self._texts.extend(texts)
+            self._count = end
+            if self._centroids is not None:
+                clusters = nearest_centroids(vectors, self._centroids)
+                self._assign[start:end] = clusters
+                for row, cluster in zip(range(start, end), clusters.tolist()):
+                    self._lists[cluster].append(row)
+                    self._list_arrays.pop(cluster, None)
+
+    def _tombstone(self, doc_id):
+        row = self._rows.pop(doc_id, None)
+        if row is not None:
+            if not self._alive.flags.writeable:
+                self._alive = self._alive.copy()
+            self._alive[row] = False
+
+    def delete(self, ids):
+        with self._lock:
+            for doc_id in ids:
+                self._tombstone(doc_id)
+
+    def ingest(self, embed_client, docs, concurrency: int = 8):
+        """
+        Embed (id, text) pairs with EmbedClient.embed_many and add them.
+        Returns {id: error} for documents that could not be embedded.
+        """
+        docs = list(docs)
+        batch = embed_client.embed_many([text for _, text in docs], concurrency=concurrency, dimensions=self.dimensions)
+        good = [i for i in range(len(docs)) if i not in batch.errors]
+        self.add([docs[i][0] for i in good], batch.vectors[good], [docs[i][1] for i in good])
+        return {docs[i][0]: error for i, error in batch.errors.items()}
+
+
+    def search(self, query, k: int = 5, nprobe: int = 8):
+        """
+        Return up to `k` (id, score, text) tuples by descending cosine
+        similarity. Uses the IVF partitions when built.
+        """
+        query = np.asarray(query, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if norm > 0:
+            query = query / norm
+        with self._lock:
+            if self._count == 0:
+                return []
+            if self._centroids is None:
+                rows = None
+                scores = self._matrix[:self._count] @ query
+                scores[~self._alive[:self._count]] = -np.inf
+            else:
+                probe = np.argsort(self._centroids @ query)[::-1][:nprobe]
+                rows = np.concatenate([self._list_rows(int(c)) for c in probe])
+                rows = rows[self._alive[rows]]
+                if rows.size == 0:
+                    return []
+                scores = self._matrix[rows] @ query
+
+            k = min(k, scores.shape[0])
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+            results = []
+            for i in top.tolist():
+                if scores[i] == -np.inf:
+                    break
+                row = i if rows is None else int(rows[i])
+                results.append((self._ids[row], float(scores[i]), self._texts[row]))
+            return results
+
+    def _list_rows(self, cluster: int):
+        rows = self._list_arrays.get(cluster)
+        if rows is None:
+            rows = self._list_arrays[cluster] = np.asarray(self._lists[cluster], dtype=np.int64)
+        return rows
+
+
+    def build_ivf(self, nlist: int, iterations: int = 10, sample: int = 100_000, seed: int = 0):
+        """
+        Partition the current rows into `nlist` clusters with spherical k-means
+        trained on up to `sample` rows.
+        """
+        with self._lock:
+            live = np.flatnonzero(self._alive[:self._count])
+            if live.size == 0:
+                raise ValueError("Cannot build IVF partitions on an empty store.")
+            nlist = min(nlist, live.size)
+            rng = np.random.default_rng(seed)
+            train = self._matrix[rng.choice(live, size=min(sample, live.size), replace=False)]
+            centroids = spherical_kmeans(train, nlist, iterations, rng)
+
+            # Only the assignments are rewritten; a mapped matrix stays mapped
+            if not self._assign.flags.writeable:
+                self._assign = self._assign.copy()
+            self._centroids = centroids
+            self._assign[:self._count] = -1
+            self._lists = [[] for _ in range(nlist)]
+            self._list_arrays = {}
+            labels = nearest_centroids(self._matrix, centroids, live)
+            self._assign[live] = labels
+            for row, cluster in zip(live.tolist(), labels.tolist()):
+                self._lists[cluster].append(row)
+
+
+    def save(self, directory: str):
+        """
+        Write the live rows to `directory` (compacting away deleted rows).
+
+        The arrays go to files numbered with a new generation
+        (vectors-<n>.npy, plus centroids-<n>.npy and assign-<n>.npy with
+        IVF) and meta.json, which names the generation, is replaced last:
+        it is the commit point, so a concurrent load() sees either the old
+        index or the new one, never a mix. Each file is written under a
+        temporary name and renamed, and files of older generations are
+        removed, except the previous one, which a reader may still be
+        opening; processes that mapped it keep a valid view.
+        """
+        with self._lock:
+            os.makedirs(directory, exist_ok=True)
+            previous = _read_meta(directory).get("generation") if _has_meta(directory) else None
+            generation = (previous or 0) + 1
+            live = np.flatnonzero(self._alive[:self._count])
+            arrays = {"vectors": self._matrix[live]}
+            if self._centroids is not None:
+                arrays["centroids"] = self._centroids
+                arrays["assign"] = self._assign[live]
+            for name, array in arrays.items():
+                path = _array_path(directory, name, generation)
+                with open(path + ".tmp", "wb") as f:
+                    np.save(f, array)
+                os.replace(path + ".tmp", path)
+            meta = {
+                "dimensions": self.dimensions,
+                "generation": generation,
+                "ivf": self._centroids is not None,
+                "ids": [self._ids[i] for i in live.tolist()],
+                "texts": [self._texts[i] for i in live.tolist()],
+            }
+            meta_path = os.path.join(directory, "meta.json")
+            with open(meta_path + ".tmp", "w", encoding="utf-8") as f:
+                json.dump(meta, f)
+            os.replace(meta_path + ".tmp", meta_path)
+            for path, number in index_array_files(directory):
+                if number not in (generation, previous):
+                    os.remove(path)
+
+    @classmethod
+    def load(cls, directory: str, mmap: bool = True):
+        """
+        Open a store written by save(). With mmap=True the matrix is mapped
+        read-only; the first add() copies it into memory.
+        """
+        for attempt in range(3):
+            meta = _read_meta(directory)
+            try:
+                return cls._load_generation(directory, meta, mmap)
+            except FileNotFoundError:
+                # Two saves finished while we read: this generation is gone
+                if attempt == 2:
+                    raise
+
+    @classmethod
+    def _load_generation(cls, directory: str, meta: dict, mmap: bool):
+        generation = meta.get("generation")
+        store = cls(meta["dimensions"])
+        matrix = np.load(_array_path(directory, "vectors", generation), mmap_mode="r" if mmap else None)
+        store._matrix = matrix
+        store._count = matrix.shape[0]
+        store._alive = np.ones(store._count, dtype=bool)
+        store._ids = meta["ids"]
+        store._texts = meta["texts"]
+        store._rows = {doc_id: row for row, doc_id in enumerate(store._ids)}
+        store._assign = np.full(store._count, -1, dtype=np.int32)
+        # Indexes saved before generations were numbered have no "ivf" flag
+        ivf = meta.get("ivf", generation is None and os.path.exists(_array_path(directory, "centroids", None)))
+        if ivf:
+            store._centroids = np.load(_array_path(directory, "centroids", generation))
+            store._assign = np.load(_array_path(directory, "assign", generation))
+            store._lists = [[] for _ in range(store._centroids.shape[0])]
+            for row, cluster in enumerate(store._assign.tolist()):
+                store._lists[cluster].append(row)
+        return store
+
+
+# VectorStore array files: vectors-<generation>.npy etc., or unnumbered for
+# indexes saved before generations were numbered
+_ARRAY_FILE = re.compile(r"(vectors|centroids|assign)(?:-(\d+))?\.npy")
+
+
+def _has_meta(directory: str) -> bool:
+    return os.path.exists(os.path.join(directory, "meta.json"))
+
+
+def _read_meta(directory: str) -> dict:
+    with open(os.path.join(directory, "meta.json"), encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _array_path(directory: str, name: str, generation) -> str:
+    suffix = f"-{generation}" if generation is not None else ""
+    return os.path.join(directory, f"{name}{suffix}.npy")
+
+
+def index_array_files(directory: str) -> list:
+    """
+    (path, generation or None) of every VectorStore array file in
+    `directory`, of any generation.
+    """
+    files = []
+    for entry in os.listdir(directory):
+        match = _ARRAY_FILE.fullmatch(entry)
+        if match:
+            files.append((os.path.join(directory, entry), int(match[2]) if match[2] else None))
+    return files
+
+
+class Retriever:
+    """
+    Embeds a chat message and returns the texts of the `top_k` closest
+    passages in a VectorStore (or QuantizedVectorStore) scoring at least
+    `min_score`.
+    """
+
+    def __init__(self, store, embed_fn, top_k: int = 3, min_score: float = 0.3):
+        self.store = store
+        self.embed_fn = embed_fn
+        self.top_k = top_k
+        self.min_score = min_score
+
+    @classmethod
+    def from_env(cls):
+        """
+        RAG_INDEX_PATH (a directory written by VectorStore.save or
+        QuantizedVectorStore.save) enables retrieval; RAG_TOP_K and
+        RAG_MIN_SCORE tune it. Returns None when disabled.
+        """
+        path = os.getenv("RAG_INDEX_PATH")
+        if not path:
+            return None
+        from client_pool import get_embed_client
+        from quantized_store import QuantizedVectorStore, is_quantized_index
+        if is_quantized_index(path):
+            store = QuantizedVectorStore.load(path)
+        else:
+            store = VectorStore.load(path)
+        return cls(
+            store,
+            embed_fn=lambda text: get_embed_client().embed_text(text, dimensions=store.dimensions),
+            top_k=int(os.getenv("RAG_TOP_K", "3")),
+            min_score=float(os.getenv("RAG_MIN_SCORE", "0.3")),
+        )
+
+    def retrieve(self, text: str) -> list:
+        """
+        Passages relevant to `text`; empty if embedding fails so the chat
+        still goes through without context.
+        """
+        try:
+            query = self.embed_fn(text)
+        except (RuntimeError, ConfigurationError):
+            return []
+        return [
+            passage for _, score, passage in self.store.search(query, k=self.top_k)
+            if passage and score >= self.min_score
+        ]